@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -24,6 +24,7 @@
 """
 Client for querying the fabric manager API
 """
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 from sat.apiclient.gateway import APIError, APIGatewayClient
@@ -101,24 +102,44 @@ class FabricControllerClient(APIGatewayClient):
 
         return enabled_by_xname
 
-    def get_fabric_edge_ports_enabled_status(self):
-        """Gets the enabled status of the ports in the fabric-ports and edge-ports port sets.
+    def get_port_sets_enabled_status(self, port_sets):
+        """Gets the enabled status of the ports in the given port sets concurrently.
+
+        Args:
+            port_sets (list of str): the names of the port sets.
 
         Returns:
-            HSN state information as a dictionary mapping from HSN port set name
-            to a dictionary mapping from xname strings to booleans indicating
-            whether that port is enabled or not.
+            A dictionary mapping from the name of each port set to a dictionary
+            mapping from port xname (str) to enabled status (bool).
 
             If we fail to get enabled status for a port set, it is omitted from the
             returned dictionary, and a warning is logged.
         """
         port_states_by_port_set = {}
+        if not port_sets:
+            return port_states_by_port_set
 
-        for port_set in self.default_port_set_names:
+        with ThreadPoolExecutor(max_workers=len(port_sets)) as executor:
+            futures = {port_set: executor.submit(self.get_port_set_enabled_status, port_set)
+                       for port_set in port_sets}
+
+        for port_set, future in futures.items():
             try:
-                port_states_by_port_set[port_set] = self.get_port_set_enabled_status(port_set)
+                port_states_by_port_set[port_set] = future.result()
             except APIError as err:
                 LOGGER.warning(f'Failed to get port status for port set {port_set}: {err}')
-                continue
 
         return port_states_by_port_set
+
+    def get_fabric_edge_ports_enabled_status(self):
+        """Gets the enabled status of the ports in the fabric-ports and edge-ports port sets.
+
+        Returns:
+            HSN state information as a dictionary mapping from HSN port set name
+            to a dictionary mapping from xname strings to booleans indicating
+            whether that port is enabled or not.
+
+            If we fail to get enabled status for a port set, it is omitted from the
+            returned dictionary, and a warning is logged.
+        """
+        return self.get_port_sets_enabled_status(self.default_port_set_names)
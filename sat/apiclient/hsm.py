@@ -460,6 +460,23 @@ class HSMClient(APIGatewayClient):
         """
         return self.get('Inventory', 'RedfishEndpoints', xname).json()
 
+    @handle_api_errors
+    def get_redfish_endpoints(self, xnames):
+        """Get the Redfish endpoints with the given xnames.
+
+        Args:
+            xnames (Iterable[str]): the xnames of the Redfish endpoints to get
+
+        Returns:
+            list of dict: the Redfish endpoints which exist in HSM. Endpoints
+                which do not exist are omitted.
+
+        Raises:
+            APIError: if there is a problem retrieving the Redfish endpoints
+        """
+        return self.get('Inventory', 'RedfishEndpoints',
+                        params={'id': sorted(xnames)}).json()['RedfishEndpoints']
+
     @handle_api_errors
     def bulk_enable_components(self, components):
         """Bulk enable a set of components.
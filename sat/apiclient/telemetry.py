@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,8 +25,9 @@
 Client for querying the Cray Shasta Telemetry API
 """
 import logging
+from urllib.parse import urlencode, urlunparse
 
-from sat.apiclient.gateway import APIError, APIGatewayClient, ReadTimeout
+from sat.apiclient.gateway import APIError, APIGatewayClient
 
 LOGGER = logging.getLogger(__name__)
 
@@ -49,30 +50,25 @@ class TelemetryAPIClient(APIGatewayClient):
 
         return True
 
-    def stream(self, topic, timeout, params=None):
-        """Create a GET stream connection to the telemetry API.
+    def get_stream_url(self, topic, params=None):
+        """Get the URL of the stream of a telemetry topic.
 
         Args:
             topic (str): The name of the Kafka telemetry topic.
-            timeout (int): The timeout in seconds to wait for a response.
-            params (dict): Parameters dictionary to pass through to requests.get.
+            params (dict): The query parameters of the stream request.
 
         Returns:
-            The requests.models.Response object if the request was successful.
-
-        Raises:
-            ReadTimeout: if requests.get raises a ReadTimeout.
-            APIError: if the status code of the response is >= 400 or requests.get
-                raises a RequestException other than ReadTimeout.
+            str: the URL of the stream
         """
+        return urlunparse(('https', self.host, f'apis/{self.base_resource_path}stream/{topic}',
+                           '', urlencode(params or {}), ''))
 
-        self.set_timeout(timeout)
-        err_prefix = 'Failed to stream telemetry data'
-        try:
-            response = super().stream('stream', topic, params=params)
-        except ReadTimeout as err:
-            raise ReadTimeout(f'{err_prefix}: {err}')
-        except APIError as err:
-            raise APIError(f'{err_prefix}: {err}')
+    def get_stream_headers(self):
+        """Get the headers needed to authenticate a stream request.
 
-        return response
+        Returns:
+            dict: the request headers
+        """
+        if self.session is None or not self.session.session.access_token:
+            return {}
+        return {'Authorization': f'Bearer {self.session.session.access_token}'}
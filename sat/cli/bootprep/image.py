@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -36,6 +36,7 @@ from sat.util import pester_choices
 from sat.waiting import (
     DependencyCycleError,
     DependencyGroupWaiter,
+    get_dependency_cycles,
     WaitingFailure
 )
 
@@ -197,7 +198,6 @@ def find_image_dependencies(input_images):
     """
     input_images_by_name = {input_image.name: input_image
                             for input_image in input_images}
-    cycles_exist = False
     for image in input_images:
         # If it is built from a recipe, or specifies an image by its id, then
         # it does not depend on any names images in the input file.
@@ -209,13 +209,14 @@ def find_image_dependencies(input_images):
         if base_image_name in input_images_by_name:
             LOGGER.info(f'Image named {image.name} depends on image named {base_image_name} '
                         f'which will also be created by this command.')
-            try:
-                image.add_dependency(input_images_by_name[base_image_name])
-            except DependencyCycleError as err:
-                LOGGER.error(str(err))
-                cycles_exist = True
+            # Cycles are checked for once all dependencies have been added
+            image.add_dependency(input_images_by_name[base_image_name], check_cycles=False)
+
+    cycles = get_dependency_cycles(input_images)
+    for cycle in cycles:
+        LOGGER.error(str(DependencyCycleError(cycle)))
 
-    if cycles_exist:
+    if cycles:
         raise ImageCreateError('Circular dependencies exist in images to be created. '
                                'Resolve the circular dependencies and try again.')
 
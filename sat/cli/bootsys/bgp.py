@@ -29,6 +29,7 @@ import re
 import sys
 
 from sat.waiting import Waiter
+from sat.cli.bootsys.util import get_polling_strategy
 from sat.config import get_config_value
 from sat.util import BeginEndLogger
 
@@ -98,6 +99,7 @@ def do_bgp_check(args):
     LOGGER.info('Checking for BGP peering sessions established and re-establishing if necessary.')
     with BeginEndLogger('Wait for BGP peering sessions established'):
         bgp_waiter = BGPSpineStatusWaiter(get_config_value('bootsys.bgp_timeout'))
+        bgp_waiter.polling_strategy = get_polling_strategy('bgp')
         if not bgp_waiter.wait_for_completion():
             sys.exit(1)
         else:
@@ -0,0 +1,274 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Monitors BOA jobs using a watch on Kubernetes Job objects.
+"""
+import logging
+from textwrap import indent
+from threading import Event, Lock, Thread
+
+from kubernetes.client import BatchV1Api
+from kubernetes.client.rest import ApiException
+from kubernetes.watch import Watch
+from urllib3.exceptions import HTTPError
+
+from sat.cli.bootsys.k8s import load_kube_api
+
+LOGGER = logging.getLogger(__name__)
+
+# The namespace and container name of BOA jobs
+BOA_NAMESPACE = 'services'
+BOA_CONTAINER = 'boa'
+
+# The message logged by BOA when it fails in a way retrying will not fix
+BOA_FATAL_ERROR_MSG = ('Fatal conditions have been detected with this run of '
+                       'Boot Orchestration that are not expected to be '
+                       'recoverable through additional iterations.')
+
+# BOA logs the fatal error message as it exits, so only the end of the log
+# needs to be retrieved to find it.
+BOA_LOG_TAIL_LINES = 500
+# The number of log lines to show when a BOA job was not successful
+BOA_LOG_LINES_TO_SHOW = 50
+
+# The states of BOA jobs which have finished
+JOB_COMPLETE = 'Complete'
+JOB_FAILED = 'Failed'
+JOB_DELETED = 'Deleted'
+
+# The number of seconds after which the API server ends each watch request.
+# The watch is restarted from the last resource version it saw.
+WATCH_TIMEOUT = 60
+# The number of seconds to wait before restarting a watch which failed
+WATCH_RETRY_DELAY = 5
+
+
+class BOAJobError(Exception):
+    """Failed to determine the result of a BOA job."""
+    pass
+
+
+def get_job_state(job):
+    """Get the state of a Kubernetes job from its conditions.
+
+    Args:
+        job (kubernetes.client.V1Job): the job
+
+    Returns:
+        str or None: JOB_COMPLETE or JOB_FAILED if the job has finished, or
+            None if it has not.
+    """
+    for condition in (job.status and job.status.conditions) or []:
+        if condition.type in (JOB_COMPLETE, JOB_FAILED) and condition.status == 'True':
+            return condition.type
+    return None
+
+
+class BOAJobMonitor(Thread):
+    """Watches the jobs in the BOA namespace and reports when BOA jobs finish.
+
+    A single watch stream serves every BOA job being waited on. Threads call
+    register() to get an Event which is set when a given job finishes.
+    """
+
+    def __init__(self, batch_api, core_api, namespace=BOA_NAMESPACE):
+        """Create a new BOAJobMonitor.
+
+        Args:
+            batch_api (kubernetes.client.BatchV1Api): the API used to list and
+                watch jobs
+            core_api (kubernetes.client.CoreV1Api): the API used to find the
+                pods of jobs and read their logs
+            namespace (str): the namespace of the BOA jobs
+        """
+        super().__init__(daemon=True)
+        self.batch_api = batch_api
+        self.core_api = core_api
+        self.namespace = namespace
+        self._job_states = {}
+        self._finished_events = {}
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._watch = None
+
+    @classmethod
+    def from_kube_config(cls):
+        """Create a new BOAJobMonitor using the Kubernetes config file.
+
+        Raises:
+            kubernetes.config.config_exception.ConfigException: if failed to
+                load kubernetes configuration.
+        """
+        core_api = load_kube_api()
+        return cls(BatchV1Api(), core_api)
+
+    def register(self, job_name):
+        """Get an Event which is set when the given job finishes.
+
+        Args:
+            job_name (str): the name of the BOA job
+
+        Returns:
+            threading.Event: an event which is set when the job finishes. It
+                is set immediately if the job has already finished.
+        """
+        with self._lock:
+            event = self._finished_events.setdefault(job_name, Event())
+            if job_name in self._job_states:
+                event.set()
+            return event
+
+    def get_job_state(self, job_name):
+        """Get the state of a job.
+
+        Args:
+            job_name (str): the name of the BOA job
+
+        Returns:
+            str or None: JOB_COMPLETE, JOB_FAILED or JOB_DELETED if the job
+                has finished, or None if it has not.
+        """
+        with self._lock:
+            return self._job_states.get(job_name)
+
+    def stop(self):
+        """Stop watching jobs."""
+        self._stop_event.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def _update_job(self, job, deleted=False):
+        """Record the state of a job and notify anyone waiting on it."""
+        state = get_job_state(job)
+        if state is None and deleted:
+            state = JOB_DELETED
+        if state is not None:
+            self._record_job_state(job.metadata.name, state)
+
+    def _record_job_state(self, job_name, state):
+        """Record the final state of a job and notify anyone waiting on it."""
+        with self._lock:
+            if job_name in self._job_states:
+                return
+            self._job_states[job_name] = state
+            event = self._finished_events.get(job_name)
+        if event is not None:
+            LOGGER.debug('BOA job %s finished with state %s.', job_name, state)
+            event.set()
+
+    def _list_jobs(self, relist=False):
+        """List all jobs, recording their states.
+
+        Args:
+            relist (bool): if True, the jobs are being listed again after the
+                watch expired, and any job which was registered before listing
+                but is missing from the list was deleted while not watching.
+
+        Returns:
+            str: the resource version from which to start watching
+        """
+        with self._lock:
+            registered = set(self._finished_events)
+        job_list = self.batch_api.list_namespaced_job(self.namespace)
+        for job in job_list.items:
+            self._update_job(job)
+
+        if relist:
+            listed = {job.metadata.name for job in job_list.items}
+            for job_name in registered - listed:
+                self._record_job_state(job_name, JOB_DELETED)
+
+        return job_list.metadata.resource_version
+
+    def run(self):
+        """Watch jobs until stop() is called."""
+        resource_version = None
+        listed = False
+        while not self._stop_event.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._list_jobs(relist=listed)
+                    listed = True
+                self._watch = Watch()
+                for event in self._watch.stream(self.batch_api.list_namespaced_job, self.namespace,
+                                                resource_version=resource_version,
+                                                timeout_seconds=WATCH_TIMEOUT):
+                    job = event['object']
+                    resource_version = job.metadata.resource_version
+                    self._update_job(job, deleted=event['type'] == 'DELETED')
+            except ApiException as err:
+                if err.status == 410:
+                    # The resource version is too old; list the jobs again.
+                    LOGGER.debug('Watch of BOA jobs expired; listing jobs again.')
+                    resource_version = None
+                    continue
+                LOGGER.warning('Failed to watch BOA jobs: %s', err)
+                self._stop_event.wait(WATCH_RETRY_DELAY)
+            except HTTPError as err:
+                LOGGER.warning('Failed to watch BOA jobs: %s', err)
+                self._stop_event.wait(WATCH_RETRY_DELAY)
+
+    def job_succeeded(self, job_name):
+        """Get whether the given finished BOA job was successful.
+
+        The end of the log of the job's most recent pod is checked for the
+        message BOA logs when it fails.
+
+        Args:
+            job_name (str): the name of the BOA job
+
+        Returns:
+            True if the given BOA job was successful, False otherwise.
+
+        Raises:
+            BOAJobError: if unable to determine success or failure of the job.
+        """
+        msg_prefix = f'Unable to determine success or failure of BOA job with ID {job_name}'
+        try:
+            pods = self.core_api.list_namespaced_pod(self.namespace,
+                                                     label_selector=f'job-name={job_name}').items
+        except (ApiException, HTTPError) as err:
+            raise BOAJobError(f'{msg_prefix}; failed to find pods: {err}')
+        if not pods:
+            raise BOAJobError(f'{msg_prefix}; no pods with job-name={job_name}')
+
+        last_pod = max(pods, key=lambda pod: pod.metadata.creation_timestamp).metadata.name
+        LOGGER.info('Determining success of BOA job with ID %s by checking logs from pod %s',
+                    job_name, last_pod)
+        try:
+            log = self.core_api.read_namespaced_pod_log(last_pod, self.namespace,
+                                                        container=BOA_CONTAINER,
+                                                        tail_lines=BOA_LOG_TAIL_LINES)
+        except (ApiException, HTTPError) as err:
+            raise BOAJobError(f'{msg_prefix}; failed to get logs of pod {last_pod}: {err}')
+
+        log_lines = log.splitlines()
+        success = not any(BOA_FATAL_ERROR_MSG in line for line in log_lines)
+        if not success:
+            lines_to_log = indent('\n'.join(log_lines[-BOA_LOG_LINES_TO_SHOW:]), prefix='  ')
+            LOGGER.error('BOA job %s was not successful. Last %s log lines from pod %s:\n%s',
+                         job_name, BOA_LOG_LINES_TO_SHOW, last_pod, lines_to_log)
+            LOGGER.error('To see full logs, run: \'kubectl -n %s logs -c %s %s\'',
+                         self.namespace, BOA_CONTAINER, last_pod)
+        return success
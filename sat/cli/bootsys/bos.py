@@ -24,7 +24,6 @@
 """
 Bootsys operations that use the Boot Orchestration Service (BOS).
 """
-from collections import defaultdict
 import logging
 import math
 import posixpath
@@ -37,12 +36,16 @@ from threading import Event, Thread
 from time import sleep, monotonic
 
 from inflect import engine
+from kubernetes.config import ConfigException
 
 from sat.apiclient import APIError, HSMClient
 from sat.apiclient.bos import BOSClientCommon
+from sat.cli.bootsys.boa import BOA_FATAL_ERROR_MSG, BOAJobError, BOAJobMonitor, JOB_COMPLETE
 from sat.cli.bootsys.defaults import PARALLEL_CHECK_INTERVAL
+from sat.cli.bootsys.util import get_polling_strategy
 from sat.config import get_config_value
 from sat.session import SATSession
+from sat.template_membership import TemplateMembershipResolver
 from sat.util import pester, prompt_continue
 from sat.xname import XName
 from sat.waiting import Waiter
@@ -179,10 +182,6 @@ def boa_job_successful(boa_job_id):
     logs_cmd = shlex.split('kubectl -n services logs -c boa '
                            '{}'.format(last_pod))
 
-    fatal_err_msg = ('Fatal conditions have been detected with this run of '
-                     'Boot Orchestration that are not expected to be '
-                     'recoverable through additional iterations.')
-
     try:
         logs_proc = subprocess.run(logs_cmd, stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE, check=True,
@@ -191,7 +190,7 @@ def boa_job_successful(boa_job_id):
         raise BOSFailure('{}; failed to get logs of pod {}: {}'.format(
             msg_prefix, last_pod, err))
 
-    success = not any(fatal_err_msg in line
+    success = not any(BOA_FATAL_ERROR_MSG in line
                       for line in logs_proc.stdout.splitlines())
 
     if not success:
@@ -275,7 +274,8 @@ class BOSV2SessionWaiter(Waiter):
 
 class BOSSessionThread(Thread):
 
-    def __init__(self, session_template, operation, limit=None):
+    def __init__(self, session_template, operation, limit=None, boa_job_monitor=None,
+                 finished_event=None):
         """Create a new BOSSessionThread that creates and monitors a BOS session
 
         Args:
@@ -285,12 +285,19 @@ class BOSSessionThread(Thread):
                 session template.
             limit (str): a limit string to pass through to BOS as the `limit`
                 parameter in the POST payload when creating the BOS session
+            boa_job_monitor (BOAJobMonitor or None): the monitor used to wait
+                for the BOA job of a BOS v1 session. If None, 'kubectl' is
+                used instead.
+            finished_event (threading.Event or None): an event to set when
+                this thread finishes
         """
         super().__init__()
         self._stop_event = Event()
         self.session_template = session_template
         self.limit = limit
         self.operation = operation
+        self.boa_job_monitor = boa_job_monitor
+        self.finished_event = finished_event
         self.session_id = None
         self.boa_job_id = None
         self.complete = False
@@ -454,6 +461,63 @@ class BOSSessionThread(Thread):
                     'failed.'.format(self.session_id, self.session_template)
                 )
 
+    def monitor_status_watch(self):
+        """Monitor the status of the BOS session using the BOAJobMonitor.
+
+        The BOAJobMonitor watches all BOA jobs with a single watch of the
+        Kubernetes API, and it sets an event when the BOA job of this session
+        finishes. The end of the job's log is then inspected to determine if
+        it was successful or not.
+
+        Once the BOA job is completed, this method returns, and results are
+        stored in the thread attributes to be examined by the coordinating
+        thread.
+
+        Returns:
+            None
+        """
+        if self.complete:
+            return
+
+        job_finished = self.boa_job_monitor.register(self.boa_job_id)
+
+        LOGGER.info(dedent(f'''
+            Waiting for BOA k8s job with id {self.boa_job_id} to complete. Session template: {self.session_template}.
+            To monitor the progress of this job, run the following command in a separate window:
+                'kubectl -n services logs -c boa -f --selector job-name={self.boa_job_id}'\
+            '''))
+
+        while not self.complete and not self.stopped():
+            if not job_finished.wait(self.check_interval):
+                LOGGER.info("Waiting for BOA k8s job with job ID %s to complete. Session template: %s",
+                            self.boa_job_id, self.session_template)
+                continue
+
+            job_state = self.boa_job_monitor.get_job_state(self.boa_job_id)
+            if job_state != JOB_COMPLETE:
+                self.mark_failed(
+                    f'BOA job {self.boa_job_id} of BOS session with id {self.session_id} '
+                    f'and session template {self.session_template} ended with state {job_state}.'
+                )
+                return
+
+            # Check if successful or failed with logs.
+            try:
+                success = self.boa_job_monitor.job_succeeded(self.boa_job_id)
+            except BOAJobError as err:
+                LOGGER.warning(str(err))
+                self.record_stat_failure()
+                self._stop_event.wait(self.check_interval)
+                continue
+
+            if success:
+                self.complete = True
+            else:
+                self.mark_failed(
+                    'BOS session with id {} and session template {} '
+                    'failed.'.format(self.session_id, self.session_template)
+                )
+
     def monitor_status(self):
         """Monitor the status of the BOS session using a BOS v2 status endpoint.
 
@@ -473,6 +537,8 @@ class BOSSessionThread(Thread):
         # class here.
         waiter = BOSV2SessionWaiter(self, math.inf,
                                     poll_interval=PARALLEL_CHECK_INTERVAL)
+        if self.operation in ('boot', 'shutdown'):
+            waiter.polling_strategy = get_polling_strategy(f'bos-{self.operation}')
 
         waiter.wait_for_completion()
         if waiter.failed:
@@ -513,14 +579,38 @@ class BOSSessionThread(Thread):
         of that session and periodically update the complete, failed, and
         fail_msg attributes as appropriate.
         """
-        self.create_session()
+        try:
+            self.create_session()
+
+            if get_config_value('bos.api_version') == 'v2':
+                self.monitor_status()
+            elif self.boa_job_monitor is not None:
+                # Watch the BOA job for BOS v1 due to initial trouble with
+                # status endpoint (CAMSCMS-5532).
+                self.monitor_status_watch()
+            else:
+                # Use 'kubectl wait', 'kubectl get', and 'kubectl logs' if the
+                # Kubernetes API cannot be used directly.
+                self.monitor_status_kubectl()
+        finally:
+            if self.finished_event is not None:
+                self.finished_event.set()
 
-        if get_config_value('bos.api_version') == 'v2':
-            self.monitor_status()
-        else:
-            # Use 'kubectl wait', 'kubectl get', and 'kubectl logs' for BOS v1
-            # due to initial trouble with status endpoint (CAMSCMS-5532).
-            self.monitor_status_kubectl()
+
+def start_boa_job_monitor():
+    """Start a BOAJobMonitor to wait for the BOA jobs of BOS v1 sessions.
+
+    Returns:
+        BOAJobMonitor or None: the started monitor, or None if the Kubernetes
+            configuration could not be loaded.
+    """
+    try:
+        monitor = BOAJobMonitor.from_kube_config()
+    except ConfigException as err:
+        LOGGER.warning('Unable to watch BOA jobs; falling back to polling with kubectl: %s', err)
+        return None
+    monitor.start()
+    return monitor
 
 
 def do_parallel_bos_operations(session_templates, operation, timeout, limit=None):
@@ -549,7 +639,14 @@ def do_parallel_bos_operations(session_templates, operation, timeout, limit=None
     LOGGER.debug('Doing parallel %s with %s: %s', operation, template_plural,
                  ', '.join(session_templates))
 
-    bos_session_threads = [BOSSessionThread(session_template, operation, limit=limit)
+    boa_job_monitor = None
+    if get_config_value('bos.api_version') != 'v2':
+        boa_job_monitor = start_boa_job_monitor()
+
+    session_finished = Event()
+    bos_session_threads = [BOSSessionThread(session_template, operation, limit=limit,
+                                            boa_job_monitor=boa_job_monitor,
+                                            finished_event=session_finished)
                            for session_template in session_templates]
 
     start_time = monotonic()
@@ -587,7 +684,10 @@ def do_parallel_bos_operations(session_templates, operation, timeout, limit=None
         for finished in just_finished:
             del active_threads[finished]
 
-        sleep(PARALLEL_CHECK_INTERVAL)
+        # Wake up as soon as a session finishes, or periodically to check the timeout.
+        if active_threads:
+            session_finished.wait(min(PARALLEL_CHECK_INTERVAL, max(timeout - elapsed_time, 0)))
+            session_finished.clear()
         elapsed_time = monotonic() - start_time
 
     if active_threads:
@@ -604,6 +704,9 @@ def do_parallel_bos_operations(session_templates, operation, timeout, limit=None
     for thread in bos_session_threads:
         thread.join()
 
+    if boa_job_monitor is not None:
+        boa_job_monitor.stop()
+
     if failed_session_templates:
         raise BOSFailure(
             f'{operation.title()} failed or timed out for session '
@@ -614,11 +717,16 @@ def do_parallel_bos_operations(session_templates, operation, timeout, limit=None
     LOGGER.info('All BOS sessions completed.')
 
 
-def get_template_nodes_by_state(session_template_data):
+def get_template_nodes_by_state(session_template_data, membership_resolver=None):
     """Get a mapping from states to node IDs for nodes in a session template.
 
     Args:
         session_template_data (dict): The session template data returned by BOS.
+        membership_resolver (TemplateMembershipResolver): the resolver to use
+            to expand the boot sets of the session template. Passing the same
+            resolver when checking multiple session templates avoids
+            retrieving nodes from HSM more than once. If None, a new resolver
+            is created.
 
     Returns:
         A dictionary whose keys are the states of nodes and whose values are
@@ -629,69 +737,19 @@ def get_template_nodes_by_state(session_template_data):
         HSMFailure: if unable to get state of nodes included in the boot sets of
             the BOS session template.
     """
-    # The HSM query parameters corresponding to each possible boot set field
-    hsm_params_by_bs_field = {
-        'node_list': 'id',
-        'node_roles_groups': 'role',
-        'node_groups': 'group'
-    }
-
-    hsm_client = HSMClient(SATSession())
+    if membership_resolver is None:
+        membership_resolver = TemplateMembershipResolver(HSMClient(SATSession()))
 
     st_name = session_template_data.get('name')
+    if 'boot_sets' not in session_template_data:
+        raise BOSFailure("Session template '{}' is missing 'boot_sets' "
+                         "key.".format(st_name))
 
     try:
-        boot_sets = session_template_data['boot_sets']
-    except KeyError as err:
-        raise BOSFailure("Session template '{}' is missing '{}' "
-                         "key.".format(st_name, err))
-
-    nodes_by_state = defaultdict(list)
-    for bs_name, bs_data in boot_sets.items():
-        for bs_field, hsm_param in hsm_params_by_bs_field.items():
-
-            try:
-                bs_field_data = bs_data[bs_field]
-            except KeyError:
-                # Boot sets may only have one of the keys specifying nodes
-                continue
-
-            msg_prefix = (
-                "Failed to get state of nodes with {}={} for boot set '{}' of "
-                "session template '{}'".format(hsm_param, bs_field_data,
-                                               bs_name, st_name)
-            )
-
-            # Probably unlikely in practice to have one of the boot set fields
-            # set to an empty list. If it does happen though, we would get back
-            # all nodes from HSM, so skip these here instead.
-            if not bs_field_data:
-                LOGGER.info("BOS session template '%s' has '%s' set to "
-                            "an empty list.", st_name, bs_field)
-                continue
-
-            try:
-                hsm_resp_json = hsm_client.get(
-                    'State', 'Components',
-                    params={'type': 'Node', hsm_param: bs_field_data}
-                ).json()
-            except (APIError, ValueError) as err:
-                raise HSMFailure('{}: {}'.format(msg_prefix, err))
-
-            try:
-                node_states = hsm_resp_json['Components']
-            except KeyError as err:
-                raise HSMFailure("{} due to missing '{}' key in HSM "
-                                 "response.".format(msg_prefix, err))
-
-            for node_state in node_states:
-                try:
-                    nodes_by_state[node_state['State']].append(node_state['ID'])
-                except KeyError as err:
-                    raise HSMFailure("{} due to missing '{}' key in node state"
-                                     ": {}".format(msg_prefix, err, node_state))
-
-    return dict(nodes_by_state)
+        return membership_resolver.get_membership(session_template_data).nodes_by_state
+    except APIError as err:
+        raise HSMFailure("Failed to get state of nodes in boot sets of "
+                         "session template '{}': {}".format(st_name, err))
 
 
 def get_templates_needing_operation(session_templates, operation):
@@ -722,7 +780,18 @@ def get_templates_needing_operation(session_templates, operation):
     else:
         raise ValueError("Unknown operation '{}'".format(operation))
 
-    bos_client = BOSClientCommon.get_bos_client(SATSession())
+    sat_session = SATSession()
+    bos_client = BOSClientCommon.get_bos_client(sat_session)
+    membership_resolver = TemplateMembershipResolver(HSMClient(sat_session))
+
+    # Retrieve all session templates at once, and fall back to retrieving
+    # them individually below if that fails.
+    try:
+        st_data_by_name = {st_data.get('name'): st_data
+                           for st_data in bos_client.get_session_templates()}
+    except (APIError, ValueError) as err:
+        LOGGER.debug("Failed to get all session templates: %s", err)
+        st_data_by_name = {}
 
     needed_st = []
     failed_st = []
@@ -730,7 +799,7 @@ def get_templates_needing_operation(session_templates, operation):
         LOGGER.debug("Checking whether nodes in session template '%s' need "
                      "operation '%s' performed.", session_template, operation)
         try:
-            st_data = bos_client.get_session_template(session_template)
+            st_data = st_data_by_name.get(session_template) or bos_client.get_session_template(session_template)
         except (APIError, ValueError) as err:
             LOGGER.error("Failed to get info about session template '%s': "
                          "%s", session_template, err)
@@ -738,7 +807,7 @@ def get_templates_needing_operation(session_templates, operation):
             continue
 
         try:
-            nodes_by_state = get_template_nodes_by_state(st_data)
+            nodes_by_state = get_template_nodes_by_state(st_data, membership_resolver)
         except (BOSFailure, HSMFailure) as err:
             LOGGER.error("Failed to get state of nodes in session template "
                          "'%s': %s", session_template, err)
@@ -26,133 +26,143 @@ Powers on and off liquid-cooled compute cabinets.
 """
 import logging
 
-from sat.apiclient import APIError, CAPMCClient, HSMClient
+from inflect import engine
+
+from sat.apiclient import APIError, HSMClient
 from sat.cli.bootsys.power import CAPMCPowerWaiter
+from sat.cli.bootsys.power_plan import CabinetPowerPlan
+from sat.cli.bootsys.util import get_polling_strategy
 from sat.config import get_config_value
 from sat.hms_discovery import HMSDiscoveryCronJob, HMSDiscoveryError, HMSDiscoveryScheduledWaiter
+from sat.report import Report
 from sat.session import SATSession
 from sat.util import prompt_continue
 
 
 LOGGER = logging.getLogger(__name__)
+INFLECTOR = engine()
 
+# The names of the phases of the cabinet power plan
+LIQUID_COOLED_PHASE = 'liquid-cooled'
+AIR_COOLED_PHASE = 'air-cooled'
 
-def do_air_cooled_cabinets_power_off(args):
-    """Power off the air-cooled cabinets without management nodes in the system.
 
-    Args:
-        args (argparse.Namespace): The parsed bootsys arguments.
+def get_air_cooled_node_xnames(hsm_client):
+    """Get xnames of the non-management nodes in air-cooled cabinets.
 
     Returns:
-        None
-    """
-    hsm_client = HSMClient(SATSession())
-    try:
-        river_nodes = hsm_client.get_component_xnames({'type': 'Node',
-                                                       'class': 'River'})
-    except APIError as err:
-        LOGGER.error(f'Failed to get the xnames of the air-cooled components: {err}')
-        raise SystemExit(1)
+        [str]: the xnames of all River nodes which are not management nodes.
 
-    try:
-        river_mgmt_nodes = hsm_client.get_component_xnames({'type': 'Node',
-                                                            'role': 'Management',
-                                                            'class': 'River'})
-    except APIError as err:
-        LOGGER.error(f'Failed to get the xnames of the management nodes: {err}')
-        raise SystemExit(1)
-
-    node_xnames = list(set(river_nodes) - set(river_mgmt_nodes))
-    LOGGER.info(f'Powering off {len(node_xnames)} non-management nodes in air-cooled cabinets.')
-    capmc_client = CAPMCClient(SATSession())
-    try:
-        capmc_client.set_xnames_power_state(node_xnames, 'off', force=True)
-    except APIError as err:
-        LOGGER.warning(f'Failed to power off all air-cooled non-management nodes: {err}')
-
-    LOGGER.info(f'Waiting for {len(node_xnames)} non-management nodes in air-cooled cabinets '
-                f'to reach powered off state.')
-    capmc_waiter = CAPMCPowerWaiter(node_xnames, 'off',
-                                    get_config_value('bootsys.capmc_timeout'))
-    timed_out_xnames = capmc_waiter.wait_for_completion()
-
-    if timed_out_xnames:
-        LOGGER.error(f'The following non-management nodes failed to reach the powered off '
-                     f'state after powering off with CAPMC: {timed_out_xnames}')
-        raise SystemExit(1)
-
-    LOGGER.info(f'All {len(node_xnames)} non-management nodes in air-cooled cabinets '
-                f'reached powered off state according to CAPMC.')
+    Raises:
+        APIError: if the xnames cannot be retrieved from HSM.
+    """
+    river_nodes = hsm_client.get_component_xnames({'type': 'Node', 'class': 'River'})
+    river_mgmt_nodes = hsm_client.get_component_xnames({'type': 'Node',
+                                                        'role': 'Management',
+                                                        'class': 'River'})
+    return sorted(set(river_nodes) - set(river_mgmt_nodes))
 
 
 def get_xnames_for_power_action(hsm_client):
     """Get xnames of RouterModules, ComputeModules, and Chassis.
 
-    This helper function gets all the xnames used in a power action (turn on or
-    turn off) individually since CAPMC does not support recursively powering off
-    disabled components in Shasta v1.5. See CRAYSAT-920.
+    This helper function gets the xnames of the components themselves, rather
+    than their cabinets, to include in a power action (turn on or turn off)
+    since CAPMC does not support recursively powering off disabled components
+    in Shasta v1.5. See CRAYSAT-920. The components of all three types are
+    retrieved from HSM with a single query, and they may then be powered in a
+    single request or in batches of cabinets.
 
     Returns:
         [str]: all xnames for RouterModules, ComputeModules, and Chassis in
                the system.
     """
-    return [component
-            for component_type in ['RouterModule', 'ComputeModule', 'Chassis']
-            for component in hsm_client.get_component_xnames({'type': component_type,
-                                                              'class': 'Mountain',
-                                                              'enabled': True})]
+    return hsm_client.get_component_xnames({'type': ['RouterModule', 'ComputeModule', 'Chassis'],
+                                            'class': 'Mountain',
+                                            'enabled': True})
 
 
-def do_liquid_cooled_cabinets_power_off(args):
-    """Power off the liquid-cooled compute cabinets in the system.
+def get_cabinets_power_off_plan():
+    """Get the plan for powering off the liquid-cooled and air-cooled cabinets.
 
-    Args:
-        args (argparse.Namespace): The parsed bootsys arguments.
+    The liquid-cooled chassis and their modules, and the non-management nodes
+    in air-cooled cabinets, are each divided into batches of cabinets as given
+    by the `bootsys.cabinet_batch_size` option. Since the two are in different
+    cabinets, their batches may be powered off at the same time.
 
     Returns:
-        None
+        CabinetPowerPlan: the plan
+
+    Raises:
+        SystemExit: if the components cannot be retrieved from HSM.
     """
     hsm_client = HSMClient(SATSession())
+    plan = CabinetPowerPlan('off', get_config_value('bootsys.cabinet_batch_size'),
+                            get_config_value('bootsys.max_concurrent_cabinet_batches'))
+
     try:
-        xnames_to_power_off = get_xnames_for_power_action(hsm_client)
+        plan.add_phase(LIQUID_COOLED_PHASE, get_xnames_for_power_action(hsm_client))
     except APIError as err:
         LOGGER.error(f'Failed to get the xnames of the liquid-cooled chassis and sub-components: {err}')
         raise SystemExit(1)
 
-    LOGGER.info(f'Powering off all liquid-cooled chassis, compute modules, and router modules. '
-                f'({len(xnames_to_power_off)} components total)')
-    capmc_client = CAPMCClient(SATSession())
     try:
-        capmc_client.set_xnames_power_state(xnames_to_power_off, 'off')
+        # Nodes in air-cooled cabinets are powered off with force, as before
+        plan.add_phase(AIR_COOLED_PHASE, get_air_cooled_node_xnames(hsm_client), force=True)
     except APIError as err:
-        LOGGER.warning(f'Failed to power off all cabinets: {err}')
-        if hasattr(err, '__cause__'):
-            LOGGER.warning(f'Cause: {err.__cause__}')
-
-    LOGGER.info(f'Waiting for {len(xnames_to_power_off)} components to reach '
-                f'powered off state.')
-    capmc_waiter = CAPMCPowerWaiter(xnames_to_power_off, 'off',
-                                    get_config_value('bootsys.capmc_timeout'))
-    timed_out_xnames = capmc_waiter.wait_for_completion()
-
-    if timed_out_xnames:
-        LOGGER.error(f'The following components failed to reach the powered off '
-                     f'state after powering off with CAPMC: {timed_out_xnames}')
+        LOGGER.error(f'Failed to get the xnames of the air-cooled components: {err}')
         raise SystemExit(1)
 
-    LOGGER.info(f'All {len(xnames_to_power_off)} liquid-cooled chassis components reached powered off '
-                f'state according to CAPMC.')
+    return plan
+
+
+def print_power_plan(plan, batch_duration, timeout):
+    """Print the batches of a power plan and an estimate of its duration.
+
+    Args:
+        plan (CabinetPowerPlan): the plan to print
+        batch_duration (float): the expected number of seconds for the
+            components of a batch to reach the power state
+        timeout (float): the maximum number of seconds to wait for each batch
+
+    Returns:
+        None
+    """
+    report = Report(['Phase', 'Batch', 'Cabinets', 'Chassis', 'Components', 'Cabinet Names'],
+                    title=f'Cabinet Power {plan.power_state.title()} Plan')
+    report.add_rows(plan.get_report_rows())
+    print(report)
+
+    num_batches = len(plan.batches)
+    print(f'{num_batches} {INFLECTOR.plural("batch", num_batches)} will be powered '
+          f'{plan.power_state}, up to {plan.max_concurrent_batches} at a time, in '
+          f'{plan.num_rounds} {INFLECTOR.plural("round", plan.num_rounds)}. Estimated time: '
+          f'{plan.estimate_duration(batch_duration):.0f} seconds '
+          f'(at most {plan.estimate_duration(timeout):.0f} seconds).')
 
 
 def do_cabinets_power_off(args):
     """Power off the compute cabinets in the system.
 
+    The liquid-cooled chassis and the non-management nodes in air-cooled
+    cabinets are powered off in batches of cabinets according to a
+    CabinetPowerPlan. With the `dry_run` argument, the plan is printed along
+    with an estimate of how long it will take, and nothing is powered off.
+
     Args:
         args (argparse.Namespace): The parsed bootsys arguments.
 
     Returns:
         None
     """
+    capmc_timeout = get_config_value('bootsys.capmc_timeout')
+
+    if getattr(args, 'dry_run', False):
+        # Without an expected duration, expect completion halfway to the timeout.
+        batch_duration = get_config_value('bootsys.capmc_expected_duration') or capmc_timeout / 2
+        print_power_plan(get_cabinets_power_off_plan(), batch_duration, capmc_timeout)
+        return
+
     if not args.disruptive:
         prompt_continue('powering off compute cabinets')
 
@@ -164,8 +174,23 @@ def do_cabinets_power_off(args):
         LOGGER.error(f'Failed to suspend discovery: {err}')
         raise SystemExit(1)
 
-    do_liquid_cooled_cabinets_power_off(args)
-    do_air_cooled_cabinets_power_off(args)
+    plan = get_cabinets_power_off_plan()
+    num_xnames = sum(len(batch.xnames) for batch in plan.batches)
+    LOGGER.info(f'Powering off {num_xnames} components in {len(plan.batches)} batches of cabinets, '
+                f'up to {plan.max_concurrent_batches} at a time.')
+    timed_out_by_phase = plan.execute(capmc_timeout, get_polling_strategy('capmc'))
+
+    failed = False
+    for phase, timed_out_xnames in timed_out_by_phase.items():
+        if timed_out_xnames:
+            LOGGER.error(f'The following {phase} components failed to reach the powered off '
+                         f'state after powering off with CAPMC: {", ".join(sorted(timed_out_xnames))}')
+            failed = True
+    if failed:
+        raise SystemExit(1)
+
+    LOGGER.info(f'All {num_xnames} components in liquid-cooled and air-cooled cabinets reached '
+                f'powered off state according to CAPMC.')
 
 
 def do_cabinets_power_on(args):
@@ -216,6 +241,7 @@ def do_cabinets_power_on(args):
     module_waiter = CAPMCPowerWaiter(xnames_to_power_on, 'on',
                                      get_config_value('bootsys.discovery_timeout'),
                                      suppress_warnings=True)
+    module_waiter.polling_strategy = get_polling_strategy('discovery')
     modules_timed_out = module_waiter.wait_for_completion()
 
     if modules_timed_out:
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -26,12 +26,9 @@ Contains classes and functions for checking, freezing and restarting Ceph.
 """
 import json
 import logging
-import socket
 import subprocess
 
-from paramiko import SSHException
-
-from sat.cli.bootsys.util import get_ssh_client
+from sat.cli.bootsys.ssh import run_on_host, run_on_hosts
 from sat.waiting import Waiter
 
 LOGGER = logging.getLogger(__name__)
@@ -73,44 +70,56 @@ class CephHealthWaiter(Waiter):
         Args: None.
         Returns: None.
         """
-        for node in self.storage_hosts:
-            client = get_ssh_client()
+        # Listing the units is read-only, so it is done on all nodes at once.
+        # The units are still restarted one node at a time.
+        listings = run_on_hosts(self.storage_hosts, 'cephadm ls')
+        for node, listing in listings.items():
             try:
-                try:
-                    client.connect(node)
-                except (SSHException, socket.error) as err:
-                    raise CephServiceRestartError(err)
-
-                _, stdout, stderr = client.exec_command('cephadm ls')
-                stderr_contents = stderr.read().decode().strip()
-                if stderr_contents:
-                    raise CephServiceRestartError(f"Could not list Ceph systemd units: "
-                                                  f"{stderr_contents}")
-
-                try:
-                    cephadm_result = json.load(stdout)
-                    systemd_units = [service['systemd_unit'] for service in cephadm_result]
-                except ValueError as err:
-                    raise CephServiceRestartError(f"cephadm returned malformed JSON while "
-                                                  f"listing services: {err}") from err
-                except KeyError as err:
-                    raise CephServiceRestartError(f"cephadm returned valid JSON, but it "
-                                                  f"was missing the required 'systemd_unit' key")
-
-                for systemd_unit in systemd_units:
-                    LOGGER.debug("Restarting unit %s on node %s", systemd_unit, node)
-                    _, _, stderr = client.exec_command(f'systemctl restart "{systemd_unit}"')
-                    stderr_contents = stderr.read().decode().strip()
-                    if stderr_contents:
-                        raise CephServiceRestartError(f"Could not restart systemd unit {systemd_unit}: "
-                                                      f"{stderr_contents}")
-                    else:
-                        LOGGER.debug(f"Restarted {systemd_unit} on {node}, stderr returned empty.")
-
+                self._restart_ceph_units(node, listing)
             except CephServiceRestartError as err:
                 LOGGER.warning("Could not restart Ceph services on storage node %s: %s", node, err)
-            finally:
-                client.close()
+
+    @staticmethod
+    def _restart_ceph_units(node, listing):
+        """Restart the Ceph systemd units listed by cephadm on a storage node.
+
+        Args:
+            node (str): the storage node on which to restart the units
+            listing (CommandResult): the result of 'cephadm ls' on the node
+
+        Raises:
+            CephServiceRestartError: if the units could not be listed or
+                restarted.
+        """
+        if listing.error:
+            raise CephServiceRestartError(listing.error)
+
+        stderr_contents = listing.stderr.strip()
+        if stderr_contents:
+            raise CephServiceRestartError(f"Could not list Ceph systemd units: "
+                                          f"{stderr_contents}")
+
+        try:
+            cephadm_result = json.loads(listing.stdout)
+            systemd_units = [service['systemd_unit'] for service in cephadm_result]
+        except ValueError as err:
+            raise CephServiceRestartError(f"cephadm returned malformed JSON while "
+                                          f"listing services: {err}") from err
+        except KeyError as err:
+            raise CephServiceRestartError(f"cephadm returned valid JSON, but it "
+                                          f"was missing the required 'systemd_unit' key")
+
+        for systemd_unit in systemd_units:
+            LOGGER.debug("Restarting unit %s on node %s", systemd_unit, node)
+            result = run_on_host(node, f'systemctl restart "{systemd_unit}"')
+            if result.error:
+                raise CephServiceRestartError(result.error)
+            stderr_contents = result.stderr.strip()
+            if stderr_contents:
+                raise CephServiceRestartError(f"Could not restart systemd unit {systemd_unit}: "
+                                              f"{stderr_contents}")
+            else:
+                LOGGER.debug(f"Restarted {systemd_unit} on {node}, stderr returned empty.")
 
 
 def validate_ceph_warning_state(ceph_check_data, allow_osdmap_flags=True):
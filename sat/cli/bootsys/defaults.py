@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,16 +25,12 @@
 Some constant default values used in the bootsys code.
 """
 
-# The default directory where pre-shutdown state is captured (currently k8s pod
-# states, HSN status). This can be overridden on the command-line.
-DEFAULT_LOCAL_STATE_DIR = '/var/sat/bootsys/'
-
-# The directory within DEFAULT_LOCAL_STATE_DIR where pod state is stored and read from
+# The directory within the S3 bucket where pod state is stored and read from
 POD_STATE_DIR = 'pod-states/'
 # The prefix used for files that record pod states.
 POD_STATE_FILE_PREFIX = 'pod-states'
 
-# The directory within DEFAULT_LOCAL_STATE_DIR where high-speed network (HSN) state is stored and read from
+# The directory within the S3 bucket where high-speed network (HSN) state is stored and read from
 HSN_STATE_DIR = 'hsn-states/'
 # The prefix used for files that record HSN state
 HSN_STATE_FILE_PREFIX = 'hsn-state'
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -28,7 +28,7 @@ import logging
 import os
 import socket
 
-from sat.cli.bootsys.util import get_ssh_client
+from sat.cli.bootsys.ssh import get_ssh_session_pool, run_on_host
 
 from paramiko import SSHException
 
@@ -64,22 +64,19 @@ def save_etcd_snapshot_on_host(hostname):
         EtcdSnapshotFailure: if there is a failure to create the directory for
             the snapshot or a failure to create the snapshot
     """
-    ssh_client = get_ssh_client()
-
+    pool = get_ssh_session_pool()
     try:
-        ssh_client.connect(hostname)
+        pool.get_client(hostname)
     except (SSHException, socket.error) as err:
         raise EtcdSnapshotFailure(f'Failed to connect to {hostname}: {err}')
 
     # If etcd is not active, attempting to create a snapshot will hang
-    try:
-        _, stdout, stderr = ssh_client.exec_command("systemctl is-active etcd")
-    except SSHException as err:
+    result = run_on_host(hostname, 'systemctl is-active etcd', pool=pool)
+    if result.error is not None:
         raise EtcdSnapshotFailure(f'Failed to determine if etcd is active on {hostname} '
-                                  f'before attempting snapshot: {err}')
+                                  f'before attempting snapshot: {result.error}')
 
-    exit_status = stdout.channel.recv_exit_status()
-    if exit_status:
+    if result.exit_status:
         raise EtcdInactiveFailure(f'The etcd service is not active on {hostname} '
                                   f'so a snapshot cannot be created.')
 
@@ -92,14 +89,12 @@ def save_etcd_snapshot_on_host(hostname):
     commands = [mkdir_cmd, etcd_cmd]
 
     for command in commands:
-        try:
-            _, stdout, stderr = ssh_client.exec_command(command)
-        except SSHException as err:
-            raise EtcdSnapshotFailure(f'Failed to execute "{command}" on {hostname}: {err}')
+        result = run_on_host(hostname, command, pool=pool)
+        if result.error is not None:
+            raise EtcdSnapshotFailure(result.error)
 
-        exit_status = stdout.channel.recv_exit_status()
-        if exit_status:
+        if result.exit_status:
             raise EtcdSnapshotFailure(
                 f'Command "{command}" on {hostname} exited with non-zero exit status: '
-                f'{exit_status}, stderr: {stderr.read()}, stdout: {stdout.read()}'
+                f'{result.exit_status}, stderr: {result.stderr}, stdout: {result.stdout}'
             )
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -33,6 +33,7 @@ import inflect
 from sat.apiclient import FabricControllerClient
 from sat.cached_property import cached_property
 from sat.cli.bootsys.state_recorder import HSNStateRecorder, StateError
+from sat.cli.bootsys.util import get_polling_strategy
 from sat.waiting import GroupWaiter
 from sat.config import get_config_value
 from sat.session import SATSession
@@ -46,6 +47,169 @@ INF = inflect.engine()
 HSNPort = namedtuple('HSNPort', ('port_set', 'port_xname'))
 
 
+def get_set_bits(bitmap):
+    """Get the indices of the bits which are set in a bitmap.
+
+    Args:
+        bitmap (int): the bitmap
+
+    Yields:
+        int: the index of each set bit, from lowest to highest
+    """
+    while bitmap:
+        lowest_bit = bitmap & -bitmap
+        yield lowest_bit.bit_length() - 1
+        bitmap ^= lowest_bit
+
+
+class PortSetState:
+    """The state of the ports in an HSN port set, stored as bitmaps.
+
+    Bit i of each bitmap corresponds to the port at index i of `ports`. A port
+    is ready when its status has been reported and it is either enabled or was
+    disabled before the shutdown.
+    """
+
+    def __init__(self, name, port_xnames, stored_state):
+        """Create a new PortSetState.
+
+        Args:
+            name (str): the name of the port set
+            port_xnames (list of str): the xnames of the ports in the port set
+            stored_state (dict): a mapping from port xname to enabled status
+                from before the shutdown. Ports which are not in the stored
+                state are expected to be enabled.
+        """
+        self.name = name
+        self.ports = sorted(port_xnames)
+        self.index_by_xname = {xname: index for index, xname in enumerate(self.ports)}
+        self.all_ports = (1 << len(self.ports)) - 1
+        self.expected_enabled = sum(1 << index for index, xname in enumerate(self.ports)
+                                    if stored_state.get(xname, True))
+        self.reported = 0
+        self.enabled = 0
+
+    @property
+    def ready(self):
+        """int: the bitmap of ports which are ready"""
+        return self.reported & (self.enabled | ~self.expected_enabled) & self.all_ports
+
+    @property
+    def converged(self):
+        """bool: True if every port in the port set is ready"""
+        return self.ready == self.all_ports
+
+    @property
+    def num_enabled(self):
+        """int: the number of enabled ports"""
+        return bin(self.enabled).count('1')
+
+    def get_xnames(self, bitmap):
+        """Get the xnames of the ports in a bitmap."""
+        return [self.ports[index] for index in get_set_bits(bitmap)]
+
+    def port_is_ready(self, port_xname):
+        """Get whether the port with the given xname is ready."""
+        index = self.index_by_xname.get(port_xname)
+        return index is not None and bool(self.ready >> index & 1)
+
+    def update(self, enabled_by_xname):
+        """Update the state of the ports from their latest enabled status.
+
+        Ports which are not in the port set are ignored, and ports which are
+        missing from the given status are treated as not reported.
+
+        Args:
+            enabled_by_xname (dict): a mapping from port xname to enabled status
+
+        Returns:
+            tuple of (int, int): bitmaps of the ports which have become ready
+                and the ports which are no longer ready since the last update
+        """
+        reported = 0
+        enabled = 0
+        for port_xname, port_enabled in enabled_by_xname.items():
+            index = self.index_by_xname.get(port_xname)
+            if index is None:
+                continue
+            reported |= 1 << index
+            if port_enabled:
+                enabled |= 1 << index
+
+        previously_ready = self.ready
+        self.reported = reported
+        self.enabled = enabled
+        changed = previously_ready ^ self.ready
+        return changed & self.ready, changed & previously_ready
+
+
+class HSNStateTracker:
+    """Tracks the state of HSN ports as they come up.
+
+    Only port sets which still have ports that are not ready are queried on
+    each poll, and those port sets are queried concurrently.
+    """
+
+    def __init__(self, fabric_client, ports_by_port_set, stored_state):
+        """Create a new HSNStateTracker.
+
+        Args:
+            fabric_client (FabricControllerClient): the client used to query
+                the status of the ports
+            ports_by_port_set (dict): a mapping from port set name to a list
+                of the xnames of the ports in that port set
+            stored_state (dict): a mapping from port set name to a mapping
+                from port xname to enabled status from before the shutdown
+        """
+        self.fabric_client = fabric_client
+        self.port_sets = {
+            port_set: PortSetState(port_set, port_xnames, stored_state.get(port_set, {}))
+            for port_set, port_xnames in ports_by_port_set.items()
+        }
+
+    @property
+    def num_ports(self):
+        """int: the total number of ports in all port sets"""
+        return sum(len(state.ports) for state in self.port_sets.values())
+
+    @property
+    def num_enabled(self):
+        """int: the total number of enabled ports in all port sets"""
+        return sum(state.num_enabled for state in self.port_sets.values())
+
+    def poll(self):
+        """Get the latest status of the ports in the port sets which have not converged."""
+        pending_port_sets = [port_set for port_set, state in self.port_sets.items()
+                             if not state.converged]
+        statuses = self.fabric_client.get_port_sets_enabled_status(pending_port_sets)
+
+        for port_set, enabled_by_xname in statuses.items():
+            state = self.port_sets[port_set]
+            now_ready, no_longer_ready = state.update(enabled_by_xname)
+            if now_ready:
+                LOGGER.debug(f'Ports in port set {port_set} now ready: '
+                             f'{", ".join(state.get_xnames(now_ready))}')
+            if no_longer_ready:
+                LOGGER.warning(f'Ports in port set {port_set} no longer ready: '
+                               f'{", ".join(state.get_xnames(no_longer_ready))}')
+            if state.converged:
+                LOGGER.info(f'All ports in port set {port_set} are ready.')
+
+    def port_is_ready(self, port_set, port_xname):
+        """Get whether a port is ready.
+
+        Args:
+            port_set (str): the name of the port set of the port
+            port_xname (str): the xname of the port
+
+        Returns:
+            True if the port is enabled or was disabled before the shutdown,
+            and False otherwise.
+        """
+        state = self.port_sets.get(port_set)
+        return state is not None and state.port_is_ready(port_xname)
+
+
 class HSNBringupWaiter(GroupWaiter):
     """Run the HSN bringup script and wait for it to be brought up."""
 
@@ -54,8 +218,9 @@ class HSNBringupWaiter(GroupWaiter):
         super().__init__(set(), timeout, poll_interval)
         self.fabric_client = FabricControllerClient(SATSession())
         self.hsn_state_recorder = HSNStateRecorder()
-        # dict mapping from port set name to dict mapping from port xname to enabled status
-        self.current_hsn_state = {}
+        # Created once the ports in each port set are known
+        self.hsn_state_tracker = None
+        self.num_enabled = None
 
     def condition_name(self):
         return "HSN bringup"
@@ -64,13 +229,20 @@ class HSNBringupWaiter(GroupWaiter):
         # TODO (SAT-591): Add HSN bringup here
 
         # Populate members with known members from fabric controller API
+        ports_by_port_set = self.fabric_client.get_fabric_edge_ports()
         self.members = {HSNPort(port_set, port_xname)
-                        for port_set, port_xnames in self.fabric_client.get_fabric_edge_ports().items()
+                        for port_set, port_xnames in ports_by_port_set.items()
                         for port_xname in port_xnames}
+        self.hsn_state_tracker = HSNStateTracker(self.fabric_client, ports_by_port_set,
+                                                 self.stored_hsn_state)
 
     def on_check_action(self):
         """Get the latest HSN state from the fabric controller API."""
-        self.current_hsn_state = self.fabric_client.get_fabric_edge_ports_enabled_status()
+        self.hsn_state_tracker.poll()
+        num_enabled = self.hsn_state_tracker.num_enabled
+        if num_enabled != self.num_enabled:
+            LOGGER.info(f'{num_enabled} of {self.hsn_state_tracker.num_ports} HSN links up')
+            self.num_enabled = num_enabled
 
     @cached_property
     def stored_hsn_state(self):
@@ -90,6 +262,11 @@ class HSNBringupWaiter(GroupWaiter):
     def member_has_completed(self, member):
         """Get whether the given member has completed.
 
+        If the port was not known before shutdown, it is expected to be
+        enabled. E.g., this could happen if a switch or cable was added while
+        the system was shut down. If no state is reported for the port, then
+        it is not healthy.
+
         Args:
             member (HSNPort): the port to check for completion.
 
@@ -97,22 +274,7 @@ class HSNBringupWaiter(GroupWaiter):
             True if the port status is enabled or if the port was disabled
             before the shutdown. False otherwise.
         """
-        try:
-            expected_state = self.stored_hsn_state[member.port_set][member.port_xname]
-        except KeyError:
-            # If the port was not known before shutdown, assume it should be enabled.
-            # E.g., this could happen if a switch or cable was added while the system
-            # was shut down.
-            expected_state = True
-
-        try:
-            current_state = self.current_hsn_state[member.port_set][member.port_xname]
-        except KeyError:
-            # If no state is reported for this port, then it is not healthy
-            return False
-
-        # if expected state is true, then current state must be true
-        return current_state or not expected_state
+        return self.hsn_state_tracker.port_is_ready(member.port_set, member.port_xname)
 
 
 def do_hsn_bringup(args):
@@ -133,6 +295,7 @@ def do_hsn_bringup(args):
     LOGGER.info('Bringing up HSN and waiting for it to be healthy.')
 
     hsn_waiter = HSNBringupWaiter(get_config_value('bootsys.hsn_timeout'))
+    hsn_waiter.polling_strategy = get_polling_strategy('hsn')
     with BeginEndLogger('bring up HSN and wait for healthy'):
         hsn_waiter.wait_for_completion()
 
@@ -0,0 +1,609 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+An IPMI v2.0 (RMCP+) client which keeps a session open to each BMC.
+
+Running ipmitool sets up a new RMCP+ session each time, which takes several
+round trips to the BMC. The IPMISessionEngine instead sets up one session
+per BMC and sends every later command over that session.
+
+Only what is needed to control the power of NCNs is implemented. Sessions use
+cipher suite 3, which is RAKP-HMAC-SHA1 authentication, HMAC-SHA1-96
+integrity and AES-CBC-128 confidentiality. The only commands supported are
+Get Chassis Status, Chassis Control and Close Session.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import struct
+from threading import Lock
+from time import monotonic
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+LOGGER = logging.getLogger(__name__)
+
+IPMI_PORT = 623
+
+# An RMCP header for an IPMI message, which is never acknowledged
+RMCP_HEADER = bytes([0x06, 0x00, 0xFF, 0x07])
+AUTH_TYPE_RMCP_PLUS = 0x06
+# The length of the session header from the auth type through the payload length
+SESSION_HEADER_LENGTH = 12
+NEXT_HEADER = 0x07
+
+PAYLOAD_IPMI = 0x00
+PAYLOAD_OPEN_SESSION_REQUEST = 0x10
+PAYLOAD_OPEN_SESSION_RESPONSE = 0x11
+PAYLOAD_RAKP1 = 0x12
+PAYLOAD_RAKP2 = 0x13
+PAYLOAD_RAKP3 = 0x14
+PAYLOAD_RAKP4 = 0x15
+PAYLOAD_ENCRYPTED = 0x80
+PAYLOAD_AUTHENTICATED = 0x40
+PAYLOAD_TYPE_MASK = 0x3F
+
+AUTH_RAKP_HMAC_SHA1 = 0x01
+INTEGRITY_HMAC_SHA1_96 = 0x01
+CONFIDENTIALITY_AES_CBC_128 = 0x01
+AUTH_CODE_LENGTH = 12
+AES_BLOCK_SIZE = 16
+
+PRIVILEGE_ADMINISTRATOR = 0x04
+# Look up the user by name only, rather than by name and privilege level
+NAME_ONLY_LOOKUP = 0x10
+
+BMC_ADDRESS = 0x20
+REMOTE_CONSOLE_ADDRESS = 0x81
+
+NETFN_CHASSIS = 0x00
+NETFN_APP = 0x06
+CMD_GET_CHASSIS_STATUS = 0x01
+CMD_CHASSIS_CONTROL = 0x02
+CMD_CLOSE_SESSION = 0x3C
+
+CHASSIS_CONTROL_BY_POWER_STATE = {
+    'off': 0x00,
+    'on': 0x01,
+}
+
+
+class IPMIError(Exception):
+    """An IPMI request failed."""
+    pass
+
+
+class IPMITimeoutError(IPMIError):
+    """The BMC did not respond to an IPMI request."""
+    pass
+
+
+class IPMISessionSetupError(IPMIError):
+    """The BMC refused to set up a session."""
+    pass
+
+
+def hmac_sha1(key, data):
+    """Get the HMAC-SHA1 of the data with the given key."""
+    return hmac.new(key, data, hashlib.sha1).digest()
+
+
+def get_user_key(password):
+    """Get the key used to authenticate a user from their password."""
+    return password.encode().ljust(20, b'\x00')[:20]
+
+
+def get_rakp2_auth_code(user_key, console_sid, bmc_sid, console_rand, bmc_rand, bmc_guid, role, username):
+    """Get the key exchange authentication code sent by the BMC in RAKP message 2."""
+    return hmac_sha1(user_key, struct.pack('<II', console_sid, bmc_sid) + console_rand + bmc_rand +
+                     bmc_guid + bytes([role, len(username)]) + username)
+
+
+def get_rakp3_auth_code(user_key, bmc_rand, console_sid, role, username):
+    """Get the key exchange authentication code sent by the console in RAKP message 3."""
+    return hmac_sha1(user_key, bmc_rand + struct.pack('<I', console_sid) + bytes([role, len(username)]) + username)
+
+
+def get_session_integrity_key(user_key, console_rand, bmc_rand, role, username):
+    """Get the session integrity key (SIK) from which the session keys are derived."""
+    return hmac_sha1(user_key, console_rand + bmc_rand + bytes([role, len(username)]) + username)
+
+
+def get_rakp4_integrity_check(session_integrity_key, console_rand, bmc_sid, bmc_guid):
+    """Get the integrity check value sent by the BMC in RAKP message 4."""
+    return hmac_sha1(session_integrity_key, console_rand + struct.pack('<I', bmc_sid) + bmc_guid)[:AUTH_CODE_LENGTH]
+
+
+def get_session_keys(session_integrity_key):
+    """Get the integrity key (K1) and confidentiality key (K2) of a session."""
+    return (hmac_sha1(session_integrity_key, b'\x01' * 20),
+            hmac_sha1(session_integrity_key, b'\x02' * 20)[:AES_BLOCK_SIZE])
+
+
+def encrypt_payload(key, payload):
+    """Encrypt a payload with AES-CBC-128."""
+    pad_length = (AES_BLOCK_SIZE - (len(payload) + 1) % AES_BLOCK_SIZE) % AES_BLOCK_SIZE
+    plaintext = payload + bytes(range(1, pad_length + 1)) + bytes([pad_length])
+    iv = os.urandom(AES_BLOCK_SIZE)
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return iv + encryptor.update(plaintext) + encryptor.finalize()
+
+
+def decrypt_payload(key, payload):
+    """Decrypt a payload encrypted with AES-CBC-128.
+
+    Raises:
+        IPMIError: if the payload is not validly encrypted.
+    """
+    if len(payload) < 2 * AES_BLOCK_SIZE or len(payload) % AES_BLOCK_SIZE:
+        raise IPMIError(f'Invalid length of encrypted payload: {len(payload)}')
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(payload[:AES_BLOCK_SIZE])).decryptor()
+    plaintext = decryptor.update(payload[AES_BLOCK_SIZE:]) + decryptor.finalize()
+    pad_length = plaintext[-1]
+    if pad_length >= AES_BLOCK_SIZE:
+        raise IPMIError(f'Invalid confidentiality pad length: {pad_length}')
+    return plaintext[:-(pad_length + 1)]
+
+
+def pack_packet(payload_type, session_id, sequence, payload, integrity_key=None, confidentiality_key=None):
+    """Pack a payload into an RMCP+ packet.
+
+    Args:
+        payload_type (int): the type of the payload
+        session_id (int): the session ID of the receiver, or 0 outside a session
+        sequence (int): the session sequence number, or 0 outside a session
+        payload (bytes): the payload
+        integrity_key (bytes or None): if given, the key used to authenticate the packet
+        confidentiality_key (bytes or None): if given, the key used to encrypt the payload
+
+    Returns:
+        bytes: the packet
+    """
+    if confidentiality_key is not None:
+        payload = encrypt_payload(confidentiality_key, payload)
+        payload_type |= PAYLOAD_ENCRYPTED
+    if integrity_key is not None:
+        payload_type |= PAYLOAD_AUTHENTICATED
+
+    session = struct.pack('<BBIIH', AUTH_TYPE_RMCP_PLUS, payload_type, session_id, sequence, len(payload)) + payload
+    if integrity_key is not None:
+        pad_length = (4 - (len(session) + 2) % 4) % 4
+        session += b'\xff' * pad_length + bytes([pad_length, NEXT_HEADER])
+        session += hmac_sha1(integrity_key, session)[:AUTH_CODE_LENGTH]
+    return RMCP_HEADER + session
+
+
+def unpack_packet(packet, integrity_key=None, confidentiality_key=None):
+    """Unpack an RMCP+ packet.
+
+    Args:
+        packet (bytes): the packet
+        integrity_key (bytes or None): if given, the packet must be
+            authenticated with this key
+        confidentiality_key (bytes or None): the key used to decrypt the
+            payload, if it is encrypted
+
+    Returns:
+        tuple of (int, int, int, bytes): the payload type, session ID, session
+            sequence number and payload
+
+    Raises:
+        IPMIError: if the packet is not valid
+    """
+    header_end = len(RMCP_HEADER) + SESSION_HEADER_LENGTH
+    if len(packet) < header_end or packet[:len(RMCP_HEADER)] != RMCP_HEADER \
+            or packet[len(RMCP_HEADER)] != AUTH_TYPE_RMCP_PLUS:
+        raise IPMIError('Received a packet which is not an RMCP+ packet')
+
+    payload_type, session_id, sequence, length = struct.unpack_from('<BIIH', packet, len(RMCP_HEADER) + 1)
+    payload = packet[header_end:header_end + length]
+    if len(payload) != length:
+        raise IPMIError('Received a truncated packet')
+
+    if payload_type & PAYLOAD_AUTHENTICATED:
+        if integrity_key is None:
+            raise IPMIError('Received an authenticated packet outside a session')
+        auth_code = hmac_sha1(integrity_key, packet[len(RMCP_HEADER):-AUTH_CODE_LENGTH])[:AUTH_CODE_LENGTH]
+        if not hmac.compare_digest(auth_code, packet[-AUTH_CODE_LENGTH:]):
+            raise IPMIError('Received a packet with an invalid authentication code')
+    elif integrity_key is not None:
+        raise IPMIError('Received an unauthenticated packet in a session')
+
+    if payload_type & PAYLOAD_ENCRYPTED:
+        if confidentiality_key is None:
+            raise IPMIError('Received an encrypted packet outside a session')
+        payload = decrypt_payload(confidentiality_key, payload)
+
+    return payload_type & PAYLOAD_TYPE_MASK, session_id, sequence, payload
+
+
+def checksum(data):
+    """Get the IPMI checksum of the data, which makes the sum of the bytes 0."""
+    return -sum(data) & 0xFF
+
+
+def build_ipmi_request(netfn, cmd, rq_seq, data=b''):
+    """Build an IPMI request message to the BMC."""
+    header = bytes([BMC_ADDRESS, netfn << 2])
+    body = bytes([REMOTE_CONSOLE_ADDRESS, rq_seq << 2, cmd]) + data
+    return header + bytes([checksum(header)]) + body + bytes([checksum(body)])
+
+
+def parse_ipmi_response(message):
+    """Parse an IPMI response message from the BMC.
+
+    Returns:
+        tuple of (int, int, int, int, bytes): the network function, request
+            sequence number, command, completion code and response data
+
+    Raises:
+        IPMIError: if the message is not valid
+    """
+    if len(message) < 8 or checksum(message[:3]) or checksum(message[3:]):
+        raise IPMIError('Received an invalid IPMI response message')
+    return message[1] >> 2, message[4] >> 2, message[5], message[6], message[7:-1]
+
+
+class IPMISession:
+    """An RMCP+ session with a single BMC."""
+
+    # The number of seconds to wait for a response before sending again
+    TIMEOUT = 1
+    # The number of times a request is sent before giving up
+    ATTEMPTS = 3
+
+    def __init__(self, host, username, password, port=IPMI_PORT):
+        """Create a new IPMISession. The session is set up when first used.
+
+        Args:
+            host (str): the hostname of the BMC
+            username (str): the IPMI username
+            password (str): the IPMI password
+            port (int): the UDP port of the BMC
+        """
+        self.host = host
+        self.port = port
+        self.username = username.encode()
+        self._user_key = get_user_key(password)
+        self._lock = Lock()
+        self._sock = None
+        self._console_sid = None
+        self._bmc_sid = None
+        self._integrity_key = None
+        self._confidentiality_key = None
+        self._sequence = 0
+        self._rq_seq = 0
+        self._message_tag = 0
+
+    @property
+    def active(self):
+        """bool: True if the session has been set up"""
+        return self._integrity_key is not None
+
+    def _exchange(self, make_packet, parse_response):
+        """Send a request and wait for its response, sending it again if needed.
+
+        Args:
+            make_packet (Callable): a function returning the packet to send.
+                It is called for each attempt.
+            parse_response (Callable): a function which parses a received
+                packet, returning None if it is not the response to the request.
+
+        Returns:
+            The parsed response.
+
+        Raises:
+            IPMITimeoutError: if no response was received.
+            IPMIError: if the BMC could not be reached.
+        """
+        try:
+            for _ in range(self.ATTEMPTS):
+                self._sock.send(make_packet())
+                deadline = monotonic() + self.TIMEOUT
+                while True:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._sock.settimeout(remaining)
+                    try:
+                        packet = self._sock.recv(4096)
+                    except socket.timeout:
+                        break
+                    try:
+                        response = parse_response(packet)
+                    except IPMIError as err:
+                        LOGGER.debug('Ignoring packet from BMC %s: %s', self.host, err)
+                        continue
+                    if response is not None:
+                        return response
+        except OSError as err:
+            raise IPMIError(f'Failed to communicate with BMC {self.host}: {err}')
+
+        raise IPMITimeoutError(f'No response from BMC {self.host} after {self.ATTEMPTS} attempts')
+
+    def _setup_exchange(self, request_type, request, response_type):
+        """Exchange one of the messages used to set up the session.
+
+        Returns:
+            bytes: the response payload, which is at least 8 bytes long
+        """
+        self._message_tag = (self._message_tag + 1) & 0xFF
+        tag = self._message_tag
+        request = bytes([tag]) + request
+
+        def parse_response(packet):
+            payload_type, _, _, payload = unpack_packet(packet)
+            if payload_type == response_type and len(payload) >= 8 and payload[0] == tag:
+                return payload
+            return None
+
+        response = self._exchange(lambda: pack_packet(request_type, 0, 0, request), parse_response)
+        if response[1]:
+            raise IPMISessionSetupError(f'BMC {self.host} refused to set up a session '
+                                        f'with status code 0x{response[1]:02x}')
+        if struct.unpack_from('<I', response, 4)[0] != self._console_sid:
+            raise IPMISessionSetupError(f'BMC {self.host} responded with the wrong session ID')
+        return response
+
+    def _open(self):
+        """Set up the session using RAKP with cipher suite 3.
+
+        Raises:
+            IPMISessionSetupError: if the BMC refused to set up the session.
+            IPMIError: if the BMC could not be reached.
+        """
+        self._close_socket()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self._sock.connect((self.host, self.port))
+        except OSError as err:
+            self._close_socket()
+            raise IPMIError(f'Failed to communicate with BMC {self.host}: {err}')
+        self._console_sid = struct.unpack('<I', os.urandom(4))[0] or 1
+
+        algorithms_payload = b''.join(
+            struct.pack('<BxxBB3x', payload_type, 8, algorithm)
+            for payload_type, algorithm in enumerate([AUTH_RAKP_HMAC_SHA1, INTEGRITY_HMAC_SHA1_96,
+                                                      CONFIDENTIALITY_AES_CBC_128])
+        )
+        response = self._setup_exchange(
+            PAYLOAD_OPEN_SESSION_REQUEST,
+            struct.pack('<BxxI', PRIVILEGE_ADMINISTRATOR, self._console_sid) + algorithms_payload,
+            PAYLOAD_OPEN_SESSION_RESPONSE
+        )
+        if len(response) < 36 or response[16:36:8] != algorithms_payload[4::8]:
+            raise IPMISessionSetupError(f'BMC {self.host} does not support cipher suite 3')
+        bmc_sid = struct.unpack_from('<I', response, 8)[0]
+
+        console_rand = os.urandom(16)
+        role = PRIVILEGE_ADMINISTRATOR | NAME_ONLY_LOOKUP
+        response = self._setup_exchange(
+            PAYLOAD_RAKP1,
+            struct.pack('<3xI', bmc_sid) + console_rand + struct.pack('<BxxB', role, len(self.username)) +
+            self.username,
+            PAYLOAD_RAKP2
+        )
+        if len(response) < 60:
+            raise IPMISessionSetupError(f'Received a truncated RAKP message 2 from BMC {self.host}')
+        bmc_rand = response[8:24]
+        bmc_guid = response[24:40]
+        expected_auth_code = get_rakp2_auth_code(self._user_key, self._console_sid, bmc_sid, console_rand,
+                                                 bmc_rand, bmc_guid, role, self.username)
+        if not hmac.compare_digest(expected_auth_code, response[40:60]):
+            raise IPMISessionSetupError(f'Authentication with BMC {self.host} failed; '
+                                        f'check the IPMI username and password')
+
+        session_integrity_key = get_session_integrity_key(self._user_key, console_rand, bmc_rand,
+                                                          role, self.username)
+        response = self._setup_exchange(
+            PAYLOAD_RAKP3,
+            struct.pack('<BxxI', 0, bmc_sid) +
+            get_rakp3_auth_code(self._user_key, bmc_rand, self._console_sid, role, self.username),
+            PAYLOAD_RAKP4
+        )
+        expected_check = get_rakp4_integrity_check(session_integrity_key, console_rand, bmc_sid, bmc_guid)
+        if not hmac.compare_digest(expected_check, response[8:8 + AUTH_CODE_LENGTH]):
+            raise IPMISessionSetupError(f'BMC {self.host} sent an invalid integrity check value')
+
+        self._bmc_sid = bmc_sid
+        self._integrity_key, self._confidentiality_key = get_session_keys(session_integrity_key)
+        self._sequence = 0
+        LOGGER.debug('Set up IPMI session with BMC %s.', self.host)
+
+    def _command(self, netfn, cmd, data=b''):
+        """Send an IPMI command over the session.
+
+        Returns:
+            bytes: the response data
+
+        Raises:
+            IPMIError: if the command failed.
+        """
+        self._rq_seq = (self._rq_seq + 1) & 0x3F
+        rq_seq = self._rq_seq
+        message = build_ipmi_request(netfn, cmd, rq_seq, data)
+
+        def make_packet():
+            self._sequence = (self._sequence + 1) & 0xFFFFFFFF or 1
+            return pack_packet(PAYLOAD_IPMI, self._bmc_sid, self._sequence, message,
+                               self._integrity_key, self._confidentiality_key)
+
+        def parse_response(packet):
+            payload_type, session_id, _, payload = unpack_packet(packet, self._integrity_key,
+                                                                 self._confidentiality_key)
+            if payload_type != PAYLOAD_IPMI or session_id != self._console_sid:
+                return None
+            response = parse_ipmi_response(payload)
+            if response[:3] != (netfn + 1, rq_seq, cmd):
+                return None
+            return response[3:]
+
+        completion_code, response_data = self._exchange(make_packet, parse_response)
+        if completion_code:
+            raise IPMIError(f'IPMI command 0x{cmd:02x} to BMC {self.host} failed with '
+                            f'completion code 0x{completion_code:02x}')
+        return response_data
+
+    def command(self, netfn, cmd, data=b''):
+        """Send an IPMI command, setting up the session first if needed.
+
+        If the BMC does not respond in an existing session, the session may
+        have expired, so a new session is set up and the command is sent again.
+
+        Returns:
+            bytes: the response data
+
+        Raises:
+            IPMISessionSetupError: if the BMC refused to set up the session.
+            IPMIError: if the command failed.
+        """
+        with self._lock:
+            if not self.active:
+                self._open()
+                return self._command(netfn, cmd, data)
+
+            try:
+                return self._command(netfn, cmd, data)
+            except IPMITimeoutError:
+                LOGGER.debug('No response in IPMI session with BMC %s; setting up a new session.', self.host)
+                self._reset()
+                self._open()
+                return self._command(netfn, cmd, data)
+
+    def get_power_state(self):
+        """Get the chassis power state.
+
+        Returns:
+            str: 'on' or 'off'
+        """
+        response = self.command(NETFN_CHASSIS, CMD_GET_CHASSIS_STATUS)
+        if not response:
+            raise IPMIError(f'Empty response to Get Chassis Status from BMC {self.host}')
+        return 'on' if response[0] & 0x01 else 'off'
+
+    def set_power_state(self, power_state):
+        """Power the chassis on or off.
+
+        Args:
+            power_state (str): 'on' or 'off'
+        """
+        self.command(NETFN_CHASSIS, CMD_CHASSIS_CONTROL, bytes([CHASSIS_CONTROL_BY_POWER_STATE[power_state]]))
+
+    def _reset(self):
+        self._integrity_key = None
+        self._confidentiality_key = None
+        self._bmc_sid = None
+
+    def _close_socket(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self):
+        """Close the session, ignoring any failure to do so."""
+        with self._lock:
+            if self.active:
+                try:
+                    self._command(NETFN_APP, CMD_CLOSE_SESSION, struct.pack('<I', self._bmc_sid))
+                except IPMIError as err:
+                    LOGGER.debug('Failed to close IPMI session with BMC %s: %s', self.host, err)
+            self._reset()
+            self._close_socket()
+
+
+class IPMISessionEngine:
+    """Keeps an IPMI session open to each of many BMCs.
+
+    Commands are sent to many BMCs in parallel, and each returns a dict mapping
+    each BMC hostname to its result. If a command fails on a BMC, the result
+    for that BMC is the IPMIError.
+    """
+
+    # The maximum number of BMCs to which commands are sent at once
+    MAX_WORKERS = 32
+
+    def __init__(self, username, password, port=IPMI_PORT):
+        """Create a new IPMISessionEngine.
+
+        Args:
+            username (str): the IPMI username
+            password (str): the IPMI password
+            port (int): the UDP port of the BMCs
+        """
+        self.username = username
+        self.password = password
+        self.port = port
+        self._sessions = {}
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+
+    def get_session(self, host):
+        """Get the session with the given BMC, creating it if needed."""
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = IPMISession(host, self.username, self.password, port=self.port)
+            return self._sessions[host]
+
+    def _run_on_hosts(self, hosts, func):
+        def run(host):
+            try:
+                return func(self.get_session(host))
+            except IPMIError as err:
+                return err
+
+        hosts = list(hosts)
+        return dict(zip(hosts, self._executor.map(run, hosts)))
+
+    def get_power_states(self, hosts):
+        """Get the chassis power state of each BMC.
+
+        Returns:
+            dict: a mapping from each host to 'on', 'off', or an IPMIError
+        """
+        return self._run_on_hosts(hosts, IPMISession.get_power_state)
+
+    def set_power_states(self, hosts, power_state):
+        """Power the chassis of each BMC on or off.
+
+        Returns:
+            dict: a mapping from each host to None, or an IPMIError
+        """
+        return self._run_on_hosts(hosts, lambda session: session.set_power_state(power_state))
+
+    def close(self):
+        """Close all sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        list(self._executor.map(IPMISession.close, sessions))
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
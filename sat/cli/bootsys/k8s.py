@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,6 +25,7 @@
 Waits for k8s API availability and for k8s pods to appear to be healthy.
 """
 import logging
+from threading import Lock
 import warnings
 
 import inflect
@@ -35,9 +36,10 @@ from yaml import YAMLLoadWarning
 
 from sat.cached_property import cached_property
 from sat.cli.bootsys.state_recorder import PodStateRecorder, StateError
-from sat.cli.bootsys.util import k8s_pods_to_status_dict
+from sat.cli.bootsys.util import get_polling_strategy
 from sat.waiting import GroupWaiter, Waiter
 from sat.config import get_config_value
+from sat.pod_cache import PodCache
 from sat.report import Report
 from sat.util import BeginEndLogger
 
@@ -66,11 +68,16 @@ class KubernetesPodStatusWaiter(GroupWaiter):
 
         self.new_pods = set()  # pods not present when shut down
 
-        self.k8s_pod_status = {}
-        self.update_k8s_pod_status()
-        self.members = [(ns, name)
-                        for ns, names in self.k8s_pod_status.items()
-                        for name in names.keys()]
+        # Pods are listed once and then watched for changes while waiting.
+        # Only pods which have changed since they were last checked are
+        # checked again.
+        self.pod_cache = PodCache(self.k8s_api)
+        self.pod_cache.list()
+        self.members = list(self.pod_cache.pods)
+        self._completed_by_pod = {}
+        self._changed_pods = set()
+        self._changed_pods_lock = Lock()
+        self.pod_cache.add_listener(self.on_pod_change)
 
     def condition_name(self):
         return 'Kubernetes pods restored to state from previous shutdown'
@@ -86,23 +93,22 @@ class KubernetesPodStatusWaiter(GroupWaiter):
                            f'states: {err}')
             return {}
 
-    def update_k8s_pod_status(self):
-        """Helper function to grab the status of all pods.
+    def on_pod_change(self, key, pod):
+        """Record that a pod has changed so that it is checked again.
 
-        Updates the internal k8s_pod_status dict to be consistent with
-        the status of the pods.
-
-        Args: None.
-        Returns: None.
+        Args:
+            key (tuple): the (namespace, name) of the pod
+            pod (CachedPod): the pod, or None if it was deleted
         """
-        all_pods = self.k8s_api.list_pod_for_all_namespaces()
-        self.k8s_pod_status = k8s_pods_to_status_dict(all_pods)
+        with self._changed_pods_lock:
+            self._changed_pods.add(key)
 
-    def on_check_action(self):
-        """Update pod status before doing each check for completion."""
-        self.update_k8s_pod_status()
+    def pre_wait_action(self):
+        """Start watching for changes to pods."""
+        self.pod_cache.start()
 
     def post_wait_action(self):
+        self.pod_cache.stop()
         report = Report(['Namespace', 'Pod name'])
         report.add_rows(self.pending)
         print(str(report))
@@ -117,7 +123,8 @@ class KubernetesPodStatusWaiter(GroupWaiter):
         "Succeeded".
         """
         ns, name = member
-        simple_answer = self.k8s_pod_status[ns][name] in ('Succeeded', 'Running')
+        phase = self.pod_cache.get_phase(ns, name)
+        simple_answer = phase in ('Succeeded', 'Running')
 
         if member in self.new_pods:
             return simple_answer
@@ -140,7 +147,29 @@ class KubernetesPodStatusWaiter(GroupWaiter):
         # last shutdown and had the same name. Thus we should be able
         # to tell if it's "completed" if it is in the same state as it
         # was at the last shutdown.
-        return self.k8s_pod_status[ns][name] == self.stored_k8s_pod_status[ns][name]
+        return phase == self.stored_k8s_pod_status[ns][name]
+
+    def members_have_completed(self, members):
+        """Check which of the given pods have completed.
+
+        Only pods which have not been checked before or which have changed
+        since they were last checked are checked.
+
+        Args:
+            members (set): the (namespace, name) of the pods to check.
+
+        Returns:
+            tuple of (set, set): the pods which have completed, and the empty
+                set, since pods never fail.
+        """
+        with self._changed_pods_lock:
+            changed_pods, self._changed_pods = self._changed_pods, set()
+
+        for member in members:
+            if member in changed_pods or member not in self._completed_by_pod:
+                self._completed_by_pod[member] = self.member_has_completed(member)
+
+        return {member for member in members if self._completed_by_pod[member]}, set()
 
 
 class KubernetesAPIAvailableWaiter(Waiter):
@@ -221,6 +250,7 @@ def do_k8s_check(args):
 
     try:
         k8s_waiter = KubernetesPodStatusWaiter(get_config_value('bootsys.k8s_timeout'))
+        k8s_waiter.polling_strategy = get_polling_strategy('k8s')
     except ConfigException as err:
         # Unlikely, given that we loaded the config earlier, but could happen
         LOGGER.error("Failed to load kubernetes config while waiting for pods "
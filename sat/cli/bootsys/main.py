@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -68,6 +68,10 @@ def do_bootsys(args):
         LOGGER.error('An action is required.')
         sys.exit(1)
 
+    if args.action == 'state':
+        load_stage('state_recorder', 'do_state_diff')(args)
+        return
+
     if args.list_stages:
         try:
             for stage in STAGES_BY_ACTION[args.action].keys():
@@ -87,6 +91,15 @@ def do_bootsys(args):
         LOGGER.warning('Ignoring --excluded-ncns option. It only applies to '
                        'ncn-power and platform-services stages.')
 
+    if args.resume and args.stage != 'platform-services':
+        LOGGER.warning('Ignoring --resume option. It only applies to the '
+                       'platform-services stage.')
+
+    if getattr(args, 'dry_run', False) and args.stage != 'cabinet-power':
+        LOGGER.warning('Ignoring --dry-run option. It only applies to the '
+                       'cabinet-power stage.')
+        args.dry_run = False
+
     try:
         submodule, stage_func_name = STAGES_BY_ACTION[args.action][args.stage]
     except KeyError:
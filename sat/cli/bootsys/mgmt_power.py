@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -35,7 +35,13 @@ import inflect
 from paramiko.ssh_exception import BadHostKeyException, AuthenticationException, SSHException
 
 from sat.cli.bootsys.ipmi_console import IPMIConsoleLogger, ConsoleLoggingError
-from sat.cli.bootsys.util import get_and_verify_ncn_groups, get_ssh_client, FatalBootsysError
+from sat.cli.bootsys.ipmi_session import IPMIError, IPMISessionEngine, IPMISessionSetupError
+from sat.cli.bootsys.util import (
+    get_and_verify_ncn_groups,
+    get_polling_strategy,
+    get_ssh_client,
+    FatalBootsysError,
+)
 from sat.waiting import GroupWaiter, WaitingFailure
 from sat.config import get_config_value
 from sat.util import BeginEndLogger, get_username_and_password_interactively, prompt_continue
@@ -50,7 +56,7 @@ class IPMIPowerStateWaiter(GroupWaiter):
     Waits for all members to reach the given IPMI power state."""
 
     def __init__(self, members, power_state, timeout, username, password,
-                 send_command=False, poll_interval=1, failure_threshold=3):
+                 send_command=False, poll_interval=1, failure_threshold=3, ipmi_engine=None):
         """Constructor for an IPMIPowerStateWaiter object.
 
         Args:
@@ -63,11 +69,18 @@ class IPMIPowerStateWaiter(GroupWaiter):
             failure_threshold (int): if a call to ipmitool gives a nonzero
                 return code this many times in a row for a given member, then
                 that member will be marked as failed.
+            ipmi_engine (IPMISessionEngine or None): if given, the engine used
+                to send IPMI commands over sessions which are kept open.
+                ipmitool is used for hosts whose BMC refuses to set up a
+                session with the engine. If None, ipmitool is always used.
         """
         self.power_state = power_state
         self.username = username
         self.password = password
         self.send_command = send_command
+        self.ipmi_engine = ipmi_engine
+        # Hosts for which ipmitool is used even though there is an ipmi_engine
+        self._ipmitool_members = set()
 
         self.failure_threshold = failure_threshold
         self.consecutive_failures = defaultdict(int)
@@ -93,6 +106,57 @@ class IPMIPowerStateWaiter(GroupWaiter):
             )
         )
 
+    def _check_power_status(self, member, returncode, stdout, stderr):
+        """Check the output of an ipmitool power status command.
+
+        Args:
+            member (str): the host which was queried
+            returncode (int): the exit code of ipmitool
+            stdout (str): the standard output of ipmitool
+            stderr (str): the standard error of ipmitool
+
+        Returns:
+            If the powerstate of the host matches that which was given
+            in the constructor, return True. Otherwise, return False.
+
+        Raises:
+            WaitingFailure: if ipmitool has failed for the host at least
+                `failure_threshold` times in a row.
+        """
+        if returncode:
+            self._record_failure(member, f'ipmitool command failed with code {returncode}; stderr: {stderr}')
+            return False
+        elif self.consecutive_failures[member]:
+            self.consecutive_failures[member] = 0
+
+        return self.power_state in stdout
+
+    def _record_failure(self, member, message):
+        """Record a failure to get the power state of a host.
+
+        A warning is logged only for the first of consecutive failures.
+
+        Args:
+            member (str): the host which was queried
+            message (str): a description of the failure
+
+        Raises:
+            WaitingFailure: if getting the power state has failed for the host
+                at least `failure_threshold` times in a row.
+        """
+        if not self.consecutive_failures[member]:
+            LOGGER.warning('Failed to get power state of %s: %s', member, message)
+
+        self.consecutive_failures[member] += 1
+        if self.consecutive_failures[member] >= self.failure_threshold:
+            raise WaitingFailure(f'{message} ({self.consecutive_failures[member]} time(s) in a row)')
+
+    def _use_ipmitool(self, member, err):
+        """Use ipmitool for a host whose BMC refused to set up a session."""
+        LOGGER.warning('Unable to keep an IPMI session open with %s; using ipmitool instead: %s',
+                       member, err)
+        self._ipmitool_members.add(member)
+
     def member_has_completed(self, member):
         """Check if a host is in the desired state.
 
@@ -107,20 +171,98 @@ class IPMIPowerStateWaiter(GroupWaiter):
         except OSError as err:
             raise WaitingFailure(f'Unable to find ipmitool: {err}')
 
-        if proc.returncode:
-            if not self.consecutive_failures[member]:
-                LOGGER.warning("impitool command failed with code %d: %s",
-                               proc.returncode, proc.stderr)
+        return self._check_power_status(member, proc.returncode, proc.stdout, proc.stderr)
+
+    def members_have_completed(self, members):
+        """Check if hosts are in the desired state.
+
+        If there is an ipmi_engine, it queries all the hosts in parallel over
+        their open sessions. Otherwise, the ipmitool commands for all the
+        hosts are started at once, so one poll takes about as long as the
+        slowest single command.
+
+        Args:
+            members (set): the hosts to check
+
+        Returns:
+            tuple of (set, set): the hosts in the desired power state, and
+                the hosts for which getting the power state has failed too
+                many times.
+        """
+        if self.ipmi_engine is None:
+            return self._members_have_completed_ipmitool(members)
+
+        completed = set()
+        failed = set()
+        engine_members = [member for member in members if member not in self._ipmitool_members]
+        power_states = self.ipmi_engine.get_power_states(f'{member}-mgmt' for member in engine_members)
+        for member in engine_members:
+            power_state = power_states[f'{member}-mgmt']
+            if isinstance(power_state, IPMISessionSetupError):
+                self._use_ipmitool(member, power_state)
+                continue
+
+            if isinstance(power_state, IPMIError):
+                try:
+                    self._record_failure(member, str(power_state))
+                except WaitingFailure as err:
+                    self._log_member_failure(member, err)
+                    failed.add(member)
+                continue
 
-            self.consecutive_failures[member] += 1
-            if self.consecutive_failures[member] >= self.failure_threshold:
-                raise WaitingFailure(f'ipmitool command failed {self.consecutive_failures[member]} time(s) '
-                                     f'with code {proc.returncode}; stderr: {proc.stderr}')
-            return False
-        elif self.consecutive_failures[member]:
             self.consecutive_failures[member] = 0
+            if power_state == self.power_state:
+                completed.add(member)
+
+        ipmitool_members = {member for member in members if member in self._ipmitool_members}
+        if ipmitool_members:
+            ipmitool_completed, ipmitool_failed = self._members_have_completed_ipmitool(ipmitool_members)
+            completed |= ipmitool_completed
+            failed |= ipmitool_failed
+
+        return completed, failed
+
+    def _members_have_completed_ipmitool(self, members):
+        """Check if hosts are in the desired state using ipmitool.
+
+        The ipmitool commands for all the hosts are started at once, so one
+        poll takes about as long as the slowest single command.
+
+        Args:
+            members (set): the hosts to check
 
-        return self.power_state in proc.stdout
+        Returns:
+            tuple of (set, set): the hosts in the desired power state, and
+                the hosts for which ipmitool has failed too many times.
+        """
+        procs = {}
+        try:
+            for member in members:
+                procs[member] = subprocess.Popen(
+                    self.get_ipmi_command(member, 'chassis power status'),
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8'
+                )
+        except OSError as err:
+            for proc in procs.values():
+                proc.kill()
+                proc.communicate()
+            failure = WaitingFailure(f'Unable to find ipmitool: {err}')
+            for member in members:
+                self._log_member_failure(member, failure)
+            return set(), set(members)
+
+        completed = set()
+        failed = set()
+        for member, proc in procs.items():
+            stdout, stderr = proc.communicate()
+            try:
+                if self._check_power_status(member, proc.returncode, stdout, stderr):
+                    completed.add(member)
+            except WaitingFailure as err:
+                self._log_member_failure(member, err)
+                failed.add(member)
+
+        return completed, failed
 
     def pre_wait_action(self):
         """Send IPMI power commands to given hosts.
@@ -132,34 +274,56 @@ class IPMIPowerStateWaiter(GroupWaiter):
             None
         """
         LOGGER.debug("Entered pre_wait_action with self.send_command: %s.", self.send_command)
-        if self.send_command:
+        if not self.send_command:
+            return
+
+        ipmitool_members = self.members
+        if self.ipmi_engine is not None:
             for member in self.members:
                 LOGGER.info('Sending IPMI power %s command to host %s', self.power_state, member)
-                ipmi_command = self.get_ipmi_command(member,
-                                                     'chassis power {}'.format(self.power_state))
-                try:
-                    proc = subprocess.run(ipmi_command, stdout=subprocess.PIPE,
-                                          stderr=subprocess.PIPE, encoding='utf-8')
-                except OSError as err:
-                    # TODO (SAT-552): Improve handling of ipmitool errors
-                    LOGGER.error('Unable to find ipmitool: %s', err)
-                    return
-
-                if proc.returncode:
-                    # TODO (SAT-552): Improve handling of ipmitool errors
-                    LOGGER.error('ipmitool command failed with code %s: stderr: %s',
-                                 proc.returncode, proc.stderr)
-                    return
+            results = self.ipmi_engine.set_power_states([f'{member}-mgmt' for member in self.members],
+                                                        self.power_state)
+            for member in self.members:
+                err = results[f'{member}-mgmt']
+                if isinstance(err, IPMISessionSetupError):
+                    self._use_ipmitool(member, err)
+                elif err is not None:
+                    LOGGER.error('IPMI power %s command failed for host %s: %s',
+                                 self.power_state, member, err)
+            ipmitool_members = [member for member in self.members if member in self._ipmitool_members]
+
+        for member in ipmitool_members:
+            LOGGER.info('Sending IPMI power %s command to host %s', self.power_state, member)
+            ipmi_command = self.get_ipmi_command(member,
+                                                 'chassis power {}'.format(self.power_state))
+            try:
+                proc = subprocess.run(ipmi_command, stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE, encoding='utf-8')
+            except OSError as err:
+                # TODO (SAT-552): Improve handling of ipmitool errors
+                LOGGER.error('Unable to find ipmitool: %s', err)
+                return
+
+            if proc.returncode:
+                # TODO (SAT-552): Improve handling of ipmitool errors
+                LOGGER.error('ipmitool command failed with code %s: stderr: %s',
+                             proc.returncode, proc.stderr)
+                return
 
 
 class SSHAvailableWaiter(GroupWaiter):
     """A waiter which waits for all member nodes to be accessible via SSH.
     """
 
-    def __init__(self, members, timeout, poll_interval=1):
-        self.ssh_client = get_ssh_client()
+    # The number of hosts whose SSH availability is checked at the same time
+    MAX_WORKERS = 10
+    # The time, in seconds, allowed for a single SSH connection attempt
+    CONNECT_TIMEOUT = 10
 
-        super().__init__(members, timeout, poll_interval=poll_interval)
+    def __init__(self, members, timeout, poll_interval=1):
+        super().__init__(members, timeout, poll_interval=poll_interval,
+                         max_workers=self.MAX_WORKERS,
+                         member_check_timeout=2 * self.CONNECT_TIMEOUT)
 
     def condition_name(self):
         return 'Hosts accessible via SSH'
@@ -170,16 +334,22 @@ class SSHAvailableWaiter(GroupWaiter):
         Args:
             member (str): a hostname to check
 
+        A separate SSH client is used for each check since members are
+        checked concurrently.
+
         Returns:
             True if SSH connecting succeeded, and
                 False otherwise.
         """
+        ssh_client = get_ssh_client()
         try:
-            self.ssh_client.connect(member)
+            ssh_client.connect(member, timeout=self.CONNECT_TIMEOUT)
         except (SSHException, socket.error):
             return False
         else:
             return True
+        finally:
+            ssh_client.close()
 
 
 # Failures are logged, but otherwise ignored. They may be considered "stalled shutdowns" and
@@ -232,20 +402,26 @@ def finish_shutdown(hosts, username, password, ncn_shutdown_timeout, ipmi_timeou
     Raises:
         SystemExit: if any of the `hosts` failed to reach powered off state
     """
-    ipmi_waiter = IPMIPowerStateWaiter(hosts, 'off', ncn_shutdown_timeout, username, password)
-    pending_hosts = ipmi_waiter.wait_for_completion()
+    with IPMISessionEngine(username, password) as ipmi_engine:
+        ipmi_waiter = IPMIPowerStateWaiter(hosts, 'off', ncn_shutdown_timeout, username, password,
+                                           ipmi_engine=ipmi_engine)
+        ipmi_waiter.polling_strategy = get_polling_strategy('ncn-shutdown')
+        pending_hosts = ipmi_waiter.wait_for_completion()
 
-    if pending_hosts:
-        LOGGER.warning('Forcibly powering off nodes: %s', ', '.join(pending_hosts))
+        failed_hosts = set()
+        if pending_hosts:
+            LOGGER.warning('Forcibly powering off nodes: %s', ', '.join(pending_hosts))
 
-        # Confirm all nodes have actually turned off.
-        failed_hosts = IPMIPowerStateWaiter(pending_hosts, 'off', ipmi_timeout, username, password,
-                                            send_command=True).wait_for_completion()
+            # Confirm all nodes have actually turned off.
+            power_off_waiter = IPMIPowerStateWaiter(pending_hosts, 'off', ipmi_timeout, username, password,
+                                                    send_command=True, ipmi_engine=ipmi_engine)
+            power_off_waiter.polling_strategy = get_polling_strategy('ipmi')
+            failed_hosts = power_off_waiter.wait_for_completion()
 
-        if failed_hosts:
-            LOGGER.error('The following nodes failed to reach powered '
-                         'off state: %s', ', '.join(failed_hosts))
-            sys.exit(1)
+    if failed_hosts:
+        LOGGER.error('The following nodes failed to reach powered '
+                     'off state: %s', ', '.join(failed_hosts))
+        sys.exit(1)
 
 
 def do_mgmt_shutdown_power(ssh_client, username, password, excluded_ncns, ncn_shutdown_timeout, ipmi_timeout):
@@ -335,7 +511,8 @@ def do_power_on_ncns(args):
 
     with BeginEndLogger(action_msg):
         try:
-            with IPMIConsoleLogger(affected_ncns, username, password):
+            with IPMIConsoleLogger(affected_ncns, username, password), \
+                    IPMISessionEngine(username, password) as ipmi_engine:
                 for ncn_group in ordered_boot_groups:
                     ncn_boot_timeout = get_config_value('bootsys.ncn_boot_timeout')
                     LOGGER.info(f'Powering on NCNs and waiting up to {ncn_boot_timeout} seconds '
@@ -344,10 +521,13 @@ def do_power_on_ncns(args):
                     # TODO (SAT-555): Probably should not send a power on if it's already on.
                     ipmi_waiter = IPMIPowerStateWaiter(ncn_group, 'on',
                                                        get_config_value('bootsys.ipmi_timeout'),
-                                                       username, password, send_command=True)
+                                                       username, password, send_command=True,
+                                                       ipmi_engine=ipmi_engine)
+                    ipmi_waiter.polling_strategy = get_polling_strategy('ipmi')
                     ipmi_waiter.wait_for_completion()
 
                     ssh_waiter = SSHAvailableWaiter(ncn_group, ncn_boot_timeout)
+                    ssh_waiter.polling_strategy = get_polling_strategy('ncn-boot')
                     inaccessible_nodes = ssh_waiter.wait_for_completion()
 
                     if inaccessible_nodes:
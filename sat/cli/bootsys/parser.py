@@ -27,6 +27,7 @@ The parser for the bootsys subcommand.
 from collections import namedtuple
 
 from sat.cli.bootsys.stages import STAGES_BY_ACTION
+from sat.parsergroups import create_format_options
 
 
 TimeoutSpec = namedtuple('TimeoutSpec', ['option_prefix', 'applicable_actions',
@@ -34,6 +35,8 @@ TimeoutSpec = namedtuple('TimeoutSpec', ['option_prefix', 'applicable_actions',
 
 
 TIMEOUT_SPECS = [
+    TimeoutSpec('session-check', ['shutdown'], 120,
+                'each service has been checked for active sessions.'),
     TimeoutSpec('capmc', ['shutdown'], 120,
                 'components reach powered off state after they are shutdown with CAPMC.'),
     TimeoutSpec('discovery', ['boot'], 600,
@@ -167,6 +170,22 @@ def _add_stage_options(subparser, action):
     )
 
 
+def _add_resume_option(subparser):
+    """Add the --resume option to the subparser.
+
+    Args:
+        subparser: The argparse.ArgumentParser object for the bootsys action
+
+    Returns:
+        None
+    """
+    subparser.add_argument(
+        '--resume', action='store_true',
+        help='Skip the steps of the platform-services stage which completed '
+             'in the previous run of that stage with the same NCNs.'
+    )
+
+
 def _add_excluded_ncns_option(subparser):
     """Add the --excluded-ncns option to the subparser.
 
@@ -187,6 +206,36 @@ def _add_excluded_ncns_option(subparser):
     )
 
 
+def _add_cabinet_power_options(subparser):
+    """Add the options which control the cabinet-power stage of shutdown.
+
+    Args:
+        subparser: The argparse.ArgumentParser object for the bootsys action
+
+    Returns:
+        None
+    """
+    subparser.add_argument(
+        '--cabinet-batch-size', metavar='CABINETS', type=int,
+        help='The number of cabinets powered off by each request in the '
+             'cabinet-power stage. If 0, all liquid-cooled cabinets and all '
+             'air-cooled cabinets are each powered off by one request. '
+             'Overrides the option bootsys.cabinet_batch_size in the config file.'
+    )
+    subparser.add_argument(
+        '--max-concurrent-cabinet-batches', metavar='BATCHES', type=int,
+        help='The maximum number of batches of cabinets powered off at the '
+             'same time in the cabinet-power stage. Overrides the option '
+             'bootsys.max_concurrent_cabinet_batches in the config file.'
+    )
+    subparser.add_argument(
+        '--dry-run', action='store_true',
+        help='Print the batches of cabinets the cabinet-power stage would '
+             'power off and an estimate of how long it would take, without '
+             'powering anything off.'
+    )
+
+
 def _add_bootsys_action_subparser(subparsers, action):
     """Add the shutdown subparser to the parent bootsys parser.
 
@@ -210,6 +259,9 @@ def _add_bootsys_action_subparser(subparsers, action):
     _add_bos_template_options(action_parser, action)
     _add_timeout_options(action_parser, action)
     _add_excluded_ncns_option(action_parser)
+    _add_resume_option(action_parser)
+    if action == 'shutdown':
+        _add_cabinet_power_options(action_parser)
 
 
 def _add_bootsys_shutdown_subparser(subparsers):
@@ -238,6 +290,49 @@ def _add_bootsys_boot_subparser(subparsers):
     _add_bootsys_action_subparser(subparsers, 'boot')
 
 
+def _add_bootsys_state_subparser(subparsers):
+    """Add the state subparser to the parent bootsys parser.
+
+    Args:
+        subparsers: The argparse.ArgumentParser object returned by the
+            add_subparsers method.
+
+    Returns:
+        None
+    """
+    state_parser = subparsers.add_parser(
+        'state', help='Inspect the state captured before shutdown',
+        description='Inspect the snapshots of system state captured by the '
+                    'capture-state stage of the shutdown action.'
+    )
+    state_subparsers = state_parser.add_subparsers(
+        metavar='state_action', dest='state_action', help='The state action to perform.'
+    )
+    state_subparsers.required = True
+
+    diff_parser = state_subparsers.add_parser(
+        'diff', help='Compare two snapshots of captured state',
+        description='Compare two snapshots of captured state. By default, the '
+                    'two most recent snapshots are compared.',
+        parents=[create_format_options()]
+    )
+    diff_parser.add_argument(
+        'state_type', choices=['pod', 'hsn'],
+        help='The type of state to compare: Kubernetes pod state or '
+             'high-speed network (HSN) state.'
+    )
+    diff_parser.add_argument(
+        '--from', dest='from_snapshot', metavar='SNAPSHOT',
+        help='The name or timestamp of the earlier snapshot to compare. '
+             'Defaults to the snapshot before the later snapshot.'
+    )
+    diff_parser.add_argument(
+        '--to', dest='to_snapshot', metavar='SNAPSHOT',
+        help='The name or timestamp of the later snapshot to compare. '
+             'Defaults to the most recent snapshot.'
+    )
+
+
 def add_bootsys_subparser(subparsers):
     """Add the bootsys subparser to the parent parser.
 
@@ -267,3 +362,4 @@ def add_bootsys_subparser(subparsers):
 
     _add_bootsys_shutdown_subparser(actions_subparsers)
     _add_bootsys_boot_subparser(actions_subparsers)
+    _add_bootsys_state_subparser(actions_subparsers)
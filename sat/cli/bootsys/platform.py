@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,13 +25,11 @@
 Start and stop platform services to boot and shut down a Shasta system.
 """
 
-from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import socket
-from paramiko import SSHException
+import os
 from threading import Thread
 
-from sat.cached_property import cached_property
 from sat.config import get_config_value
 from sat.cli.bootsys.ceph import (
     check_ceph_health,
@@ -40,9 +38,15 @@ from sat.cli.bootsys.ceph import (
     CephHealthWaiter
 )
 from sat.cli.bootsys.etcd import save_etcd_snapshot_on_host, EtcdInactiveFailure, EtcdSnapshotFailure
-from sat.cli.bootsys.util import get_and_verify_ncn_groups, get_ssh_client, FatalBootsysError
-from sat.waiting import Waiter
-from sat.util import BeginEndLogger, pester_choices, prompt_continue
+from sat.cli.bootsys.ssh import run_on_host
+from sat.cli.bootsys.steps import Step, StepCheckpoint, StepDefinitionError, StepEngine, StepsAborted
+from sat.cli.bootsys.util import (
+    get_and_verify_ncn_groups,
+    get_polling_strategy,
+    FatalBootsysError,
+)
+from sat.waiting import Waiter, WaitingFailure, wait_for_all
+from sat.util import BeginEndLogger, get_resource_section_path, pester_choices, prompt_continue
 
 LOGGER = logging.getLogger(__name__)
 
@@ -110,7 +114,6 @@ class RemoteServiceWaiter(Waiter):
         self.service_name = service_name
         self.target_state = target_state
         self.target_enabled = target_enabled
-        self.ssh_client = get_ssh_client()
 
     def _run_remote_command(self, command, nonzero_error=True):
         """Run the given command on the remote host.
@@ -121,31 +124,22 @@ class RemoteServiceWaiter(Waiter):
                 non-zero exit codes.
 
         Returns:
-            A 2-tuple of paramiko.channel.ChannelFile objects representing
-            stdout and stderr from the command.
+            A 2-tuple of the stdout and stderr of the command, decoded as str.
 
         Raises:
-            RuntimeError: if the command returned a non-zero exit code
-                and nonzero_exit = True.
-            SSHException: if the server failed to execute the command.
+            RuntimeError: if connecting to the host or running the command
+                failed, or if the command returned a non-zero exit code and
+                nonzero_error = True.
         """
-        LOGGER.debug('Executing command "%s" on host %s', command, self.host)
-        stdin, stdout, stderr = self.ssh_client.exec_command(command)
-        exit_code = stdout.channel.recv_exit_status()
-        if exit_code and nonzero_error:
-            error_message = (f'Command {command} on host {self.host} returned non-zero exit code {exit_code}. '
-                             f'Stdout: "{stdout.read()}" Stderr: "{stderr.read()}"')
+        result = run_on_host(self.host, command)
+        if result.error is not None:
+            raise RuntimeError(result.error)
+        if result.exit_status and nonzero_error:
+            error_message = (f'Command {command} on host {self.host} returned non-zero exit code '
+                             f'{result.exit_status}. Stdout: "{result.stdout}" Stderr: "{result.stderr}"')
             raise RuntimeError(error_message)
 
-        return stdout, stderr
-
-    def wait_for_completion(self):
-        """Wait for completion but catch and log errors, and fail if errors are caught."""
-        try:
-            return super().wait_for_completion()
-        except (RuntimeError, socket.error, SSHException) as e:
-            LOGGER.error(e)
-            return False
+        return result.stdout, result.stderr
 
     def condition_name(self):
         return (f'service {self.service_name} {self.target_state} '
@@ -158,22 +152,23 @@ class RemoteServiceWaiter(Waiter):
         This method will set `self.completed` to True if no action is needed.
 
         Raises:
-            SSHException, socket.error: if connecting to the host fails,
-                or if the server failed to execute a command.
-            RuntimeError, SSHException: from _run_remote_command.
+            WaitingFailure: if connecting to the host fails, if the server
+                failed to execute a command, or if a command failed.
         """
         systemctl_action = ('stop', 'start')[self.target_state == 'active']
-        self.ssh_client.connect(self.host)
-        if self.has_completed():
-            self.completed = True
-        else:
-            LOGGER.debug('Found service not in %s state on host %s.', self.target_state, self.host)
-            self._run_remote_command(f'systemctl {systemctl_action} {self.service_name}')
+        try:
+            if self.has_completed():
+                self.completed = True
+            else:
+                LOGGER.debug('Found service not in %s state on host %s.', self.target_state, self.host)
+                self._run_remote_command(f'systemctl {systemctl_action} {self.service_name}')
 
-        if self.target_enabled and self._get_enabled() != self.target_enabled:
-            LOGGER.debug('Found service not in %s state on host %s.', self.target_enabled, self.host)
-            systemctl_action = ('disable', 'enable')[self.target_enabled == 'enabled']
-            self._run_remote_command(f'systemctl {systemctl_action} {self.service_name}')
+            if self.target_enabled and self._get_enabled() != self.target_enabled:
+                LOGGER.debug('Found service not in %s state on host %s.', self.target_enabled, self.host)
+                systemctl_action = ('disable', 'enable')[self.target_enabled == 'enabled']
+                self._run_remote_command(f'systemctl {systemctl_action} {self.service_name}')
+        except RuntimeError as err:
+            raise WaitingFailure(str(err)) from err
 
     def _get_active(self):
         """Check whether the service is active or not according to systemctl.
@@ -183,12 +178,12 @@ class RemoteServiceWaiter(Waiter):
                 'active', 'inactive' or 'unknown'.
 
         Raises:
-            RuntimeError, SSHException: from _run_remote_command.
+            RuntimeError: from _run_remote_command.
         """
         # systemctl is-active always exits with a non-zero code if the service is not active
         stdout, stderr = self._run_remote_command(f'systemctl is-active {self.service_name}',
                                                   nonzero_error=False)
-        return stdout.read().decode().strip()
+        return stdout.strip()
 
     def _get_enabled(self):
         """Check whether the service is enabled or not according to systemctl.
@@ -198,20 +193,23 @@ class RemoteServiceWaiter(Waiter):
                 'enabled', 'disabled', or 'unknown'.
 
         Raises:
-            RuntimeError, SSHException: from _run_remote_command.
+            RuntimeError: from _run_remote_command.
         """
         # systemctl is-enabled always exits with a non-zero code if the service is not active
         stdout, stderr = self._run_remote_command(f'systemctl is-enabled {self.service_name}',
                                                   nonzero_error=False)
-        return stdout.read().decode().strip()
+        return stdout.strip()
 
     def has_completed(self):
         """Check that the service is active or inactive on the remote host.
 
         Raises:
-            RuntimeError, SSHException: from _get_active.
+            WaitingFailure: if the state of the service could not be queried.
         """
-        current_state = self._get_active()
+        try:
+            current_state = self._get_active()
+        except RuntimeError as err:
+            raise WaitingFailure(str(err)) from err
         return current_state == self.target_state
 
 
@@ -227,20 +225,6 @@ class ContainerStopThread(Thread):
         self.host = host
         self.success = False
 
-    @cached_property
-    def ssh_client(self):
-        """paramiko.SSHClient: an SSHClient connected to `self.host`
-
-        Raises:
-            SystemExit(1): if there is a failure to connect to `self.host`.
-        """
-        try:
-            ssh_client = get_ssh_client()
-            ssh_client.connect(self.host)
-            return ssh_client
-        except (socket.error, SSHException) as err:
-            self._err_exit(f'Failed to connect to host {self.host}: {err}')
-
     def _run_remote_command(self, cmd, err_on_non_zero=True):
         """Run the given command on `self.host`.
 
@@ -256,22 +240,17 @@ class ContainerStopThread(Thread):
                 stderr (str): the stderr of the command decoded with utf-8
 
         Raises:
-            SystemExit(1): if the command failed to execute on the remote host.
+            SystemExit(1): if connecting to `self.host` or running the command
+                on it failed.
         """
-        try:
-            _, stdout, stderr = self.ssh_client.exec_command(cmd)
-        except (SSHException, socket.error) as err:
-            self._err_exit(f'Failed to execute {cmd} on {self.host}: {err}')
-        else:
-            exit_status = stdout.channel.recv_exit_status()
-            stdout_str = stdout.read().decode()
-            stderr_str = stderr.read().decode()
+        result = run_on_host(self.host, cmd)
+        if result.error is not None:
+            self._err_exit(result.error)
+        if result.exit_status and err_on_non_zero:
+            self._err_exit(f'Command "{cmd}" on {self.host} exited with exit status {result.exit_status}. '
+                           f'stdout: {result.stdout}, stderr: {result.stderr}')
 
-            if exit_status and err_on_non_zero:
-                self._err_exit(f'Command "{cmd}" on {self.host} exited with exit status {exit_status}. '
-                               f'stdout: {stdout_str}, stderr: {stderr_str}')
-
-            return exit_status, stdout_str, stderr_str
+        return result.exit_status, result.stdout, result.stderr
 
     def _err_exit(self, err_msg):
         """Log an error message, mark failure, and exit thread.
@@ -374,7 +353,9 @@ class ContainerStopThread(Thread):
 
 def do_service_action_on_hosts(hosts, service, target_state,
                                timeout=SERVICE_ACTION_TIMEOUT, target_enabled=None):
-    """Do a service start/stop and optionally enable/disable across hosts in parallel.
+    """Do a service start/stop and optionally enable/disable across hosts concurrently.
+
+    The services on all hosts are waited for by a single polling loop.
 
     Args:
         hosts (list of str): The list of hosts on which to operate.
@@ -393,12 +374,7 @@ def do_service_action_on_hosts(hosts, service, target_state,
     service_action_waiters = [RemoteServiceWaiter(host, service, target_state=target_state,
                                                   timeout=timeout, target_enabled=target_enabled)
                               for host in hosts]
-    for waiter in service_action_waiters:
-        waiter.wait_for_completion_async()
-    for waiter in service_action_waiters:
-        waiter.wait_for_completion_await()
-
-    if not all(waiter.completed for waiter in service_action_waiters):
+    if not wait_for_all(service_action_waiters):
         raise FatalPlatformError(f'Failed to ensure {service} is {target_state} '
                                  f'{f"and {target_enabled} " if target_enabled else ""}'
                                  f'on all hosts.')
@@ -496,6 +472,7 @@ def do_ceph_unfreeze(ncn_groups):
         ceph_timeout = get_config_value('bootsys.ceph_timeout')
         LOGGER.info(f'Waiting up to {ceph_timeout} seconds for Ceph to become healthy after unfreeze')
         ceph_waiter = CephHealthWaiter(ceph_timeout, storage_hosts, retries=1)
+        ceph_waiter.polling_strategy = get_polling_strategy('ceph')
         if not ceph_waiter.wait_for_completion():
             raise FatalPlatformError(f'Ceph is not healthy. Please correct Ceph health and try again.')
         else:
@@ -514,11 +491,18 @@ def do_etcd_snapshot(ncn_groups):
     # A dict mapping from failed hostnames to EtcdSnapshotFailure instances
     snapshot_errs = {}
 
-    for manager in managers:
+    def save_snapshot(manager):
         try:
             save_etcd_snapshot_on_host(manager)
         except EtcdSnapshotFailure as err:
-            snapshot_errs[manager] = err
+            return err
+
+    # Snapshots are saved on all managers at once. Errors are collected in
+    # the order of the managers so that they are logged in a consistent order.
+    with ThreadPoolExecutor(max_workers=max(len(managers), 1)) as executor:
+        for manager, err in zip(managers, executor.map(save_snapshot, managers)):
+            if err is not None:
+                snapshot_errs[manager] = err
 
     if snapshot_errs:
         for hostname, err in snapshot_errs.items():
@@ -541,32 +525,73 @@ def do_etcd_start(ncn_groups):
                                target_enabled='enabled')
 
 
+# The resources used by steps which operate on all Kubernetes NCNs
+KUBERNETES_RESOURCES = ['managers', 'workers']
+
 # Each step has a description that is printed and an action that is called
 # with the single argument being a dict mapping from NCN group names to hosts.
-PlatformServicesStep = namedtuple('PlatformServicesStep', ('description', 'action'))
+# Steps which do not depend on each other are executed concurrently. The
+# resources of each step are the disjoint groups of NCNs it operates on, so
+# that only one step at a time operates on any NCN. Steps on all Kubernetes
+# NCNs use both the 'managers' and 'workers' resources.
 STEPS_BY_ACTION = {
-    # The ordered steps to start platform services
+    # The steps to start platform services
     'start': [
-        PlatformServicesStep('Ensure containerd is running and enabled on all Kubernetes NCNs.',
-                             do_containerd_start),
-        PlatformServicesStep('Ensure etcd is running and enabled on all Kubernetes manager NCNs.',
-                             do_etcd_start),
-        PlatformServicesStep('Start inactive Ceph services, unfreeze Ceph cluster and wait for Ceph health.',
-                             do_ceph_unfreeze),
-        PlatformServicesStep('Start and enable kubelet on all Kubernetes NCNs.', do_kubelet_start)
+        Step('Ensure containerd is running and enabled on all Kubernetes NCNs.',
+             do_containerd_start, name='containerd-start', depends_on=[],
+             resources=KUBERNETES_RESOURCES),
+        Step('Ensure etcd is running and enabled on all Kubernetes manager NCNs.',
+             do_etcd_start, name='etcd-start', depends_on=[], resources=['managers']),
+        Step('Start inactive Ceph services, unfreeze Ceph cluster and wait for Ceph health.',
+             do_ceph_unfreeze, name='ceph-unfreeze', depends_on=[], resources=['storage']),
+        Step('Start and enable kubelet on all Kubernetes NCNs.', do_kubelet_start,
+             name='kubelet-start', depends_on=['containerd-start', 'etcd-start', 'ceph-unfreeze'],
+             resources=KUBERNETES_RESOURCES)
     ],
-    # The ordered steps to stop platform services
+    # The steps to stop platform services
     'stop': [
-        PlatformServicesStep('Create etcd snapshot on all Kubernetes manager NCNs.', do_etcd_snapshot),
-        PlatformServicesStep('Stop etcd on all Kubernetes manager NCNs.', do_etcd_stop),
-        PlatformServicesStep('Stop and disable kubelet on all Kubernetes NCNs.', do_kubelet_stop),
-        PlatformServicesStep('Stop containers running under containerd on all Kubernetes NCNs.',
-                             do_stop_containers),
-        PlatformServicesStep('Stop containerd on all Kubernetes NCNs.', do_containerd_stop),
-        PlatformServicesStep('Check health of Ceph cluster and freeze state.', do_ceph_freeze)
+        Step('Create etcd snapshot on all Kubernetes manager NCNs.', do_etcd_snapshot,
+             name='etcd-snapshot', depends_on=[], resources=['managers']),
+        Step('Stop etcd on all Kubernetes manager NCNs.', do_etcd_stop,
+             name='etcd-stop', depends_on=['etcd-snapshot'], resources=['managers']),
+        Step('Stop and disable kubelet on all Kubernetes NCNs.', do_kubelet_stop,
+             name='kubelet-stop', depends_on=['etcd-stop'], resources=KUBERNETES_RESOURCES),
+        Step('Stop containers running under containerd on all Kubernetes NCNs.',
+             do_stop_containers, name='containers-stop', depends_on=['kubelet-stop'],
+             resources=KUBERNETES_RESOURCES),
+        Step('Stop containerd on all Kubernetes NCNs.', do_containerd_stop,
+             name='containerd-stop', depends_on=['containers-stop'], resources=KUBERNETES_RESOURCES),
+        Step('Check health of Ceph cluster and freeze state.', do_ceph_freeze,
+             name='ceph-freeze', depends_on=['etcd-stop', 'containerd-stop'], resources=['storage'])
     ]
 }
 
+# The maximum number of steps which may operate on each NCN group at once
+PLATFORM_RESOURCE_LIMITS = {
+    'managers': 1,
+    'workers': 1,
+    'storage': 1,
+}
+
+
+def get_platform_checkpoint(action, ncn_groups):
+    """Get the checkpoint recording the completed steps of a platform action.
+
+    Args:
+        action (str): the platform action, a key in STEPS_BY_ACTION.
+        ncn_groups (dict): a mapping from NCN group names to hosts
+
+    Returns:
+        StepCheckpoint: the checkpoint for the action
+    """
+    path = os.path.join(get_resource_section_path('bootsys'),
+                        f'platform-{action}-checkpoint.json')
+    key = {
+        'action': action,
+        'ncn_groups': {group: sorted(hosts) for group, hosts in sorted(ncn_groups.items())}
+    }
+    return StepCheckpoint(path, key)
+
 
 def do_platform_action(args, action):
     """Do a platform action with the given ordered steps.
@@ -594,24 +619,36 @@ def do_platform_action(args, action):
         LOGGER.error(f'Not proceeding with platform {action}: {err}')
         raise SystemExit(1)
 
-    for step in steps:
-        try:
-            info_message = f'Executing step: {step.description}'
-            LOGGER.info(info_message)
-            step.action(ncn_groups)
-        except NonFatalPlatformError as err:
+    def handle_step_error(step, err):
+        if isinstance(err, NonFatalPlatformError):
             LOGGER.warning(f'Non-fatal error in step "{step.description}" of '
                            f'platform services {action}: {err}')
             answer = pester_choices(f'Continue with platform services {action}?', ('yes', 'no'))
             if answer == 'yes':
                 LOGGER.info('Continuing.')
-            else:
-                LOGGER.info('Aborting.')
-                raise SystemExit(1)
-        except FatalPlatformError as err:
+                return True
+            LOGGER.info('Aborting.')
+        elif isinstance(err, FatalPlatformError):
             LOGGER.error(f'Fatal error in step "{step.description}" of '
                          f'platform services {action}: {err}')
-            raise SystemExit(1)
+        else:
+            LOGGER.error(f'Unexpected error in step "{step.description}" of '
+                         f'platform services {action}: {err}')
+        return False
+
+    try:
+        engine = StepEngine(steps, resource_limits=PLATFORM_RESOURCE_LIMITS,
+                            checkpoint=get_platform_checkpoint(action, ncn_groups),
+                            resume=args.resume)
+        engine.run(ncn_groups, error_handler=handle_step_error)
+    except StepDefinitionError as err:
+        LOGGER.error(f'Invalid steps for platform services {action}: {err}')
+        raise SystemExit(1)
+    except StepsAborted:
+        if engine.checkpoint.completed:
+            LOGGER.info(f'To skip the steps which completed, run this stage again '
+                        f'with the --resume option.')
+        raise SystemExit(1)
 
 
 def do_platform_stop(args):
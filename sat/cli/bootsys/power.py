@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -113,6 +113,35 @@ class CAPMCPowerWaiter(GroupWaiter):
 
         return current_state == self.power_state
 
+    def members_have_completed(self, members):
+        """Check which members have reached the desired power state with one query.
+
+        When CAPMC cannot determine the power state of some of the members,
+        e.g. because they are not yet reachable, it reports them as undefined
+        along with the power states of the other members, so those members
+        are simply not yet complete. If the query fails entirely, no member
+        is considered complete, and all of them are queried again at once on
+        the next poll rather than with one request per member.
+
+        Args:
+            members (set): the xnames to check
+
+        Returns:
+            tuple of (set, set): the xnames which have reached the desired
+                power state, and the empty set, since no member can fail.
+        """
+        LOGGER.debug('Checking whether %d xname(s) have reached desired power state %s',
+                     len(members), self.power_state)
+        try:
+            xnames_by_power_state = self.capmc_client.get_xnames_power_state(sorted(members))
+        except APIError as err:
+            # When cabinets are powered off, the query may fail until the
+            # components are reachable, so try again on the next poll.
+            LOGGER.debug('Failed to query power state of %d xname(s): %s', len(members), err)
+            return set(), set()
+
+        return set(xnames_by_power_state.get(self.power_state, [])) & set(members), set()
+
 
 def do_nodes_power_off(timeout):
     """Ensure the compute and application nodes (UANs) are powered off.
@@ -0,0 +1,259 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Planning and execution of power operations on whole cabinets.
+
+The components to power on or off are grouped by cabinet, and the cabinets
+are divided into batches. A single CAPMC request is made for all the
+components of a batch, and the batch is then waited for with a single CAPMC
+status query for all its components on each poll. A limited number of batches
+are powered at once, which limits the power drawn when many cabinets are
+switched at the same time. The time taken therefore grows with the number of
+batches rather than with the number of components.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+
+from sat.apiclient import APIError, CAPMCClient
+from sat.cli.bootsys.power import CAPMCPowerWaiter
+from sat.session import SATSession
+from sat.xname import XName
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_xnames_by_cabinet(xnames):
+    """Group xnames by the cabinet which contains them.
+
+    Args:
+        xnames (Iterable[str]): the xnames to group
+
+    Returns:
+        dict: a mapping from each cabinet xname to the sorted list of xnames
+            in that cabinet, ordered by cabinet
+    """
+    xnames_by_cabinet = defaultdict(list)
+    for xname in xnames:
+        xnames_by_cabinet[XName(xname).get_cabinet()].append(XName(xname))
+    return {
+        str(cabinet): [str(xname) for xname in sorted(cabinet_xnames)]
+        for cabinet, cabinet_xnames in sorted(xnames_by_cabinet.items())
+    }
+
+
+class PowerBatch:
+    """A batch of cabinets whose components are powered at the same time."""
+
+    def __init__(self, phase, index, xnames_by_cabinet, force=False):
+        """Create a new PowerBatch.
+
+        Args:
+            phase (str): the name of the phase of the plan the batch is part of
+            index (int): the 1-based index of the batch within its phase
+            xnames_by_cabinet (dict): a mapping from each cabinet in the batch
+                to the xnames to power in that cabinet
+            force (bool): whether to force the power operation
+        """
+        self.phase = phase
+        self.index = index
+        self.xnames_by_cabinet = xnames_by_cabinet
+        self.force = force
+
+    @property
+    def cabinets(self):
+        """list of str: the cabinets in the batch"""
+        return list(self.xnames_by_cabinet)
+
+    @property
+    def xnames(self):
+        """list of str: the xnames of all the components in the batch"""
+        return [xname for xnames in self.xnames_by_cabinet.values() for xname in xnames]
+
+    @property
+    def chassis(self):
+        """list of str: the chassis containing the components in the batch"""
+        return sorted({str(XName(xname).get_chassis()) for xname in self.xnames
+                       if XName(xname).get_type() != 'CABINET'})
+
+    @property
+    def name(self):
+        """str: a name for the batch used in log messages"""
+        return f'{self.phase} batch {self.index}'
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name!r}, cabinets={self.cabinets!r})'
+
+
+class CabinetPowerPlan:
+    """A plan for powering the components of many cabinets in batches.
+
+    A plan consists of one or more phases, each of which is a set of
+    components, such as the liquid-cooled chassis or the air-cooled nodes.
+    Phases must not contain the same cabinets, and the batches of different
+    phases may be powered at the same time. Batches are started alternately
+    from each phase so that every phase makes progress.
+    """
+
+    def __init__(self, power_state, batch_size=0, max_concurrent_batches=1):
+        """Create a new CabinetPowerPlan.
+
+        Args:
+            power_state (str): the power state to set, 'on' or 'off'
+            batch_size (int): the number of cabinets in each batch, or 0 to
+                put all the cabinets of a phase in a single batch
+            max_concurrent_batches (int): the maximum number of batches which
+                are powered at the same time
+        """
+        self.power_state = power_state
+        self.batch_size = batch_size
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.batches_by_phase = {}
+
+    def add_phase(self, phase, xnames, force=False):
+        """Add a phase of components to the plan.
+
+        Args:
+            phase (str): the name of the phase
+            xnames (Iterable[str]): the xnames of the components to power
+            force (bool): whether to force the power operation
+
+        Returns:
+            list of PowerBatch: the batches of the phase
+        """
+        xnames_by_cabinet = get_xnames_by_cabinet(xnames)
+        cabinets = list(xnames_by_cabinet)
+        batch_size = self.batch_size or len(cabinets) or 1
+        batches = [
+            PowerBatch(phase, index + 1,
+                       {cabinet: xnames_by_cabinet[cabinet] for cabinet in cabinets[start:start + batch_size]},
+                       force)
+            for index, start in enumerate(range(0, len(cabinets), batch_size))
+        ]
+        self.batches_by_phase[phase] = batches
+        return batches
+
+    @property
+    def batches(self):
+        """list of PowerBatch: the batches in the order they are started"""
+        batches = []
+        phase_batches = list(self.batches_by_phase.values())
+        for index in range(max((len(b) for b in phase_batches), default=0)):
+            batches.extend(b[index] for b in phase_batches if index < len(b))
+        return batches
+
+    @property
+    def num_rounds(self):
+        """int: the number of rounds of concurrent batches needed"""
+        return math.ceil(len(self.batches) / self.max_concurrent_batches)
+
+    def estimate_duration(self, batch_duration):
+        """Estimate how long the plan will take to execute.
+
+        Args:
+            batch_duration (float): the number of seconds the components of
+                a batch take to reach the power state
+
+        Returns:
+            float: the estimated number of seconds
+        """
+        return self.num_rounds * batch_duration
+
+    def get_report_rows(self):
+        """Get rows describing the batches of the plan.
+
+        Returns:
+            list of list: a row for each batch containing its phase, its
+                index, the number of cabinets, chassis and components, and
+                the cabinets
+        """
+        return [
+            [batch.phase, batch.index, len(batch.cabinets), len(batch.chassis),
+             len(batch.xnames), ', '.join(batch.cabinets)]
+            for batch in self.batches
+        ]
+
+    def _execute_batch(self, batch, timeout, polling_strategy):
+        """Power the components of a batch and wait for them to reach the power state.
+
+        Args:
+            batch (PowerBatch): the batch to power
+            timeout (int): the number of seconds to wait for the components
+                to reach the power state
+            polling_strategy (PollingStrategy or None): the polling strategy
+                used while waiting
+
+        Returns:
+            set of str: the xnames which did not reach the power state
+        """
+        xnames = batch.xnames
+        LOGGER.info(f'Powering {self.power_state} {batch.name} ({len(batch.cabinets)} cabinets, '
+                    f'{len(xnames)} components): {", ".join(batch.cabinets)}')
+        try:
+            CAPMCClient(SATSession()).set_xnames_power_state(xnames, self.power_state, force=batch.force)
+        except APIError as err:
+            LOGGER.warning(f'Failed to power {self.power_state} all components of {batch.name}: {err}')
+            if err.__cause__ is not None:
+                LOGGER.warning(f'Cause: {err.__cause__}')
+
+        waiter = CAPMCPowerWaiter(xnames, self.power_state, timeout)
+        if polling_strategy is not None:
+            waiter.polling_strategy = polling_strategy
+        timed_out_xnames = waiter.wait_for_completion()
+        if timed_out_xnames:
+            LOGGER.warning(f'{len(timed_out_xnames)} components of {batch.name} did not reach '
+                           f'powered {self.power_state} state.')
+        else:
+            LOGGER.info(f'All {len(xnames)} components of {batch.name} reached powered '
+                        f'{self.power_state} state.')
+        return timed_out_xnames
+
+    def execute(self, timeout, polling_strategy=None):
+        """Power the components of every batch of the plan.
+
+        Args:
+            timeout (int): the number of seconds to wait for the components
+                of each batch to reach the power state
+            polling_strategy (PollingStrategy or None): the polling strategy
+                used while waiting for each batch
+
+        Returns:
+            dict: a mapping from each phase to the set of xnames in that
+                phase which did not reach the power state
+        """
+        timed_out_by_phase = {phase: set() for phase in self.batches_by_phase}
+        batches = self.batches
+        if not batches:
+            return timed_out_by_phase
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_batches, len(batches))) as executor:
+            futures = {
+                executor.submit(self._execute_batch, batch, timeout, polling_strategy): batch
+                for batch in batches
+            }
+            for future, batch in futures.items():
+                timed_out_by_phase[batch.phase] |= set(future.result())
+
+        return timed_out_by_phase
@@ -23,12 +23,18 @@
 #
 """
 Various checks on system services to ensure idleness before shutdown.
+
+The services are checked concurrently, and the sessions listed from each
+service are kept in a SessionCache shared by all the checkers, so that checking
+again shortly afterwards does not list every session again.
 """
 from abc import ABC, abstractmethod
 from collections import OrderedDict
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import logging
-import socket
 import sys
+from threading import Lock
+import time
 import warnings
 
 from inflect import engine
@@ -36,7 +42,6 @@ from kubernetes.client import CoreV1Api
 from kubernetes.client.rest import ApiException
 from kubernetes.config import load_kube_config
 from kubernetes.config.config_exception import ConfigException
-from paramiko.ssh_exception import SSHException
 from yaml import YAMLLoadWarning
 
 from sat.apiclient import (
@@ -46,28 +51,122 @@ from sat.apiclient import (
     NMDClient
 )
 from sat.apiclient.bos import BOSClientCommon
-from sat.cli.bootsys.util import get_mgmt_ncn_groups, get_ssh_client
+from sat.cli.bootsys.ssh import run_on_hosts
+from sat.cli.bootsys.util import get_mgmt_ncn_groups
 from sat.config import get_config_value
 from sat.constants import MISSING_VALUE
 from sat.apiclient import FASClient
 from sat.report import Report
 from sat.session import SATSession
-from sat.util import get_new_ordered_dict, get_val_by_path
+from sat.util import get_new_ordered_dict, get_val_by_path, submit_daemon
 
 
 LOGGER = logging.getLogger(__name__)
 INFLECTOR = engine()
 
+# The number of seconds for which sessions listed from a service are reused
+SESSION_CACHE_MAX_AGE = 30
+
 
 class ServiceCheckError(Exception):
     """Indicates that we could not get status about the sessions for a service."""
     pass
 
 
+class SessionCache:
+    """A cache of the sessions listed from services.
+
+    A SessionCache is shared by the activity checkers of one bootsys run. It
+    holds a single SATSession used to query every service, and the result of
+    each query for a limited time. Queries may be made from many threads at
+    once, and a query which is already being made by one thread is not
+    repeated by another.
+    """
+
+    def __init__(self, max_age=SESSION_CACHE_MAX_AGE):
+        """Create a new SessionCache.
+
+        Args:
+            max_age (float): the number of seconds for which the result of a
+                query is reused
+        """
+        self.max_age = max_age
+        self._session = None
+        self._results = {}
+        self._key_locks = {}
+        self._lock = Lock()
+
+    @property
+    def session(self):
+        """SATSession: the session used to query all services"""
+        with self._lock:
+            if self._session is None:
+                self._session = SATSession()
+            return self._session
+
+    def get(self, key, query):
+        """Get the result of a query, making the query only if necessary.
+
+        The result must not be modified, since it is shared with every other
+        caller which gets the same key. Exceptions raised by the query are
+        not cached.
+
+        Args:
+            key (tuple): the key identifying the query
+            query (Callable): a function which makes the query and returns
+                its result
+
+        Returns:
+            The result of the query.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+
+        with key_lock:
+            cached = self._results.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.max_age:
+                LOGGER.debug('Using cached result of query %s', key)
+                return cached[1]
+
+            query_time = time.monotonic()
+            result = query()
+            self._results[key] = (query_time, result)
+            return result
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock:
+            self._results.clear()
+
+
+_session_cache = None
+_session_cache_lock = Lock()
+
+
+def get_session_cache():
+    """Get the SessionCache shared by all of bootsys.
+
+    Returns:
+        SessionCache: the shared cache, which is created when this is first
+            called.
+    """
+    global _session_cache
+    with _session_cache_lock:
+        if _session_cache is None:
+            _session_cache = SessionCache()
+        return _session_cache
+
+
 class ActivityChecker(ABC):
     """An abstract base class for checking arbitrary activities."""
-    def __init__(self):
-        """Create a new ActivityChecker."""
+    def __init__(self, session_cache=None):
+        """Create a new ActivityChecker.
+
+        Args:
+            session_cache (SessionCache): the cache of queries made to
+                services. If None, a new cache is used.
+        """
+        self.session_cache = session_cache or SessionCache()
         # The name of the service
         self.service_name = ''
         # The singular noun describing the sessions
@@ -137,9 +236,9 @@ class ServiceActivityChecker(ActivityChecker):
     cli.
     """
 
-    def __init__(self):
+    def __init__(self, session_cache=None):
         """Create a new ServiceActivityChecker."""
-        super().__init__()
+        super().__init__(session_cache)
         # cray CLI args to get more information about a specific session
         self.cray_cli_args = ''
         # The field name that identifies a session
@@ -158,13 +257,16 @@ class ServiceActivityChecker(ActivityChecker):
 
 class SDUActivityChecker(ActivityChecker):
     """A class that checks for SDU being used to actively dump system state."""
-    def __init__(self):
+
+    # The number of seconds to wait for output from the command run on each NCN
+    COMMAND_TIMEOUT_SECS = 60
+
+    def __init__(self, session_cache=None):
         """Create a new SDUActivityChecker."""
-        super().__init__()
+        super().__init__(session_cache)
         self.service_name = 'SDU'
         self.session_name = 'session'
 
-        self.ssh_client = get_ssh_client()
         mgmt_ncns, _ = get_mgmt_ncn_groups()
         self.remote_manager_ncns = mgmt_ncns['managers']
 
@@ -173,6 +275,9 @@ class SDUActivityChecker(ActivityChecker):
     def get_active_sessions(self):
         """Get any active SDU sessions.
 
+        The manager NCNs are checked in parallel over the SSH connections
+        shared by all of bootsys.
+
         Returns:
             A list of OrderedDicts representing the active SDU sessions.
 
@@ -181,19 +286,14 @@ class SDUActivityChecker(ActivityChecker):
         """
         self.active_sdu_sessions = []
 
-        for ncn in self.remote_manager_ncns:
-            try:
-                self.ssh_client.connect(ncn)
-                command = 'sdu bash pgrep sdu'
-                LOGGER.debug("Running command %s on NCN \"%s\"", command, ncn)
-                channel = self.ssh_client.get_transport().open_session()
-                channel.exec_command(command)
-
-                self.interpret_return_value(ncn, channel.recv_exit_status(), channel.makefile_stderr().read())
-            except (SSHException, socket.error) as err:
-                raise self.get_err(f'Unable to connect to management NCN "{ncn}": {str(err)}')
-            finally:
-                self.ssh_client.close()
+        command = 'sdu bash pgrep sdu'
+        LOGGER.debug('Running command "%s" on NCNs %s', command, ', '.join(self.remote_manager_ncns))
+        results = run_on_hosts(self.remote_manager_ncns, command, timeout=self.COMMAND_TIMEOUT_SECS)
+
+        for ncn, result in results.items():
+            if result.error is not None:
+                raise self.get_err(f'Unable to connect to management NCN "{ncn}": {result.error}')
+            self.interpret_return_value(ncn, result.exit_status, result.stderr)
 
         return self.active_sdu_sessions
 
@@ -218,7 +318,7 @@ class SDUActivityChecker(ActivityChecker):
             ncn (str): the hostname of the NCN being checked for an SDU session
             retval (int): the return code of the sdu/pgrep process checking for SDU
                 sessions
-            stderr (bytes): the raw contents of stderr from the sdu/pgrep process
+            stderr (str): the contents of stderr from the sdu/pgrep process
 
         Raises:
             ServiceCheckError: if an error occurred while checking for an SDU session.
@@ -233,7 +333,7 @@ class SDUActivityChecker(ActivityChecker):
         elif retval == 127:
             LOGGER.warning("The `sdu` command was not found on %s.", ncn)
         else:
-            stderr_contents = stderr.decode().strip()
+            stderr_contents = stderr.strip()
             err_details = f'(return code: {retval}, stderr: "{stderr_contents}")'
             errmsg = {
                 2:   f"Syntax error on pgrep commandline on {ncn}. {stderr_contents}",
@@ -246,9 +346,9 @@ class SDUActivityChecker(ActivityChecker):
 class BOSV1ActivityChecker(ServiceActivityChecker):
     """A class that checks for active BOS sessions when BOS v1 is in use."""
 
-    def __init__(self):
+    def __init__(self, session_cache=None):
         """Create a new BOSActivityChecker."""
-        super().__init__()
+        super().__init__(session_cache)
 
         self.service_name = 'BOS'
         self.session_name = 'session'
@@ -264,13 +364,14 @@ class BOSV1ActivityChecker(ServiceActivityChecker):
         Raises:
             ServiceCheckError: if unable to get the active BOS sessions.
         """
-        bos_client = BOSClientCommon.get_bos_client(SATSession(), version='v1')
+        bos_client = BOSClientCommon.get_bos_client(self.session_cache.session, version='v1')
 
         active_sessions = []
         bos_session_fields = ['bos_launch', 'operation', 'stage',
                               'session_template_id']
         try:
-            session_ids = bos_client.get('session').json()
+            session_ids = self.session_cache.get(('BOS', 'v1', 'session'),
+                                                 lambda: bos_client.get('session').json())
         except (APIError, ValueError) as err:
             raise self.get_err(str(err))
 
@@ -291,14 +392,6 @@ class BOSV1ActivityChecker(ServiceActivityChecker):
         k8s_client = CoreV1Api()
 
         for session_id in session_ids:
-            session_info = {}
-            try:
-                session_info = bos_client.get('session', session_id).json()
-            except (APIError, ValueError) as err:
-                # This is not really fatal, but reduces the info we can provide
-                LOGGER.warning('Unable to get details about BOS session %s: %s',
-                               session_id, err)
-
             label_selector = 'job-name=boa-{}'.format(session_id)
             try:
                 pods = k8s_client.list_namespaced_pod(
@@ -315,6 +408,18 @@ class BOSV1ActivityChecker(ServiceActivityChecker):
                 # Per k8s API docs, there are 5 possible phases: Pending,
                 # Running, Succeeded, Failed, and Unknown.
                 if pod.status.phase in ('Pending', 'Running'):
+                    # Only the details of active sessions are needed
+                    session_info = {}
+                    try:
+                        session_info = dict(self.session_cache.get(
+                            ('BOS', 'v1', 'session', session_id),
+                            lambda: bos_client.get('session', session_id).json()
+                        ))
+                    except (APIError, ValueError) as err:
+                        # This is not really fatal, but reduces the info we can provide
+                        LOGGER.warning('Unable to get details about BOS session %s: %s',
+                                       session_id, err)
+
                     session_info[self.id_field_name] = session_id
                     active_sessions.append(
                         get_new_ordered_dict(
@@ -333,8 +438,8 @@ class BOSV1ActivityChecker(ServiceActivityChecker):
 class BOSV2ActivityChecker(ServiceActivityChecker):
     """A class that checks for active BOS sessions when BOS v2 is in use."""
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, session_cache=None):
+        super().__init__(session_cache)
         self.service_name = 'BOS'
         self.session_name = 'session'
         self.cray_cli_args = 'bos v2 sessions describe'
@@ -357,12 +462,12 @@ class BOSV2ActivityChecker(ServiceActivityChecker):
             'status.status',
             'template_name',
         ]
-        bos_client = BOSClientCommon.get_bos_client(SATSession(), version='v2')
+        bos_client = BOSClientCommon.get_bos_client(self.session_cache.session, version='v2')
 
         try:
             return [
                 get_new_ordered_dict(session, bos_v2_paths, MISSING_VALUE)
-                for session in bos_client.get_sessions()
+                for session in self.session_cache.get(('BOS', 'v2', 'sessions'), bos_client.get_sessions)
                 if get_val_by_path(session, 'status.status') != 'complete'
             ]
         except APIError as err:
@@ -373,9 +478,9 @@ class BOSV2ActivityChecker(ServiceActivityChecker):
 class CFSActivityChecker(ServiceActivityChecker):
     """A class that checks for active CFS sessions."""
 
-    def __init__(self):
+    def __init__(self, session_cache=None):
         """Create a new CFSActivityChecker."""
-        super().__init__()
+        super().__init__(session_cache)
         self.service_name = 'CFS'
         self.session_name = 'session'
         self.cray_cli_args = 'cfs sessions describe'
@@ -392,9 +497,10 @@ class CFSActivityChecker(ServiceActivityChecker):
         Raises:
             ServiceCheckError: if unable to get the active CFS sessions.
         """
-        cfs_client = CFSClient(SATSession())
+        cfs_client = CFSClient(self.session_cache.session)
         try:
-            sessions = cfs_client.get('sessions').json()
+            sessions = self.session_cache.get(('CFS', 'sessions'),
+                                              lambda: cfs_client.get('sessions').json())
         except (APIError, ValueError) as err:
             raise self.get_err(str(err))
 
@@ -417,9 +523,9 @@ class CFSActivityChecker(ServiceActivityChecker):
 class CRUSActivityChecker(ServiceActivityChecker):
     """A class that checks for active CRUS sessions."""
 
-    def __init__(self):
+    def __init__(self, session_cache=None):
         """Create a new CRUSActivityChecker."""
-        super().__init__()
+        super().__init__(session_cache)
         self.service_name = 'CRUS'
         self.session_name = 'upgrade'
         self.cray_cli_args = 'crus session describe'
@@ -434,9 +540,10 @@ class CRUSActivityChecker(ServiceActivityChecker):
         Raises:
             ServiceCheckError: if unable to get the active CRUS upgrades.
         """
-        crus_client = CRUSClient(SATSession())
+        crus_client = CRUSClient(self.session_cache.session)
         try:
-            upgrades = crus_client.get('session').json()
+            upgrades = self.session_cache.get(('CRUS', 'session'),
+                                              lambda: crus_client.get('session').json())
         except (APIError, ValueError) as err:
             raise self.get_err(str(err))
 
@@ -457,10 +564,10 @@ class CRUSActivityChecker(ServiceActivityChecker):
 class FirmwareActivityChecker(ServiceActivityChecker):
     """A class that checks for active FAS sessions."""
 
-    def __init__(self):
+    def __init__(self, session_cache=None):
         """Create a new FirmwareActivityChecker"""
-        super().__init__()
-        self.fw_client = FASClient(SATSession())
+        super().__init__(session_cache)
+        self.fw_client = FASClient(self.session_cache.session)
 
         self.service_name = 'FAS'
         self.session_name = 'action'
@@ -478,7 +585,8 @@ class FirmwareActivityChecker(ServiceActivityChecker):
                 actions.
         """
         try:
-            active_updates = self.fw_client.get_active_actions()
+            active_updates = self.session_cache.get(('FAS', 'active actions'),
+                                                    self.fw_client.get_active_actions)
         except APIError as err:
             raise self.get_err(str(err))
 
@@ -494,9 +602,9 @@ class FirmwareActivityChecker(ServiceActivityChecker):
 class NMDActivityChecker(ServiceActivityChecker):
     """A class that checks for active NMD sessions."""
 
-    def __init__(self):
+    def __init__(self, session_cache=None):
         """Create a new NMDActivityChecker."""
-        super().__init__()
+        super().__init__(session_cache)
         self.service_name = 'NMD'
         self.session_name = 'dump'
         self.cray_cli_args = 'nmd dumps describe'
@@ -511,9 +619,10 @@ class NMDActivityChecker(ServiceActivityChecker):
         Raises:
             ServiceCheckError: if unable to get the active NMD dumps.
         """
-        nmd_client = NMDClient(SATSession())
+        nmd_client = NMDClient(self.session_cache.session)
         try:
-            dumps = nmd_client.get('dumps').json()
+            dumps = self.session_cache.get(('NMD', 'dumps'),
+                                           lambda: nmd_client.get('dumps').json())
         except (APIError, ValueError) as err:
             raise self.get_err(str(err))
 
@@ -528,14 +637,83 @@ class NMDActivityChecker(ServiceActivityChecker):
         ]
 
 
-def _report_active_sessions(service_activity_checkers):
+def _get_timed_sessions(checker):
+    """Get the active sessions from a checker and measure how long it takes.
+
+    Returns:
+        Tuple[list, ServiceCheckError, float]: the active sessions, or None
+            if they could not be retrieved, the error which prevented them
+            from being retrieved, or None, and the elapsed time in seconds
+    """
+    start_time = time.monotonic()
+    try:
+        sessions, err = checker.get_active_sessions(), None
+    except ServiceCheckError as check_err:
+        sessions, err = None, check_err
+    return sessions, err, time.monotonic() - start_time
+
+
+def _get_all_active_sessions(service_activity_checkers, timeout=None, timings=None):
+    """Get the active sessions from all checkers concurrently.
+
+    Args:
+        service_activity_checkers: A list of ActivityChecker objects to be
+            queried for service activity.
+        timeout (None or float): the number of seconds to wait for each
+            checker, measured from when all the checkers were started. If
+            None, wait until every checker has finished.
+        timings (None or dict): if given, this dict is updated with the number
+            of seconds taken by each checker that finished, keyed by the
+            checker's service name.
+
+    Returns:
+        A list of (checker, sessions, error) tuples, one for each checker in
+        the order given. Either sessions is the list of active sessions or
+        error is the ServiceCheckError describing why they could not be
+        retrieved.
+    """
+    if timings is None:
+        timings = {}
+    if not service_activity_checkers:
+        return []
+
+    results = []
+    start_time = time.monotonic()
+    # Checkers are run in daemon threads so that a checker which does not
+    # finish before the timeout cannot prevent SAT from exiting.
+    futures = []
+    for checker in service_activity_checkers:
+        LOGGER.info('Checking for {}.'.format(checker.active_sessions_desc))
+        futures.append(submit_daemon(_get_timed_sessions, checker))
+
+    for checker, future in zip(service_activity_checkers, futures):
+        remaining = None if timeout is None else max(0, start_time + timeout - time.monotonic())
+        try:
+            sessions, err, timings[checker.service_name] = future.result(timeout=remaining)
+            results.append((checker, sessions, err))
+        except FuturesTimeoutError:
+            results.append((checker, None, checker.get_err(
+                f'Timed out after {timeout} seconds'
+            )))
+
+    return results
+
+
+def _report_active_sessions(service_activity_checkers, timeout=None, timings=None):
     """Reports on the active sessions of various services on the system.
 
-    Prints information about active sessions of the various services.
+    The services are checked concurrently, and information about active
+    sessions of the various services is printed in the order the checkers are
+    given. The time taken by each checker and by all checkers is logged.
 
     Args:
         service_activity_checkers: A list of ServiceActivityChecker objects to
             be queried for service activity.
+        timeout (None or float): the number of seconds to wait for each
+            checker. If None, wait until every checker has finished.
+        timings (None or dict): if given, this dict is updated with the number
+            of seconds taken by each checker that finished, keyed by the
+            checker's service name.
 
     Returns:
         A tuple of:
@@ -544,12 +722,15 @@ def _report_active_sessions(service_activity_checkers):
     """
     active_services = []
     failed_services = []
+    if timings is None:
+        timings = {}
 
-    for checker in service_activity_checkers:
-        LOGGER.info('Checking for {}.'.format(checker.active_sessions_desc))
-        try:
-            sessions = checker.get_active_sessions()
-        except ServiceCheckError as err:
+    start_time = time.monotonic()
+    results = _get_all_active_sessions(service_activity_checkers, timeout, timings)
+    elapsed = time.monotonic() - start_time
+
+    for checker, sessions, err in results:
+        if err is not None:
             LOGGER.error(str(err))
             failed_services.append(checker.service_name)
             continue
@@ -577,6 +758,10 @@ def _report_active_sessions(service_activity_checkers):
         report.add_rows(sessions)
         print(report)
 
+    if timings:
+        LOGGER.info('Checked for active sessions in %.2f seconds (%s).', elapsed,
+                    ', '.join(f'{service}: {seconds:.2f}s' for service, seconds in timings.items()))
+
     return active_services, failed_services
 
 
@@ -602,16 +787,19 @@ def do_service_activity_check(args):
         BOSV1ActivityChecker if get_config_value('bos.api_version') == 'v1' \
         else BOSV2ActivityChecker
 
+    session_cache = get_session_cache()
     service_activity_checkers = [
-        bos_checker_cls(),
-        CFSActivityChecker(),
-        CRUSActivityChecker(),
-        FirmwareActivityChecker(),
-        NMDActivityChecker(),
-        SDUActivityChecker()
+        bos_checker_cls(session_cache),
+        CFSActivityChecker(session_cache),
+        CRUSActivityChecker(session_cache),
+        FirmwareActivityChecker(session_cache),
+        NMDActivityChecker(session_cache),
+        SDUActivityChecker(session_cache)
     ]
 
-    active, failed = _report_active_sessions(service_activity_checkers)
+    active, failed = _report_active_sessions(
+        service_activity_checkers, get_config_value('bootsys.session_check_timeout')
+    )
 
     if failed:
         LOGGER.error(f'Failed to get active sessions for the following '
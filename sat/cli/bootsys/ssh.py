@@ -0,0 +1,249 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Shared SSH connections to NCNs and parallel execution of remote commands.
+
+Connecting over SSH requires a key exchange and authentication, which takes
+far longer than running a short command. An SSHSessionPool therefore keeps a
+single connection to each host, and every command run on that host is run
+over its own channel of that connection. Channels of one connection may be
+used from many threads at once.
+"""
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+import socket
+from threading import BoundedSemaphore, Lock
+
+from paramiko import SSHException
+
+from sat.cli.bootsys.util import get_ssh_client
+
+LOGGER = logging.getLogger(__name__)
+
+# The default maximum number of channels open at once on one connection. This
+# matches the default value of MaxSessions in sshd_config.
+DEFAULT_MAX_CHANNELS_PER_HOST = 10
+
+
+class CommandResult:
+    """The result of running a command on a remote host."""
+
+    def __init__(self, host, command, exit_status=None, stdout='', stderr='', error=None):
+        """Create a new CommandResult.
+
+        Args:
+            host (str): the host on which the command was run
+            command (str): the command which was run
+            exit_status (int or None): the exit status of the command, or
+                None if the command could not be run
+            stdout (str): the standard output of the command
+            stderr (str): the standard error of the command
+            error (str or None): a description of the error which prevented
+                the command from being run, if any
+        """
+        self.host = host
+        self.command = command
+        self.exit_status = exit_status
+        self.stdout = stdout
+        self.stderr = stderr
+        self.error = error
+
+    @property
+    def succeeded(self):
+        """bool: True if the command ran and exited with status 0"""
+        return self.error is None and self.exit_status == 0
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(host={self.host!r}, command={self.command!r}, '
+                f'exit_status={self.exit_status!r}, error={self.error!r})')
+
+
+class SSHSessionPool:
+    """A pool of SSH connections with at most one connection per host."""
+
+    def __init__(self, connect_kwargs=None, max_channels_per_host=DEFAULT_MAX_CHANNELS_PER_HOST):
+        """Create a new SSHSessionPool.
+
+        Args:
+            connect_kwargs (dict): additional keyword arguments passed to
+                paramiko.SSHClient.connect, e.g. `port` or `username`.
+            max_channels_per_host (int): the maximum number of commands run
+                at once on one host by run_on_host().
+        """
+        self.connect_kwargs = connect_kwargs or {}
+        self.max_channels_per_host = max_channels_per_host
+        self._clients = {}
+        self._host_locks = {}
+        self._channel_semaphores = {}
+        self._lock = Lock()
+
+    def _get_host_lock(self, host):
+        with self._lock:
+            return self._host_locks.setdefault(host, Lock())
+
+    def get_client(self, host):
+        """Get an SSH client connected to the given host.
+
+        The same client is returned for every call with the same host, as long
+        as its connection is still active. Clients returned by this method
+        are owned by the pool and should not be closed by callers.
+
+        Args:
+            host (str): the host to connect to
+
+        Returns:
+            paramiko.SSHClient: a client connected to the host
+
+        Raises:
+            SSHException, socket.error: if connecting to the host fails
+        """
+        with self._get_host_lock(host):
+            client = self._clients.get(host)
+            if client is not None:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active():
+                    return client
+                LOGGER.debug('SSH connection to %s is no longer active; reconnecting.', host)
+                client.close()
+                del self._clients[host]
+
+            client = get_ssh_client()
+            try:
+                client.connect(host, **self.connect_kwargs)
+            except Exception:
+                client.close()
+                raise
+            self._clients[host] = client
+            return client
+
+    @contextmanager
+    def channel_slot(self, host):
+        """Wait until another channel may be opened on the connection to a host.
+
+        Args:
+            host (str): the host on which to open a channel
+        """
+        with self._lock:
+            semaphore = self._channel_semaphores.setdefault(
+                host, BoundedSemaphore(self.max_channels_per_host)
+            )
+        with semaphore:
+            yield
+
+    def close(self):
+        """Close all connections in the pool."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_session_pool = None
+_session_pool_lock = Lock()
+
+
+def get_ssh_session_pool():
+    """Get the SSHSessionPool shared by all of bootsys.
+
+    The pool is created when this is first called, and its connections are
+    closed when the program exits.
+
+    Returns:
+        SSHSessionPool: the shared pool
+    """
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SSHSessionPool()
+            atexit.register(_session_pool.close)
+        return _session_pool
+
+
+def run_on_host(host, command, timeout=None, pool=None):
+    """Run a command on a host using a pooled connection.
+
+    Args:
+        host (str): the host on which to run the command
+        command (str): the command to run
+        timeout (float or None): the timeout, in seconds, for reading output
+            from the command, or None to wait indefinitely
+        pool (SSHSessionPool or None): the pool of connections to use. If
+            None, the shared pool is used.
+
+    Returns:
+        CommandResult: the result of the command. If connecting to the host
+            or running the command failed, its `error` attribute is set.
+    """
+    pool = pool or get_ssh_session_pool()
+    LOGGER.debug('Executing command "%s" on host %s', command, host)
+    try:
+        client = pool.get_client(host)
+        with pool.channel_slot(host):
+            _, stdout, stderr = client.exec_command(command, timeout=timeout)
+            try:
+                stdout_str = stdout.read().decode(errors='replace')
+                stderr_str = stderr.read().decode(errors='replace')
+                exit_status = stdout.channel.recv_exit_status()
+            finally:
+                # Close the channel so it does not count against the limit
+                # of sessions per connection on the server.
+                stdout.channel.close()
+    except (SSHException, socket.error) as err:
+        return CommandResult(host, command, error=f'Failed to execute "{command}" on {host}: {err}')
+
+    return CommandResult(host, command, exit_status, stdout_str, stderr_str)
+
+
+def run_on_hosts(hosts, command, timeout=None, pool=None, max_workers=None):
+    """Run a command on many hosts in parallel using pooled connections.
+
+    Args:
+        hosts (Iterable[str]): the hosts on which to run the command
+        command (str): the command to run
+        timeout (float or None): see run_on_host
+        pool (SSHSessionPool or None): see run_on_host
+        max_workers (int or None): the maximum number of hosts on which the
+            command is run at once. If None, it is run on all hosts at once.
+
+    Returns:
+        dict: a mapping from each host to its CommandResult, in the order the
+            hosts were given.
+    """
+    hosts = list(hosts)
+    if not hosts:
+        return {}
+
+    pool = pool or get_ssh_session_pool()
+    with ThreadPoolExecutor(max_workers=max_workers or len(hosts)) as executor:
+        results = executor.map(lambda host: run_on_host(host, command, timeout, pool), hosts)
+        return dict(zip(hosts, results))
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -23,8 +23,14 @@
 #
 """
 Handles capturing state (e.g. k8s pod state) before a shutdown operation.
+
+Each capture of state is stored in S3 as a gzip-compressed JSON snapshot. A
+snapshot contains either the full state or a patch to the most recent full
+snapshot, whichever is smaller. A manifest object lists the snapshots which
+are available, so the bucket does not need to be listed to find them.
 """
 from abc import ABC, abstractmethod
+import gzip
 import json
 import logging
 import os
@@ -42,17 +48,31 @@ from yaml import YAMLLoadWarning
 from sat.apiclient import FabricControllerClient
 from sat.session import SATSession
 from sat.cli.bootsys.defaults import (
-    DEFAULT_LOCAL_STATE_DIR,
     POD_STATE_DIR, POD_STATE_FILE_PREFIX,
     HSN_STATE_DIR, HSN_STATE_FILE_PREFIX
 )
-from sat.cli.bootsys.util import k8s_pods_to_status_dict
 from sat.config import get_config_value
+from sat.constants import MISSING_VALUE
+from sat.pod_cache import PodCache
+from sat.report import Report
 from sat.util import BeginEndLogger, get_s3_resource
 
 
 LOGGER = logging.getLogger(__name__)
 
+# The version of the format of snapshots and manifests
+SNAPSHOT_FORMAT_VERSION = 1
+
+# The suffix added to the file suffix of compressed snapshots
+COMPRESSED_SUFFIX = '.gz'
+
+# A delta snapshot is stored only if it is smaller than this fraction of the
+# size of the full snapshot.
+MAX_DELTA_SIZE_RATIO = 0.5
+
+# The error codes of S3 responses for objects which do not exist
+MISSING_OBJECT_ERROR_CODES = ('NoSuchKey', '404')
+
 
 class StateError(Exception):
     """Failed to capture state information or load captured state information."""
@@ -64,15 +84,85 @@ class PodStateError(StateError):
     pass
 
 
+def get_merge_patch(old, new):
+    """Get a JSON merge patch (RFC 7386) which changes one value into another.
+
+    Args:
+        old: the original value
+        new: the new value
+
+    Returns:
+        The merge patch. Applying it to `old` with `apply_merge_patch` gives
+        `new`, unless `new` contains a dict value of None, which a merge patch
+        cannot represent.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+
+    patch = {}
+    for key in old.keys() - new.keys():
+        patch[key] = None
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            patch[key] = get_merge_patch(old[key], value)
+    return patch
+
+
+def apply_merge_patch(target, patch):
+    """Apply a JSON merge patch (RFC 7386) to a value.
+
+    Args:
+        target: the value to patch, which is not modified
+        patch: the merge patch
+
+    Returns:
+        The patched value.
+    """
+    if not isinstance(patch, dict):
+        return patch
+
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def get_state_differences(old, new, path=()):
+    """Get the differences between two states.
+
+    Args:
+        old: the first state
+        new: the second state
+        path (tuple): the keys of the values being compared
+
+    Returns:
+        list of tuple: a (path, old value, new value) tuple for each value
+            which differs, where a value which is missing from a state is None
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        differences = []
+        for key in sorted(old.keys() | new.keys(), key=str):
+            differences.extend(get_state_differences(old.get(key), new.get(key), path + (key,)))
+        return differences
+    return [] if old == new else [(path, old, new)]
+
+
 class StateRecorder(ABC):
     """
-    Records some state information to a time-stamped file and stores it in the
-    configured S3 bucket.
+    Records some state information to a time-stamped snapshot and stores it in
+    the configured S3 bucket.
 
-    The data is stored in JSON and loaded as JSON.
+    The data is stored as gzip-compressed JSON, and it is uploaded and
+    downloaded without writing it to a local file.
     """
 
-    def __init__(self, description, dir_path, file_prefix, num_to_keep, s3, bucket_name, file_suffix='.json'):
+    def __init__(self, description, dir_path, file_prefix, num_to_keep, s3, bucket_name, file_suffix='.json',
+                 use_deltas=True):
         """
         Create a new StateRecorder object to record and load state information.
 
@@ -84,6 +174,8 @@ class StateRecorder(ABC):
             s3 (ServiceResource): A boto3.resources.factory.s3.ServiceResource object.
             bucket_name (str): The name of the S3 bucket to use.
             file_suffix (str): The suffix of the files to remove.
+            use_deltas (bool): Whether to store snapshots as patches to the
+                most recent full snapshot when that is smaller.
         """
         self.description = description
         self.dir_path = dir_path
@@ -92,78 +184,161 @@ class StateRecorder(ABC):
         self.file_suffix = file_suffix
         self.s3 = s3
         self.bucket_name = bucket_name
+        self.use_deltas = use_deltas
 
-    def _get_s3_state_files(self):
-        """Get a list of state files the configured S3 bucket.
+    @property
+    def manifest_key(self):
+        """str: the key of the object which lists the snapshots"""
+        return os.path.join(self.dir_path, f'{self.file_prefix}.manifest{self.file_suffix}')
 
-        File names will be sorted by last-modified time, from oldest to most recent.
+    def _read_object(self, key):
+        """Read the contents of an object in the S3 bucket into memory.
+
+        Args:
+            key (str): the key of the object
+
+        Returns:
+            bytes: the contents of the object
+
+        Raises:
+            ClientError, BotoCoreError, Boto3Error: if the object cannot be read
+        """
+        # TODO(SAT-926): Start verifying HTTPS requests
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', category=InsecureRequestWarning)
+            return self.s3.Object(self.bucket_name, key).get()['Body'].read()
+
+    def _write_object(self, key, data):
+        """Write an object to the S3 bucket from memory.
+
+        Args:
+            key (str): the key of the object
+            data (bytes): the contents of the object
+
+        Raises:
+            ClientError, BotoCoreError, Boto3Error: if the object cannot be written
+        """
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', category=InsecureRequestWarning)
+            self.s3.Object(self.bucket_name, key).put(Body=data)
+
+    def _list_s3_state_files(self):
+        """List the snapshots in the S3 bucket without using the manifest.
+
+        This finds snapshots stored before the manifest was introduced, which
+        contain uncompressed JSON.
+
+        Returns:
+            list of dict: the snapshots sorted by last-modified time, from
+                oldest to most recent
+
+        Raises:
+            StateError: if the bucket cannot be listed
         """
         try:
             s3_bucket = self.s3.Bucket(self.bucket_name)
-            state_files = [
-                f.key for f in
-                sorted(s3_bucket.objects.filter(Prefix=self.dir_path), key=lambda x: x.last_modified)
-                if os.path.basename(f.key).startswith(self.file_prefix) and f.key.endswith(self.file_suffix)
-            ]
-            return state_files
+            objects = sorted(s3_bucket.objects.filter(Prefix=self.dir_path),
+                             key=lambda x: x.last_modified)
         except (BotoCoreError, ClientError, Boto3Error) as err:
             raise StateError(f'Unable to list files in S3 Bucket {self.bucket_name}: {err}')
 
-    def _remove_old_files(self):
-        """Remove old files within the given S3 bucket that match the given prefix.
+        return [
+            {'key': f.key, 'timestamp': f.last_modified.strftime('%Y-%m-%dT%H:%M:%S'), 'base': None}
+            for f in objects
+            if os.path.basename(f.key).startswith(f'{self.file_prefix}.') and f.key != self.manifest_key
+            and (f.key.endswith(self.file_suffix) or f.key.endswith(self.file_suffix + COMPRESSED_SUFFIX))
+        ]
+
+    def get_snapshots(self):
+        """Get the snapshots which are available.
 
-        File names will be sorted by last-modified time and all but the last `self.num_to_keep` files will be removed.
+        The snapshots are read from the manifest. If there is no manifest, the
+        S3 bucket is listed instead.
+
+        Returns:
+            list of dict: the snapshots from oldest to most recent. Each has
+                the keys 'key', 'timestamp', and 'base', which is the key of
+                the full snapshot that a delta snapshot is relative to, or None.
+
+        Raises:
+            StateError: if the manifest or the S3 bucket cannot be read
         """
-        candidates_for_removal = self._get_s3_state_files()
-        LOGGER.debug('Current state files: %s', candidates_for_removal)
+        try:
+            manifest = json.loads(self._read_object(self.manifest_key))
+        except ClientError as err:
+            if err.response.get('Error', {}).get('Code') in MISSING_OBJECT_ERROR_CODES:
+                return self._list_s3_state_files()
+            raise StateError(f'Unable to read manifest {self.manifest_key} from S3: {err}')
+        except (BotoCoreError, Boto3Error) as err:
+            raise StateError(f'Unable to read manifest {self.manifest_key} from S3: {err}')
+        except ValueError as err:
+            raise StateError(f'Failed to parse JSON from manifest {self.manifest_key}: {err}')
+
+        try:
+            return manifest['snapshots']
+        except (KeyError, TypeError):
+            raise StateError(f'Manifest {self.manifest_key} is missing the list of snapshots')
 
-        num_to_remove = len(candidates_for_removal) - self.num_to_keep
-        if num_to_remove > 0:
-            for file_to_remove in candidates_for_removal[:num_to_remove]:
-                LOGGER.debug('Removing %s from S3', file_to_remove)
-                try:
-                    self.s3.Object(self.bucket_name, file_to_remove).delete()
-                except (BotoCoreError, ClientError, Boto3Error) as err:
-                    LOGGER.warning(f'Failed to remove old file {file_to_remove} from S3: {err}')
+    def _get_s3_state_files(self):
+        """Get a list of state files in the configured S3 bucket.
+
+        File names will be sorted from oldest to most recent.
+        """
+        return [snapshot['key'] for snapshot in self.get_snapshots()]
 
-        LOGGER.debug('Files left in bucket: %s', self._get_s3_state_files())
+    def _get_snapshots_to_keep(self, snapshots):
+        """Get the snapshots which are kept when old snapshots are removed.
 
-    def _create_new_file(self):
-        """Create a new file in the given directory.
+        The most recent `self.num_to_keep` snapshots are kept, along with any
+        full snapshots that they are relative to.
 
-        The new file name will be of the form `file_prefix`.TIMESTAMP`file_suffix`.
+        Args:
+            snapshots (list of dict): the snapshots from oldest to most recent
 
         Returns:
-            str: The name of the newly created file.
+            list of dict: the snapshots to keep, from oldest to most recent
+        """
+        recent = snapshots[-self.num_to_keep:] if self.num_to_keep > 0 else []
+        keys_to_keep = {snapshot['key'] for snapshot in recent}
+        keys_to_keep |= {snapshot['base'] for snapshot in recent if snapshot.get('base')}
+        return [snapshot for snapshot in snapshots if snapshot['key'] in keys_to_keep]
+
+    def _remove_old_files(self, snapshots=None):
+        """Remove old snapshots from the S3 bucket and update the manifest.
+
+        All but the last `self.num_to_keep` snapshots are removed, except for
+        full snapshots which a remaining delta snapshot is relative to.
+
+        Args:
+            snapshots (list of dict): the snapshots from oldest to most recent.
+                If None, they are read from the manifest.
 
         Raises:
-            StateError: if the new file cannot be created.
+            StateError: if the snapshots cannot be listed or the manifest
+                cannot be written
         """
-        timestamp_str = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
-        new_file = os.path.join(self.dir_path,
-                                f'{self.file_prefix}.{timestamp_str}{self.file_suffix}')
-        local_new_file_path = os.path.join(DEFAULT_LOCAL_STATE_DIR, new_file)
+        if snapshots is None:
+            snapshots = self.get_snapshots()
+        LOGGER.debug('Current state files: %s', [snapshot['key'] for snapshot in snapshots])
 
+        to_keep = self._get_snapshots_to_keep(snapshots)
+        manifest = {'version': SNAPSHOT_FORMAT_VERSION, 'snapshots': to_keep}
         try:
-            with open(local_new_file_path, 'w') as f:
-                f.write('')
-        except OSError as err:
-            raise StateError(f'Failed to create new file {local_new_file_path}: {err}') from err
+            self._write_object(self.manifest_key, json.dumps(manifest).encode())
+        except (ClientError, BotoCoreError, Boto3Error) as err:
+            raise StateError(f'Failed to write manifest {self.manifest_key} to S3: {err}')
 
-        return new_file
+        kept_keys = {snapshot['key'] for snapshot in to_keep}
+        for snapshot in snapshots:
+            if snapshot['key'] in kept_keys:
+                continue
+            LOGGER.debug('Removing %s from S3', snapshot['key'])
+            try:
+                self.s3.Object(self.bucket_name, snapshot['key']).delete()
+            except (BotoCoreError, ClientError, Boto3Error) as err:
+                LOGGER.warning(f'Failed to remove old file {snapshot["key"]} from S3: {err}')
 
-    def _ensure_local_dir_path_exists(self):
-        """Ensure that DEFAULT_LOCAL_STATE_DIR/self.dir_path exists"""
-        local_dir_path = os.path.join(DEFAULT_LOCAL_STATE_DIR, self.dir_path)
-        try:
-            os.makedirs(local_dir_path, exist_ok=True)
-        except (FileExistsError, NotADirectoryError) as err:
-            raise StateError(
-                f'Cannot create state file because one of the leading components '
-                f'of the path {local_dir_path} is not a directory.'
-            ) from err
-        except OSError as err:
-            raise StateError(f'Failed to ensure state directory {local_dir_path} exists: {err}')
+        LOGGER.debug('Files left in bucket: %s', [snapshot['key'] for snapshot in to_keep])
 
     @abstractmethod
     def get_state_data(self):
@@ -179,85 +354,162 @@ class StateRecorder(ABC):
         raise NotImplementedError("'get_state_data' is not implemented on abstract "
                                   "base class StateRecorder.")
 
+    def _get_delta_snapshot(self, snapshots, state_data, full_data):
+        """Get a delta snapshot relative to the most recent full snapshot.
+
+        Args:
+            snapshots (list of dict): the existing snapshots
+            state_data: the state to store
+            full_data (bytes): the compressed full snapshot of the state
+
+        Returns:
+            tuple of (bytes, str): the compressed delta snapshot and the key of
+                the full snapshot it is relative to, or (None, None) if there
+                is no full snapshot or if the delta is not small enough
+        """
+        base_key = next((snapshot['key'] for snapshot in reversed(snapshots)
+                         if not snapshot.get('base') and snapshot['key'].endswith(COMPRESSED_SUFFIX)),
+                        None)
+        if base_key is None:
+            return None, None
+
+        try:
+            base_state = self.load_snapshot(base_key, snapshots)
+        except StateError as err:
+            LOGGER.warning(f'Failed to load snapshot {base_key}; storing full snapshot: {err}')
+            return None, None
+
+        patch = get_merge_patch(base_state, state_data)
+        if apply_merge_patch(base_state, patch) != state_data:
+            return None, None
+
+        delta_data = gzip.compress(json.dumps({
+            'version': SNAPSHOT_FORMAT_VERSION, 'base': base_key, 'patch': patch
+        }).encode())
+        if len(delta_data) >= MAX_DELTA_SIZE_RATIO * len(full_data):
+            return None, None
+        return delta_data, base_key
+
     def dump_state(self):
-        """Dump state information to a file in `self.dir_path`.
+        """Dump state information to a new snapshot in `self.dir_path`.
 
-        Ensures that the `self.dir_path` exists and then creates a new file for
-        the current state info, dumps state info to that file.  Then removes
-        existing files from the S3 bucket if necessary to maintain the maximum
-        number of state files to keep based on `self.num_to_keep`.
+        The snapshot is compressed and uploaded to the S3 bucket from memory.
+        If delta snapshots are enabled and a patch to the most recent full
+        snapshot is small enough, the patch is stored instead of the full
+        state. Then old snapshots are removed from the S3 bucket if necessary
+        to maintain the maximum number of snapshots to keep based on
+        `self.num_to_keep`, and the manifest is updated.
 
         Raises:
             StateError: if we failed to capture the pod state and save it to the
-                given file path
+                S3 bucket
         """
         # This can raise a StateError
         state_data = self.get_state_data()
+        snapshots = self.get_snapshots()
 
-        self._ensure_local_dir_path_exists()
-        new_file_name = self._create_new_file()
-        local_new_file_name = os.path.join(DEFAULT_LOCAL_STATE_DIR, new_file_name)
+        timestamp_str = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+        new_file_name = os.path.join(
+            self.dir_path, f'{self.file_prefix}.{timestamp_str}{self.file_suffix}{COMPRESSED_SUFFIX}'
+        )
+
+        data = gzip.compress(json.dumps({
+            'version': SNAPSHOT_FORMAT_VERSION, 'base': None, 'state': state_data
+        }).encode())
+        base_key = None
+        if self.use_deltas:
+            delta_data, base_key = self._get_delta_snapshot(snapshots, state_data, data)
+            if delta_data is not None:
+                data = delta_data
 
         try:
-            with open(local_new_file_name, 'w') as f:
-                json.dump(state_data, f)
-        except OSError as err:
-            raise StateError(f'Failed to write state to file {local_new_file_name}: {err}') from err
-        try:
-            LOGGER.debug('Uploading %s to S3', new_file_name)
-            # TODO(SAT-926): Start verifying HTTPS requests
-            with warnings.catch_warnings():
-                warnings.filterwarnings('ignore', category=InsecureRequestWarning)
-                self.s3.Object(self.bucket_name, new_file_name).upload_file(local_new_file_name)
+            LOGGER.debug('Uploading %s to S3 (%d bytes)', new_file_name, len(data))
+            self._write_object(new_file_name, data)
         except (ClientError, BotoCoreError, Boto3Error) as err:
-            raise PodStateError(f'Failed to dump state to S3: {err}')
-        finally:
-            os.remove(local_new_file_name)
+            raise StateError(f'Failed to dump state to S3: {err}')
 
-        self._remove_old_files()
+        snapshots = [snapshot for snapshot in snapshots if snapshot['key'] != new_file_name]
+        snapshots.append({'key': new_file_name, 'timestamp': timestamp_str, 'base': base_key})
+        self._remove_old_files(snapshots)
 
-    def get_stored_state(self):
-        """Get the state information most recently stored to a file.
+    def load_snapshot(self, key, snapshots=None):
+        """Load the state stored in a snapshot.
 
-        This assumes the information in the file is in JSON format and parses it
-        with JSON.
+        Args:
+            key (str): the key of the snapshot
+            snapshots (list of dict): the available snapshots. If None, they
+                are read from the manifest when needed.
 
         Returns:
-            The latest state information loaded from the given file and parsed
-            with JSON.
+            The state stored in the snapshot.
 
         Raises:
-            StateError: if the file containing the latest state cannot be
-                opened or parsed with JSON.
+            StateError: if the snapshot, or the full snapshot that it is
+                relative to, cannot be downloaded or parsed.
         """
-        files_in_bucket = self._get_s3_state_files()
-        LOGGER.debug('Files in bucket: %s', files_in_bucket)
-        if not files_in_bucket:
-            raise StateError('No stored state found')
-        latest_state_file = os.path.join(files_in_bucket[-1])
-        latest_state_file_local_path = os.path.join(DEFAULT_LOCAL_STATE_DIR, latest_state_file)
-        LOGGER.debug('Latest state file: %s', latest_state_file)
-        self._ensure_local_dir_path_exists()
         try:
-            with warnings.catch_warnings():
-                warnings.filterwarnings('ignore', category=InsecureRequestWarning)
-                self.s3.Object(self.bucket_name, latest_state_file).download_file(latest_state_file_local_path)
-            LOGGER.debug('Downloaded %s to %s', latest_state_file, latest_state_file_local_path)
+            data = self._read_object(key)
+            LOGGER.debug('Downloaded %s (%d bytes)', key, len(data))
         except (BotoCoreError, ClientError, Boto3Error) as err:
-            raise StateError(f'Unable to download {latest_state_file} from s3: {err}')
+            raise StateError(f'Unable to download {key} from s3: {err}')
 
         try:
-            with open(latest_state_file_local_path) as f:
-                state_data = json.load(f)
-            return state_data
-        except OSError as err:
-            raise StateError(
-                f'Failed to open downloaded file {latest_state_file_local_path} to read latest state: {err}'
-            )
+            if not key.endswith(COMPRESSED_SUFFIX):
+                # Snapshots stored before compression was introduced
+                return json.loads(data)
+            snapshot = json.loads(gzip.decompress(data))
+        except (OSError, EOFError) as err:
+            raise StateError(f'Failed to decompress {key}: {err}')
         except ValueError as err:
-            raise StateError(f'Failed to parse JSON from downloaded file {latest_state_file_local_path}: {err}')
-        finally:
-            os.remove(latest_state_file_local_path)
+            raise StateError(f'Failed to parse JSON from {key}: {err}')
+
+        try:
+            if snapshot['base'] is None:
+                return snapshot['state']
+            base_key = snapshot['base']
+            patch = snapshot['patch']
+        except (KeyError, TypeError) as err:
+            raise StateError(f'Snapshot {key} is missing required key {err}')
+
+        if base_key == key:
+            raise StateError(f'Snapshot {key} is relative to itself')
+        return apply_merge_patch(self.load_snapshot(base_key, snapshots), patch)
+
+    def find_snapshot(self, name, snapshots):
+        """Find a snapshot by its key, file name or timestamp.
+
+        Args:
+            name (str): the key, file name or timestamp of the snapshot
+            snapshots (list of dict): the available snapshots
+
+        Returns:
+            dict: the snapshot
+
+        Raises:
+            StateError: if there is no such snapshot
+        """
+        for snapshot in reversed(snapshots):
+            if name in (snapshot['key'], os.path.basename(snapshot['key']), snapshot.get('timestamp')):
+                return snapshot
+        raise StateError(f'No {self.description} snapshot named {name} found')
+
+    def get_stored_state(self):
+        """Get the state information most recently stored to a snapshot.
+
+        Returns:
+            The latest state information loaded from the most recent snapshot.
+
+        Raises:
+            StateError: if there are no snapshots, or if the latest snapshot
+                cannot be downloaded or parsed.
+        """
+        snapshots = self.get_snapshots()
+        LOGGER.debug('Files in bucket: %s', [snapshot['key'] for snapshot in snapshots])
+        if not snapshots:
+            raise StateError('No stored state found')
+        latest_state_file = snapshots[-1]['key']
+        LOGGER.debug('Latest state file: %s', latest_state_file)
+        return self.load_snapshot(latest_state_file, snapshots)
 
 
 class PodStateRecorder(StateRecorder):
@@ -289,9 +541,9 @@ class PodStateRecorder(StateRecorder):
         except (FileNotFoundError, ConfigException) as err:
             raise PodStateError('Failed to load kubernetes config: {}'.format(err)) from err
 
-        k8s_api = CoreV1Api()
-        all_pods = k8s_api.list_pod_for_all_namespaces()
-        return k8s_pods_to_status_dict(all_pods)
+        pod_cache = PodCache(CoreV1Api())
+        pod_cache.list()
+        return pod_cache.get_phases_by_namespace()
 
 
 class HSNStateRecorder(StateRecorder):
@@ -350,3 +602,91 @@ def do_state_capture(args):
         sys.exit(1)
     else:
         LOGGER.info('Finished capturing system state.')
+
+
+# The classes of the state recorders whose snapshots can be compared, keyed by
+# the name used on the command line
+STATE_RECORDER_CLASSES = {
+    'pod': PodStateRecorder,
+    'hsn': HSNStateRecorder,
+}
+
+
+def get_state_diff_rows(old_state, new_state):
+    """Get rows describing the differences between two states.
+
+    Args:
+        old_state: the earlier state
+        new_state: the later state
+
+    Returns:
+        list of list: a row for each value which differs, consisting of the
+            group of the value, its name, its earlier value and its later
+            value, where a missing value is MISSING_VALUE
+    """
+    rows = []
+    for path, old_value, new_value in get_state_differences(old_state, new_state):
+        group = path[0] if len(path) > 1 else ''
+        name = '.'.join(str(key) for key in path[1:]) if len(path) > 1 else '.'.join(path)
+        rows.append([group, name,
+                     MISSING_VALUE if old_value is None else old_value,
+                     MISSING_VALUE if new_value is None else new_value])
+    return rows
+
+
+def do_state_diff(args):
+    """Compare two snapshots of state captured by `do_state_capture`.
+
+    Args:
+        args: The argparse.Namespace object containing the parsed arguments
+            passed to the bootsys subcommand.
+
+    Returns:
+        None.
+
+    Raises:
+        SystemExit: if the snapshots cannot be found or loaded.
+    """
+    recorder = STATE_RECORDER_CLASSES[args.state_type]()
+
+    try:
+        snapshots = recorder.get_snapshots()
+        if len(snapshots) < 2 and not (args.from_snapshot and args.to_snapshot):
+            LOGGER.error(f'At least two snapshots of {recorder.description} are required '
+                         f'to compare; found {len(snapshots)}.')
+            sys.exit(1)
+
+        to_snapshot = (recorder.find_snapshot(args.to_snapshot, snapshots)
+                       if args.to_snapshot else snapshots[-1])
+        if args.from_snapshot:
+            from_snapshot = recorder.find_snapshot(args.from_snapshot, snapshots)
+        else:
+            to_index = snapshots.index(to_snapshot)
+            if to_index == 0:
+                LOGGER.error(f'There is no snapshot of {recorder.description} '
+                             f'before {to_snapshot["key"]}.')
+                sys.exit(1)
+            from_snapshot = snapshots[to_index - 1]
+
+        old_state = recorder.load_snapshot(from_snapshot['key'], snapshots)
+        new_state = recorder.load_snapshot(to_snapshot['key'], snapshots)
+    except StateError as err:
+        LOGGER.error(f'Failed to load {recorder.description}: {err}')
+        sys.exit(1)
+
+    LOGGER.info('Comparing %s to %s', from_snapshot['key'], to_snapshot['key'])
+    rows = get_state_diff_rows(old_state, new_state)
+    if not rows:
+        LOGGER.info('No differences in %s.', recorder.description)
+        return
+
+    report = Report(
+        ['Group', 'Name', 'Before', 'After'], None,
+        args.sort_by, args.reverse,
+        get_config_value('format.no_headings'),
+        get_config_value('format.no_borders'),
+        display_headings=args.fields,
+        print_format=args.format
+    )
+    report.add_rows(rows)
+    print(report)
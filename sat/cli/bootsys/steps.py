@@ -0,0 +1,300 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Execution of the steps of a bootsys stage.
+
+Each step may depend on other steps, and steps which do not depend on each
+other are run concurrently. Steps may also declare the resources they use,
+such as a group of NCNs, and the number of steps using a given resource at
+once can be limited. The names of completed steps can be saved to a
+checkpoint file so that a failed stage can be resumed.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import logging
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StepDefinitionError(Exception):
+    """The steps given to a StepEngine are not valid."""
+    pass
+
+
+class StepsAborted(Exception):
+    """Running the steps was aborted after a step failed."""
+    pass
+
+
+class Step:
+    """A single step of a bootsys stage."""
+
+    def __init__(self, description, action, name=None, depends_on=None, resources=()):
+        """Create a new Step.
+
+        Args:
+            description (str): a description of the step which is logged when
+                the step is executed
+            action (callable): the function which performs the step
+            name (str): a short name which identifies the step. Defaults to
+                the description.
+            depends_on (Iterable[str] or None): the names of the steps which
+                must complete before this step begins. If None, the step
+                depends on the step before it in the list of steps, if any.
+            resources (Iterable[str]): the names of the resources used by
+                this step.
+        """
+        self.description = description
+        self.action = action
+        self.name = name or description
+        self.depends_on = None if depends_on is None else tuple(depends_on)
+        self.resources = tuple(resources)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name!r})'
+
+
+class StepCheckpoint:
+    """A file recording which steps of a stage have completed.
+
+    The checkpoint stores a key identifying the stage and its inputs, and the
+    completed steps are only used if the key matches when it is loaded.
+    """
+
+    def __init__(self, path, key):
+        """Create a new StepCheckpoint.
+
+        Args:
+            path (str): the path of the checkpoint file
+            key: a JSON-serializable value identifying the stage and its inputs
+        """
+        self.path = path
+        self.key = key
+        self.completed = []
+
+    def load(self):
+        """Load the names of the completed steps from the checkpoint file.
+
+        Returns:
+            set of str: the names of the steps completed according to the
+                checkpoint, or the empty set if there is no usable checkpoint.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return set()
+        except (OSError, ValueError) as err:
+            LOGGER.warning('Unable to read checkpoint file %s: %s', self.path, err)
+            return set()
+
+        if not isinstance(data, dict) or data.get('key') != self.key:
+            LOGGER.warning('Ignoring checkpoint file %s since it was saved for different '
+                           'options or a different set of hosts.', self.path)
+            return set()
+
+        self.completed = list(data.get('completed', []))
+        return set(self.completed)
+
+    def mark_completed(self, step_name):
+        """Record that a step has completed.
+
+        Args:
+            step_name (str): the name of the step which completed
+        """
+        self.completed.append(step_name)
+        tmp_path = f'{self.path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': self.key, 'completed': self.completed}, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            LOGGER.warning('Unable to write checkpoint file %s: %s', self.path, err)
+
+    def clear(self):
+        """Remove the checkpoint file."""
+        self.completed = []
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            LOGGER.warning('Unable to remove checkpoint file %s: %s', self.path, err)
+
+
+class StepEngine:
+    """Runs steps concurrently, respecting their dependencies and resources."""
+
+    def __init__(self, steps, resource_limits=None, checkpoint=None, resume=False):
+        """Create a new StepEngine.
+
+        Args:
+            steps (list of Step): the steps to run
+            resource_limits (dict): a mapping from resource names to the
+                maximum number of steps using that resource which may run at
+                once. Resources which are not given are not limited.
+            checkpoint (StepCheckpoint or None): the checkpoint in which to
+                record completed steps
+            resume (bool): if True, skip the steps recorded as completed in
+                the checkpoint.
+
+        Raises:
+            StepDefinitionError: if step names are not unique, if a step
+                depends on an unknown step, or if the dependencies contain a
+                cycle.
+        """
+        self.steps = list(steps)
+        self.resource_limits = resource_limits or {}
+        self.checkpoint = checkpoint
+        self.resume = resume
+
+        self.steps_by_name = {}
+        for step in self.steps:
+            if step.name in self.steps_by_name:
+                raise StepDefinitionError(f'Duplicate step name: {step.name}')
+            self.steps_by_name[step.name] = step
+
+        self.dependencies = {}
+        for idx, step in enumerate(self.steps):
+            if step.depends_on is None:
+                depends_on = [self.steps[idx - 1].name] if idx else []
+            else:
+                depends_on = step.depends_on
+            unknown = [name for name in depends_on if name not in self.steps_by_name]
+            if unknown:
+                raise StepDefinitionError(f'Step {step.name} depends on unknown '
+                                          f'step(s): {", ".join(unknown)}')
+            self.dependencies[step.name] = set(depends_on)
+
+        self._check_for_cycles()
+
+    def _check_for_cycles(self):
+        """Check that the steps can be run in some order.
+
+        Raises:
+            StepDefinitionError: if the dependencies contain a cycle.
+        """
+        remaining = {name: len(deps) for name, deps in self.dependencies.items()}
+        ready = [name for name, count in remaining.items() if not count]
+        while ready:
+            name = ready.pop()
+            del remaining[name]
+            for other in remaining:
+                if name in self.dependencies[other]:
+                    remaining[other] -= 1
+                    if not remaining[other]:
+                        ready.append(other)
+        if remaining:
+            raise StepDefinitionError(f'Circular dependencies exist between steps: '
+                                      f'{", ".join(sorted(remaining))}')
+
+    def _can_start(self, step, resources_in_use):
+        return all(resources_in_use.get(resource, 0) < self.resource_limits[resource]
+                   for resource in step.resources if resource in self.resource_limits)
+
+    def run(self, *args, error_handler=None):
+        """Run the steps.
+
+        Each step's action is called with the given arguments once all the
+        steps it depends on have finished. If a step raises an exception, the
+        error handler is called with the step and the exception. If it
+        returns True, the step is considered finished and its dependents are
+        run. Otherwise, or if there is no error handler, no further steps are
+        begun, and the steps which are already running are allowed to finish.
+
+        Args:
+            *args: the arguments passed to the action of each step
+            error_handler (callable): a function called with the step and the
+                exception when a step fails.
+
+        Raises:
+            StepsAborted: if a step failed and the error handler did not
+                return True.
+            Exception: the exception raised by a failed step, if there is no
+                error handler.
+        """
+        skipped = set()
+        if self.checkpoint is not None:
+            if self.resume:
+                skipped = self.checkpoint.load() & set(self.steps_by_name)
+            else:
+                self.checkpoint.clear()
+
+        finished = set()
+        for step in self.steps:
+            if step.name in skipped:
+                LOGGER.info('Skipping step completed in a previous run: %s', step.description)
+                finished.add(step.name)
+
+        not_started = [step for step in self.steps if step.name not in finished]
+        resources_in_use = {}
+        running = {}
+        aborted = None
+
+        with ThreadPoolExecutor(max_workers=max(len(not_started), 1)) as executor:
+            while True:
+                if aborted is None:
+                    for step in list(not_started):
+                        if self.dependencies[step.name] <= finished and \
+                                self._can_start(step, resources_in_use):
+                            LOGGER.info('Executing step: %s', step.description)
+                            not_started.remove(step)
+                            for resource in step.resources:
+                                resources_in_use[resource] = resources_in_use.get(resource, 0) + 1
+                            running[executor.submit(step.action, *args)] = step
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    for resource in step.resources:
+                        resources_in_use[resource] -= 1
+
+                    err = future.exception()
+                    if err is None:
+                        finished.add(step.name)
+                        if self.checkpoint is not None:
+                            self.checkpoint.mark_completed(step.name)
+                    elif aborted is not None:
+                        LOGGER.error('Step "%s" also failed: %s', step.description, err)
+                    elif error_handler is not None and error_handler(step, err):
+                        finished.add(step.name)
+                    else:
+                        aborted = err
+
+        if aborted is not None:
+            if error_handler is None:
+                raise aborted
+            raise StepsAborted(str(aborted)) from aborted
+
+        if not_started:
+            # Only possible if a resource limit is less than one
+            raise StepDefinitionError(f'Unable to begin step(s): '
+                                      f'{", ".join(step.name for step in not_started)}')
+
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,14 +25,15 @@
 Generic common utilities for the bootsys subcommand.
 """
 
-from collections import defaultdict
 import logging
 import re
 
 from paramiko import SSHClient, WarningPolicy
 import yaml
 
+from sat.config import get_config_value
 from sat.util import pester_choices
+from sat.waiting import BackoffPolling, ExpectedDurationPolling, FixedPolling
 
 LOGGER = logging.getLogger(__name__)
 
@@ -98,32 +99,6 @@ def get_mgmt_ncn_hostnames(subroles):
     return ncn_hostnames
 
 
-def k8s_pods_to_status_dict(v1_pod_list):
-    """Helper function to convert a V1PodList to a dict.
-
-    It is used for recording the pod phase for every pod in the system.
-
-    The dict has the following schema:
-    {
-        namespace (str): {
-            name_in_namespace (str): pod_phase (str)
-        }
-    }
-
-    Args:
-        v1_pod_list: a V1PodList object from the kubernetes library
-
-    Returns:
-        a defaultdict in the above form
-
-    """
-    pods_dict = defaultdict(dict)
-    for pod in v1_pod_list.items:
-        pods_dict[pod.metadata.namespace][pod.metadata.name] = pod.status.phase
-
-    return pods_dict
-
-
 def get_mgmt_ncn_groups(excluded_ncns=None):
     """Get included and excluded management NCNs grouped by subrole.
 
@@ -227,3 +202,29 @@ def get_ssh_client():
     ssh_client.set_missing_host_key_policy(WarningPolicy)
 
     return ssh_client
+
+
+def get_polling_strategy(option_prefix):
+    """Get the polling strategy configured for waiting on part of a stage.
+
+    Args:
+        option_prefix (str): the prefix of the timeout option for the condition
+            being waited for, e.g. 'bos-boot' for the `bos_boot_timeout` option.
+
+    Returns:
+        PollingStrategy: the polling strategy given by the `<prefix>_polling`
+            option in the bootsys section of the config file.
+    """
+    underscore_prefix = option_prefix.replace('-', '_')
+    strategy = get_config_value(f'bootsys.{underscore_prefix}_polling')
+    max_interval = get_config_value('bootsys.max_poll_interval')
+    jitter = get_config_value('bootsys.poll_jitter')
+
+    if strategy == 'backoff':
+        return BackoffPolling(max_interval=max_interval, jitter=jitter)
+    if strategy == 'expected':
+        # Without an expected duration, expect completion halfway to the timeout.
+        expected_duration = (get_config_value(f'bootsys.{underscore_prefix}_expected_duration')
+                             or get_config_value(f'bootsys.{underscore_prefix}_timeout') / 2)
+        return ExpectedDurationPolling(expected_duration, max_interval=max_interval, jitter=jitter)
+    return FixedPolling(jitter=jitter)
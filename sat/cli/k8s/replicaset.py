@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -36,6 +36,7 @@ from kubernetes.config.config_exception import ConfigException
 from kubernetes.client.rest import ApiException
 
 from sat.cached_property import cached_property
+from sat.pod_cache import PodCache
 
 
 LOGGER = logging.getLogger(__name__)
@@ -43,12 +44,17 @@ LOGGER = logging.getLogger(__name__)
 
 class ReplicaSet(kubernetes.client.models.v1_replica_set.V1ReplicaSet):
 
+    # A mapping from (namespace, pod-template-hash) to the pods with that
+    # label, which is shared by all replica sets from get_all_replica_sets.
+    # If None, all pods are listed when the pods of a replica set are needed.
+    pods_by_template_hash = None
+
     @cached_property
     def pods(self):
         """Get all pods owned by this replicaset.
 
         Returns:
-            All pods associated with this ReplicaSet in a list.
+            All pods associated with this ReplicaSet in a list of CachedPods.
 
         Raises:
             ApiException: If the call to get all pods failed.
@@ -61,17 +67,10 @@ class ReplicaSet(kubernetes.client.models.v1_replica_set.V1ReplicaSet):
                     self.metadata.name))
             return []
 
-        ns = self.metadata.namespace
+        if self.pods_by_template_hash is None:
+            self.pods_by_template_hash = self.get_pods_by_template_hash()
 
-        label = 'pod-template-hash={}'.format(hash_)
-        try:
-            corev1 = kubernetes.client.CoreV1Api()
-            return corev1.list_namespaced_pod(ns, label_selector=label).items
-        except ApiException as err:
-            LOGGER.warning(
-                'Could not retrieve pods in namespace {} with label selector '
-                '{}: {}'.format(ns, label, err))
-            return []
+        return self.pods_by_template_hash.get((self.metadata.namespace, hash_), [])
 
     @cached_property
     def running_pods(self):
@@ -80,7 +79,7 @@ class ReplicaSet(kubernetes.client.models.v1_replica_set.V1ReplicaSet):
         Returns:
             All pods with a status of 'Running' as a list.
         """
-        return [x for x in self.pods if x.status.phase == 'Running']
+        return [x for x in self.pods if x.phase == 'Running']
 
     @cached_property
     def co_located_replicas(self):
@@ -96,14 +95,33 @@ class ReplicaSet(kubernetes.client.models.v1_replica_set.V1ReplicaSet):
         node_pods = defaultdict(lambda: [])
 
         for pod in self.running_pods:
-            node = pod.spec.node_name
-            node_pods[node].append(pod.metadata.name)
+            node_pods[pod.node].append(pod.name)
 
         # Don't save entries that are of len 1.
         entry = {k: v for k, v in node_pods.items() if len(v) > 1}
 
         return entry
 
+    @staticmethod
+    def get_pods_by_template_hash():
+        """Get all pods grouped by namespace and pod-template-hash label.
+
+        All pods are listed with a single query rather than one query for
+        the pods of each replica set.
+
+        Returns:
+            A mapping from (namespace, pod-template-hash) to a list of pods.
+
+        Raises:
+            ApiException: An error occurred while retrieving data.
+        """
+        pod_cache = PodCache(kubernetes.client.CoreV1Api())
+        try:
+            pod_cache.list()
+        except ApiException as err:
+            raise ApiException('Could not retrieve list of pods: {}'.format(err))
+        return pod_cache.get_pods_by_template_hash()
+
     @classmethod
     def get_all_replica_sets(cls):
         """Returns a list of all available replica sets.
@@ -138,7 +156,9 @@ class ReplicaSet(kubernetes.client.models.v1_replica_set.V1ReplicaSet):
         except ApiException as err:
             raise ApiException('Could not retrieve list of replicasets: {}'.format(err))
 
+        pods_by_template_hash = cls.get_pods_by_template_hash()
         for rs in replica_sets:
             rs.__class__ = ReplicaSet
+            rs.pods_by_template_hash = pods_by_template_hash
 
         return replica_sets
@@ -0,0 +1,257 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Evaluation of alert rules against sensor readings as they are received.
+
+Each rule is a query string in the syntax of the --filter option, which is
+evaluated against each reading using the fields displayed by the sensors
+subcommand. Readings also have a 'Rate' field, which is the change in the
+sensor's value per minute over a sliding window of recent readings.
+"""
+
+from collections import deque
+from datetime import datetime
+import json
+import logging
+
+from sat.constants import MISSING_VALUE
+from sat.filtering import parse_query_string
+from sat.report import Report
+from sat.util import SATEncoder
+from sat.cli.sensors.recording import parse_timestamp
+from sat.cli.sensors.sensor_fields import FIELD_MAPPING, get_sensor_identity
+
+LOGGER = logging.getLogger(__name__)
+
+RATE_FIELD = 'Rate'
+ALERT_FIELDS = list(FIELD_MAPPING.keys()) + [RATE_FIELD]
+
+ALERT = 'alert'
+CLEAR = 'clear'
+
+# The default length in seconds of the window over which rates are computed
+DEFAULT_WINDOW_SECS = 60
+
+# The fields of each reading displayed for an event in the 'pretty' format
+PRETTY_EVENT_HEADINGS = ['Event', 'Rule', 'xname', 'Type', 'Topic', 'Timestamp',
+                         'Physical Context', 'Index', 'Device Specific Context', 'Value', RATE_FIELD]
+
+
+class AlertRule:
+    """A condition on sensor readings which raises an alert when it is true."""
+
+    def __init__(self, query):
+        """Create a new AlertRule.
+
+        Args:
+            query (str): the query string which matches readings that should
+                raise an alert
+
+        Raises:
+            parsec.ParseError: if the query string is invalid
+        """
+        self.query = query
+        self.filter_fn = parse_query_string(query, ALERT_FIELDS)
+        self.enabled = True
+
+    def get_matches(self, rows):
+        """Evaluate the rule against a batch of readings.
+
+        Args:
+            rows ([dict]): the readings, keyed by ALERT_FIELDS
+
+        Returns:
+            list of bool: whether each row matches the rule
+        """
+        if not self.enabled:
+            return [False] * len(rows)
+
+        matches = []
+        for row in rows:
+            try:
+                matches.append(bool(self.filter_fn(row)))
+            except TypeError:
+                # A numeric comparison against a non-numeric value, or against
+                # the rate of a sensor with a single reading, does not match.
+                matches.append(False)
+            except KeyError as err:
+                LOGGER.error(f'Alert rule "{self.query}" refers to an unknown field {err}; '
+                             f'the rule will not be evaluated.')
+                self.enabled = False
+                return [False] * len(rows)
+        return matches
+
+
+class SensorWindow:
+    """The recent readings of one sensor, used to compute its rate of change."""
+
+    def __init__(self, window_secs):
+        """Create a new SensorWindow.
+
+        Args:
+            window_secs (float): the length of the window in seconds
+        """
+        self.window_secs = window_secs
+        self.readings = deque()
+
+    def add(self, timestamp, value):
+        """Add a reading and get the rate of change over the window.
+
+        Args:
+            timestamp (float): the time of the reading in seconds since the epoch
+            value (float): the value of the reading
+
+        Returns:
+            float or None: the change in value per minute between the oldest
+                and newest readings in the window, or None if the window does
+                not span any time.
+        """
+        if not self.readings or timestamp > self.readings[-1][0]:
+            self.readings.append((timestamp, value))
+        while self.readings[0][0] < self.readings[-1][0] - self.window_secs:
+            self.readings.popleft()
+
+        (first_time, first_value), (last_time, last_value) = self.readings[0], self.readings[-1]
+        if last_time == first_time:
+            return None
+        return (last_value - first_value) / (last_time - first_time) * 60
+
+
+class AlertEngine:
+    """Evaluates alert rules against each batch of sensor readings."""
+
+    def __init__(self, rules, window_secs=DEFAULT_WINDOW_SECS, emit=None):
+        """Create a new AlertEngine.
+
+        Args:
+            rules ([AlertRule]): the rules to evaluate
+            window_secs (float): the length in seconds of the window over
+                which rates are computed
+            emit (Callable): a function which is called with the list of
+                events produced by each batch of readings
+        """
+        self.rules = rules
+        self.window_secs = window_secs
+        self.emit = emit
+        self.windows = {}
+        # The (rule index, sensor key) pairs with an active alert
+        self.active = set()
+        self.alert_count = 0
+
+    def get_row(self, topic, metric, sensor):
+        """Get the fields of a reading, updating the sensor's window.
+
+        Returns:
+            tuple: the sensor key and a dict keyed by ALERT_FIELDS
+        """
+        topic_result = {'Topic': topic}
+        row = {heading: extractor(topic_result, metric, sensor)
+               for heading, extractor in FIELD_MAPPING.items()}
+        key = (topic, metric['Context']) + get_sensor_identity(topic, metric, sensor)
+
+        row[RATE_FIELD] = None
+        try:
+            row['Value'] = float(row['Value'])
+        except (TypeError, ValueError):
+            return key, row
+
+        timestamp = parse_timestamp(sensor.get('Timestamp'))
+        if timestamp is not None:
+            window = self.windows.get(key)
+            if window is None:
+                window = self.windows[key] = SensorWindow(self.window_secs)
+            row[RATE_FIELD] = window.add(timestamp, row['Value'])
+        return key, row
+
+    def evaluate(self, topic, metric, sensors):
+        """Evaluate all rules against a batch of readings. This is called as a TopicResults listener.
+
+        An alert event is produced when a rule starts matching a sensor, and a
+        clear event is produced when it stops matching.
+
+        Args:
+            topic (str): The name of the Kafka telemetry topic.
+            metric (dict): A dictionary with the Context and Type of the xname.
+            sensors ([dict]): A list of dictionaries with sensor readings.
+
+        Returns:
+            list of dict: the events, each with 'time', 'event', 'rule', and
+                'row' keys.
+        """
+        keyed_rows = [self.get_row(topic, metric, sensor) for sensor in sensors]
+        rows = [row for _, row in keyed_rows]
+        now = datetime.now().isoformat(timespec='seconds')
+
+        events = []
+        for rule_index, rule in enumerate(self.rules):
+            for (key, row), matches in zip(keyed_rows, rule.get_matches(rows)):
+                active_key = (rule_index, key)
+                if matches and active_key not in self.active:
+                    self.active.add(active_key)
+                    self.alert_count += 1
+                    events.append({'time': now, 'event': ALERT, 'rule': rule.query, 'row': row})
+                elif not matches and active_key in self.active:
+                    self.active.remove(active_key)
+                    events.append({'time': now, 'event': CLEAR, 'rule': rule.query, 'row': row})
+
+        if events and self.emit is not None:
+            self.emit(events)
+        return events
+
+
+def format_ndjson_events(events):
+    """Format alert events as newline-delimited JSON.
+
+    Args:
+        events (list of dict): the events returned by AlertEngine.evaluate
+
+    Returns:
+        str: one JSON object per line for each event
+    """
+    return '\n'.join(json.dumps(event, cls=SATEncoder) for event in events)
+
+
+def format_pretty_events(events, no_headings=False, no_borders=False):
+    """Format alert events as a table.
+
+    Args:
+        events (list of dict): the events returned by AlertEngine.evaluate
+        no_headings (bool): if True, omit the headings of the table
+        no_borders (bool): if True, omit the borders of the table
+
+    Returns:
+        str: the table
+    """
+    report = Report(PRETTY_EVENT_HEADINGS, f'Sensor alerts at {events[0]["time"]}',
+                    no_headings=no_headings, no_borders=no_borders,
+                    show_empty=True, show_missing=True)
+    report.add_rows([
+        {
+            **event['row'],
+            'Event': event['event'],
+            'Rule': event['rule'],
+            RATE_FIELD: MISSING_VALUE if event['row'][RATE_FIELD] is None else round(event['row'][RATE_FIELD], 3),
+        } for event in events
+    ])
+    return str(report)
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -28,11 +28,10 @@ Entry point for the sensors subcommand.
 import logging
 import re
 import signal
-import threading
-import time
 import traceback
 
 import inflect
+from parsec import ParseError
 
 from sat.apiclient import APIError, HSMClient
 from sat.config import get_config_value
@@ -40,13 +39,26 @@ from sat.constants import MISSING_VALUE
 from sat.report import Report
 from sat.session import SATSession
 
-from sat.cli.sensors.telemetry_client import TelemetryClient
-from sat.cli.sensors.sensor_fields import FIELD_MAPPING
+from sat.cli.sensors.alerts import (
+    AlertEngine,
+    AlertRule,
+    format_ndjson_events,
+    format_pretty_events
+)
+from sat.cli.sensors.recording import iter_recording, RecordingError, SensorRecorder
+from sat.cli.sensors.telemetry_client import TelemetryMultiplexer
+from sat.cli.sensors.sensor_fields import FIELD_MAPPING, UNIQUE_SENSOR_FIELD_MAPPING
+from sat.xname import XName
 
 
 CHASSIS_XNAME_REGEX = re.compile(r'x\d+c\d$')
 CHASSIS_XNAME_PREFIX_REGEX = re.compile(r'x\d+c\d')
 
+# Headings of the tables displayed for a sensor recording
+RECORDING_KEY_HEADINGS = ['xname', 'Type', 'Topic'] + list(UNIQUE_SENSOR_FIELD_MAPPING.keys())
+SUMMARY_HEADINGS = ['Samples', 'Min', 'Max', 'Mean', 'First Timestamp', 'Last Timestamp']
+REPLAY_HEADINGS = ['Start', 'End', 'Samples', 'Min', 'Max', 'Mean']
+
 
 inf = inflect.engine()
 LOGGER = logging.getLogger(__name__)
@@ -55,7 +67,7 @@ LOGGER = logging.getLogger(__name__)
 class ServiceExit(Exception):
     """
     Custom exception which is used to trigger the clean exit
-    of all running threads and the main program.
+    of all telemetry streams and the main program.
     """
     pass
 
@@ -231,56 +243,130 @@ def make_raw_table(all_topics_results):
     return raw_table
 
 
-def any_thread_alive(telemetry_clients):
-    """Check if any threads are alive or not.
+def make_recording_table(path, summarize):
+    """Create a table of the sensor time series in a recording file.
+
+    The recording is read one sensor at a time, so only the rows of the
+    table are held in memory.
 
     Args:
-        telemetry_clients (threading.Thread list):  A list of threads.
+        path (str): The path of the recording file.
+        summarize (bool): If True, create one row per sensor aggregating all
+            of its readings. Otherwise, create one row per bucket of older
+            readings and per recent reading.
 
     Returns:
-        True or False
+        A list of lists containing the rows of the table.
+
+    Raises:
+        RecordingError: if the recording cannot be read.
     """
 
-    return any(thread.is_alive() for thread in telemetry_clients)
+    value_headings = SUMMARY_HEADINGS if summarize else REPLAY_HEADINGS
+    rows = []
+    for series in iter_recording(path):
+        topic, xname, bmc_type, *identity = series.key
+        key_values = [XName(xname), bmc_type, topic] + identity
+        intervals = [series.summarize()] if summarize else series.get_intervals()
+        for interval in intervals:
+            interval['Mean'] = round(interval['Mean'], 3)
+            rows.append(key_values + [interval[heading] for heading in value_headings])
 
+    return rows
 
-def wait_for_threads(telemetry_clients, stop_event, update_until_timeout, total_timeout):
-    """Wait for threads started for each telemetry topic.
+
+def show_recording(args):
+    """Display the contents of a sensor recording file.
 
     Args:
-        telemetry_clients (threading.Thread list):  A list of threads (one per telemetry topic).
-        stop_event (threading.Event): Event object used to stop all threads.
-        update_until_timeout (bool): True if update sensor data for all xnames until timeout.
-        total_timeout (int): The total timeout in seconds for all threads.
+        args: The argparse.Namespace object containing the parsed arguments
+            passed to this subcommand.
 
     Returns:
         None
     """
 
-    LOGGER.info(f'Waiting for threads using timeout of {total_timeout} seconds')
-    if update_until_timeout:
-        LOGGER.info('Sensor data will continue to be updated for each xname until timeout occurs')
-    else:
-        LOGGER.info('Each thread will exit when sensor data is received for all xnames')
+    summarize = args.summarize_file is not None
+    path = args.summarize_file if summarize else args.replay_file
+    try:
+        rows = make_recording_table(path, summarize)
+    except RecordingError as err:
+        LOGGER.error(err)
+        raise SystemExit(1)
+
+    report = Report(
+        RECORDING_KEY_HEADINGS + (SUMMARY_HEADINGS if summarize else REPLAY_HEADINGS), None,
+        args.sort_by, args.reverse,
+        get_config_value('format.no_headings'),
+        get_config_value('format.no_borders'),
+        filter_strs=args.filter_strs,
+        display_headings=args.fields,
+        print_format=args.format)
+    report.add_rows(rows)
+    print(report)
+
+
+def save_recording(recorder):
+    """Write the final snapshot of a sensor recording.
+
+    Args:
+        recorder (SensorRecorder): The recorder to save.
+
+    Raises:
+        SystemExit: if the recording cannot be written.
+    """
+
+    if not recorder.series:
+        LOGGER.warning(f'No sensor readings were recorded, so {recorder.path} was not written.')
+        return
+
+    try:
+        recorder.write_snapshot()
+    except RecordingError as err:
+        LOGGER.error(err)
+        raise SystemExit(1)
+
+    LOGGER.info(f'Recorded {len(recorder.series)} sensors to {recorder.path}')
+    if recorder.skipped_readings:
+        LOGGER.warning(f'Skipped {recorder.skipped_readings} sensor readings without a numeric '
+                       f'value or a valid timestamp.')
 
-    now = time.time()
-    end = now + total_timeout
-    while now <= end and any_thread_alive(telemetry_clients):
-        time.sleep(1)
-        now = time.time()
 
-    if not any_thread_alive(telemetry_clients):
-        LOGGER.info('All threads have completed')
-    else:
-        LOGGER.info(f'Timed out after {total_timeout} seconds')
-        LOGGER.debug('Stopping all threads - setting stop_event')
-        stop_event.set()
+def get_alert_engine(args):
+    """Create the engine which evaluates the alert rules given on the command line.
 
-    for client_thread in telemetry_clients:
-        client_thread.join()
+    Args:
+        args: The argparse.Namespace object containing the parsed arguments
+            passed to this subcommand.
 
+    Returns:
+        AlertEngine: the engine, which prints events as soon as they occur.
+
+    Raises:
+        SystemExit: if an alert rule is invalid.
+    """
 
-def get_telemetry_metrics(topics, xnames_info, batchsize, update_until_timeout, total_timeout):
+    rules = []
+    for query in args.alert_queries:
+        try:
+            rules.append(AlertRule(query))
+        except ParseError as err:
+            LOGGER.error(f'Invalid alert rule "{query}": {err}')
+            raise SystemExit(1)
+
+    def print_events(events):
+        if args.alert_format == 'ndjson':
+            output = format_ndjson_events(events)
+        else:
+            output = format_pretty_events(events, get_config_value('format.no_headings'),
+                                          get_config_value('format.no_borders'))
+        print(output, flush=True)
+
+    return AlertEngine(rules, args.alert_window, emit=print_events)
+
+
+def get_telemetry_metrics(topics, xnames_info, batchsize, update_until_timeout, total_timeout,
+                          listeners=None):
     """Get sensor data from the Kafka topics for the specified xnames.
 
     Args:
@@ -289,43 +375,26 @@ def get_telemetry_metrics(topics, xnames_info, batchsize, update_until_timeout,
         batchsize (int): The number of metrics to include in each message from API.
         update_until_timeout (bool): True if update sensor data for all xnames until timeout.
         total_timeout (int): The maximum timeout in seconds for collecting data from all topics.
+        listeners (list): Functions called with each batch of sensor readings
+            received. See TopicResults.
 
     Returns:
         all_topics_results ([dict]): A list of dictionaries with sensor data (one per topic).
     """
 
-    all_topics_results = [None] * len(topics)
-    telemetry_clients = []
-
-    # Event to share between threads to coordinate shutdown
-    stop_event = threading.Event()
+    for topic in topics:
+        LOGGER.info(f'Getting telemetry data from {topic}...')
+    multiplexer = TelemetryMultiplexer(topics, xnames_info, batchsize, update_until_timeout,
+                                       listeners=listeners)
 
-    try:
-        for i, topic in enumerate(topics):
-            LOGGER.info(f'Getting telemetry data from {topic}...')
-            telemetry_client = TelemetryClient(stop_event, xnames_info,
-                                               batchsize, update_until_timeout,
-                                               topic, all_topics_results, i)
-            LOGGER.debug(f'Starting thread: {telemetry_client.getName()}')
-
-            if telemetry_client.endpoint_alive():
-                telemetry_clients.append(telemetry_client)
-                telemetry_client.start()
-            else:
-                LOGGER.error('Exiting due to error pinging telemetry API')
-                raise SystemExit(1)
-
-        LOGGER.info('Please be patient...')
-        wait_for_threads(telemetry_clients, stop_event, update_until_timeout, total_timeout)
-
-    except ServiceExit:
-        LOGGER.debug('Stopping all threads - setting stop_event')
-        stop_event.set()
-        for client_thread in telemetry_clients:
-            client_thread.join()
-        raise ServiceExit
+    if not multiplexer.endpoint_alive():
+        LOGGER.error('Exiting due to error pinging telemetry API')
+        raise SystemExit(1)
 
-    return all_topics_results
+    LOGGER.info('Please be patient...')
+    # If SIGINT or SIGTERM raises ServiceExit, the event loop is closed and
+    # all streams are stopped before the exception propagates.
+    return multiplexer.run(total_timeout)
 
 
 def do_sensors(args):
@@ -341,6 +410,13 @@ def do_sensors(args):
     The readings that result are displayed in a tabular format using the standard
     Report class.
 
+    If a recording file is given, the readings received until the timeout are
+    also recorded as time series in the file. A recording file can be
+    replayed or summarized without querying any APIs.
+
+    If alert rules are given, each batch of readings is evaluated against the
+    rules as it is received, and alerts are displayed immediately.
+
     Args:
         args: The argparse.Namespace object containing the parsed arguments
             passed to this subcommand.
@@ -349,6 +425,13 @@ def do_sensors(args):
         None
     """
 
+    if args.replay_file is not None or args.summarize_file is not None:
+        show_recording(args)
+        return
+
+    # Check the alert rules before querying any APIs
+    alert_engine = get_alert_engine(args) if args.alert_queries else None
+
     xnames_info = expand_and_screen_xnames(args.xnames, args.types, args.recursive)
     if not xnames_info:
         LOGGER.error(f'No telemetry data being collected for '
@@ -359,10 +442,26 @@ def do_sensors(args):
     LOGGER.info('Telemetry data being collected for '
                 f'{", ".join(xname_info["xname"] for xname_info in xnames_info)}')
 
+    recorder = None
+    listeners = []
+    update_until_timeout = args.update_until_timeout
+    if args.record_file is not None:
+        recorder = SensorRecorder(args.record_file)
+        listeners.append(recorder.record)
+        update_until_timeout = True
+        LOGGER.info(f'Recording sensor data to {args.record_file} for {args.timeout} seconds')
+    if alert_engine is not None:
+        listeners.append(alert_engine.evaluate)
+        update_until_timeout = True
+
     try:
-        all_topics_results = get_telemetry_metrics(args.topics, xnames_info,
-                                                   args.batchsize, args.update_until_timeout,
-                                                   int(args.timeout))
+        try:
+            all_topics_results = get_telemetry_metrics(args.topics, xnames_info,
+                                                       args.batchsize, update_until_timeout,
+                                                       int(args.timeout), listeners)
+        finally:
+            if recorder is not None:
+                save_recording(recorder)
 
         topics_with_api_error = [topic_result['Topic']
                                  for topic_result in all_topics_results if topic_result['APIError']]
@@ -376,6 +475,12 @@ def do_sensors(args):
             LOGGER.warning(f'Timed out after {args.timeout} seconds searching for xnames data from topics '
                            f'{", ".join(t for t in topics_not_done)}.')
 
+        if alert_engine is not None:
+            LOGGER.info(f'{alert_engine.alert_count} {inf.plural("alert", alert_engine.alert_count)} '
+                        f'raised; {len(alert_engine.active)} still active.')
+            if args.alert_format == 'ndjson':
+                return
+
         report = Report(
             tuple(FIELD_MAPPING.keys()), None,
             args.sort_by, args.reverse,
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -26,6 +26,7 @@ The parser for the sensors subcommand.
 """
 
 import sat.parsergroups
+from sat.cli.sensors.alerts import DEFAULT_WINDOW_SECS
 
 
 BATCHSIZE = 16
@@ -105,3 +106,49 @@ def add_sensors_subparser(subparsers):
                                 default=False,
                                 action='store_true',
                                 help='Update sensor data for each xname until timeout occurs.')
+
+    recording_group = sensors_parser.add_mutually_exclusive_group()
+    recording_group.add_argument('--record',
+                                 metavar='FILE',
+                                 dest='record_file',
+                                 help='Record the sensor data received from each xname until '
+                                      'timeout occurs as time series in FILE. Implies '
+                                      '--update-until-timeout.')
+
+    recording_group.add_argument('--replay',
+                                 metavar='FILE',
+                                 dest='replay_file',
+                                 help='Display the time series recorded in FILE with --record '
+                                      'instead of querying the Telemetry API.')
+
+    recording_group.add_argument('--summarize',
+                                 metavar='FILE',
+                                 dest='summarize_file',
+                                 help='Display the number of readings and the minimum, maximum and '
+                                      'mean value of each sensor recorded in FILE with --record '
+                                      'instead of querying the Telemetry API.')
+
+    sensors_parser.add_argument('--alert',
+                                metavar='QUERY',
+                                dest='alert_queries',
+                                action='append',
+                                help='Display an alert as soon as a sensor reading matching QUERY '
+                                     'is received, and when readings of that sensor stop matching. '
+                                     'QUERY uses the syntax of --filter, and may also refer to the '
+                                     '"Rate" field, the change in value per minute over the '
+                                     'window given by --alert-window. May be given multiple times. '
+                                     'Implies --update-until-timeout.')
+
+    sensors_parser.add_argument('--alert-window',
+                                metavar='SECONDS',
+                                type=float,
+                                default=DEFAULT_WINDOW_SECS,
+                                help=f'The length of the window over which the "Rate" field of '
+                                     f'--alert queries is computed. Defaults to {DEFAULT_WINDOW_SECS}.')
+
+    sensors_parser.add_argument('--alert-format',
+                                choices=['pretty', 'ndjson'],
+                                default='pretty',
+                                help='The format in which to display alerts. "ndjson" prints one '
+                                     'JSON object per line for each alert, and the table of sensor '
+                                     'readings is not displayed at the end. The default is "pretty".')
@@ -0,0 +1,470 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Recording of sensor readings as time series for the sensors subcommand.
+
+While recording, the readings of each sensor are kept in fixed-size ring
+buffers. The most recent readings are kept as they were received, and older
+readings are combined into buckets of a fixed width with their minimum,
+maximum and mean. The contents of the ring buffers are periodically written to
+a compressed recording file, which can be replayed or summarized one sensor at
+a time.
+
+A recording file is a gzip-compressed stream which starts with
+RECORDING_MAGIC and the bucket width, followed by each sensor's time series.
+Each time series consists of its key as JSON, its buckets, and its samples.
+"""
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import gzip
+import json
+import logging
+import os
+import struct
+import time
+
+from dateutil.parser import isoparse
+
+from sat.cli.sensors.sensor_fields import get_sensor_identity
+
+LOGGER = logging.getLogger(__name__)
+
+RECORDING_MAGIC = b'SATSENS1'
+
+# The number of most recent readings of each sensor kept as received
+RAW_SAMPLES_PER_SENSOR = 32
+# The width in seconds of the buckets which older readings are combined into
+BUCKET_SECS = 60
+# The number of buckets kept for each sensor
+BUCKETS_PER_SENSOR = 120
+# The interval in seconds between writes of the recording file
+SNAPSHOT_INTERVAL_SECS = 60
+
+_HEADER = struct.Struct('<dI')
+_KEY_LENGTH = struct.Struct('<H')
+_COUNT = struct.Struct('<I')
+_BUCKET = struct.Struct('<dIddd')
+_SAMPLE = struct.Struct('<dd')
+
+
+class RecordingError(Exception):
+    """A recording file could not be written or read."""
+    pass
+
+
+def parse_timestamp(timestamp):
+    """Parse the timestamp of a sensor reading.
+
+    Args:
+        timestamp (str): an ISO 8601 timestamp. A timestamp without a time zone
+            is assumed to be in UTC.
+
+    Returns:
+        float or None: the seconds since the epoch, or None if the timestamp
+            cannot be parsed.
+    """
+    try:
+        parsed = isoparse(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_timestamp(seconds):
+    """Format seconds since the epoch in the format used by the Telemetry API.
+
+    Args:
+        seconds (float): the seconds since the epoch
+
+    Returns:
+        str: the timestamp in UTC
+    """
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class RingBuffer:
+    """A buffer of fixed-width records of floats which discards its oldest record when full."""
+
+    def __init__(self, width, capacity):
+        """Create a new RingBuffer.
+
+        Args:
+            width (int): the number of values in each record
+            capacity (int): the maximum number of records
+        """
+        self.width = width
+        self.capacity = capacity
+        self._data = array('d')
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _offset(self, index):
+        return ((self._start + index) % self.capacity) * self.width
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('RingBuffer index out of range')
+        offset = self._offset(index)
+        return tuple(self._data[offset:offset + self.width])
+
+    def __iter__(self):
+        for index in range(self._len):
+            yield self[index]
+
+    def append(self, record):
+        """Append a record, discarding the oldest record if the buffer is full.
+
+        Args:
+            record (tuple): the values of the record
+
+        Returns:
+            tuple or None: the discarded record, if any
+        """
+        if self._len < self.capacity:
+            self._data.extend(record)
+            self._len += 1
+            return None
+
+        evicted = self[0]
+        offset = self._offset(0)
+        self._data[offset:offset + self.width] = array('d', record)
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def replace_last(self, record):
+        """Replace the most recent record.
+
+        Args:
+            record (tuple): the values of the record
+        """
+        offset = self._offset(self._len - 1)
+        self._data[offset:offset + self.width] = array('d', record)
+
+
+class SensorSeries:
+    """The recorded time series of one sensor."""
+
+    def __init__(self, key, raw_capacity=RAW_SAMPLES_PER_SENSOR,
+                 bucket_capacity=BUCKETS_PER_SENSOR, bucket_secs=BUCKET_SECS):
+        """Create a new SensorSeries.
+
+        Args:
+            key (tuple): the topic, xname and Type of the BMC, and the
+                identity of the sensor
+            raw_capacity (int): the number of most recent samples to keep
+            bucket_capacity (int): the number of buckets to keep
+            bucket_secs (int): the width of each bucket in seconds
+        """
+        self.key = key
+        self.bucket_secs = bucket_secs
+        # Each sample is (timestamp, value)
+        self.samples = RingBuffer(2, raw_capacity)
+        # Each bucket is (start, count, min, max, total)
+        self.buckets = RingBuffer(5, bucket_capacity)
+
+    def add(self, timestamp, value):
+        """Add a sample to the series.
+
+        Args:
+            timestamp (float): the time of the reading in seconds since the epoch
+            value (float): the value of the reading
+
+        Returns:
+            True if the sample was added, or False if it has the same timestamp
+            as the most recent sample.
+        """
+        if self.samples and self.samples[-1][0] == timestamp:
+            return False
+
+        evicted = self.samples.append((timestamp, value))
+        if evicted is not None:
+            self._add_to_bucket(*evicted)
+        return True
+
+    def _add_to_bucket(self, timestamp, value):
+        """Combine a sample into the bucket for its time."""
+        start = timestamp - timestamp % self.bucket_secs
+        if self.buckets:
+            last_start, count, minimum, maximum, total = self.buckets[-1]
+            # A sample which arrived out of order is added to the latest bucket
+            if start <= last_start:
+                self.buckets.replace_last((last_start, count + 1, min(minimum, value),
+                                           max(maximum, value), total + value))
+                return
+        self.buckets.append((start, 1, value, value, value))
+
+
+class SensorRecorder:
+    """Records the readings of all sensors received during a sensors command."""
+
+    def __init__(self, path, snapshot_interval=SNAPSHOT_INTERVAL_SECS,
+                 raw_capacity=RAW_SAMPLES_PER_SENSOR, bucket_capacity=BUCKETS_PER_SENSOR,
+                 bucket_secs=BUCKET_SECS):
+        """Create a new SensorRecorder.
+
+        Args:
+            path (str): the path of the recording file
+            snapshot_interval (float): the number of seconds between writes of
+                the recording file
+            raw_capacity (int): the number of most recent samples to keep per sensor
+            bucket_capacity (int): the number of buckets to keep per sensor
+            bucket_secs (int): the width of each bucket in seconds
+        """
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.raw_capacity = raw_capacity
+        self.bucket_capacity = bucket_capacity
+        self.bucket_secs = bucket_secs
+        self.series = {}
+        self.skipped_readings = 0
+        self._last_snapshot = time.monotonic()
+        # Periodic snapshots are written in a worker thread so that compressing
+        # and writing the recording does not stall the telemetry streams.
+        self._snapshot_executor = None
+        self._pending_snapshot = None
+
+    def record(self, topic, metric, sensors):
+        """Record sensor readings. This is called as a TopicResults listener.
+
+        Args:
+            topic (str): The name of the Kafka telemetry topic.
+            metric (dict): A dictionary with the Context and Type of the xname.
+            sensors ([dict]): A list of dictionaries with sensor readings.
+        """
+        for sensor in sensors:
+            timestamp = parse_timestamp(sensor.get('Timestamp'))
+            try:
+                value = float(sensor.get('Value'))
+            except (TypeError, ValueError):
+                value = None
+            if timestamp is None or value is None:
+                self.skipped_readings += 1
+                continue
+
+            key = (topic, metric['Context'], metric['Type']) + get_sensor_identity(topic, metric, sensor)
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = SensorSeries(key, self.raw_capacity,
+                                                         self.bucket_capacity, self.bucket_secs)
+            series.add(timestamp, value)
+
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self._start_periodic_snapshot()
+
+    def _get_contents(self):
+        """Copy the recorded time series so they can be written by another thread.
+
+        Returns:
+            list of tuple: the key, buckets and samples of each series
+        """
+        return [(series.key, list(series.buckets), list(series.samples))
+                for series in self.series.values()]
+
+    def _start_periodic_snapshot(self):
+        """Start writing a snapshot of the recording in the worker thread.
+
+        A new snapshot is not started while the previous one is being written.
+        """
+        if self._pending_snapshot is not None and not self._pending_snapshot.done():
+            return
+
+        self._last_snapshot = time.monotonic()
+        if self._snapshot_executor is None:
+            self._snapshot_executor = ThreadPoolExecutor(max_workers=1,
+                                                         thread_name_prefix='sensor-recording')
+        self._pending_snapshot = self._snapshot_executor.submit(self._write_periodic_snapshot,
+                                                                self._get_contents())
+
+    def _write_periodic_snapshot(self, contents):
+        """Write a periodic snapshot, logging rather than raising any error."""
+        try:
+            self._write_contents(contents)
+        except RecordingError as err:
+            LOGGER.error(err)
+
+    def wait_for_snapshot(self):
+        """Wait for a periodic snapshot which is being written to finish."""
+        if self._pending_snapshot is not None:
+            self._pending_snapshot.result()
+            self._pending_snapshot = None
+
+    def write_snapshot(self):
+        """Write all recorded time series to the recording file.
+
+        Any periodic snapshot being written is waited for first, so it cannot
+        replace the file after this snapshot. The file is replaced atomically,
+        so a reader never sees a partially written recording.
+
+        Raises:
+            RecordingError: if the file cannot be written
+        """
+        self.wait_for_snapshot()
+        self._last_snapshot = time.monotonic()
+        self._write_contents(self._get_contents())
+
+    def _write_contents(self, contents):
+        """Write copied time series to the recording file.
+
+        Args:
+            contents (list): the key, buckets and samples of each series, as
+                returned by _get_contents
+
+        Raises:
+            RecordingError: if the file cannot be written
+        """
+        temp_path = f'{self.path}.tmp'
+        try:
+            with gzip.open(temp_path, 'wb') as f:
+                f.write(RECORDING_MAGIC)
+                f.write(_HEADER.pack(self.bucket_secs, len(contents)))
+                for series_key, buckets, samples in contents:
+                    key = json.dumps(series_key).encode()
+                    f.write(_KEY_LENGTH.pack(len(key)))
+                    f.write(key)
+                    f.write(_COUNT.pack(len(buckets)))
+                    for start, count, minimum, maximum, total in buckets:
+                        f.write(_BUCKET.pack(start, int(count), minimum, maximum, total))
+                    f.write(_COUNT.pack(len(samples)))
+                    for sample in samples:
+                        f.write(_SAMPLE.pack(*sample))
+            os.replace(temp_path, self.path)
+        except OSError as err:
+            raise RecordingError(f'Unable to write sensor recording to {self.path}: {err}')
+
+        LOGGER.debug(f'Wrote {len(contents)} sensor time series to {self.path}')
+
+
+class RecordedSeries:
+    """The time series of one sensor read from a recording file."""
+
+    def __init__(self, key, bucket_secs, buckets, samples):
+        """Create a new RecordedSeries.
+
+        Args:
+            key (list): the topic, xname and Type, and the sensor identity
+            bucket_secs (float): the width of each bucket in seconds
+            buckets ([tuple]): the (start, count, min, max, total) buckets
+            samples ([tuple]): the (timestamp, value) samples
+        """
+        self.key = key
+        self.bucket_secs = bucket_secs
+        self.buckets = buckets
+        self.samples = samples
+
+    def get_intervals(self):
+        """Get the buckets and samples of the series in time order.
+
+        Returns:
+            list of dict: the Start, End, Samples, Min, Max and Mean of each
+                bucket and sample
+        """
+        intervals = [
+            {
+                'Start': format_timestamp(start),
+                'End': format_timestamp(start + self.bucket_secs),
+                'Samples': int(count),
+                'Min': minimum,
+                'Max': maximum,
+                'Mean': total / count,
+            } for start, count, minimum, maximum, total in self.buckets
+        ]
+        intervals.extend(
+            {
+                'Start': format_timestamp(timestamp),
+                'End': format_timestamp(timestamp),
+                'Samples': 1,
+                'Min': value,
+                'Max': value,
+                'Mean': value,
+            } for timestamp, value in self.samples
+        )
+        return intervals
+
+    def summarize(self):
+        """Aggregate the buckets and samples of the series.
+
+        Returns:
+            dict: the Samples, Min, Max, Mean, and the timestamps of the first
+                and last readings.
+        """
+        count = sum(bucket[1] for bucket in self.buckets) + len(self.samples)
+        minimum = min([bucket[2] for bucket in self.buckets] + [sample[1] for sample in self.samples])
+        maximum = max([bucket[3] for bucket in self.buckets] + [sample[1] for sample in self.samples])
+        total = sum(bucket[4] for bucket in self.buckets) + sum(sample[1] for sample in self.samples)
+        first = self.buckets[0][0] if self.buckets else self.samples[0][0]
+        last = self.samples[-1][0] if self.samples else self.buckets[-1][0]
+        return {
+            'Samples': int(count),
+            'Min': minimum,
+            'Max': maximum,
+            'Mean': total / count,
+            'First Timestamp': format_timestamp(first),
+            'Last Timestamp': format_timestamp(last),
+        }
+
+
+def _read_exactly(f, size):
+    """Read exactly `size` bytes from a recording file."""
+    data = f.read(size)
+    if len(data) != size:
+        raise RecordingError('Sensor recording is truncated')
+    return data
+
+
+def iter_recording(path):
+    """Read the time series in a recording file one at a time.
+
+    Args:
+        path (str): the path of the recording file
+
+    Yields:
+        RecordedSeries: each sensor's time series
+
+    Raises:
+        RecordingError: if the file cannot be read or is not a recording
+    """
+    try:
+        with gzip.open(path, 'rb') as f:
+            if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise RecordingError(f'{path} is not a sensor recording')
+            bucket_secs, series_count = _HEADER.unpack(_read_exactly(f, _HEADER.size))
+            for _ in range(series_count):
+                key_length, = _KEY_LENGTH.unpack(_read_exactly(f, _KEY_LENGTH.size))
+                key = json.loads(_read_exactly(f, key_length))
+                bucket_count, = _COUNT.unpack(_read_exactly(f, _COUNT.size))
+                buckets = list(_BUCKET.iter_unpack(_read_exactly(f, _BUCKET.size * bucket_count)))
+                sample_count, = _COUNT.unpack(_read_exactly(f, _COUNT.size))
+                samples = list(_SAMPLE.iter_unpack(_read_exactly(f, _SAMPLE.size * sample_count)))
+                yield RecordedSeries(key, bucket_secs, buckets, samples)
+    except (OSError, EOFError, ValueError) as err:
+        raise RecordingError(f'Unable to read sensor recording {path}: {err}')
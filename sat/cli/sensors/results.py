@@ -0,0 +1,171 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Storage of the telemetry data collected by the sensors subcommand.
+"""
+
+import logging
+
+from sat.cli.sensors.sensor_fields import get_sensor_identity
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TopicResults:
+    """The sensor data received from one telemetry topic.
+
+    The data is kept in the `results` dictionary, which has the structure
+    consumed by `make_raw_table`. Alongside it, the metrics are indexed by
+    context and the sensors are indexed by their identity, so that storing a
+    reading and checking whether data has been received for every context do
+    not depend on the number of xnames or sensors.
+    """
+
+    def __init__(self, topic, xnames_info, listeners=None):
+        """Create a new TopicResults.
+
+        Args:
+            topic (str): The name of the Kafka telemetry topic.
+            xnames_info ([dict]): A list of dictionaries with xname and Type.
+            listeners (list): Functions called with the topic, the metric and
+                the list of sensor readings each time readings are received
+                for a requested xname.
+        """
+        self.listeners = listeners or []
+        metrics = [
+            {
+                'Context': xname_info['xname'],
+                'Type': xname_info['Type'],
+                'Count': 0,
+                'Sensors': []
+            } for xname_info in xnames_info
+        ]
+        self.results = {
+            'Topic': topic,
+            'Done': False,
+            'APIError': False,
+            'Metrics': metrics
+        }
+
+        # Data for a context is only ever stored in the first metric with
+        # that context.
+        self._metrics_by_context = {}
+        for metric in metrics:
+            self._metrics_by_context.setdefault(metric['Context'], metric)
+
+        # Maps (context, sensor identity) to the sensor dict in the results.
+        self._sensors_by_identity = {}
+        self._contexts_without_data = len(self._metrics_by_context)
+
+    @property
+    def topic(self):
+        """str: the name of the Kafka telemetry topic"""
+        return self.results.get('Topic')
+
+    def get_sensor_identity(self, metric, sensor):
+        """Get the fields which uniquely identify a sensor within a metric.
+
+        Args:
+            metric (dict): A dictionary with sensor data collected so far for the xname.
+            sensor (dict): A dictionary with sensor data for the xname.
+
+        Returns:
+            tuple: the values of the fields in UNIQUE_SENSOR_FIELD_MAPPING
+        """
+        return get_sensor_identity(self.topic, metric, sensor)
+
+    def _index_sensor(self, metric, sensor):
+        """Add a sensor to the index unless a sensor with its identity is present."""
+        key = (metric['Context'], self.get_sensor_identity(metric, sensor))
+        self._sensors_by_identity.setdefault(key, sensor)
+
+    def add_or_update_sensor(self, metric, sensor):
+        """Add or update data for a sensor in the results for a metric.
+
+        Args:
+            metric (dict): A dictionary with sensor data collected so far for the xname.
+            sensor (dict): A dictionary with new sensor data for the xname.
+        """
+        key = (metric['Context'], self.get_sensor_identity(metric, sensor))
+        metric_sensor = self._sensors_by_identity.get(key)
+        if metric_sensor is not None:
+            metric_sensor['Timestamp'] = sensor['Timestamp']
+            metric_sensor['Value'] = sensor['Value']
+        else:
+            # Sensor doesn't exist in the results so add it
+            metric['Sensors'].append(sensor)
+            self._sensors_by_identity[key] = sensor
+
+    def update_metric_sensors(self, metric, sensors):
+        """Initialize or update the sensors data in the results for a metric.
+
+        Args:
+            metric (dict): A dictionary with sensor data collected so far for the xname.
+            sensors ([dict]): A list of dictionaries with new sensor data for the xname.
+        """
+        if metric['Sensors']:
+            # Sensor data has already been collected for the xname, so add or update it
+            LOGGER.debug(f'Updating sensors for xname: {metric["Context"]} '
+                         f'and topic: {self.topic}')
+            for sensor in sensors:
+                self.add_or_update_sensor(metric, sensor)
+        else:
+            if sensors is not None:
+                LOGGER.debug(f'Setting sensors for xname: {metric["Context"]} '
+                             f'and topic: {self.topic}')
+                metric['Sensors'] = sensors
+                for sensor in sensors:
+                    self._index_sensor(metric, sensor)
+
+    def set_sensors_for_context(self, context, sensors):
+        """Set the sensors data in the results for a particular context.
+
+        Args:
+            context (str): The Context (xname) of the sensor data.
+            sensors ([dict]): A list of dictionaries with sensor data for the xname.
+
+        Returns:
+           True if the context is one of the requested xnames and otherwise False.
+        """
+        metric = self._metrics_by_context.get(context)
+        if metric is None:
+            return False
+
+        if metric['Count'] == 0:
+            self._contexts_without_data -= 1
+        metric['Count'] += 1
+        self.update_metric_sensors(metric, sensors)
+        if sensors is not None:
+            for listener in self.listeners:
+                listener(self.topic, metric, sensors)
+        return True
+
+    def all_contexts_received(self):
+        """Check whether data has been received for every requested xname.
+
+        Returns:
+            True if data has been received for all xnames and otherwise False.
+        """
+        return self._contexts_without_data == 0
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -78,3 +78,18 @@ ALL_FIELDS = GLOBAL_FIELDS + UNIQUE_SENSOR_FIELDS + SENSOR_VALUE_FIELD
 UNIQUE_SENSOR_FIELD_MAPPING = OrderedDict(UNIQUE_SENSOR_FIELDS)
 
 FIELD_MAPPING = OrderedDict(ALL_FIELDS)
+
+
+def get_sensor_identity(topic, metric, sensor):
+    """Get the values of the fields which uniquely identify a sensor within a metric.
+
+    Args:
+        topic: the topic passed to the field extractors
+        metric (dict): A dictionary with the Context and Type of the xname.
+        sensor (dict): A dictionary with sensor data for the xname.
+
+    Returns:
+        tuple: the values of the fields in UNIQUE_SENSOR_FIELD_MAPPING
+    """
+    return tuple(extractor(topic, metric, sensor)
+                 for extractor in UNIQUE_SENSOR_FIELD_MAPPING.values())
@@ -0,0 +1,345 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Asynchronous reading of server-sent event streams.
+
+The streams are read with asyncio so that the streams of many telemetry topics
+can be consumed concurrently in a single thread.
+"""
+
+import asyncio
+from collections import namedtuple
+import logging
+import ssl
+from urllib.parse import urlsplit
+
+LOGGER = logging.getLogger(__name__)
+
+# The maximum number of bytes of an error response body to read
+MAX_ERROR_BODY_BYTES = 64 * 1024
+
+# The size of the reads from the body of a stream which is not chunked
+READ_SIZE = 64 * 1024
+
+SSEEvent = namedtuple('SSEEvent', ['event', 'data', 'id'])
+
+
+class HTTPStreamError(Exception):
+    """The HTTP stream could not be opened or read."""
+    pass
+
+
+class HTTPStatusError(HTTPStreamError):
+    """The server responded to the request with an error status code."""
+
+    def __init__(self, status, reason, body=b''):
+        self.status = status
+        self.reason = reason
+        self.body = body
+        super().__init__(f'Request failed with status code {status}: {reason}')
+
+
+class SSEParser:
+    """An incremental parser of server-sent events.
+
+    Bytes are fed to the parser as they arrive from the stream, and every
+    event that has been completely received is returned. Any partial line or
+    event is kept until the rest of it arrives.
+    """
+
+    def __init__(self):
+        """Create a new SSEParser."""
+        self._buffer = b''
+        self._event = ''
+        self._data = []
+        self._last_id = None
+
+    def _process_line(self, line):
+        """Process one line of the stream.
+
+        Args:
+            line (str): the line without its line terminator
+
+        Returns:
+            SSEEvent or None: the event which was dispatched by the line, if any
+        """
+        if not line:
+            return self._dispatch()
+        if line.startswith(':'):
+            return None
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+
+        if field == 'data':
+            self._data.append(value)
+        elif field == 'event':
+            self._event = value
+        elif field == 'id' and '\0' not in value:
+            self._last_id = value
+        # The 'retry' field and unknown fields are ignored
+        return None
+
+    def _dispatch(self):
+        """Dispatch the event whose fields have been received.
+
+        Returns:
+            SSEEvent or None: the event, or None if no data has been received
+        """
+        event = None
+        if self._data:
+            event = SSEEvent(self._event or 'message', '\n'.join(self._data), self._last_id)
+        self._event = ''
+        self._data = []
+        return event
+
+    def feed(self, data):
+        """Feed bytes received from the stream to the parser.
+
+        Args:
+            data (bytes): the bytes received
+
+        Returns:
+            list of SSEEvent: the events completed by the given bytes
+        """
+        self._buffer += data
+        events = []
+        while True:
+            cr_index = self._buffer.find(b'\r')
+            lf_index = self._buffer.find(b'\n')
+            if cr_index == -1 and lf_index == -1:
+                break
+
+            if cr_index != -1 and (lf_index == -1 or cr_index < lf_index):
+                if cr_index == len(self._buffer) - 1:
+                    # The line may be terminated by '\r\n', so wait for the next byte
+                    break
+                end = cr_index
+                terminator_len = 2 if self._buffer[cr_index + 1:cr_index + 2] == b'\n' else 1
+            else:
+                end = lf_index
+                terminator_len = 1
+
+            line = self._buffer[:end].decode('utf-8', errors='replace')
+            self._buffer = self._buffer[end + terminator_len:]
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+
+        return events
+
+
+def get_ssl_context(cert_verify):
+    """Get the SSL context used to connect to the server.
+
+    Args:
+        cert_verify (bool): whether to verify the server's certificate
+
+    Returns:
+        ssl.SSLContext: the SSL context
+    """
+    context = ssl.create_default_context()
+    if not cert_verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class HTTPStream:
+    """The body of a streamed HTTP response."""
+
+    def __init__(self, reader, writer, headers):
+        """Create a new HTTPStream.
+
+        Args:
+            reader (asyncio.StreamReader): the reader of the connection,
+                positioned at the start of the body
+            writer (asyncio.StreamWriter): the writer of the connection
+            headers (dict): the response headers, with lowercase names
+        """
+        self.reader = reader
+        self.writer = writer
+        self.headers = headers
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        content_length = headers.get('content-length')
+        self._remaining = int(content_length) if content_length and not self.chunked else None
+        self._eof = False
+
+    @classmethod
+    async def open(cls, url, headers=None, cert_verify=True):
+        """Send a GET request and read the response headers.
+
+        Args:
+            url (str): the URL to request
+            headers (dict): additional request headers
+            cert_verify (bool): whether to verify the server's certificate
+
+        Returns:
+            HTTPStream: the stream of the response body
+
+        Raises:
+            HTTPStatusError: if the server responded with an error status
+            HTTPStreamError: if the response could not be parsed
+            OSError: if the connection fails
+        """
+        parsed = urlsplit(url)
+        use_ssl = parsed.scheme == 'https'
+        port = parsed.port or (443 if use_ssl else 80)
+        reader, writer = await asyncio.open_connection(
+            parsed.hostname, port,
+            ssl=get_ssl_context(cert_verify) if use_ssl else None
+        )
+
+        try:
+            path = parsed.path or '/'
+            if parsed.query:
+                path += f'?{parsed.query}'
+            request_headers = {
+                'Host': parsed.netloc,
+                'Accept': 'text/event-stream',
+                'Cache-Control': 'no-cache',
+                'Connection': 'close',
+            }
+            request_headers.update(headers or {})
+            request = f'GET {path} HTTP/1.1\r\n' + ''.join(
+                f'{name}: {value}\r\n' for name, value in request_headers.items()
+            ) + '\r\n'
+            writer.write(request.encode('latin-1'))
+            await writer.drain()
+
+            status_line = (await reader.readline()).decode('latin-1').strip()
+            try:
+                _, status, *reason = status_line.split(' ', 2)
+                status = int(status)
+            except ValueError:
+                raise HTTPStreamError(f'Invalid HTTP status line: {status_line!r}')
+
+            response_headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if not line:
+                    raise HTTPStreamError('Connection closed while reading response headers')
+                line = line.strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+
+            stream = cls(reader, writer, response_headers)
+            if status >= 400:
+                body = await stream.read_body(MAX_ERROR_BODY_BYTES)
+                stream.close()
+                raise HTTPStatusError(status, reason[0] if reason else '', body)
+        except BaseException:
+            writer.close()
+            raise
+
+        return stream
+
+    async def read_body(self, max_bytes):
+        """Read the rest of the body, up to a maximum number of bytes.
+
+        Args:
+            max_bytes (int): the maximum number of bytes to read
+
+        Returns:
+            bytes: the body
+        """
+        body = b''
+        while len(body) < max_bytes:
+            chunk = await self.read_chunk()
+            if not chunk:
+                break
+            body += chunk
+        return body[:max_bytes]
+
+    async def read_chunk(self):
+        """Read the next bytes of the body.
+
+        Returns:
+            bytes: the next bytes of the body, or b'' at the end of the body
+
+        Raises:
+            HTTPStreamError: if the chunked encoding of the body is invalid
+            asyncio.IncompleteReadError: if the connection is closed in the
+                middle of a chunk
+        """
+        if self._eof:
+            return b''
+
+        if self.chunked:
+            size_line = await self.reader.readline()
+            if not size_line:
+                raise HTTPStreamError('Connection closed before the end of a chunked response')
+            try:
+                size = int(size_line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPStreamError(f'Invalid chunk size: {size_line!r}')
+            if size == 0:
+                self._eof = True
+                return b''
+            data = await self.reader.readexactly(size)
+            await self.reader.readexactly(2)
+            return data
+
+        if self._remaining is not None:
+            if self._remaining == 0:
+                self._eof = True
+                return b''
+            data = await self.reader.read(min(READ_SIZE, self._remaining))
+            if not data:
+                raise HTTPStreamError('Connection closed before the end of the response')
+            self._remaining -= len(data)
+            return data
+
+        data = await self.reader.read(READ_SIZE)
+        if not data:
+            self._eof = True
+        return data
+
+    async def events(self, read_timeout=None):
+        """Iterate over the server-sent events in the body.
+
+        Args:
+            read_timeout (float): the number of seconds to wait for each read
+                from the stream, or None to wait indefinitely
+
+        Yields:
+            SSEEvent: each event in the stream
+
+        Raises:
+            asyncio.TimeoutError: if no data is received within `read_timeout`
+        """
+        parser = SSEParser()
+        while True:
+            data = await asyncio.wait_for(self.read_chunk(), read_timeout)
+            if not data:
+                return
+            for event in parser.feed(data):
+                yield event
+
+    def close(self):
+        """Close the connection."""
+        self.writer.close()
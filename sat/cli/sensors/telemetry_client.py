@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -23,76 +23,71 @@
 #
 """
 The TelemetryClient for the sensors subcommand.
+
+The streams of all requested telemetry topics are consumed concurrently by a
+single asyncio event loop run by the TelemetryMultiplexer.
 """
 
+import asyncio
 import datetime
 import json
 import logging
-import threading
-import time
-import sseclient
 
-from sat.apiclient import APIError, ReadTimeout, TelemetryAPIClient
+from sat.apiclient import TelemetryAPIClient
 from sat.session import SATSession
 
-from sat.cli.sensors.sensor_fields import UNIQUE_SENSOR_FIELD_MAPPING
+from sat.cli.sensors.results import TopicResults
+from sat.cli.sensors.sse import HTTPStatusError, HTTPStream, HTTPStreamError
 
 
 LOGGER = logging.getLogger(__name__)
 
 
-class TelemetryClient(threading.Thread):
-    """A thread that collects telemetry data using the SMA Telemetry API."""
+class TelemetryClient:
+    """A consumer of the stream of one topic from the SMA Telemetry API."""
 
     # Default timeout for the telemetry streaming API
     GET_TIMEOUT_SECS = 60
 
-    # Time to sleep in between telemetry API reconnect attempts
-    RECONNECT_DELAY_SECS = 10
+    # Time to sleep before the first telemetry API reconnect attempt. The
+    # time is doubled after each failed attempt up to RECONNECT_MAX_DELAY_SECS.
+    RECONNECT_DELAY_SECS = 1
+    RECONNECT_MAX_DELAY_SECS = 10
 
     # Number of times to try to reconnect
     RECONNECT_RETRIES = 3
 
-    def __init__(self, stop_event, xnames_info, batchsize, update_until_timeout,
-                 topic, all_results, results_index):
-        """Create a thread to connect to streaming telemetry API.
+    def __init__(self, api_client, xnames_info, batchsize, update_until_timeout,
+                 topic, all_results, results_index, listeners=None):
+        """Create a consumer of the streaming telemetry API for a topic.
 
         Args:
-            stop_event (threading.Event): Event object used to stop all threads.
+            api_client (TelemetryAPIClient): The client used to get the stream URL.
             xnames_info ([dict]): A list of dictionaries with xname and Type.
             batchsize (int): The number of metrics to include in each message from API.
             update_until_timeout (bool): True if update sensor data for all xnames until timeout.
             topic (str): The name of the Kafka telemetry topic.
-            all_results ([dict]): A list of dictionaries with temeletry results for all topics.
-            results_index (int): The index into the results list for this thread.
+            all_results ([dict]): A list of dictionaries with telemetry results for all topics.
+            results_index (int): The index into the results list for this topic.
+            listeners (list): Functions called with each batch of sensor
+                readings received. See TopicResults.
         """
 
-        super().__init__()
-        self.stop_event = stop_event
+        self.api_client = api_client
         self.batchsize = batchsize
         self.update_until_timeout = update_until_timeout
         self.retries = 0
+        self.stopped = False
+        self.total_messages = 0
+        self.total_metrics = 0
 
-        # initialize the results for this thread
-        metrics = [
-            {
-                'Context': xname_info['xname'],
-                'Type': xname_info['Type'],
-                'Count': 0,
-                'Sensors': []
-            } for xname_info in xnames_info
-        ]
-        self.results = {
-            'Topic': topic,
-            'Done': False,
-            'APIError': False,
-            'Metrics': metrics
-        }
+        # initialize the results for this topic
+        self.topic_results = TopicResults(topic, xnames_info, listeners)
+        self.results = self.topic_results.results
         all_results[results_index] = self.results
-        self.api_client = TelemetryAPIClient(SATSession())
 
     def get_topic(self):
-        """Get the Kafka topic being consumed using this thread.
+        """Get the Kafka topic being consumed by this client.
 
         Returns:
            A topic name string or None.
@@ -100,75 +95,8 @@ class TelemetryClient(threading.Thread):
 
         return self.results.get('Topic')
 
-    def stop(self):
-        """Stop the execution of this thread at the next opportunity.
-        """
-
-        self.stop_event.set()
-
-    def stopped(self):
-        """Return whether a stop of this thread was requested.
-
-        Returns:
-           True or False
-        """
-
-        return self.stop_event.is_set()
-
-    def endpoint_alive(self):
-        """Check whether or not the Telemetry API service is alive or not.
-
-        Returns:
-           True or False
-        """
-        return self.api_client.ping()
-
-    def add_or_update_sensor(self, metric, sensor):
-        """Add or update data for a sensor in the results for a metric.
-
-        Args:
-            metric (dict): A dictionary with sensor data collected so far for the xname.
-            sensor (dict): A dictionary with new sensor data for the xname.
-        """
-
-        new_sensor_identity = [extractor(self.get_topic(), metric, sensor) for extractor
-                               in UNIQUE_SENSOR_FIELD_MAPPING.values()]
-
-        # Search for the sensor in the existing results and update it if it exists
-        metric_sensors = metric['Sensors']
-        for metric_sensor in metric_sensors:
-            old_sensor_identity = [extractor(self.get_topic(), metric, metric_sensor)
-                                   for extractor in UNIQUE_SENSOR_FIELD_MAPPING.values()]
-            if old_sensor_identity == new_sensor_identity:
-                metric_sensor['Timestamp'] = sensor['Timestamp']
-                metric_sensor['Value'] = sensor['Value']
-                break
-        else:
-            # Sensor doesn't exist in the results so add it
-            metric_sensors.append(sensor)
-
-    def update_metric_sensors(self, metric, sensors):
-        """Initialize or update the sensors data in the thread results for a metric.
-
-        Args:
-            metric (dict): A dictionary with sensor data collected so far for the xname.
-            sensors ([dict]): A list of dictionaries with new sensor data for the xname.
-        """
-
-        if metric['Sensors']:
-            # Sensor data has already been collected for the xname, so add or update it
-            LOGGER.debug(f'Updating sensors for xname: {metric["Context"]} '
-                         f'and topic: {self.get_topic()}')
-            for sensor in sensors:
-                self.add_or_update_sensor(metric, sensor)
-        else:
-            if sensors is not None:
-                LOGGER.debug(f'Setting sensors for xname: {metric["Context"]} '
-                             f'and topic: {self.get_topic()}')
-                metric['Sensors'] = sensors
-
     def set_sensors_for_context(self, context, sensors):
-        """Set the sensors data in the thread results for a particular context.
+        """Set the sensors data in the results for a particular context.
 
         Args:
             context (str): The Context (xname) of the sensor data.
@@ -178,22 +106,10 @@ class TelemetryClient(threading.Thread):
            True if successful and otherwise False.
         """
 
-        metrics = self.results.get('Metrics')
-        for metric in metrics:
-            try:
-                if metric['Context'] == context:
-                    metric['Count'] += 1
-                    self.update_metric_sensors(metric, sensors)
-                    return True
-            except KeyError as err:
-                LOGGER.error(f'Failed to parse telemetry results due to missing key(s) in '
-                             f'Metrics: {err}')
-                raise
-
-        return False
+        return self.topic_results.set_sensors_for_context(context, sensors)
 
     def am_i_done(self):
-        """Checks if the thread is done getting data for all xnames and topics requested.
+        """Checks if the client is done getting data for all xnames requested.
 
         Returns:
            True if all done and otherwise False.
@@ -202,22 +118,13 @@ class TelemetryClient(threading.Thread):
         if self.update_until_timeout:
             return False
 
-        metrics = self.results.get('Metrics')
-        for metric in metrics:
-            try:
-                if metric['Count'] == 0:
-                    return False
-            except KeyError as err:
-                LOGGER.error(f"Failed to get metric count due to missing 'Count' key: {err}")
-                raise
-
-        return True
+        return self.topic_results.all_contexts_received()
 
     def unpack_data(self, messages):
-        """Unpack data returned from the sseclient stream.
+        """Unpack data returned from the stream.
 
         Args:
-            messages (sseclient.event.data): The json messages returned from the streaming client.
+            messages (str): The json messages in the data of a server-sent event.
 
         Returns:
             num_metrics (int): The number of metrics received.
@@ -243,99 +150,198 @@ class TelemetryClient(threading.Thread):
                 if self.am_i_done():
                     break
         except KeyError as err:
-            LOGGER.error(f'Failed to unpack messages received from sseclient due to missing key(s) '
+            LOGGER.error(f'Failed to unpack messages received from stream due to missing key(s) '
                          f'in messages: {err}')
             raise
 
         return num_metrics
 
-    def check_if_run_done(self, topic):
-        """Checks if the thread run should stop.
-
-        Args:
-            topic (str): The name of the Kafka telemetry topic.
+    def check_if_run_done(self):
+        """Checks if consuming the stream should stop.
 
         Returns:
-           True if thread run should stop and otherwise False.
+           True if the client should stop and otherwise False.
         """
 
-        if self.stopped():
-            LOGGER.debug(f'The stop_event is set. Stopping thread for {topic}')
-            return True
-
-        done = self.results.get('Done')
-        if done:
+        if self.results.get('Done') or self.results.get('APIError'):
             return True
 
         if self.am_i_done():
-            LOGGER.info(f'Telemetry data received from {topic} for all requested xnames.')
+            LOGGER.info(f'Telemetry data received from {self.get_topic()} for all requested xnames.')
             self.results['Done'] = True
             return True
 
         return False
 
-    def ping_and_sleep(self, topic):
-        """Ping the Telemetry API service until alive with sleep in between.
-
-        Args:
-            topic (str): The name of the Kafka telemetry topic.
+    def get_reconnect_delay(self):
+        """Get the time to wait before the next reconnect attempt.
 
         Returns:
-           True or False if alive or not for RECONNECT_RETRIES.
+            The delay in seconds, or None if no more attempts should be made.
         """
 
-        alive = False
-        while not alive and not self.stopped() and self.retries < self.RECONNECT_RETRIES:
-            self.retries += 1
-            alive = self.endpoint_alive()
-            if not alive:
-                time.sleep(self.RECONNECT_DELAY_SECS)
+        if self.retries >= self.RECONNECT_RETRIES:
+            return None
+        self.retries += 1
+        return min(self.RECONNECT_DELAY_SECS * 2 ** (self.retries - 1), self.RECONNECT_MAX_DELAY_SECS)
 
-        if not alive and self.retries == self.RECONNECT_RETRIES:
-            self.results['APIError'] = True
-            LOGGER.error(f'Exceeded number of retries: '
-                         f'{self.RECONNECT_RETRIES} for {topic}')
+    def stop(self):
+        """Stop consuming the stream after the event being processed, if any."""
+        self.stopped = True
 
-        return alive
+    async def consume_stream(self):
+        """Open the stream of the topic and process its events.
 
-    def run(self):
-        """Create a Telemetry API message consumer and consume messages for a list of xnames.
+        Returns:
+            None when the stream ends or all requested data has been received.
+
+        Raises:
+            HTTPStatusError: if the Telemetry API responds with an error.
+            asyncio.TimeoutError: if no data is received within GET_TIMEOUT_SECS.
+            HTTPStreamError, OSError, asyncio.IncompleteReadError: if the
+                connection fails or is closed unexpectedly.
+            ValueError, KeyError: if the data received cannot be parsed.
         """
 
-        LOGGER.debug(f'Thread starting at {datetime.datetime.now()}')
+        topic = self.get_topic()
+        url = self.api_client.get_stream_url(topic, params={'count': 0, 'batchsize': self.batchsize})
+        stream = await asyncio.wait_for(
+            HTTPStream.open(url, headers=self.api_client.get_stream_headers(),
+                            cert_verify=self.api_client.cert_verify),
+            self.GET_TIMEOUT_SECS
+        )
+        try:
+            LOGGER.info(f'Waiting for metrics for all requested xnames from {topic}.')
+            async for event in stream.events(read_timeout=self.GET_TIMEOUT_SECS):
+                self.total_messages += 1
+                self.total_metrics += self.unpack_data(event.data)
+                self.retries = 0
+                LOGGER.info(f'Received {self.total_metrics} metrics from stream: {event.event}')
+                if self.stopped or self.am_i_done():
+                    break
+        finally:
+            stream.close()
+
+    async def run(self):
+        """Consume messages for a list of xnames until done, reconnecting as needed."""
 
-        total_metrics = 0
-        topic = self.results.get('Topic')
-        while not self.check_if_run_done(topic):
+        topic = self.get_topic()
+        LOGGER.debug(f'Consumer for {topic} starting at {datetime.datetime.now()}')
+
+        while not self.stopped and not self.check_if_run_done():
             try:
-                response = self.api_client.stream(topic, self.GET_TIMEOUT_SECS,
-                                                  params={'count': 0, 'batchsize': self.batchsize})
-                client = sseclient.SSEClient(response)
-                LOGGER.info(f'Waiting for metrics for all requested xnames from {topic}.')
-                for event in client.events():
-                    num_metrics = self.unpack_data(event.data)
-                    total_metrics += num_metrics
-                    LOGGER.info(f'Received {total_metrics} metrics from stream: {event.event}')
-                    if self.am_i_done() or self.stopped():
-                        break
-
-            except APIError as err:
+                await self.consume_stream()
+                if self.stopped or self.check_if_run_done():
+                    break
+                LOGGER.warning(f'Telemetry API stream for {topic} ended.')
+
+            except HTTPStatusError as err:
                 self.results['APIError'] = True
-                LOGGER.error(f'Request to Telemetry API failed: {err}')
+                LOGGER.error(f'Request to Telemetry API failed: Failed to stream telemetry data '
+                             f'from {topic}: {err}')
                 break
 
-            except ReadTimeout:
+            except asyncio.TimeoutError:
                 LOGGER.error(f'Timed out getting any data from {topic}.')
                 self.results['Done'] = True
                 break
 
-            except Exception as err:
+            except (HTTPStreamError, OSError, asyncio.IncompleteReadError, ValueError, KeyError) as err:
                 LOGGER.error(f'Telemetry API exception: {err}')
-                if not self.ping_and_sleep(topic):
-                    break
-                LOGGER.debug(f'Attempting Telemetry API reconnect for {topic}')
 
-        msg_info = ''
-        if self.stopped():
-            msg_info = ' due to stop_event'
-        LOGGER.debug(f'Thread stopping{msg_info} for {topic}')
+            delay = self.get_reconnect_delay()
+            if delay is None:
+                self.results['APIError'] = True
+                LOGGER.error(f'Exceeded number of retries: '
+                             f'{self.RECONNECT_RETRIES} for {topic}')
+                break
+            LOGGER.debug(f'Attempting Telemetry API reconnect for {topic} in {delay} seconds')
+            await asyncio.sleep(delay)
+
+        LOGGER.debug(f'Consumer stopping for {topic}')
+
+
+class TelemetryMultiplexer:
+    """Consumes the streams of several telemetry topics in one event loop."""
+
+    def __init__(self, topics, xnames_info, batchsize, update_until_timeout, api_client=None,
+                 listeners=None):
+        """Create a new TelemetryMultiplexer.
+
+        Args:
+            topics ([str]): A list of topics with telemetry data for sensors.
+            xnames_info ([dict]): A list of dictionaries with xname and Type.
+            batchsize (int): The number of metrics to include in each message from API.
+            update_until_timeout (bool): True if update sensor data for all xnames until timeout.
+            api_client (TelemetryAPIClient): The client to use for the Telemetry
+                API. If None, a new client is created.
+            listeners (list): Functions called with each batch of sensor
+                readings received from any topic. See TopicResults.
+        """
+
+        self.api_client = api_client or TelemetryAPIClient(SATSession())
+        self.update_until_timeout = update_until_timeout
+        self.all_topics_results = [None] * len(topics)
+        self.telemetry_clients = [
+            TelemetryClient(self.api_client, xnames_info, batchsize, update_until_timeout,
+                            topic, self.all_topics_results, i, listeners)
+            for i, topic in enumerate(topics)
+        ]
+
+    def endpoint_alive(self):
+        """Check whether or not the Telemetry API service is alive or not.
+
+        Returns:
+           True or False
+        """
+        return self.api_client.ping()
+
+    async def consume_all(self, total_timeout):
+        """Consume the streams of all topics until they are done or the timeout expires.
+
+        Args:
+            total_timeout (int): The total timeout in seconds for all topics.
+        """
+
+        tasks = [asyncio.ensure_future(client.run()) for client in self.telemetry_clients]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=total_timeout)
+        finally:
+            # Stop any streams which are still open, including when interrupted.
+            # Before Python 3.12, asyncio.wait_for can swallow a cancellation
+            # if the read it is waiting for completes at the same time, so
+            # consumers of busy streams are also told to stop.
+            for client, task in zip(self.telemetry_clients, tasks):
+                client.stop()
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if pending:
+            LOGGER.info(f'Timed out after {total_timeout} seconds')
+        else:
+            LOGGER.info('All topics have completed')
+
+        for client, task in zip(self.telemetry_clients, tasks):
+            if task in done and task.exception() is not None:
+                client.results['APIError'] = True
+                LOGGER.error(f'Unexpected error getting telemetry data from '
+                             f'{client.get_topic()}: {task.exception()}')
+
+    def run(self, total_timeout):
+        """Get sensor data from all topics.
+
+        Args:
+            total_timeout (int): The total timeout in seconds for all topics.
+
+        Returns:
+            all_topics_results ([dict]): A list of dictionaries with sensor data (one per topic).
+        """
+
+        LOGGER.info(f'Waiting for telemetry data using timeout of {total_timeout} seconds')
+        if self.update_until_timeout:
+            LOGGER.info('Sensor data will continue to be updated for each xname until timeout occurs')
+        else:
+            LOGGER.info('Each topic is complete when sensor data is received for all xnames')
+
+        asyncio.run(self.consume_all(total_timeout))
+        return self.all_topics_results
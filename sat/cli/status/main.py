@@ -30,12 +30,16 @@ from sat.apiclient.bos import BOSClientCommon
 from sat.apiclient.gateway import APIError
 from sat.apiclient.hsm import HSMClient
 from sat.cli.status.constants import COMPONENT_TYPES
+from sat.cli.status.planner import StatusQueryPlan
 import sat.cli.status.status_module
 from sat.cli.status.status_module import StatusModule
+from sat.cli.status.watch import watch_status
 from sat.config import get_config_value
+from sat.constants import MISSING_VALUE
 from sat.filtering import CustomFilter
 from sat.report import Report
 from sat.session import SATSession
+from sat.template_membership import TemplateMembershipResolver
 from sat.xname import XName
 
 
@@ -133,85 +137,110 @@ def get_bos_template_filter_fn(bos_template, session):
         A CustomFilter object which can filter rows based on nodes' belonging
         to a BOS session template boot set.
     """
-
-    skip_filter = False
-    hsm_client = HSMClient(session)
     bos_client = BOSClientCommon.get_bos_client(session)
-
-    nodes = set()
-    roles = set()
+    membership_resolver = TemplateMembershipResolver(HSMClient(session))
 
     try:
         session_template = bos_client.get_session_template(bos_template)
-        for boot_set in session_template.get('boot_sets', {}).values():
-            roles |= set(boot_set.get('node_roles_groups', []))
-            nodes |= set(boot_set.get('node_list', []))
-            for node_group in boot_set.get('node_groups', []):
-                nodes |= set(hsm_client.get_component_xnames(params={
-                    'group': node_group
-                }))
-
+        membership = membership_resolver.get_membership(session_template)
     except APIError as err:
         LOGGER.warning('Could not get nodes from the given session template: %s', err)
-        skip_filter = True
+        membership = None
 
     def filter_fn(row):
-        return skip_filter or \
-            str(row.get('xname')) in nodes or \
-            row.get('Role') in roles
+        return membership is None or row.get('xname') in membership
 
     return CustomFilter(filter_fn, ['xname'])
 
 
-def do_status(args):
-    """Displays node status.
-
-    Results are sorted by the "sort_column" member of args, which defaults
-    to xname. xnames are tokenized for the purposes of sorting, so that their
-    numeric elements are sorted by their value, not lexicographically. Sort
-    order is reversed if the "reverse" member of args is True.
+def get_status_modules(args):
+    """Get the status modules selected by the command-line arguments.
 
     Args:
         args: The argparse.Namespace object containing the parsed arguments
             passed to this subcommand.
 
     Returns:
-        None
+        None or list: the StatusModule subclasses to query, or None if all
+            modules should be queried
     """
-    session = SATSession()
+    if args.status_module_names is None:
+        return None
 
-    modules = args.status_module_names
-    if modules is not None:
-        modules = []
-        seen_module_names = set()
-        for module_name in args.status_module_names:
-            if module_name in seen_module_names:
-                continue
-
-            module_cls = getattr(sat.cli.status.status_module, module_name)
-            can_use, err_reason = module_cls.can_use()
-            if not can_use:
-                LOGGER.warning('Cannot retrieve status information from %s: %s',
-                               module_cls.source_name, err_reason)
-            else:
-                modules.append(module_cls)
-            seen_module_names.add(module_name)
+    modules = []
+    seen_module_names = set()
+    for module_name in args.status_module_names:
+        if module_name in seen_module_names:
+            continue
 
+        module_cls = getattr(sat.cli.status.status_module, module_name)
+        can_use, err_reason = module_cls.can_use()
+        if not can_use:
+            LOGGER.warning('Cannot retrieve status information from %s: %s',
+                           module_cls.source_name, err_reason)
+        else:
+            modules.append(module_cls)
+        seen_module_names.add(module_name)
+
+    return modules
+
+
+def get_status_reports(args, session, modules):
+    """Query the status modules and create a report for each component type.
+
+    Args:
+        args: The argparse.Namespace object containing the parsed arguments
+            passed to this subcommand.
+        session (SATSession): a SATSession object to connect to the API gateway
+        modules (None or list): the StatusModule subclasses to query, or None
+            to query all modules
+
+    Returns:
+        list of Report: a report for each component type with any components
+    """
     types = COMPONENT_TYPES if 'all' in args.types else args.types
     multiple_reports = len(types) != 1
-    report_strings = []
+    reports = []
+
+    headings_by_type = {
+        component_type: StatusModule.get_all_headings(
+            primary_key='xname',
+            limit_modules=modules,
+            component_type=component_type,
+            initial_headings=DEFAULT_HEADING_ORDER
+        )
+        for component_type in types
+    }
+    plan = StatusQueryPlan(
+        {component_type: headings for component_type, headings in headings_by_type.items() if headings},
+        filter_strs=args.filter_strs,
+        display_headings=args.fields,
+        sort_by=args.sort_by,
+    )
+    all_modules = StatusModule.get_relevant_modules(limit_modules=modules)
+    queried_modules = plan.get_required_modules(all_modules, primary_key='xname')
 
     components = StatusModule.get_populated_rows(
         primary_key='xname',
         primary_key_type=XName,
-        limit_modules=modules,
+        limit_modules=queried_modules,
         session=session,
         component_types=types,
+        hsm_params=plan.get_hsm_params(),
+        module_timeout=args.module_timeout,
     )
 
+    # Columns of modules which were not queried are neither displayed nor
+    # filtered on, but every row must still contain every heading.
+    skipped_headings = {heading for module in all_modules if module not in queried_modules
+                        for heading in module.headings}
+    for component in components:
+        for heading in skipped_headings:
+            component.setdefault(heading, MISSING_VALUE)
+
     for component_type, components_by_type in group_dicts_by('Type', components).items():
         title = f'{component_type} Status' if multiple_reports else None
-        headings = StatusModule.get_all_headings(
+        headings = headings_by_type.get(component_type) or StatusModule.get_all_headings(
             primary_key='xname',
             limit_modules=modules,
             component_type=component_type,
@@ -245,6 +274,37 @@ def do_status(args):
         )
 
         report.add_rows(components_by_type)
-        report_strings.append(str(report))
+        reports.append(report)
+
+    return reports
+
+
+def do_status(args):
+    """Displays node status.
+
+    Results are sorted by the "sort_column" member of args, which defaults
+    to xname. xnames are tokenized for the purposes of sorting, so that their
+    numeric elements are sorted by their value, not lexicographically. Sort
+    order is reversed if the "reverse" member of args is True.
+
+    If the "watch" member of args is set, status is retrieved repeatedly at
+    that interval, and only changes are displayed after the first time.
+
+    Args:
+        args: The argparse.Namespace object containing the parsed arguments
+            passed to this subcommand.
+
+    Returns:
+        None
+    """
+    session = SATSession()
+    modules = get_status_modules(args)
+
+    if args.watch is not None:
+        watch_status(lambda: get_status_reports(args, session, modules),
+                     interval=args.watch, primary_key='xname',
+                     print_format=args.watch_format)
+        return
 
-    print('\n\n'.join(report_strings))
+    reports = get_status_reports(args, session, modules)
+    print('\n\n'.join(str(report) for report in reports))
@@ -92,6 +92,27 @@ def add_status_subparser(subparsers):
              'the boot sets contained in the given BOS session template.'
     )
 
+    status_parser.add_argument(
+        '--module-timeout', metavar='SECONDS', type=int, default=300,
+        help='The number of seconds to wait for status information from SLS, '
+             'CFS, and BOS. Fields from services which do not respond in time '
+             'are shown as MISSING. The default is 300 seconds.'
+    )
+
+    status_parser.add_argument(
+        '--watch', metavar='SECONDS', type=float,
+        help='Retrieve status repeatedly at the given interval in seconds until '
+             'interrupted. The full status is displayed the first time, and only '
+             'rows which were added, changed, or removed are displayed afterwards.'
+    )
+
+    status_parser.add_argument(
+        '--watch-format', choices=['pretty', 'ndjson'], default='pretty',
+        help='The format in which to display changes with --watch. "ndjson" '
+             'prints one JSON object per line for each added, changed, or '
+             'removed row. The default is "pretty".'
+    )
+
     status_parser.add_argument(
         '--bos-version',
         choices=['v1', 'v2'],
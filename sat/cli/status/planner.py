@@ -0,0 +1,261 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Planning of the API queries made by `sat status`.
+
+The planner inspects the filters and the displayed fields given on the command
+line and determines which conditions can be evaluated by HSM itself when
+querying components, and which status modules need to be queried at all.
+Filters are always evaluated locally by the Report as well, so the output is
+the same whether or not a condition could be pushed down to HSM.
+"""
+import logging
+
+from parsec import ParseError
+
+from sat.filtering import (
+    CombinedFilter,
+    ComparisonFilter,
+    parse_multiple_query_strings,
+)
+from sat.util import match_query_key
+
+LOGGER = logging.getLogger(__name__)
+
+# Mapping from table headings to the names of the HSM '/State/Components'
+# query parameters which filter on the same values.
+HSM_PARAMS_BY_HEADING = {
+    'xname': 'id',
+    'NID': 'nid',
+    'State': 'state',
+    'Flag': 'flag',
+    'Enabled': 'enabled',
+    'Arch': 'arch',
+    'Class': 'class',
+    'Role': 'role',
+    'SubRole': 'subrole',
+}
+
+# Characters that have a special meaning in the wildcard patterns used in
+# filter comparisons. Patterns containing them cannot be pushed down to HSM.
+WILDCARD_CHARS = set('*?[]')
+
+
+def get_conjuncts(filter_fn):
+    """Get the comparisons that must all be true for a filter to match a row.
+
+    Only the comparisons joined to the top of the filter tree by boolean "and"
+    operations are returned. Comparisons underneath an "or" are not required
+    to be true for a row to match, so they are not included.
+
+    Args:
+        filter_fn (BaseFilterFunction): the parsed filter
+
+    Returns:
+        list of ComparisonFilter: the comparisons which are required to be
+            true for the filter to match
+    """
+    if isinstance(filter_fn, ComparisonFilter):
+        return [filter_fn]
+    if isinstance(filter_fn, CombinedFilter) and filter_fn.combinator is all:
+        return [comparison for child in filter_fn.filter_fns
+                for comparison in get_conjuncts(child)]
+    return []
+
+
+def get_hsm_param_value(heading, cmpr_val):
+    """Get the value of an HSM query parameter equivalent to a comparison.
+
+    Args:
+        heading (str): the heading compared against
+        cmpr_val (str or float): the value the heading is compared to with '='
+
+    Returns:
+        str or None: the value to pass to HSM, or None if the comparison
+            cannot be expressed exactly as an HSM query parameter.
+    """
+    if heading == 'NID':
+        if isinstance(cmpr_val, float) and cmpr_val.is_integer():
+            return str(int(cmpr_val))
+        return None
+
+    if not isinstance(cmpr_val, str) or not cmpr_val or WILDCARD_CHARS & set(cmpr_val):
+        return None
+
+    if heading == 'Enabled':
+        return cmpr_val.lower() if cmpr_val.lower() in ('true', 'false') else None
+    if heading == 'SubRole' and cmpr_val.lower() == 'none':
+        # HSMStatusModule fills in 'None' for compute nodes without a SubRole,
+        # which HSM has no way of matching.
+        return None
+
+    return cmpr_val
+
+
+class StatusQueryPlan:
+    """A plan for retrieving the data displayed by `sat status`."""
+
+    def __init__(self, headings_by_type, filter_strs=None, display_headings=None, sort_by=None):
+        """Create a new StatusQueryPlan.
+
+        Args:
+            headings_by_type (dict): a mapping from each component type being
+                displayed to the list of headings of its table
+            filter_strs (list of str): the filter query strings given by the user
+            display_headings (list of str): the fields which should be
+                displayed, or None if all fields should be displayed
+            sort_by (str or int): the field to sort the output by, if any
+        """
+        self.headings_by_type = headings_by_type
+        self.filter_strs = filter_strs or []
+        self.display_headings = display_headings
+        self.sort_by = sort_by
+
+    def _get_filter(self, headings):
+        """Parse the filter strings against the given headings.
+
+        Returns:
+            BaseFilterFunction or None: the parsed filter, or None if there are
+                no filters or they cannot be parsed. Invalid filters are
+                reported when the Report parses them.
+        """
+        try:
+            return parse_multiple_query_strings(self.filter_strs, headings)
+        except ParseError:
+            return None
+
+    def _get_pushdown_params_for_headings(self, headings):
+        """Get the HSM query parameters implied by the filters for one table.
+
+        Returns:
+            dict: a mapping from HSM query parameter name to value
+        """
+        filter_fn = self._get_filter(headings)
+        if filter_fn is None:
+            return {}
+
+        values_by_param = {}
+        for comparison in get_conjuncts(filter_fn):
+            heading = comparison.query_key
+            param = HSM_PARAMS_BY_HEADING.get(heading)
+            if param is None:
+                continue
+
+            # Other comparisons only narrow the results further, and they
+            # are still evaluated locally.
+            if comparison.comparator != '=':
+                continue
+            values_by_param.setdefault(param, set()).add(
+                get_hsm_param_value(heading, comparison.cmpr_val)
+            )
+
+        # A parameter may only be used if every equality against its heading
+        # can be evaluated by HSM, and all of them agree on the value, since
+        # multiple values of one parameter are combined with "or" by HSM.
+        return {
+            param: values.pop() for param, values in values_by_param.items()
+            if len(values) == 1 and None not in values
+        }
+
+    def get_hsm_params(self):
+        """Get the HSM query parameters which can be pushed down to HSM.
+
+        A single query retrieves components of every type, so a parameter is
+        only pushed down if it is implied by the filters of every table.
+
+        Returns:
+            dict: a mapping from HSM query parameter name to value
+        """
+        if not self.filter_strs or not self.headings_by_type:
+            return {}
+
+        params_by_type = [self._get_pushdown_params_for_headings(headings)
+                          for headings in self.headings_by_type.values()]
+        common_params = params_by_type[0]
+        for params in params_by_type[1:]:
+            common_params = {param: value for param, value in common_params.items()
+                             if params.get(param) == value}
+
+        if common_params:
+            LOGGER.debug('Pushing down filter parameters to HSM query: %s', common_params)
+        return common_params
+
+    def _get_required_headings(self, headings):
+        """Get the headings needed to filter, sort and display one table.
+
+        Returns:
+            set of str or None: the set of headings required, or None if all
+                headings are required.
+        """
+        if self.display_headings is None:
+            return None
+
+        required = {match_query_key(heading, headings) for heading in self.display_headings}
+
+        if self.filter_strs:
+            filter_fn = self._get_filter(headings)
+            if filter_fn is None:
+                return None
+            required |= filter_fn.get_filtered_fields()
+
+        if self.sort_by is not None:
+            try:
+                required.add(headings[int(self.sort_by)])
+            except IndexError:
+                pass
+            except ValueError:
+                required.add(match_query_key(self.sort_by, headings))
+
+        required.discard(None)
+        return required
+
+    def get_required_modules(self, modules, primary_key):
+        """Get the status modules which must be queried to produce the output.
+
+        Modules which only supply fields that are neither displayed, filtered
+        on, nor sorted by are not needed. The primary module is always needed.
+
+        Args:
+            modules (list): the StatusModule subclasses which could be queried
+            primary_key (str): the primary key heading shared by all modules
+
+        Returns:
+            list: the subset of `modules` which must be queried
+        """
+        required_headings = set()
+        for headings in self.headings_by_type.values():
+            headings_for_type = self._get_required_headings(headings)
+            if headings_for_type is None:
+                return modules
+            required_headings |= headings_for_type
+
+        required_modules = [
+            module for module in modules
+            if module.primary or required_headings.intersection(set(module.headings) - {primary_key})
+        ]
+        skipped = [module.source_name for module in modules if module not in required_modules]
+        if skipped:
+            LOGGER.debug('Skipping status modules which supply no requested fields: %s',
+                         ', '.join(skipped))
+        return required_modules
@@ -27,7 +27,9 @@ Tools for adding information to `sat status` output.
 
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 import logging
+import time
 from urllib.parse import urlparse
 
 from sat.apiclient.bos import BOSClientCommon
@@ -38,7 +40,7 @@ from sat.apiclient.ims import IMSClient
 from sat.apiclient.sls import SLSClient
 from sat.config import get_config_value
 from sat.constants import MISSING_VALUE
-from sat.util import get_val_by_path
+from sat.util import get_val_by_path, submit_daemon
 
 
 LOGGER = logging.getLogger(__name__)
@@ -268,10 +270,59 @@ class StatusModule(ABC):
             raise ValueError('Must be exactly one primary StatusModule')
         return primaries.pop()
 
+    @staticmethod
+    def _join_rows(module_instance, rows, items_by_primary_key, primary_key, primary_key_type):
+        """Join the rows retrieved by a module into the table.
+
+        Args:
+            module_instance (StatusModule): the module which retrieved the rows
+            rows ([dict]): the rows retrieved by the module
+            items_by_primary_key (dict): the table being populated, keyed by
+                primary key. Only the primary module may add new keys.
+            primary_key (str): the primary key the rows are joined on
+            primary_key_type (str -> Any): the type of the primary key
+        """
+        module = type(module_instance)
+        for row in rows:
+            mapped_row = {}
+
+            for heading, value in row.items():
+                mapped_heading = module_instance.map_heading(heading)
+                if mapped_heading == primary_key:
+                    value = primary_key_type(value)
+
+                mapped_row[mapped_heading] = value
+
+            # If the module returned a row without all the proper
+            # headings, fill in MISSING under each heading in the
+            # missing columns.
+            for missing_heading in set(module.headings) - set(mapped_row.keys()):
+                mapped_row[missing_heading] = MISSING_VALUE
+
+            if module.primary or mapped_row[primary_key] in items_by_primary_key:
+                items_by_primary_key[mapped_row[primary_key]].update(mapped_row)
+
+    @staticmethod
+    def _get_timed_rows(module_instance):
+        """Retrieve the rows of a module and measure how long it takes.
+
+        Returns:
+            Tuple[[dict], float]: the rows and the elapsed time in seconds
+        """
+        start_time = time.monotonic()
+        rows = module_instance.rows
+        return rows, time.monotonic() - start_time
+
     @classmethod
-    def get_populated_rows(cls, *, primary_key, session, limit_modules=None, primary_key_type=str, **kwargs):
+    def get_populated_rows(cls, *, primary_key, session, limit_modules=None, primary_key_type=str,
+                           module_timeout=None, module_timings=None, **kwargs):
         """Return a list of rows joining data from all defined modules.
 
+        The primary module is queried first. All other modules are then
+        queried concurrently, and the rows from each are joined into the table
+        as soon as that module finishes. If a module does not finish within
+        `module_timeout` seconds, its columns are left with MISSING values.
+
         Additional keyword arguments are passed through to StatusModule
         constructors.
 
@@ -286,6 +337,11 @@ class StatusModule(ABC):
             primary_key_type (str -> Any): a callable (or type) which takes a string
                 and returns an object. The primary key of the populated rows
                 will have this type.
+            module_timeout (None or float): the number of seconds to wait for
+                the non-primary modules. If None, wait until all have finished.
+            module_timings (None or dict): if given, this dict is updated with
+                the number of seconds taken by each module that finished,
+                keyed by the module's `source_name`.
 
         Returns:
             [dict]: data from the status modules as described above,
@@ -293,51 +349,67 @@ class StatusModule(ABC):
         """
         items_by_primary_key = defaultdict(dict)
         primary_module = cls.get_primary()
+        if module_timings is None:
+            module_timings = {}
 
         modules = cls.get_relevant_modules(limit_modules=limit_modules)
         if primary_module not in modules:
             modules = [primary_module, *modules]
 
+        module_instances = {}
         for module in sorted(modules, key=cls._module_index):
-            module_instance = module(session=session,
-                                     primary_keys=items_by_primary_key.keys(),
-                                     **kwargs)
+            module_instances[module] = module(session=session,
+                                              primary_keys=items_by_primary_key.keys(),
+                                              **kwargs)
 
-            try:
-                # By default, fill each existing row with 'MISSING' values
-                # under the headings supplied by this module before filling in
-                # data retrieved by the module. This covers the case where the
-                # module doesn't have any information on a primary key that
-                # already exists in the table, e.g. if SLS doesn't have a
-                # hostname for a given xname. Note that this only runs once the
-                # primary keys are populated from the primary module; missing
-                # fields in the primary module are handled below.
-                for row in items_by_primary_key.values():
-                    row.update({heading: MISSING_VALUE for heading in module.headings
-                                if heading != primary_key})
-
-                for row in module_instance.rows:
-                    mapped_row = {}
-
-                    for heading, value in row.items():
-                        mapped_heading = module_instance.map_heading(heading)
-                        if mapped_heading == primary_key:
-                            value = primary_key_type(value)
-
-                        mapped_row[mapped_heading] = value
-
-                    # If the module returned a row without all the proper
-                    # headings, fill in MISSING under each heading in the
-                    # missing columns.
-                    for missing_heading in set(module.headings) - set(mapped_row.keys()):
-                        mapped_row[missing_heading] = MISSING_VALUE
-
-                    if module.primary or mapped_row[primary_key] in items_by_primary_key:
-                        items_by_primary_key[mapped_row[primary_key]].update(mapped_row)
-
-            except StatusModuleException as err:
-                LOGGER.warning('Could not retrieve status information from %s; %s',
-                               module.source_name, err)
+        try:
+            rows, module_timings[primary_module.source_name] = cls._get_timed_rows(
+                module_instances[primary_module]
+            )
+            cls._join_rows(module_instances.pop(primary_module), rows,
+                           items_by_primary_key, primary_key, primary_key_type)
+        except StatusModuleException as err:
+            LOGGER.warning('Could not retrieve status information from %s; %s',
+                           primary_module.source_name, err)
+
+        if not module_instances:
+            return list(items_by_primary_key.values())
+
+        # By default, fill each existing row with 'MISSING' values under the
+        # headings supplied by the remaining modules before filling in data
+        # retrieved by the modules. This covers the case where a module
+        # doesn't have any information on a primary key that already exists
+        # in the table, e.g. if SLS doesn't have a hostname for a given xname,
+        # as well as the case where a module fails or times out. Missing
+        # fields in the primary module are handled in _join_rows().
+        for module in module_instances:
+            for row in items_by_primary_key.values():
+                row.update({heading: MISSING_VALUE for heading in module.headings
+                            if heading != primary_key})
+
+        # Modules are run in daemon threads so that a module which does not
+        # finish before the timeout cannot prevent SAT from exiting.
+        futures = {submit_daemon(cls._get_timed_rows, module_instance): module_instance
+                   for module_instance in module_instances.values()}
+        try:
+            for future in as_completed(futures, timeout=module_timeout):
+                module_instance = futures[future]
+                source_name = module_instance.source_name
+                try:
+                    rows, module_timings[source_name] = future.result()
+                    cls._join_rows(module_instance, rows, items_by_primary_key,
+                                   primary_key, primary_key_type)
+                except StatusModuleException as err:
+                    LOGGER.warning('Could not retrieve status information from %s; %s',
+                                   source_name, err)
+        except FuturesTimeoutError:
+            for future, module_instance in futures.items():
+                if not future.done():
+                    LOGGER.warning('Timed out after %s seconds waiting for status information from %s.',
+                                   module_timeout, module_instance.source_name)
+
+        for source_name, elapsed in module_timings.items():
+            LOGGER.debug('Retrieved status information from %s in %.2f seconds.', source_name, elapsed)
 
         return list(items_by_primary_key.values())
 
@@ -352,9 +424,19 @@ class HSMStatusModule(StatusModule):
     source_name = 'HSM'
     primary = True
 
-    def __init__(self, *, session, component_types, **_):
+    def __init__(self, *, session, component_types, hsm_params=None, **_):
+        """Construct an HSMStatusModule.
+
+        Args:
+            session (sat.session.SATSession): a session for connecting to the
+                API gateway
+            component_types (list of str): the component types to query
+            hsm_params (dict): additional query parameters which narrow the
+                components retrieved from HSM, e.g. {'state': 'Off'}
+        """
         super().__init__(session=session)
         self.component_types = [] if 'all' in component_types else component_types
+        self.hsm_params = hsm_params or {}
 
     @staticmethod
     def map_heading(heading):
@@ -370,8 +452,19 @@ class HSMStatusModule(StatusModule):
     @property
     def rows(self):
         hsm_client = HSMClient(self.session)
+        params = {'type': self.component_types}
         try:
-            response = hsm_client.get('State', 'Components', params={'type': self.component_types})
+            if self.hsm_params:
+                try:
+                    response = hsm_client.get('State', 'Components', params={**params, **self.hsm_params})
+                except APIError as err:
+                    # HSM rejects values it does not recognize, e.g. an unknown
+                    # state, so fall back to filtering all components locally.
+                    LOGGER.debug('Request to HSM API with parameters %s failed; retrying '
+                                 'without them: %s', self.hsm_params, err)
+                    response = hsm_client.get('State', 'Components', params=params)
+            else:
+                response = hsm_client.get('State', 'Components', params=params)
         except APIError as err:
             raise StatusModuleException(f'Request to HSM API failed: {err}') from err
 
@@ -450,6 +543,59 @@ class CFSStatusModule(StatusModule):
         return cfs_response
 
 
+def resolve_resources(keys, get_all, get_one, key_field, description, max_workers=10):
+    """Retrieve each distinct resource identified by the given keys once.
+
+    The resources are looked up in a single listing of all resources first.
+    Any resources not found in the listing, or all resources if the listing
+    cannot be retrieved, are then retrieved individually with at most
+    `max_workers` concurrent requests.
+
+    Args:
+        keys (Iterable[str]): the keys identifying the resources. Duplicate
+            and empty keys are ignored.
+        get_all (Callable[[], list of dict]): a function which lists all
+            resources
+        get_one (Callable[[str], dict]): a function which retrieves a single
+            resource given its key
+        key_field (str): the field of each listed resource containing its key
+        description (str): a description of the type of resource, used in
+            log messages
+        max_workers (int): the maximum number of concurrent requests for
+            individual resources
+
+    Returns:
+        dict: a mapping from each key which could be resolved to its resource
+    """
+    keys = {key for key in keys if key}
+    if not keys:
+        return {}
+
+    resolved = {}
+    try:
+        for resource in get_all():
+            if resource.get(key_field) in keys:
+                resolved[resource[key_field]] = resource
+    except APIError as err:
+        LOGGER.debug('Could not list all %ss; retrieving them individually: %s', description, err)
+
+    unresolved = keys - set(resolved)
+    if not unresolved:
+        return resolved
+
+    LOGGER.debug('Retrieving %d %ss individually.', len(unresolved), description)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unresolved))) as executor:
+        futures = {executor.submit(get_one, key): key for key in unresolved}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                resolved[key] = future.result()
+            except APIError as err:
+                LOGGER.warning('Could not retrieve %s %s: %s', description, key, err)
+
+    return resolved
+
+
 class BOSStatusModule(StatusModule):
     """Module for retrieving boot status information from BOS"""
     headings = ['xname', 'Boot Status', 'Most Recent BOS Session', 'Most Recent Session Template', 'Most Recent Image']
@@ -462,15 +608,16 @@ class BOSStatusModule(StatusModule):
             return (False, 'BOS v2 is required to retrieve component boot status')
         return (True, None)
 
-    def get_image_for_component(self, raw_component):
-        """Helper function to query the image name given a component dict from BOS.
+    @staticmethod
+    def get_image_id_for_component(raw_component):
+        """Helper function to get the IMS image ID given a component dict from BOS.
 
         Args:
             raw_component (dict): a component dictionary returned from BOS v2
 
         Returns:
-            str: the name of the IMS image currently booted on the given
-                component, or MISSING_VALUE if it cannot be identified
+            str or None: the ID of the IMS image currently booted on the given
+                component, or None if it cannot be identified
         """
 
         # To get a human readable name for each booted image, IMS is
@@ -480,33 +627,38 @@ class BOSStatusModule(StatusModule):
         #
         # TODO: This seems a bit fragile but BOS doesn't appear to provide
         # this information anywhere else.
-
-        ims_client = IMSClient(self.session)
-        booted_image = MISSING_VALUE
-
         kernel_path = get_val_by_path(raw_component, 'actual_state.boot_artifacts.kernel')
         if kernel_path:
-            img_id = urlparse(kernel_path).path.split('/')[1]
-            try:
-                booted_image = ims_client.get_image(img_id)['name']
-
-            except APIError as err:
-                LOGGER.warning('Could not retrieve image name for component %s: %s',
-                               raw_component['xname'], err)
-            except KeyError as err:
-                LOGGER.warning('Image %s missing "%s" field in IMS response',
-                               img_id, err)
-        return booted_image
+            return urlparse(kernel_path).path.split('/')[1]
+        return None
 
     @property
     def rows(self):
         bos_client = BOSClientCommon.get_bos_client(self.session, version='v2')
+        ims_client = IMSClient(self.session)
 
         try:
             raw_components = bos_client.get_components()
         except APIError as err:
             raise StatusModuleException(f'Failed to query BOS for component information: {err}') from err
 
+        if any('id' not in raw_component for raw_component in raw_components):
+            raise StatusModuleException('A component in BOS response is missing the "id" field')
+
+        # Many components share the same image, session, and session template,
+        # so each distinct one is retrieved only once and then joined locally.
+        image_ids = {raw_component['id']: self.get_image_id_for_component(raw_component)
+                     for raw_component in raw_components}
+        images = resolve_resources(image_ids.values(),
+                                   lambda: ims_client.get_matching_resources('image'),
+                                   ims_client.get_image, 'id', 'IMS image')
+        sessions = resolve_resources((raw_component.get('session') for raw_component in raw_components),
+                                     bos_client.get_sessions, bos_client.get_session,
+                                     'name', 'BOS session')
+        templates = resolve_resources((session.get('template_name') for session in sessions.values()),
+                                      bos_client.get_session_templates, bos_client.get_session_template,
+                                      'name', 'BOS session template')
+
         headings_to_paths = {
             'xname': 'id',
             'Most Recent BOS Session': 'session',
@@ -515,47 +667,38 @@ class BOSStatusModule(StatusModule):
 
         components = []
         for raw_component in raw_components:
-            if 'id' not in raw_component:
-                raise StatusModuleException('A component in BOS response is missing the "id" field')
-
             component = {
                 heading: get_val_by_path(raw_component, path) or MISSING_VALUE
                 for heading, path in headings_to_paths.items()
             }
-            component['Most Recent Image'] = self.get_image_for_component(raw_component)
-
-            # Another request to BOS is needed in order to retrieve the
-            # session template used with each session.
             component_xname = component['xname']
-            try:
-                session_id = raw_component.get('session')
-                if not session_id:
-                    if session_id is None:
-                        LOGGER.warning('"session" key missing from BOS response for component %s',
-                                       component_xname)
-                    continue
+            components.append(component)
 
+            image_id = image_ids[component_xname]
+            component['Most Recent Image'] = MISSING_VALUE
+            if image_id in images:
                 try:
-                    component_session = bos_client.get_session(session_id)
-                except APIError as err:
-                    LOGGER.warning('Could not retrieve BOS session for component %s: %s',
-                                   component_xname, err)
-                    continue
+                    component['Most Recent Image'] = images[image_id]['name']
+                except KeyError as err:
+                    LOGGER.warning('Image %s missing "%s" field in IMS response',
+                                   image_id, err)
 
-                try:
-                    template_name = component_session['template_name']
-                    component['Most Recent Session Template'] = bos_client.get_session_template(template_name)['name']
-                except APIError as err:
-                    LOGGER.warning('Could not retrieve BOS session template for component %s with session %s: %s',
-                                   component_xname, session_id, err)
+            session_id = raw_component.get('session')
+            if not session_id:
+                if session_id is None:
+                    LOGGER.warning('"session" key missing from BOS response for component %s',
+                                   component_xname)
+                continue
 
-                except KeyError as err:
-                    LOGGER.warning('"%s" key missing from BOS response for component %s',
-                                   err, component_xname)
-                    continue
-            finally:
-                # This finally block always runs regardless of whether the
-                # loop was prematurely `continue`d or not.
-                components.append(component)
+            if session_id not in sessions:
+                continue
+
+            try:
+                template_name = sessions[session_id]['template_name']
+                if template_name in templates:
+                    component['Most Recent Session Template'] = templates[template_name]['name']
+            except KeyError as err:
+                LOGGER.warning('"%s" key missing from BOS response for component %s',
+                               err, component_xname)
 
         return components
@@ -0,0 +1,212 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Repeated retrieval of status with reporting of changed rows.
+"""
+from datetime import datetime
+import json
+import logging
+import time
+
+from sat.report import Report
+from sat.util import SATEncoder
+
+LOGGER = logging.getLogger(__name__)
+
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+
+def get_rows_by_key(reports, primary_key):
+    """Get the rows displayed by the given reports, keyed by primary key.
+
+    The primary key is included in each row even if it is not one of the
+    headings displayed by the report.
+
+    Args:
+        reports ([Report]): the reports containing the rows
+        primary_key (str): the heading whose values identify the rows
+
+    Returns:
+        dict: a mapping from the string value of the primary key of each row
+            which matches the report filters to a tuple of the report and the
+            displayed row with its primary key
+    """
+    rows_by_key = {}
+    for report in reports:
+        headings = report.display_headings
+        if primary_key not in headings:
+            headings = [primary_key] + headings
+        try:
+            rows = report.get_selected_rows(headings)
+        except (KeyError, TypeError) as err:
+            LOGGER.error('Could not filter rows of status report: %s', err)
+            continue
+
+        for row in rows:
+            rows_by_key[str(row[primary_key])] = (report, row)
+    return rows_by_key
+
+
+def diff_rows(previous, current):
+    """Compute the changes between two sets of rows.
+
+    Args:
+        previous (dict): a mapping from key to (report, row), as returned by
+            get_rows_by_key(), from the previous time status was retrieved
+        current (dict): the same mapping for the current status
+
+    Returns:
+        list of dict: a change event for each row which was added, removed, or
+            changed. Each event has the keys 'event', 'key', 'report' and
+            'row', where 'row' is the current row, or the previous row if the
+            row was removed. Events for changed rows also have a 'changes' key
+            mapping each changed heading to a dict with 'old' and 'new' values.
+    """
+    events = []
+    for key, (report, row) in current.items():
+        if key not in previous:
+            events.append({'event': ADDED, 'key': key, 'report': report, 'row': row})
+            continue
+
+        previous_row = previous[key][1]
+        changes = {
+            heading: {'old': previous_row.get(heading), 'new': value}
+            for heading, value in row.items()
+            if previous_row.get(heading) != value
+        }
+        if changes:
+            events.append({'event': CHANGED, 'key': key, 'report': report,
+                           'row': row, 'changes': changes})
+
+    for key, (report, row) in previous.items():
+        if key not in current:
+            events.append({'event': REMOVED, 'key': key, 'report': report, 'row': row})
+
+    return events
+
+
+def format_ndjson_events(events, timestamp):
+    """Format change events as newline-delimited JSON.
+
+    Args:
+        events (list of dict): change events as returned by diff_rows()
+        timestamp (str): the time at which the changes were detected
+
+    Returns:
+        str: one JSON object per line for each event
+    """
+    lines = []
+    for event in events:
+        serialized = {'time': timestamp, 'event': event['event'], 'row': event['row']}
+        if 'changes' in event:
+            serialized['changes'] = event['changes']
+        lines.append(json.dumps(serialized, cls=SATEncoder))
+    return '\n'.join(lines)
+
+
+def format_pretty_events(events, timestamp, primary_key):
+    """Format change events as tables of the changed rows.
+
+    A table is created for each report with changes, containing the current
+    values of added and changed rows and the last values of removed rows.
+
+    Args:
+        events (list of dict): change events as returned by diff_rows()
+        timestamp (str): the time at which the changes were detected
+        primary_key (str): the heading whose values identify the rows
+
+    Returns:
+        str: the formatted tables
+    """
+    reports = []
+    events_by_report = {}
+    for event in events:
+        events_by_report.setdefault(event['report'], []).append(event)
+
+    for report, report_events in events_by_report.items():
+        other_headings = [heading for heading in report.display_headings if heading != primary_key]
+        title = f'{report.title} Changes at {timestamp}' if report.title else f'Changes at {timestamp}'
+        changes_report = Report(
+            [primary_key, 'Change'] + other_headings, title,
+            sort_by=primary_key, no_headings=report.no_headings, no_borders=report.no_borders,
+            show_empty=True, show_missing=True
+        )
+        changes_report.add_rows([
+            {**event['row'], 'Change': event['event']}
+            for event in report_events
+        ])
+        reports.append(str(changes_report))
+
+    return '\n\n'.join(reports)
+
+
+def watch_status(get_reports, interval, primary_key, print_format='pretty', max_iterations=None):
+    """Repeatedly retrieve status and print the rows which changed.
+
+    In the 'pretty' format, the full reports are printed the first time, and
+    afterwards a table of the added, changed, and removed rows is printed
+    each time there are changes. In the 'ndjson' format, an event is printed
+    for each row which is added, changed, or removed, starting with an 'added'
+    event for every row the first time.
+
+    Args:
+        get_reports (Callable[[], list of Report]): a function which retrieves
+            the current status and returns it as a list of reports
+        interval (float): the number of seconds between each retrieval
+        primary_key (str): the heading whose values identify the rows
+        print_format (str): 'pretty' or 'ndjson'
+        max_iterations (None or int): if not None, the number of times to
+            retrieve status before returning. Otherwise, retrieve status until
+            interrupted.
+
+    Returns:
+        None
+    """
+    previous = None
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        start_time = time.monotonic()
+        timestamp = datetime.now().isoformat(timespec='seconds')
+
+        reports = get_reports()
+        current = get_rows_by_key(reports, primary_key)
+
+        if previous is None and print_format == 'pretty':
+            print('\n\n'.join(str(report) for report in reports), flush=True)
+        else:
+            events = diff_rows(previous or {}, current)
+            LOGGER.debug('Found %d changed rows at %s.', len(events), timestamp)
+            if events:
+                if print_format == 'ndjson':
+                    output = format_ndjson_events(events, timestamp)
+                else:
+                    output = format_pretty_events(events, timestamp, primary_key)
+                print(output, flush=True)
+
+        previous = current
+        iteration += 1
+        if max_iterations is None or iteration < max_iterations:
+            time.sleep(max(0, interval - (time.monotonic() - start_time)))
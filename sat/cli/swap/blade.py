@@ -265,6 +265,31 @@ class RedfishEndpointDiscoveryWaiter(GroupWaiter):
             if not any('404' in arg for arg in err.args):
                 raise WaitingFailure(f'Could not query Redfish endpoint for {member}: {err}')
 
+    def members_have_completed(self, members):
+        """Check the discovery status of all the given Redfish endpoints with one query.
+
+        Endpoints which do not exist yet are still pending. If the endpoints
+        cannot be queried at once, each one is queried separately instead.
+
+        Args:
+            members (set): the xnames of the Redfish endpoints to check
+
+        Returns:
+            tuple of (set, set): the endpoints which have been discovered,
+                and the empty set.
+        """
+        try:
+            endpoints = self.hsm_client.get_redfish_endpoints(members)
+        except APIError as err:
+            LOGGER.debug('Could not query Redfish endpoints at once: %s', err)
+            return super().members_have_completed(members)
+
+        completed = {
+            endpoint['ID'] for endpoint in endpoints
+            if endpoint.get('DiscoveryInfo', {}).get('LastDiscoveryStatus') == 'DiscoverOK'
+        }
+        return completed & set(members), set()
+
 
 class SwapOutProcedure(BladeSwapProcedure):
     """The blade removal portion of the blade swap procedure."""
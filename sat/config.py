@@ -94,6 +94,80 @@ def validate_bos_api_version(version):
         )
 
 
+def validate_polling_strategy(strategy):
+    """Validates the given polling strategy name.
+
+    Args:
+        strategy (str): the name of the polling strategy to validate
+
+    Returns:
+        None
+
+    Raises:
+        ConfigValidationError: if `strategy` is not a valid polling strategy
+    """
+    valid_polling_strategies = ['fixed', 'backoff', 'expected']
+    if strategy not in valid_polling_strategies:
+        raise ConfigValidationError(
+            f'Polling strategy "{strategy}" is not one of the valid '
+            f'polling strategies: {", ".join(valid_polling_strategies)}'
+        )
+
+
+def validate_poll_jitter(jitter):
+    """Validates the given polling jitter.
+
+    Args:
+        jitter (float): the fraction by which poll intervals may vary
+
+    Returns:
+        None
+
+    Raises:
+        ConfigValidationError: if `jitter` is not at least 0 and less than 1
+    """
+    if not 0 <= jitter < 1:
+        raise ConfigValidationError(
+            f'Poll jitter {jitter} must be at least 0 and less than 1.'
+        )
+
+
+def validate_cabinet_batch_size(batch_size):
+    """Validates the given number of cabinets per power batch.
+
+    Args:
+        batch_size (int): the number of cabinets in each batch, or 0 for all
+
+    Returns:
+        None
+
+    Raises:
+        ConfigValidationError: if `batch_size` is negative
+    """
+    if batch_size < 0:
+        raise ConfigValidationError(
+            f'Cabinet batch size {batch_size} must be at least 0.'
+        )
+
+
+def validate_max_concurrent_cabinet_batches(max_batches):
+    """Validates the given maximum number of cabinet batches powered at once.
+
+    Args:
+        max_batches (int): the maximum number of batches powered at once
+
+    Returns:
+        None
+
+    Raises:
+        ConfigValidationError: if `max_batches` is less than 1
+    """
+    if max_batches < 1:
+        raise ConfigValidationError(
+            f'Maximum concurrent cabinet batches {max_batches} must be at least 1.'
+        )
+
+
 SAT_CONFIG_SPEC = {
     'api_gateway': {
         'host': OptionSpec(str, 'api-gw-service-nmn.local', None, None),
@@ -108,6 +182,11 @@ SAT_CONFIG_SPEC = {
     'bootsys': {
         'max_hsn_states': OptionSpec(int, 10, None, None),
         'max_pod_states': OptionSpec(int, 10, None, None),
+        'max_poll_interval': OptionSpec(int, 60, None, None),
+        'poll_jitter': OptionSpec(float, 0.0, validate_poll_jitter, None),
+        'cabinet_batch_size': OptionSpec(int, 0, validate_cabinet_batch_size, 'cabinet_batch_size'),
+        'max_concurrent_cabinet_batches': OptionSpec(int, 1, validate_max_concurrent_cabinet_batches,
+                                                     'max_concurrent_cabinet_batches'),
         'bos_templates': OptionSpec(list, [], None, 'bos_templates'),
         'cle_bos_template': OptionSpec(str, '', None, 'cle_bos_template'),
         'uan_bos_template': OptionSpec(str, '', None, 'uan_bos_template')
@@ -138,10 +217,17 @@ SAT_CONFIG_SPEC = {
 def _add_bootsys_timeouts(config_spec):
     bootsys_timeout_opts = {}
     for ts in TIMEOUT_SPECS:
-        underscore_option = f'{ts.option_prefix.replace("-", "_")}_timeout'
+        underscore_prefix = ts.option_prefix.replace("-", "_")
+        underscore_option = f'{underscore_prefix}_timeout'
         bootsys_timeout_opts[underscore_option] = OptionSpec(
             int, ts.default, None, underscore_option
         )
+        bootsys_timeout_opts[f'{underscore_prefix}_polling'] = OptionSpec(
+            str, 'fixed', validate_polling_strategy, None
+        )
+        bootsys_timeout_opts[f'{underscore_prefix}_expected_duration'] = OptionSpec(
+            int, 0, None, None
+        )
     config_spec['bootsys'].update(bootsys_timeout_opts)
 
 
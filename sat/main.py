@@ -35,11 +35,29 @@ import argcomplete
 from sat.config import ConfigFileExistsError, DEFAULT_CONFIG_PATH, generate_default_config, load_config
 from sat.logging import bootstrap_logging, configure_logging
 from sat.parser import create_parent_parser
+from sat.timeline import enable_timeline
 from sat.util import ensure_permissions, get_resource_section_path
 
 LOGGER = logging.getLogger(__name__)
 
 
+def write_timeline(timeline, path, timeline_format):
+    """Write the timeline of the time spent waiting to a file.
+
+    Args:
+        timeline (sat.timeline.Timeline): the timeline to write
+        path (str): the path of the file to write
+        timeline_format (str): the format of the file
+    """
+    try:
+        timeline.write(path, timeline_format)
+    except OSError as err:
+        LOGGER.error('Failed to write timeline to %s: %s', path, err)
+    else:
+        LOGGER.info('Wrote timeline of %d waited-for conditions to %s',
+                    len(timeline.waiter_timings), path)
+
+
 def main():
     """SAT Main.
 
@@ -117,7 +135,12 @@ def main():
                          args.command, args.command)
             sys.exit(1)
 
-        subcommand(args)
+        timeline = enable_timeline() if args.timeline else None
+        try:
+            subcommand(args)
+        finally:
+            if timeline is not None:
+                write_timeline(timeline, args.timeline, args.timeline_format)
 
     except KeyboardInterrupt:
         LOGGER.info("Received keyboard interrupt; quitting.", exc_info=True)
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -32,6 +32,7 @@ import sys
 import inflect
 
 import sat.cli
+from sat.timeline import TIMELINE_FORMATS
 
 
 def _unrecognized_msg(unknown, subcommand=None):
@@ -172,6 +173,21 @@ def create_parent_parser():
         metavar='TIMEOUT',
         type=int)
 
+    parser.add_argument(
+        '--timeline',
+        help='Record the time spent waiting for conditions during this run, '
+             'including when each component being waited for finished, and '
+             'write it to the given file.',
+        metavar='FILE')
+
+    parser.add_argument(
+        '--timeline-format',
+        help='The format of the file written by --timeline. "json" writes a '
+             'summary of each condition waited for, and "chrome" writes a '
+             'trace-event file which can be viewed with chrome://tracing or '
+             'Perfetto.',
+        choices=TIMELINE_FORMATS, default='json')
+
     subparsers = parser.add_subparsers(metavar='command', dest='command')
     sat.cli.build_out_subparsers(subparsers)
 
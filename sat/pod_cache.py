@@ -0,0 +1,301 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+A compact cache of the Kubernetes pods in the system.
+
+The cache is populated by listing all pods once, and it can then be kept up to
+date by watching for changes to pods from the resource version of the list,
+like a Kubernetes informer. Only the fields of each pod used by SAT are kept,
+and responses from the Kubernetes API are parsed as JSON rather than being
+deserialized into kubernetes model objects.
+"""
+from collections import defaultdict, namedtuple
+import json
+import logging
+from threading import Event, Lock, Thread
+
+from kubernetes.client.rest import ApiException
+from kubernetes.watch.watch import HTTP_STATUS_GONE, iter_resp_lines
+from urllib3.exceptions import HTTPError
+
+LOGGER = logging.getLogger(__name__)
+
+# The fields of a pod kept in the cache
+CachedPod = namedtuple('CachedPod', ['namespace', 'name', 'phase', 'node', 'template_hash'])
+
+
+def get_cached_pod(pod):
+    """Get the fields of a pod which are kept in the cache.
+
+    Args:
+        pod (dict): the pod as returned as JSON by the Kubernetes API
+
+    Returns:
+        CachedPod: the cached fields of the pod
+    """
+    metadata = pod['metadata']
+    return CachedPod(
+        metadata['namespace'],
+        metadata['name'],
+        pod.get('status', {}).get('phase'),
+        pod.get('spec', {}).get('nodeName'),
+        (metadata.get('labels') or {}).get('pod-template-hash')
+    )
+
+
+class PodCache:
+    """A cache of the namespace, name, phase and node of every pod.
+
+    Attributes:
+        pods (dict): a mapping from (namespace, name) to the CachedPod
+        resource_version (str): the resource version of the pods in the cache,
+            or None if the pods need to be listed
+    """
+
+    # The number of pods requested in each page of the list of all pods
+    LIST_PAGE_SIZE = 500
+
+    # The number of seconds after which the API server ends each watch
+    WATCH_TIMEOUT_SECS = 300
+
+    # The number of seconds to wait for the response to a watch before giving
+    # up, in case the API server does not end the watch at its timeout
+    WATCH_REQUEST_TIMEOUT_SECS = WATCH_TIMEOUT_SECS + 30
+
+    # The number of seconds to wait before retrying after a failed watch
+    RETRY_DELAY_SECS = 5
+
+    def __init__(self, k8s_api):
+        """Create a new PodCache.
+
+        Args:
+            k8s_api (kubernetes.client.CoreV1Api): the Kubernetes API client
+        """
+        self.k8s_api = k8s_api
+        self.pods = {}
+        self.resource_version = None
+        self._listeners = []
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    def add_listener(self, listener):
+        """Add a function to call when a pod is added, changed or deleted.
+
+        The function is called with the (namespace, name) of the pod and the
+        CachedPod, or None if the pod was deleted. While the cache is being
+        watched, it is called from the thread which watches the pods.
+
+        Args:
+            listener (callable): the function to call
+        """
+        self._listeners.append(listener)
+
+    def _set_pod(self, key, pod):
+        """Update a pod in the cache and notify listeners if it changed.
+
+        Args:
+            key (tuple): the (namespace, name) of the pod
+            pod (CachedPod): the pod, or None if it was deleted
+        """
+        with self._lock:
+            old_pod = self.pods.pop(key, None)
+            if pod is not None:
+                self.pods[key] = pod
+        if old_pod != pod:
+            for listener in self._listeners:
+                listener(key, pod)
+
+    def list(self):
+        """List all pods and replace the contents of the cache.
+
+        Raises:
+            ApiException: if the request to the Kubernetes API fails
+            urllib3.exceptions.HTTPError: if the connection fails
+            ValueError: if the response is not valid JSON
+            KeyError: if the response is missing required fields
+        """
+        pods = {}
+        continue_token = None
+        while True:
+            kwargs = {'limit': self.LIST_PAGE_SIZE, '_preload_content': False}
+            if continue_token:
+                kwargs['_continue'] = continue_token
+            pod_list = json.loads(self.k8s_api.list_pod_for_all_namespaces(**kwargs).data)
+            for pod in pod_list.get('items') or []:
+                cached_pod = get_cached_pod(pod)
+                pods[(cached_pod.namespace, cached_pod.name)] = cached_pod
+            continue_token = pod_list['metadata'].get('continue')
+            if not continue_token:
+                break
+
+        for key in set(self.pods) - set(pods):
+            self._set_pod(key, None)
+        for key, pod in pods.items():
+            self._set_pod(key, pod)
+        self.resource_version = pod_list['metadata'].get('resourceVersion')
+
+    def handle_event(self, event):
+        """Update the cache from an event received from a watch of all pods.
+
+        Args:
+            event (dict): the event received from the Kubernetes API
+
+        Raises:
+            KeyError: if the event is missing required fields
+        """
+        event_type = event['type']
+        obj = event['object']
+        if event_type == 'ERROR':
+            if obj.get('code') != HTTP_STATUS_GONE:
+                LOGGER.warning('Error received while watching pods: %s', obj.get('message'))
+            # The pods must be listed again before watching again.
+            self.resource_version = None
+            return
+
+        self.resource_version = obj['metadata']['resourceVersion']
+        if event_type == 'BOOKMARK':
+            return
+
+        pod = get_cached_pod(obj)
+        self._set_pod((pod.namespace, pod.name), None if event_type == 'DELETED' else pod)
+
+    def watch(self, stopped=None):
+        """Watch for changes to pods from the current resource version.
+
+        This returns when the watch times out or fails, or when the cache is
+        stopped.
+
+        Args:
+            stopped (threading.Event): the event which is set when the watch
+                should stop. Defaults to the event of the current run.
+
+        Raises:
+            ApiException: if the request to the Kubernetes API fails
+            urllib3.exceptions.HTTPError: if the connection fails
+            ValueError: if an event is not valid JSON
+            KeyError: if an event is missing required fields
+        """
+        response = self.k8s_api.list_pod_for_all_namespaces(
+            watch=True, resource_version=self.resource_version, allow_watch_bookmarks=True,
+            timeout_seconds=self.WATCH_TIMEOUT_SECS, _preload_content=False,
+            _request_timeout=self.WATCH_REQUEST_TIMEOUT_SECS
+        )
+        if stopped is None:
+            stopped = self._stopped
+        try:
+            for line in iter_resp_lines(response):
+                if stopped.is_set():
+                    return
+                self.handle_event(json.loads(line))
+                if self.resource_version is None:
+                    return
+        finally:
+            response.release_conn()
+
+    def _run(self, stopped):
+        """List and watch pods until the given event is set.
+
+        Args:
+            stopped (threading.Event): the event which is set when the cache
+                is stopped
+        """
+        while not stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self.list()
+                self.watch(stopped)
+                continue
+            except ApiException as err:
+                if err.status == HTTP_STATUS_GONE:
+                    self.resource_version = None
+                    continue
+                LOGGER.warning('Failed to watch pods: %s', err)
+            except (HTTPError, ValueError, KeyError) as err:
+                LOGGER.warning('Failed to watch pods: %s', err)
+            stopped.wait(self.RETRY_DELAY_SECS)
+
+    def start(self):
+        """Start keeping the cache up to date in a background thread.
+
+        If the pods have not been listed yet, they are listed by the thread
+        before it starts watching them. Each start uses a new stop event, so a
+        thread from an earlier start which is still waiting on its watch exits
+        instead of running alongside the new one.
+        """
+        if self._thread is not None:
+            return
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, args=(self._stopped,), name='pod-cache',
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop keeping the cache up to date.
+
+        The background thread stops after the watch it is waiting on receives
+        its next event or times out. The cache can be started again before
+        then, and the old thread will not process any more events.
+        """
+        self._stopped.set()
+        self._thread = None
+
+    def get_phase(self, namespace, name):
+        """Get the phase of a pod.
+
+        Returns:
+            str: the phase of the pod, or None if it is not in the cache
+        """
+        pod = self.pods.get((namespace, name))
+        return pod.phase if pod else None
+
+    def get_phases_by_namespace(self):
+        """Get the phase of every pod grouped by namespace.
+
+        Returns:
+            defaultdict: a mapping from namespace to a dict mapping from pod
+                name to phase
+        """
+        with self._lock:
+            pods = list(self.pods.values())
+        phases = defaultdict(dict)
+        for pod in pods:
+            phases[pod.namespace][pod.name] = pod.phase
+        return phases
+
+    def get_pods_by_template_hash(self):
+        """Get the pods grouped by namespace and pod-template-hash label.
+
+        Returns:
+            defaultdict: a mapping from (namespace, pod-template-hash) to a
+                list of CachedPods sorted by name. Pods without the label are
+                omitted.
+        """
+        with self._lock:
+            pods = sorted(self.pods.values())
+        pods_by_template_hash = defaultdict(list)
+        for pod in pods:
+            if pod.template_hash is not None:
+                pods_by_template_hash[(pod.namespace, pod.template_hash)].append(pod)
+        return pods_by_template_hash
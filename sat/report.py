@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -299,6 +299,30 @@ class Report:
                         if heading in data_rows[0].keys()]
         return new_headings, data_rows
 
+    def get_selected_rows(self, headings=None):
+        """Creates a list of the sorted rows which match the filters.
+
+        Unlike get_rows_to_print(), empty and missing columns are not removed,
+        and errors are not handled.
+
+        Args:
+            headings (list): the headings of the columns to return. If None,
+                the display_headings are returned.
+
+        Returns:
+            a list of OrderedDicts containing sorted rows which match the
+            filters given in the filter strings of the Report.
+
+        Raises:
+            KeyError: if a filter refers to a field which is not present
+            TypeError: if a filter compares values of incompatible types
+        """
+        if headings is None:
+            headings = self.display_headings
+        self.sort_data()
+        return [OrderedDict(zip(headings, [row[column] for column in headings]))
+                for row in filter(self.filter_fn, self.data)]
+
     def get_rows_to_print(self):
         """Creates a list of rows to print.
 
@@ -311,11 +335,8 @@ class Report:
             returned are limited to those in the display_headings minus those
             whose rows contain only EMPTY or MISSING.
         """
-
-        self.sort_data()
         try:
-            selected = [OrderedDict(zip(self.display_headings, [row[column] for column in self.display_headings]))
-                        for row in filter(self.filter_fn, self.data)]
+            selected = self.get_selected_rows()
         except KeyError as err:
             LOGGER.error('The query key "%s" does not match '
                          'any fields in the input; returning no output.',
@@ -0,0 +1,186 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Resolution of the nodes targeted by the boot sets of BOS session templates.
+"""
+from collections import defaultdict
+import hashlib
+import json
+import logging
+
+from sat.apiclient.gateway import APIError
+from sat.cached_property import cached_property
+from sat.xname import XName
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TemplateMembership:
+    """The nodes targeted by the boot sets of a session template."""
+
+    def __init__(self, nodes_by_xname):
+        """Create a new TemplateMembership.
+
+        Args:
+            nodes_by_xname (dict): a mapping from XName to the HSM component
+                of each node targeted by the session template
+        """
+        self.nodes_by_xname = nodes_by_xname
+
+    @cached_property
+    def xnames(self):
+        """set of str: the xnames of the nodes in the session template"""
+        return {node['ID'] for node in self.nodes_by_xname.values()}
+
+    @cached_property
+    def nodes_by_state(self):
+        """dict: a mapping from HSM state to a sorted list of xnames in that state"""
+        nodes_by_state = defaultdict(list)
+        for xname, node in sorted(self.nodes_by_xname.items(), key=lambda item: item[0].tokens):
+            nodes_by_state[node.get('State')].append(node['ID'])
+        return dict(nodes_by_state)
+
+    def __contains__(self, xname):
+        return XName(str(xname)) in self.nodes_by_xname
+
+
+class TemplateMembershipResolver:
+    """Resolves the nodes in session templates' boot sets from one HSM download.
+
+    HSM node components, and HSM groups if any boot set refers to a node
+    group, are each retrieved once per resolver. The boot sets of every
+    session template are then expanded locally, and the result is cached by
+    the content of the boot sets.
+    """
+
+    def __init__(self, hsm_client):
+        """Create a new TemplateMembershipResolver.
+
+        Args:
+            hsm_client (sat.apiclient.HSMClient): the HSM client used to
+                retrieve node components and groups
+        """
+        self.hsm_client = hsm_client
+        self._membership_by_hash = {}
+
+    @cached_property
+    def node_components(self):
+        """dict: a mapping from XName to HSM component for all nodes
+
+        Raises:
+            APIError: if the nodes cannot be retrieved from HSM
+        """
+        try:
+            components = self.hsm_client.get('State', 'Components', params={'type': 'Node'}).json()['Components']
+            return {XName(component['ID']): component for component in components}
+        except ValueError as err:
+            raise APIError(f'Failed to get state of nodes due to bad JSON in response: {err}')
+        except KeyError as err:
+            raise APIError(f"Failed to get state of nodes due to missing '{err}' key in HSM response.")
+
+    @cached_property
+    def group_members(self):
+        """dict: a mapping from lowercase HSM group label to a set of member XNames
+
+        Raises:
+            APIError: if the groups cannot be retrieved from HSM
+        """
+        try:
+            groups = self.hsm_client.get('groups').json()
+            return {group['label'].lower(): {XName(member) for member in group['members'].get('ids', [])}
+                    for group in groups}
+        except ValueError as err:
+            raise APIError(f'Failed to get HSM groups due to bad JSON in response: {err}')
+        except (KeyError, AttributeError, TypeError) as err:
+            raise APIError(f'Failed to get HSM groups due to unexpected data in HSM response: {err}')
+
+    @staticmethod
+    def get_content_hash(session_template_data):
+        """Get a hash of the boot sets of a session template.
+
+        Args:
+            session_template_data (dict): the session template data from BOS
+
+        Returns:
+            str: a hash of the boot sets
+        """
+        boot_sets = session_template_data.get('boot_sets')
+        return hashlib.sha256(json.dumps(boot_sets, sort_keys=True).encode()).hexdigest()
+
+    def _get_boot_set_nodes(self, boot_set):
+        """Get the XNames of the nodes targeted by one boot set.
+
+        Args:
+            boot_set (dict): the boot set data
+
+        Returns:
+            set of XName: the nodes in the boot set
+        """
+        nodes = set()
+
+        node_list = {XName(xname) for xname in boot_set.get('node_list') or []}
+        nodes |= node_list & set(self.node_components)
+
+        roles = {role.lower() for role in boot_set.get('node_roles_groups') or []}
+        if roles:
+            nodes |= {xname for xname, component in self.node_components.items()
+                      if str(component.get('Role', '')).lower() in roles}
+
+        group_labels = boot_set.get('node_groups') or []
+        for group_label in group_labels:
+            members = self.group_members.get(group_label.lower(), set())
+            nodes |= members & set(self.node_components)
+
+        return nodes
+
+    def get_membership(self, session_template_data):
+        """Get the nodes targeted by all boot sets of a session template.
+
+        Args:
+            session_template_data (dict): the session template data from BOS
+
+        A session template without boot sets contains no nodes.
+
+        Returns:
+            TemplateMembership: the nodes in the session template
+
+        Raises:
+            APIError: if node components or groups cannot be retrieved from HSM
+        """
+        st_name = session_template_data.get('name')
+        content_hash = self.get_content_hash(session_template_data)
+        if content_hash not in self._membership_by_hash:
+            nodes = set()
+            for boot_set in session_template_data.get('boot_sets', {}).values():
+                for bs_field in ('node_list', 'node_roles_groups', 'node_groups'):
+                    if bs_field in boot_set and not boot_set[bs_field]:
+                        LOGGER.info("BOS session template '%s' has '%s' set to "
+                                    "an empty list.", st_name, bs_field)
+                nodes |= self._get_boot_set_nodes(boot_set)
+
+            self._membership_by_hash[content_hash] = TemplateMembership(
+                {xname: self.node_components[xname] for xname in nodes}
+            )
+
+        return self._membership_by_hash[content_hash]
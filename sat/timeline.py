@@ -0,0 +1,366 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Recording of the time spent waiting for conditions.
+
+Every Waiter records when it started and finished waiting, how many times it
+checked for completion, how many attempts it made, and why it failed, as well
+as when each member of a GroupWaiter began and finished. When a timeline is
+enabled with enable_timeline(), these records are collected so that they can
+be written to a file as JSON or as a Chrome trace-event file, which can be
+viewed with chrome://tracing or Perfetto.
+"""
+import json
+import logging
+from threading import Lock
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+TIMELINE_FORMATS = ('json', 'chrome')
+
+
+class MemberTiming:
+    """The timing of a single member of a GroupWaiter.
+
+    Attributes:
+        begin (float or None): the monotonic time at which waiting for the
+            member began, or None if it began when the Waiter started.
+        end (float or None): the monotonic time at which the member finished.
+        outcome (str or None): 'completed', 'failed', 'timed out', or None if
+            the member has not finished.
+        reason (str or None): the reason the member failed, if it failed.
+    """
+
+    def __init__(self):
+        self.begin = None
+        self.end = None
+        self.outcome = None
+        self.reason = None
+
+
+class WaiterTiming:
+    """The timing of waiting for a single Waiter.
+
+    Attributes:
+        name (str): the name of the condition waited for.
+        waiter_type (str): the name of the class of the Waiter.
+        start (float or None): the monotonic time at which waiting started.
+        end (float or None): the monotonic time at which waiting finished.
+        attempt_starts (list of float): the monotonic times at which each
+            waiting attempt began.
+        num_checks (int): the number of times completion was checked.
+        outcome (str or None): 'completed', 'failed', 'timed out', 'error',
+            or None if waiting has not finished.
+        reason (str or None): the reason waiting failed, if it failed.
+        members (dict): a mapping from the str of each member of a
+            GroupWaiter to its MemberTiming.
+    """
+
+    def __init__(self, waiter_type):
+        self.waiter_type = waiter_type
+        self.name = waiter_type
+        self.start = None
+        self.end = None
+        self.attempt_starts = []
+        self.num_checks = 0
+        self.outcome = None
+        self.reason = None
+        self.members = {}
+
+    def begin(self, name, now):
+        """Record that waiting began.
+
+        Args:
+            name (str): the name of the condition waited for
+            now (float): the current monotonic time
+        """
+        self.name = name
+        self.start = now
+        self.end = None
+        self.attempt_starts = []
+        self.num_checks = 0
+        self.outcome = None
+        self.reason = None
+        self.members = {}
+
+    def finish(self, now, outcome, reason=None):
+        """Record that waiting finished.
+
+        Members which have not finished are recorded as timed out.
+
+        Args:
+            now (float): the current monotonic time
+            outcome (str): the outcome of waiting
+            reason (str): the reason waiting failed, if it failed
+        """
+        self.end = now
+        self.outcome = outcome
+        if reason is not None:
+            self.reason = reason
+        for member_timing in self.members.values():
+            if member_timing.outcome is None:
+                member_timing.end = now
+                member_timing.outcome = 'timed out'
+
+    def _get_member(self, member):
+        return self.members.setdefault(str(member), MemberTiming())
+
+    def add_member(self, member):
+        """Record that a member is waited for from the time waiting started.
+
+        Args:
+            member: the member to add
+        """
+        self._get_member(member)
+
+    def member_began(self, member, now):
+        """Record that waiting for a member began.
+
+        Args:
+            member: the member which began
+            now (float): the current monotonic time
+        """
+        self._get_member(member).begin = now
+
+    def member_finished(self, member, now, outcome, reason=None):
+        """Record that a member finished.
+
+        Only the first time a member finishes is recorded, since a GroupWaiter
+        checks members which have completed again when it retries.
+
+        Args:
+            member: the member which finished
+            now (float): the current monotonic time
+            outcome (str): 'completed' or 'failed'
+            reason (str): the reason the member failed, if it failed
+        """
+        member_timing = self._get_member(member)
+        if member_timing.outcome is not None:
+            return
+        member_timing.end = now
+        member_timing.outcome = outcome
+        if reason is not None:
+            member_timing.reason = reason
+
+    def member_failure_reason(self, member, reason):
+        """Record why a member failed, before it is known to have finished.
+
+        Args:
+            member: the member which failed
+            reason (str): the reason the member failed
+        """
+        self._get_member(member).reason = reason
+
+
+class Timeline:
+    """A collection of the timings of Waiters.
+
+    Times are recorded using the monotonic clock, and converted to wall clock
+    times when exported.
+    """
+
+    def __init__(self):
+        self.waiter_timings = []
+        self._lock = Lock()
+        self._wall_clock_offset = time.time() - time.monotonic()
+
+    def add(self, waiter_timing):
+        """Add the timing of a Waiter to the timeline.
+
+        Args:
+            waiter_timing (WaiterTiming): the timing to add
+        """
+        with self._lock:
+            if not any(timing is waiter_timing for timing in self.waiter_timings):
+                self.waiter_timings.append(waiter_timing)
+
+    def _wall_clock(self, monotonic_time):
+        if monotonic_time is None:
+            return None
+        return monotonic_time + self._wall_clock_offset
+
+    @staticmethod
+    def _duration(start, end):
+        if start is None or end is None:
+            return None
+        return end - start
+
+    def to_dict(self):
+        """Get the timeline as a dictionary which can be serialized as JSON.
+
+        Times are given in seconds since the epoch, and durations in seconds.
+
+        Returns:
+            dict: the timeline
+        """
+        waiters = []
+        with self._lock:
+            waiter_timings = list(self.waiter_timings)
+
+        for timing in waiter_timings:
+            members = []
+            for member, member_timing in sorted(timing.members.items()):
+                begin = timing.start if member_timing.begin is None else member_timing.begin
+                members.append({
+                    'member': member,
+                    'begin': self._wall_clock(begin),
+                    'end': self._wall_clock(member_timing.end),
+                    'duration': self._duration(begin, member_timing.end),
+                    'outcome': member_timing.outcome,
+                    'reason': member_timing.reason,
+                })
+            waiters.append({
+                'condition': timing.name,
+                'type': timing.waiter_type,
+                'start': self._wall_clock(timing.start),
+                'end': self._wall_clock(timing.end),
+                'duration': self._duration(timing.start, timing.end),
+                'attempts': len(timing.attempt_starts),
+                'retries': max(len(timing.attempt_starts) - 1, 0),
+                'checks': timing.num_checks,
+                'outcome': timing.outcome,
+                'reason': timing.reason,
+                'members': members,
+            })
+
+        return {'waiters': waiters}
+
+    def to_chrome_trace(self):
+        """Get the timeline in the Chrome trace-event format.
+
+        Each Waiter is shown as a process, with the time spent waiting for the
+        Waiter as a whole on its first thread, and the time spent waiting for
+        each member of a GroupWaiter on a separate thread. Retries are shown
+        as instant events.
+
+        Returns:
+            dict: the trace events, which can be serialized as JSON.
+        """
+        with self._lock:
+            waiter_timings = [timing for timing in self.waiter_timings if timing.start is not None]
+        origin = min((timing.start for timing in waiter_timings), default=0)
+
+        def microseconds(monotonic_time):
+            return round((monotonic_time - origin) * 1e6)
+
+        def complete_event(name, pid, tid, start, end, args):
+            return {
+                'name': name, 'cat': 'waiter', 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': microseconds(start), 'dur': microseconds(end) - microseconds(start),
+                'args': args,
+            }
+
+        def metadata_event(name, pid, tid, value):
+            return {'name': name, 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': value}}
+
+        events = []
+        for pid, timing in enumerate(waiter_timings, start=1):
+            # Waiters which have not finished are shown up to the last check.
+            end = timing.end if timing.end is not None else max(
+                [timing.start] + [member.end for member in timing.members.values()
+                                  if member.end is not None]
+            )
+            events.append(metadata_event('process_name', pid, 0, timing.name))
+            events.append(metadata_event('thread_name', pid, 0, timing.waiter_type))
+            events.append(complete_event(timing.name, pid, 0, timing.start, end, {
+                'outcome': timing.outcome,
+                'reason': timing.reason,
+                'checks': timing.num_checks,
+                'attempts': len(timing.attempt_starts),
+            }))
+            for attempt_start in timing.attempt_starts[1:]:
+                events.append({'name': 'retry', 'cat': 'waiter', 'ph': 'i', 's': 'p',
+                               'pid': pid, 'tid': 0, 'ts': microseconds(attempt_start)})
+
+            for tid, (member, member_timing) in enumerate(sorted(timing.members.items()), start=1):
+                begin = timing.start if member_timing.begin is None else member_timing.begin
+                member_end = member_timing.end if member_timing.end is not None else end
+                events.append(metadata_event('thread_name', pid, tid, member))
+                events.append(complete_event(member, pid, tid, begin, member_end, {
+                    'outcome': member_timing.outcome,
+                    'reason': member_timing.reason,
+                }))
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path, timeline_format='json'):
+        """Write the timeline to a file.
+
+        Args:
+            path (str): the path of the file to write
+            timeline_format (str): 'json' or 'chrome'
+
+        Raises:
+            OSError: if the file cannot be written
+            ValueError: if the format is not valid
+        """
+        if timeline_format == 'json':
+            data = self.to_dict()
+        elif timeline_format == 'chrome':
+            data = self.to_chrome_trace()
+        else:
+            raise ValueError(f'Invalid timeline format: {timeline_format}')
+
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+
+_timeline = None
+
+
+def enable_timeline():
+    """Begin collecting the timings of all Waiters which begin waiting.
+
+    Returns:
+        Timeline: the timeline which collects the timings
+    """
+    global _timeline
+    _timeline = Timeline()
+    return _timeline
+
+
+def get_timeline():
+    """Get the timeline enabled with enable_timeline().
+
+    Returns:
+        Timeline or None: the timeline, or None if it is not enabled
+    """
+    return _timeline
+
+
+def record_waiter_timing(waiter_timing):
+    """Add the timing of a Waiter to the timeline, if it is enabled.
+
+    Args:
+        waiter_timing (WaiterTiming): the timing to add
+    """
+    if _timeline is not None:
+        _timeline.add(waiter_timing)
+
+
+def disable_timeline():
+    """Stop collecting the timings of Waiters."""
+    global _timeline
+    _timeline = None
@@ -27,6 +27,7 @@ Contains structures and code that is generally useful across all of SAT.
 from json.encoder import JSONEncoder
 import sys
 from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import timedelta
 from functools import partial
 from getpass import getpass
@@ -35,6 +36,7 @@ import math
 import os
 import os.path
 import re
+from threading import Thread
 import time
 
 # Logic borrowed from imps to get the most efficient YAML available
@@ -572,6 +574,40 @@ class BeginEndLogger:
         self.logger.log(self.level, 'END: %s. Duration: %s', self.msg, duration)
 
 
+def submit_daemon(func, *args, **kwargs):
+    """Call a function in a new daemon thread.
+
+    Unlike the worker threads of a concurrent.futures.ThreadPoolExecutor,
+    which are joined when the interpreter exits, a daemon thread which never
+    finishes does not prevent SAT from exiting. This is used when waiting for
+    the result is limited by a timeout, and a call which does not finish in
+    time is abandoned.
+
+    Args:
+        func (callable): the function to call
+        *args: positional arguments to pass to `func`
+        **kwargs: keyword arguments to pass to `func`
+
+    Returns:
+        concurrent.futures.Future: the future which is given the value
+            returned or the exception raised by `func`
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as err:
+            future.set_exception(err)
+        else:
+            future.set_result(result)
+
+    Thread(target=run, name=getattr(func, '__name__', None), daemon=True).start()
+    return future
+
+
 def is_subsequence(needle, haystack):
     """Checks if needle is a subsequence of haystack.
 
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -26,12 +26,20 @@ Common code for waiting for a condition.
 """
 
 import abc
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import heapq
+import itertools
 import logging
-from threading import Thread
+from queue import Empty, SimpleQueue
+import random
+from threading import Condition, Event, Lock, Thread
 import time
 
 import inflect
 
+from sat.timeline import WaiterTiming, record_waiter_timing
+from sat.util import submit_daemon
+
 
 inf = inflect.engine()
 LOGGER = logging.getLogger(__file__)
@@ -44,6 +52,359 @@ class WaitingFailure(Exception):
     command not working."""
 
 
+class PollingStrategy(metaclass=abc.ABCMeta):
+    """Determines how long a Waiter waits between checks for completion.
+
+    A Waiter which has a polling strategy also checks for completion one
+    final time when its timeout is reached, so that a condition reached
+    between the last regular check and the timeout is not missed.
+    """
+
+    def __init__(self, jitter=0.0):
+        """Create a new PollingStrategy.
+
+        Args:
+            jitter (float): the fraction by which each interval may randomly
+                be shortened or lengthened, so that many Waiters started at
+                once do not all check at the same times.
+
+        Raises:
+            ValueError: if jitter is not at least 0 and less than 1.
+        """
+        if not 0 <= jitter < 1:
+            raise ValueError(f'Jitter must be at least 0 and less than 1, not {jitter}.')
+        self.jitter = jitter
+
+    @abc.abstractmethod
+    def get_interval(self, waiter, elapsed, num_checks):
+        """Get the time to wait before the next check, without jitter.
+
+        Args:
+            waiter (Waiter): the Waiter which is polling
+            elapsed (float): the time, in seconds, since the current waiting
+                attempt began
+            num_checks (int): the number of checks made so far in the current
+                waiting attempt
+
+        Returns:
+            float: the time, in seconds, until the next check
+        """
+        raise NotImplementedError('{}.get_interval'.format(self.__class__.__name__))
+
+    def get_next_interval(self, waiter, elapsed, num_checks):
+        """Get the time to wait before the next check, with jitter applied.
+
+        Args:
+            waiter (Waiter): the Waiter which is polling
+            elapsed (float): the time, in seconds, since the current waiting
+                attempt began
+            num_checks (int): the number of checks made so far in the current
+                waiting attempt
+
+        Returns:
+            float: the time, in seconds, until the next check
+        """
+        interval = self.get_interval(waiter, elapsed, num_checks)
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return interval
+
+
+class FixedPolling(PollingStrategy):
+    """Checks at the poll interval of the Waiter."""
+
+    def get_interval(self, waiter, elapsed, num_checks):
+        return waiter.poll_interval
+
+
+class BackoffPolling(PollingStrategy):
+    """Checks at exponentially increasing intervals.
+
+    The first interval is the poll interval of the Waiter, and each
+    following interval is longer by a constant factor, up to a maximum.
+    """
+
+    def __init__(self, factor=2, max_interval=60, jitter=0.0):
+        """Create a new BackoffPolling.
+
+        Args:
+            factor (float): the factor by which each interval is longer than
+                the previous one
+            max_interval (float): the maximum interval, in seconds
+            jitter (float): see PollingStrategy
+        """
+        super().__init__(jitter=jitter)
+        self.factor = factor
+        self.max_interval = max_interval
+
+    def get_interval(self, waiter, elapsed, num_checks):
+        interval = waiter.poll_interval * self.factor ** max(num_checks - 1, 0)
+        return max(waiter.poll_interval, min(interval, self.max_interval))
+
+
+class ExpectedDurationPolling(PollingStrategy):
+    """Checks rarely at first, and frequently once completion is expected.
+
+    Until the expected duration has elapsed, each interval is half of the
+    time remaining until then, up to a maximum. Checks therefore become more
+    frequent as the expected duration approaches, and after it has elapsed,
+    the poll interval of the Waiter is used.
+    """
+
+    def __init__(self, expected_duration, max_interval=60, jitter=0.0):
+        """Create a new ExpectedDurationPolling.
+
+        Args:
+            expected_duration (float): the time, in seconds, in which the
+                awaited condition is expected to be reached
+            max_interval (float): the maximum interval, in seconds
+            jitter (float): see PollingStrategy
+        """
+        super().__init__(jitter=jitter)
+        self.expected_duration = expected_duration
+        self.max_interval = max_interval
+
+    def get_interval(self, waiter, elapsed, num_checks):
+        remaining = self.expected_duration - elapsed
+        return max(waiter.poll_interval, min(remaining / 2, self.max_interval))
+
+
+# The steps performed by a WaiterScheduler for a Waiter
+BEGIN_STEP = 'begin'
+START_STEP = 'start'
+CHECK_STEP = 'check'
+
+
+class WaiterScheduler:
+    """Drives any number of Waiters from a single polling loop.
+
+    Each Waiter is kept in a heap ordered by the time its next check is due.
+    The loop sleeps until the earliest of those times, and then performs
+    exactly one step for that Waiter: beginning to wait, starting the first
+    waiting attempt, checking for completion, or handling a timeout. Waiters
+    are therefore only checked when they are due, and no thread is needed
+    per Waiter.
+
+    The pre_wait_action() of a Waiter may be slow, for example if it runs a
+    command on a remote host, so it is run in a thread of its own unless the
+    Waiter says otherwise. The first waiting attempt starts once it returns,
+    and the pre-wait actions of other Waiters do not delay it.
+
+    A scheduler may either be run in the calling thread with `run()`, which
+    returns once every Waiter added to it has finished, or in the background,
+    in which case a single thread runs the loop as long as there is anything
+    to wait for.
+    """
+
+    def __init__(self, background=False):
+        """Create a new WaiterScheduler.
+
+        Args:
+            background (bool): if True, run the polling loop in a background
+                thread which is started when a Waiter is added.
+        """
+        self.background = background
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._thread = None
+        self._running_pre_waits = 0
+
+    def _schedule(self, waiter, due, step=CHECK_STEP):
+        """Add an entry to the queue for the given Waiter.
+
+        Args:
+            waiter (Waiter): the Waiter to schedule
+            due (float): the monotonic time at which the step is due
+            step (str): the step to perform for the Waiter
+        """
+        with self._condition:
+            # The counter breaks ties between entries due at the same time so
+            # that Waiters themselves are never compared.
+            heapq.heappush(self._queue, (due, next(self._counter), step, waiter))
+            self._condition.notify()
+
+    def _start_pre_wait_action(self, waiter):
+        """Run the pre_wait_action() of a Waiter in a new thread.
+
+        When the action returns, the Waiter is scheduled to start its first
+        waiting attempt. Any exception raised by the action is raised again
+        by that step in the polling loop.
+
+        Args:
+            waiter (Waiter): the Waiter whose pre-wait action is run
+        """
+        def run_pre_wait_action():
+            try:
+                waiter.pre_wait_action()
+            except Exception as err:
+                waiter._pre_wait_error = err
+            finally:
+                with self._condition:
+                    self._running_pre_waits -= 1
+                    self._schedule(waiter, float('-inf'), step=START_STEP)
+
+        with self._condition:
+            self._running_pre_waits += 1
+        Thread(target=run_pre_wait_action, daemon=True).start()
+
+    def add(self, waiter):
+        """Begin waiting for a Waiter.
+
+        The Waiter's pre_wait_action() is run by the polling loop, not by
+        this method.
+
+        Args:
+            waiter (Waiter): the Waiter to wait for
+        """
+        waiter._scheduler = self
+        waiter._done.clear()
+        with self._condition:
+            self._schedule(waiter, float('-inf'), step=BEGIN_STEP)
+            if self.background and self._thread is None:
+                self._thread = Thread(target=self.run)
+                self._thread.start()
+
+    def _finish(self, waiter, now, post_wait=True, outcome=None, reason=None):
+        """Stop waiting for a Waiter.
+
+        Args:
+            waiter (Waiter): the Waiter which is finished
+            now (float): the current monotonic time
+            post_wait (bool): if True, run the Waiter's post_wait_action()
+            outcome (str): the outcome recorded in the Waiter's timing. By
+                default, this is determined from the state of the Waiter.
+            reason (str): the reason waiting failed, if it failed
+        """
+        if outcome is None:
+            if waiter.completed:
+                outcome = 'completed'
+            elif waiter.failed is True:
+                outcome = 'failed'
+            else:
+                outcome = 'timed out'
+        waiter.timing.finish(now, outcome, reason)
+        try:
+            if post_wait:
+                waiter.post_wait_action()
+        finally:
+            waiter._done.set()
+
+    def _step(self, waiter, now, step):
+        """Perform a single step of waiting for a Waiter.
+
+        Args:
+            waiter (Waiter): the Waiter which is due
+            now (float): the current monotonic time
+            step (str): the step to perform for the Waiter
+
+        Raises:
+            Any exception other than WaitingFailure raised by the Waiter.
+        """
+        waiter._step_time = now
+        try:
+            if step == BEGIN_STEP:
+                waiter._begin_waiting(now)
+                if waiter._runs_pre_wait_in_thread():
+                    self._start_pre_wait_action(waiter)
+                    return
+                waiter.pre_wait_action()
+                step = START_STEP
+
+            if step == START_STEP:
+                if waiter._start_waiting():
+                    self._schedule(waiter, waiter._attempt_start)
+                else:
+                    # Allow pre_wait_action() to set completed to prevent
+                    # needless waiting.
+                    self._finish(waiter, now, post_wait=False)
+                return
+
+            # Every attempt checks at least once, even if the timeout has
+            # already elapsed by the time of its first check.
+            timed_out = waiter._attempt_timed_out(now)
+            if not timed_out or waiter.polling_strategy is not None or not waiter._num_checks:
+                waiter._num_checks += 1
+                waiter.timing.num_checks += 1
+                if waiter._check():
+                    self._finish(waiter, now)
+                    return
+                if not timed_out:
+                    self._schedule(waiter, waiter._get_next_check_time(now))
+                    return
+
+            if waiter._retry_after_timeout():
+                # The retry action may be slow, so the attempt starts after it.
+                waiter._begin_attempt(time.monotonic())
+                self._schedule(waiter, waiter._attempt_start)
+            else:
+                self._finish(waiter, now)
+
+        except WaitingFailure as err:
+            waiter.failed = True
+            LOGGER.error('Could not wait for condition "%s": %s', waiter.condition_name(), err)
+            self._finish(waiter, now, outcome='failed', reason=str(err))
+
+    def run(self):
+        """Run the polling loop until every Waiter added to it has finished.
+
+        Raises:
+            Any exception other than WaitingFailure raised by a Waiter when
+            the scheduler is not running in the background. Exceptions raised
+            in the background are logged, and the Waiter raising them is
+            considered finished.
+        """
+        while True:
+            with self._condition:
+                if not self._queue:
+                    if not self._running_pre_waits:
+                        self._thread = None
+                        return
+                    self._condition.wait()
+                    continue
+
+                due = self._queue[0][0]
+                now = time.monotonic()
+                if due > now:
+                    if self.background or self._running_pre_waits:
+                        # Wake up early if another Waiter is added or a
+                        # pre-wait action finishes.
+                        self._condition.wait(due - now)
+                    else:
+                        time.sleep(due - now)
+                    continue
+
+                _, _, step, waiter = heapq.heappop(self._queue)
+
+            try:
+                self._step(waiter, now, step)
+            except Exception as err:
+                self._finish(waiter, now, post_wait=False, outcome='error', reason=str(err))
+                if not self.background:
+                    raise
+                LOGGER.error('Unexpected error waiting for condition "%s": %s',
+                             waiter.condition_name(), err)
+
+
+_background_scheduler = WaiterScheduler(background=True)
+
+
+def wait_for_all(waiters):
+    """Wait for all the given Waiters concurrently in the calling thread.
+
+    Args:
+        waiters (list of Waiter): the Waiters to wait for
+
+    Returns:
+        bool: True if all the Waiters completed, and False otherwise.
+    """
+    scheduler = WaiterScheduler()
+    for waiter in waiters:
+        scheduler.add(waiter)
+    scheduler.run()
+    return all(waiter.completed for waiter in waiters)
+
+
 class Waiter(metaclass=abc.ABCMeta):
     """Waits for a single condition to occur.
 
@@ -62,6 +423,10 @@ class Waiter(metaclass=abc.ABCMeta):
     in the code, though understanding what different states the Waiter can be in
     can help understand how the class works internally.
 
+    Waiting is driven by a WaiterScheduler, which calls the private step
+    methods of this class. Many Waiters can be waited for at once using
+    wait_for_all().
+
     Attributes:
         timeout (int): the timeout, in seconds, for the wait operation
         poll_interval (int): the interval, in seconds, between polls for
@@ -71,13 +436,29 @@ class Waiter(metaclass=abc.ABCMeta):
             this is 0, meaning the wait will only occur once.
         failed (bool): True if there was an irrecoverable failure waiting
             for the condition, False if waiting did not have issues.
+        polling_strategy (PollingStrategy or None): determines the time
+            between checks for completion. If None, checks are made every
+            poll_interval seconds.
+        timing (WaiterTiming): the times at which waiting started and
+            finished, the number of checks and attempts made, and the reason
+            waiting failed, if it failed.
     """
     def __init__(self, timeout, poll_interval=1, retries=0):
         self.timeout = timeout
         self.poll_interval = poll_interval
         self.completed = False
         self.failed = False
-        self._waiter_thread = None
+        self.polling_strategy = None
+
+        self._scheduler = None
+        self._waiting_async = False
+        self._attempt_start = None
+        self._num_checks = 0
+        self._step_time = None
+        self._pre_wait_error = None
+        self.timing = WaiterTiming(type(self).__name__)
+        self._done = Event()
+        self._done.set()
 
         if retries < 0:
             raise ValueError("Retries cannot be less than zero.")
@@ -132,100 +513,175 @@ class Waiter(metaclass=abc.ABCMeta):
         behaviors by overriding this method.
         """
 
-    def _wait_polling_loop(self):
-        """Internal helper function which implements the polling loop for a given Waiter class.
+    def _begin_waiting(self, now):
+        """Record that waiting has begun, before the pre-wait action is run.
 
-        This function essentially implements one waiting attempt, and different
-        implementations can be used to optimize waiting methods for different
-        situations, and should generally not be overwritten by client classes
-        outside this module.
+        Args:
+            now (float): the current monotonic time
         """
-        start_time = time.monotonic()
-        while time.monotonic() - start_time < self.timeout:
-            self.on_check_action()
+        self.timing.begin(self.condition_name(), now)
+        record_waiter_timing(self.timing)
+
+    def _runs_pre_wait_in_thread(self):
+        """Check whether pre_wait_action() should be run in a thread of its own.
 
-            # Store value in case we want to use it in post_wait_action.
-            self.completed = self.has_completed()
+        By default, it is run in a thread if it is overridden, since it may
+        then block, for example to run a command on a remote host.
 
-            if self.completed:
-                break
+        Returns:
+            bool: True if pre_wait_action() is run in a thread, and False if
+                it is run by the polling loop.
+        """
+        return type(self).pre_wait_action is not Waiter.pre_wait_action
 
-            time.sleep(self.poll_interval)
+    def _start_waiting(self):
+        """Begin the first waiting attempt once the pre-wait action has run.
 
-    def wait_for_completion(self):
-        """Wait for the condition to be achieved or for timeout.
+        The attempt starts at the current time, so the time taken by the
+        pre-wait action does not count towards the timeout.
 
         Returns:
-            bool: True if condition succeeded, False if timed out.
-        """
-        self.pre_wait_action()
+            bool: True if the condition needs to be waited for, or False if
+                pre_wait_action() found it to be completed already.
 
-        # Allow pre_wait_action() to set self.completed to prevent needless waiting.
+        Raises:
+            Any exception raised by pre_wait_action() in another thread.
+        """
+        err, self._pre_wait_error = self._pre_wait_error, None
+        if err is not None:
+            raise err
         if self.completed:
-            return True
+            return False
+        self._begin_attempt(time.monotonic())
+        return True
 
-        try:
-            while not self.completed:
-                self._wait_polling_loop()
-
-                if not self.completed:
-                    LOGGER.error('Waiting for condition "%s" timed out after %d seconds',
-                                 self.condition_name(), self.timeout)
-
-                    if self.retries_remaining:
-                        LOGGER.info('Retrying waiting for condition "%s". (%d %s remaining)',
-                                    self.condition_name(), self.retries_remaining,
-                                    inf.plural_noun('retry', self.retries_remaining))
-                        self.retries_remaining -= 1
-                        self.on_retry_action()
-                    else:
-                        # Waiting failed, and there are no more retries left.
-                        break
-        except WaitingFailure as err:
-            self.failed = True
-            LOGGER.error('Could not wait for condition "%s": %s', self.condition_name(), err)
+    def _begin_attempt(self, now):
+        """Begin one waiting attempt.
+
+        Args:
+            now (float): the current monotonic time
+        """
+        self._attempt_start = now
+        self._num_checks = 0
+        self.timing.attempt_starts.append(now)
 
-        self.post_wait_action()
+    def _get_next_check_time(self, now):
+        """Get the time of the next check for completion.
 
+        Args:
+            now (float): the current monotonic time
+
+        Returns:
+            float: the monotonic time at which to check next. When there is a
+                polling strategy, this is never later than the timeout.
+        """
+        if self.polling_strategy is None:
+            return now + self.poll_interval
+
+        interval = self.polling_strategy.get_next_interval(
+            self, now - self._attempt_start, self._num_checks
+        )
+        return min(now + interval, self._attempt_start + self.timeout)
+
+    def _attempt_timed_out(self, now):
+        """Check whether the current waiting attempt has timed out.
+
+        Args:
+            now (float): the current monotonic time
+
+        Returns:
+            bool: True if the timeout has elapsed, and False otherwise.
+        """
+        return now - self._attempt_start >= self.timeout
+
+    def _check(self):
+        """Check for completion once.
+
+        This implements one polling cycle, and different implementations can
+        be used to optimize waiting methods for different situations. It
+        should generally not be overridden by client classes outside this
+        module.
+
+        Returns:
+            bool: True if waiting is finished, and False otherwise.
+        """
+        self.on_check_action()
+
+        # Store value in case we want to use it in post_wait_action.
+        self.completed = self.has_completed()
+        return self.completed
+
+    def _retry_after_timeout(self):
+        """Handle the current waiting attempt timing out.
+
+        Returns:
+            bool: True if waiting should be retried, and False otherwise.
+        """
+        LOGGER.error('Waiting for condition "%s" timed out after %d seconds',
+                     self.condition_name(), self.timeout)
+
+        if not self.retries_remaining:
+            return False
+
+        LOGGER.info('Retrying waiting for condition "%s". (%d %s remaining)',
+                    self.condition_name(), self.retries_remaining,
+                    inf.plural_noun('retry', self.retries_remaining))
+        self.retries_remaining -= 1
+        self.on_retry_action()
+        return True
+
+    def is_waiting(self):
+        """Check if this waiter is currently being waited for by a scheduler.
+
+        Returns:
+            bool: True if waiting has begun and not finished, False otherwise.
+        """
+        return not self._done.is_set()
+
+    def wait_for_completion(self):
+        """Wait for the condition to be achieved or for timeout.
+
+        Returns:
+            bool: True if condition succeeded, False if timed out.
+        """
+        wait_for_all([self])
         return self.completed
 
     def wait_for_completion_async(self):
         """Begin waiting for the completion condition.
 
-        This will spawn a new thread which will run Waiter.wait_for_completion
-        in another thread, and will immediately yield control back to the
-        calling thread. To clean up the thread, the method
-        Waiter.wait_for_completion_await should be called.
+        The waiter is added to a scheduler which waits for all asynchronous
+        waiters from a single background thread, and control is immediately
+        yielded back to the calling thread. To wait for the waiter to finish,
+        the method Waiter.wait_for_completion_await should be called.
 
         Returns:
             None
         """
-        self._waiter_thread = Thread(target=self.wait_for_completion)
-        self._waiter_thread.start()
+        self._waiting_async = True
+        _background_scheduler.add(self)
 
     def wait_for_completion_await(self):
-        """Clean up waiting thread.
+        """Wait for an asynchronous wait to finish.
 
-        This will join the waiting thread. This expects the method
-        Waiter.wait_for_completion_async to have been called previously.
+        This expects the method Waiter.wait_for_completion_async to have been
+        called previously.
 
         Returns:
             None.
         """
-        if self._waiter_thread is None:
+        if not self._waiting_async:
             raise RuntimeError('wait_for_completion_async must be called before '
                                'wait_for_completion_await.')
-        self._waiter_thread.join()
+        self._done.wait()
 
     def is_waiting_async(self):
         """Check if this waiter is currently waiting asynchronously.
 
-        If wait_for_completion_async() has been called and the waiter
-        thread has not finished, this returns True. Otherwise, this
-        returns False.
+        If wait_for_completion_async() has been called and waiting has not
+        finished, this returns True. Otherwise, this returns False.
         """
-        return (self._waiter_thread is not None
-                and self._waiter_thread.is_alive())
+        return self._waiting_async and self.is_waiting()
 
     def __enter__(self):
         self.wait_for_completion_async()
@@ -267,16 +723,22 @@ class SimultaneousWaiter(Waiter):
         return f"Simultaneous conditions: {conditions}"
 
     def pre_wait_action(self):
+        # The conditions are waited for by the same scheduler as this waiter.
         for waiter in self._subwaiters:
-            waiter.wait_for_completion_async()
+            self._scheduler.add(waiter)
+
+    def _runs_pre_wait_in_thread(self):
+        # Adding the conditions to the scheduler does not block.
+        return False
+
+    def _attempt_timed_out(self, now):
+        # Each condition times out on its own, and this waiter has timed out
+        # once all of them have finished without all of them completing.
+        return not any(waiter.is_waiting() for waiter in self._subwaiters) and not self.has_completed()
 
     def has_completed(self):
         return all(waiter.completed for waiter in self._subwaiters)
 
-    def post_wait_action(self):
-        for waiter in self._subwaiters:
-            waiter.wait_for_completion_await()
-
 
 class GroupWaiter(Waiter):
     """Waits for a all members of some group to reach some state.
@@ -290,15 +752,29 @@ class GroupWaiter(Waiter):
             this is 0, meaning the wait will only occur once.
         failed (set): contains members which cannot be waited for, or
             which it is known will never complete.
+        max_workers (int): the maximum number of members whose completion
+            is checked at the same time. By default, this is 1, meaning
+            members are checked one at a time.
+        member_check_timeout (int or float): the time, in seconds, to wait
+            for the check of a single member before treating that member as
+            not yet completed. If None, checks are waited for indefinitely.
     """
 
-    def __init__(self, members, timeout, poll_interval=1, retries=0):
+    def __init__(self, members, timeout, poll_interval=1, retries=0,
+                 max_workers=1, member_check_timeout=None):
         super().__init__(timeout, poll_interval, retries)
 
         self.members = set(members)
         self.pending = set(self.members)
         self.failed = set()
 
+        self.max_workers = max_workers
+        self.member_check_timeout = member_check_timeout
+        # Members whose checks are still running, possibly after having been
+        # abandoned by an earlier poll because they exceeded their timeout.
+        self._running_checks = set()
+        self._running_checks_lock = Lock()
+
     @abc.abstractmethod
     def member_has_completed(self, member):
         """Check whether or not a given member has completed.
@@ -311,6 +787,165 @@ class GroupWaiter(Waiter):
         """
         raise NotImplementedError('{}.member_has_completed'.format(self.__class__.__name__))
 
+    def members_have_completed(self, members):
+        """Check which of the given members have completed or failed.
+
+        The default implementation calls member_has_completed() once for each
+        member. If max_workers is greater than 1 or a member_check_timeout is
+        set, the calls are made from a pool of worker threads. Subclasses which
+        can check the state of many members with a single query should
+        override this method to do so.
+
+        Args:
+            members (set): the members to check.
+
+        Returns:
+            tuple of (set, set): the members which have completed, and the
+                members which have failed, i.e. which cannot be waited for
+                or which will never complete.
+        """
+        if members and (self.max_workers > 1 or self.member_check_timeout is not None):
+            return self._check_members_concurrently(members)
+
+        completed = set()
+        failed = set()
+        for member in members:
+            try:
+                if self.member_has_completed(member):
+                    completed.add(member)
+            except WaitingFailure as err:
+                self._log_member_failure(member, err)
+                failed.add(member)
+        return completed, failed
+
+    def _check_members_concurrently(self, members):
+        """Check the given members using a bounded number of worker threads.
+
+        A member whose check takes longer than member_check_timeout is treated
+        as not yet completed. Its check is abandoned rather than interrupted,
+        and the member is not checked again until the abandoned check returns,
+        so a hung check occupies at most one worker thread. The workers are
+        daemon threads, so an abandoned check cannot prevent SAT from exiting.
+
+        Args:
+            members (set): the members to check.
+
+        Returns:
+            tuple of (set, set): the members which have completed, and the
+                members which have failed.
+        """
+        completed = set()
+        failed = set()
+
+        with self._running_checks_lock:
+            to_check = members - self._running_checks
+            self._running_checks |= to_check
+        if not to_check:
+            return completed, failed
+
+        start_times = {}
+
+        def check(member):
+            start_times[member] = time.monotonic()
+            try:
+                return self.member_has_completed(member)
+            finally:
+                with self._running_checks_lock:
+                    self._running_checks.discard(member)
+
+        futures = {Future(): member for member in to_check}
+        unstarted = SimpleQueue()
+        for future in futures:
+            unstarted.put(future)
+
+        def run_checks():
+            while True:
+                try:
+                    future = unstarted.get_nowait()
+                except Empty:
+                    return
+                # The future is cancelled if its check was skipped.
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(check(futures[future]))
+                except BaseException as err:
+                    future.set_exception(err)
+
+        for _ in range(min(self.max_workers, len(to_check))):
+            submit_daemon(run_checks)
+
+        pending_futures = set(futures)
+        num_abandoned = 0
+        while pending_futures:
+            wait_timeout = None
+            if self.member_check_timeout is not None:
+                now = time.monotonic()
+                started = [start_times[futures[future]] for future in pending_futures
+                           if futures[future] in start_times]
+                if started:
+                    wait_timeout = max(min(started) + self.member_check_timeout - now, 0)
+                else:
+                    wait_timeout = self.member_check_timeout
+
+            done, pending_futures = wait(pending_futures, timeout=wait_timeout,
+                                         return_when=FIRST_COMPLETED)
+            for future in done:
+                member = futures[future]
+                try:
+                    if future.result():
+                        completed.add(member)
+                except WaitingFailure as err:
+                    self._log_member_failure(member, err)
+                    failed.add(member)
+
+            if self.member_check_timeout is None:
+                continue
+
+            now = time.monotonic()
+            for future in list(pending_futures):
+                member = futures[future]
+                start_time = start_times.get(member)
+                if start_time is not None and now - start_time >= self.member_check_timeout:
+                    LOGGER.warning('Timed out after %s seconds checking condition "%s" for member %s.',
+                                   self.member_check_timeout, self.condition_name(), str(member))
+                    pending_futures.discard(future)
+                    num_abandoned += 1
+
+            if num_abandoned >= self.max_workers:
+                # Every worker thread is occupied by an abandoned check, so the
+                # remaining members cannot be checked during this poll.
+                for future in pending_futures:
+                    if future.cancel():
+                        with self._running_checks_lock:
+                            self._running_checks.discard(futures[future])
+                pending_futures = {future for future in pending_futures if not future.cancelled()}
+
+        return completed, failed
+
+    def _log_member_failure(self, member, err):
+        """Log that waiting for a member failed.
+
+        Args:
+            member: the member which failed.
+            err (Exception): the reason it failed.
+        """
+        LOGGER.error('Failed to wait for condition "%s" for member %s: %s',
+                     self.condition_name(), str(member), err)
+        self.timing.member_failure_reason(member, str(err))
+
+    def _record_members_finished(self, completed, failed):
+        """Record the time at which members completed or failed.
+
+        Args:
+            completed (set): the members which completed
+            failed (set): the members which failed
+        """
+        for member in completed:
+            self.timing.member_finished(member, self._step_time, 'completed')
+        for member in failed:
+            self.timing.member_finished(member, self._step_time, 'failed')
+
     def has_completed(self):
         """Check if every member has completed.
 
@@ -331,37 +966,40 @@ class GroupWaiter(Waiter):
         super().wait_for_completion()
         return self.pending
 
-    def _wait_polling_loop(self):
-        """Alternate implementation of the polling loop for waiting on groups.
+    def _begin_waiting(self, now):
+        super()._begin_waiting(now)
+        self._add_member_timings()
 
-        This removes completed and failed members from as it goes, and excludes
-        them from future attempts as a small optimization.
-        """
-
-        start_time = time.monotonic()
+    def _add_member_timings(self):
+        """Add the members which are waited for from the start to the timing."""
+        for member in self.members:
+            self.timing.add_member(member)
 
+    def _begin_attempt(self, now):
+        super()._begin_attempt(now)
         # Ensure we set this to a set of all members before starting to wait
         # because children classes may set `self.members` after `__init__`.
         self.pending = set(self.members)
 
-        while self.pending and time.monotonic() - start_time < self.timeout:
-            completed = set()
+    def _attempt_timed_out(self, now):
+        return bool(self.pending) and super()._attempt_timed_out(now)
 
-            self.on_check_action()
-            for member in (self.pending - self.failed):
-                try:
-                    if self.member_has_completed(member):
-                        completed.add(member)
-                except WaitingFailure as err:
-                    LOGGER.error('Failed to wait for condition "%s" for member %s: %s',
-                                 self.condition_name(), str(member), err)
-                    self.failed.add(member)
+    def _check(self):
+        """Alternate implementation of the polling cycle for waiting on groups.
 
+        This checks all pending members at once with members_have_completed(),
+        and removes completed and failed members as it goes, excluding them
+        from future attempts.
+        """
+        if self.pending:
+            self.on_check_action()
+            completed, failed = self.members_have_completed(self.pending - self.failed)
+            self._record_members_finished(completed, failed)
+            self.failed |= failed
             self.pending -= (completed | self.failed)
 
-            time.sleep(self.poll_interval)
-
         self.completed = not self.pending
+        return self.completed
 
 
 class DependencyCycleError(Exception):
@@ -404,7 +1042,7 @@ class DependencyGroupMember(abc.ABC):
         This method may be overridden to customize behavior.
         """
 
-    def add_dependency(self, dependency):
+    def add_dependency(self, dependency, check_cycles=True):
         """Add an item that this item depends on.
 
         This detects whether a cycle is created by adding this dependency.
@@ -415,16 +1053,25 @@ class DependencyGroupMember(abc.ABC):
         Then an attempt to add a dependency of item C on item A would
         introduce a cycle, or circular dependency.
 
+        Checking for cycles searches every dependency of the given item, so
+        when building a large dependency graph, it is faster to add all the
+        dependencies with check_cycles=False and then check the whole graph
+        once with get_dependency_cycles().
+
         Args:
             dependency (DependencyGroupMember): an item upon which this item
                 depends
+            check_cycles (bool): if True, check whether adding this dependency
+                introduces a cycle.
 
         Raises:
-            DependencyCycleError: if adding this dependency introduces a cycle
+            DependencyCycleError: if check_cycles is True and adding this
+                dependency introduces a cycle
         """
-        cycle_members = dependency.depends_on(self)
-        if cycle_members:
-            raise DependencyCycleError(cycle_members)
+        if check_cycles:
+            cycle_members = dependency.depends_on(self)
+            if cycle_members:
+                raise DependencyCycleError(cycle_members)
 
         # self depends on dependency
         self.dependencies.add(dependency)
@@ -480,20 +1127,161 @@ class DependencyGroupMember(abc.ABC):
         return deps
 
 
+def get_dependency_cycles(members):
+    """Find the circular dependencies between the given items.
+
+    Items are removed from the graph in topological order, as in Kahn's
+    algorithm, so that only items which are part of a cycle, or which depend
+    on a cycle, remain. The cycles are then found by following dependencies
+    among the remaining items. This takes linear time in the size of the
+    dependency graph. Dependencies on items which are not in `members` are
+    ignored.
+
+    Args:
+        members (Iterable[DependencyGroupMember]): the items to check
+
+    Returns:
+        list of list of DependencyGroupMember: the distinct cycles found, in
+            the format used by DependencyCycleError, i.e. each item in a cycle
+            depends on the next item in the list, and the last item depends
+            on the first.
+    """
+    members = set(members)
+    remaining_dependencies = {member: len(member.dependencies & members) for member in members}
+    ready = [member for member, count in remaining_dependencies.items() if not count]
+    while ready:
+        member = ready.pop()
+        del remaining_dependencies[member]
+        for dependent in member.dependents:
+            if dependent in remaining_dependencies:
+                remaining_dependencies[dependent] -= 1
+                if not remaining_dependencies[dependent]:
+                    ready.append(dependent)
+
+    # Every remaining item has at least one remaining dependency, so following
+    # remaining dependencies from any of them must eventually revisit an item.
+    cycles = []
+    visited = set()
+    for start in remaining_dependencies:
+        path = []
+        path_indices = {}
+        member = start
+        while member not in visited:
+            visited.add(member)
+            path_indices[member] = len(path)
+            path.append(member)
+            member = next(dependency for dependency in member.dependencies
+                          if dependency in remaining_dependencies)
+        if member in path_indices:
+            cycles.append(path[path_indices[member]:])
+    return cycles
+
+
 class DependencyGroupWaiter(GroupWaiter, abc.ABC):
-    """A specialized GroupWaiter which can reason about dependencies between members."""
+    """A specialized GroupWaiter which can reason about dependencies between members.
+
+    Members are begun once all of their dependencies within the group have
+    completed. The number of dependencies each member is still waiting for is
+    tracked, so that completing a member only needs to visit its direct
+    dependents. If there are more members ready to begin than are allowed to
+    be in progress at once, those with the longest chain of members depending
+    on them are begun first.
+
+    Attributes:
+        max_in_flight (int or None): the maximum number of members which may
+            be in progress at once, or None if there is no limit.
+        begun (set): the members which have been begun.
+    """
 
-    def __init__(self, members, timeout, poll_interval=1, retries=0):
-        super().__init__(members, timeout, poll_interval, retries)
+    def __init__(self, members, timeout, poll_interval=1, retries=0,
+                 max_workers=1, member_check_timeout=None, max_in_flight=None):
+        super().__init__(members, timeout, poll_interval, retries,
+                         max_workers, member_check_timeout)
 
         for member in self.members:
             if not isinstance(member, DependencyGroupMember):
                 raise TypeError(f'{member} (type {type(member).__name__}) '
                                 'is not a subclass of DependencyGroupMember')
 
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError(f'max_in_flight must be at least 1, not {max_in_flight}')
+        self.max_in_flight = max_in_flight
+
+        cycles = get_dependency_cycles(self.members)
+        if cycles:
+            raise DependencyCycleError(cycles[0])
+
         self.begun = set()
-        self.pending = set(member for member in self.members
-                           if not member.has_dependencies())
+        self._remaining_dependencies = {member: len(member.dependencies & self.members)
+                                        for member in self.members}
+        self._critical_path_lengths = self._get_critical_path_lengths()
+        # Heap of members which are ready to begin, ordered by critical path
+        self._ready = []
+        self._ready_counter = itertools.count()
+        for member, count in self._remaining_dependencies.items():
+            if not count:
+                self._push_ready(member)
+        self.pending = set()
+
+    def _get_critical_path_lengths(self):
+        """Get the length of the longest chain of dependents of each member.
+
+        Returns:
+            dict: a mapping from each member to the number of members in the
+                longest chain of members starting with it in which each
+                member depends on the previous one.
+        """
+        remaining_dependents = {member: len(member.dependents & self.members)
+                                for member in self.members}
+        lengths = {}
+        todo = [member for member, count in remaining_dependents.items() if not count]
+        while todo:
+            member = todo.pop()
+            lengths[member] = 1 + max((lengths[dependent] for dependent in member.dependents
+                                       if dependent in self.members), default=0)
+            for dependency in member.dependencies:
+                if dependency in remaining_dependents:
+                    remaining_dependents[dependency] -= 1
+                    if not remaining_dependents[dependency]:
+                        todo.append(dependency)
+        return lengths
+
+    def _push_ready(self, member):
+        """Add a member to the members which are ready to begin."""
+        heapq.heappush(self._ready, (-self._critical_path_lengths[member],
+                                     next(self._ready_counter), member))
+
+    def _begin_ready_members(self):
+        """Begin ready members until the limit on members in progress is reached."""
+        while self._ready and (self.max_in_flight is None or len(self.pending) < self.max_in_flight):
+            _, _, member = heapq.heappop(self._ready)
+            self._begin_member(member)
+            if member not in self.failed:
+                self.pending.add(member)
+
+    def _release_dependents(self, member):
+        """Mark a member as completed for the purposes of its dependents.
+
+        Args:
+            member (DependencyGroupMember): the member which completed.
+        """
+        for dependent in member.dependents:
+            if dependent in self._remaining_dependencies:
+                self._remaining_dependencies[dependent] -= 1
+                if not self._remaining_dependencies[dependent]:
+                    self._push_ready(dependent)
+
+    def wait_for_completion(self):
+        """Wait until all members have completed (or failed), or timeout is reached.
+
+        Returns:
+            set: A set of members which were begun or ready to begin but did
+                not complete if the timeout was reached, or the empty set if
+                all members complete. Members whose dependencies failed are
+                not included.
+        """
+        super().wait_for_completion()
+        return self.pending | {member for _, _, member in self._ready}
 
     def _begin_member(self, member):
         """Helper function to begin waiting for a member.
@@ -507,42 +1295,36 @@ class DependencyGroupWaiter(GroupWaiter, abc.ABC):
         if member in self.begun:
             return
 
+        self.timing.member_began(member, self._step_time)
         try:
             member.begin()
             self.begun.add(member)
         except WaitingFailure as err:
             LOGGER.error(str(err))
             self.failed.add(member)
+            self.timing.member_finished(member, self._step_time, 'failed', str(err))
 
-    def pre_wait_action(self):
-        for member in self.pending:
-            self._begin_member(member)
-        self.pending -= self.failed
-
-    def _wait_polling_loop(self):
-        start_time = time.monotonic()
-        while self.pending and time.monotonic() - start_time < self.timeout:
-            completed = set()
-            for member in self.pending:
-                try:
-                    if self.member_has_completed(member):
-                        completed.add(member)
-                except WaitingFailure as err:
-                    LOGGER.error('Failed to wait for condition "%s" for member %s: %s',
-                                 self.condition_name(), str(member), err)
-                    self.failed.add(member)
+    def _add_member_timings(self):
+        # Members are added to the timing when they are begun.
+        pass
 
+    def pre_wait_action(self):
+        self._begin_ready_members()
+
+    def _begin_attempt(self, now):
+        # Unlike GroupWaiter, members which have not begun are not pending,
+        # and completed members are not waited for again on retry.
+        Waiter._begin_attempt(self, now)
+
+    def _check(self):
+        if self.pending:
+            completed, failed = self.members_have_completed(set(self.pending))
+            self._record_members_finished(completed, failed)
+            self.failed |= failed
             self.pending -= (completed | self.failed)
             for member in completed:
-                for dependent in member.dependents:
-                    # TODO: full_dependencies() runs in linear time based on the
-                    # size of the dependency graph, so this could be
-                    # accidentally quadratic resulting in slow performance for
-                    # large graphs. Dynamic programming would solve this.
-                    if not dependent.full_dependencies().intersection(self.pending | self.failed):
-                        self.pending.add(dependent)
-                        self._begin_member(dependent)
+                self._release_dependents(member)
+            self._begin_ready_members()
 
-            time.sleep(self.poll_interval)
-
-        self.completed = not self.pending
+        self.completed = not self.pending and not self._ready
+        return self.completed
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2019-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2019-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -177,6 +177,18 @@ class TestFabricControllerClient(ExtendedTestCase):
         self.assert_in_element(self.fabric_status_fail_msg, cm.output)
         self.assertEqual(expected, actual)
 
+    def test_get_port_sets_enabled_status(self):
+        """Test getting enabled status of only the given port sets."""
+        expected = {
+            'edge-ports': {'x3000c0r24j8p0': True, 'x3000c0r24j8p1': False}
+        }
+        actual = self.fabric_client.get_port_sets_enabled_status(['edge-ports'])
+        self.assertEqual(expected, actual)
+
+    def test_get_port_sets_enabled_status_no_port_sets(self):
+        """Test getting enabled status of no port sets."""
+        self.assertEqual({}, self.fabric_client.get_port_sets_enabled_status([]))
+
 
 if __name__ == '__main__':
     unittest.main()
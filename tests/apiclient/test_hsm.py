@@ -164,6 +164,19 @@ class TestHSMClientRedfishEndpoints(ExtendedTestCase):
         """Stop patches."""
         mock.patch.stopall()
 
+    def test_get_redfish_endpoints(self):
+        """Test getting Redfish endpoints by xname with one request."""
+        endpoints = self.hsm_client.get_redfish_endpoints({'x1000c0s2b0', 'x1000c0s1b0'})
+        self.mock_get.assert_called_once_with('Inventory', 'RedfishEndpoints',
+                                              params={'id': ['x1000c0s1b0', 'x1000c0s2b0']})
+        self.assertEqual(self.mock_get.return_value.json.return_value['RedfishEndpoints'], endpoints)
+
+    def test_get_redfish_endpoints_bad_response(self):
+        """Test getting Redfish endpoints when the response is missing the endpoints."""
+        self.mock_get.return_value.json.return_value = {}
+        with self.assertRaisesRegex(APIError, 'Failed to get redfish endpoints'):
+            self.hsm_client.get_redfish_endpoints({'x1000c0s1b0'})
+
     def test_get_all_bmc_xnames(self):
         """Test getting all BMC xnames."""
         expected_xnames = {bmc['ID'] for bmc in self.mock_get.return_value.json.return_value['RedfishEndpoints']}
@@ -0,0 +1,444 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+A simulated BMC for testing the IPMI session engine.
+
+The simulator implements the parts of RMCP+ it needs directly from the IPMI
+v2.0 specification, without using the packet or key functions of
+sat.cli.bootsys.ipmi_session. Otherwise, a mistake in the client's reading of
+the specification would be repeated by the simulator, and the tests would
+still pass. The section of the specification describing each message or
+computation is given in the comments.
+"""
+import hashlib
+import hmac
+import os
+import socket
+import threading
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# RMCP header (section 13.1.3): version 6, reserved, sequence 0xFF (no ACK),
+# class of message IPMI
+RMCP_HEADER = b'\x06\x00\xff\x07'
+# Authentication type / format of an RMCP+ session header (section 13.6)
+RMCP_PLUS_FORMAT = 0x06
+
+# Payload types (table 13-16) and the payload type flags (section 13.6)
+IPMI_MESSAGE = 0x00
+OPEN_SESSION_REQUEST = 0x10
+OPEN_SESSION_RESPONSE = 0x11
+RAKP_MESSAGE_1 = 0x12
+RAKP_MESSAGE_2 = 0x13
+RAKP_MESSAGE_3 = 0x14
+RAKP_MESSAGE_4 = 0x15
+ENCRYPTED_FLAG = 0x80
+AUTHENTICATED_FLAG = 0x40
+
+# Cipher suite 3 (table 22-20): RAKP-HMAC-SHA1, HMAC-SHA1-96, AES-CBC-128
+CIPHER_SUITE_3 = (0x01, 0x01, 0x01)
+
+# RMCP+ status codes (table 13-15)
+STATUS_INVALID_SESSION_ID = 0x02
+STATUS_UNAUTHORIZED_NAME = 0x0D
+STATUS_INVALID_INTEGRITY_CHECK = 0x0F
+STATUS_NO_CIPHER_SUITE_MATCH = 0x11
+
+# IPMI network functions and commands (appendix G)
+NETFN_CHASSIS_REQUEST = 0x00
+NETFN_APP_REQUEST = 0x06
+GET_CHASSIS_STATUS = 0x01
+CHASSIS_CONTROL = 0x02
+CLOSE_SESSION = 0x3C
+
+# IPMI completion codes (table 5-2)
+COMPLETION_INVALID_COMMAND = 0xC1
+COMPLETION_INVALID_DATA = 0xCC
+
+
+class InvalidPacket(Exception):
+    """The simulator received a packet it silently discards."""
+    pass
+
+
+def u32(data, offset):
+    """Read a little-endian 32-bit integer from data at offset."""
+    return int.from_bytes(data[offset:offset + 4], 'little')
+
+
+def le32(value):
+    """Encode a 32-bit integer in little-endian byte order."""
+    return value.to_bytes(4, 'little')
+
+
+def sha1_hmac(key, *fields):
+    """Get the HMAC-SHA1 of the concatenation of the given fields."""
+    mac = hmac.new(key, digestmod=hashlib.sha1)
+    for field in fields:
+        mac.update(field)
+    return mac.digest()
+
+
+def ipmi_checksum(data):
+    """Get the 2's complement checksum of data (section 13.8)."""
+    total = 0
+    for byte in data:
+        total = (total + byte) % 256
+    return (256 - total) % 256
+
+
+def aes_cbc_128_encrypt(key, plaintext):
+    """Encrypt a payload as described in section 13.29."""
+    # The pad bytes are 1, 2, 3, ... followed by the number of pad bytes, so
+    # that the payload, pad and pad length are a multiple of 16 bytes long.
+    pad = b''
+    while (len(plaintext) + len(pad) + 1) % 16:
+        pad += bytes([len(pad) + 1])
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return iv + encryptor.update(plaintext + pad + bytes([len(pad)])) + encryptor.finalize()
+
+
+def aes_cbc_128_decrypt(key, data):
+    """Decrypt a payload as described in section 13.29."""
+    if len(data) < 32 or len(data) % 16:
+        raise InvalidPacket('bad encrypted payload length')
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(data[:16])).decryptor()
+    plaintext = decryptor.update(data[16:]) + decryptor.finalize()
+    pad_length = plaintext[-1]
+    pad = plaintext[-1 - pad_length:-1]
+    if pad != bytes(range(1, pad_length + 1)):
+        raise InvalidPacket('bad confidentiality pad')
+    return plaintext[:-1 - pad_length]
+
+
+def build_packet(payload_type, session_id, sequence, payload, k1=None, k2=None):
+    """Build an RMCP+ packet (section 13.6).
+
+    If k1 is given, the packet is authenticated with HMAC-SHA1-96 (section
+    13.28.4). If k2 is also given, the payload is encrypted (section 13.29).
+    """
+    if k2 is not None:
+        payload = aes_cbc_128_encrypt(k2, payload)
+        payload_type |= ENCRYPTED_FLAG
+    if k1 is not None:
+        payload_type |= AUTHENTICATED_FLAG
+
+    session = (bytes([RMCP_PLUS_FORMAT, payload_type]) + le32(session_id) + le32(sequence) +
+               len(payload).to_bytes(2, 'little') + payload)
+    if k1 is not None:
+        # The integrity pad of 0xFF bytes makes the data covered by the
+        # AuthCode, from the auth type through the next header, a multiple of
+        # four bytes long. The next header is always 0x07.
+        pad = b''
+        while (len(session) + len(pad) + 2) % 4:
+            pad += b'\xff'
+        session += pad + bytes([len(pad), 0x07])
+        session += sha1_hmac(k1, session)[:12]
+    return RMCP_HEADER + session
+
+
+def parse_packet(packet, k1=None, k2=None):
+    """Parse an RMCP+ packet (section 13.6).
+
+    Returns:
+        tuple of (int, int, int, bytes): the payload type without its flags,
+            the session ID, the session sequence number, and the payload
+
+    Raises:
+        InvalidPacket: if the packet is not valid
+    """
+    if packet[:4] != RMCP_HEADER or len(packet) < 16 or packet[4] != RMCP_PLUS_FORMAT:
+        raise InvalidPacket('not an RMCP+ packet')
+    payload_type = packet[5]
+    session_id = u32(packet, 6)
+    sequence = u32(packet, 10)
+    length = int.from_bytes(packet[14:16], 'little')
+    payload = packet[16:16 + length]
+    if len(payload) != length:
+        raise InvalidPacket('truncated packet')
+
+    if payload_type & AUTHENTICATED_FLAG:
+        if k1 is None:
+            raise InvalidPacket('authenticated packet outside a session')
+        trailer = packet[16 + length:]
+        if len(trailer) < 14:
+            raise InvalidPacket('missing integrity trailer')
+        pad_length = trailer[-14]
+        if trailer[-13] != 0x07 or trailer[:pad_length] != b'\xff' * pad_length:
+            raise InvalidPacket('bad integrity trailer')
+        if len(packet[4:-12]) % 4:
+            raise InvalidPacket('integrity data is not a multiple of four bytes')
+        if not hmac.compare_digest(sha1_hmac(k1, packet[4:-12])[:12], packet[-12:]):
+            raise InvalidPacket('bad AuthCode')
+    elif k1 is not None:
+        raise InvalidPacket('unauthenticated packet in a session')
+
+    if payload_type & ENCRYPTED_FLAG:
+        if k2 is None:
+            raise InvalidPacket('encrypted packet outside a session')
+        payload = aes_cbc_128_decrypt(k2, payload)
+
+    return payload_type & 0x3F, session_id, sequence, payload
+
+
+class _SimulatedSession:
+    """The state of one session on the simulated BMC."""
+
+    def __init__(self, console_sid, bmc_sid):
+        self.console_sid = console_sid
+        self.bmc_sid = bmc_sid
+        self.console_rand = None
+        self.bmc_rand = os.urandom(16)
+        self.role = None
+        self.username = None
+        self.k1 = None
+        self.k2 = None
+        self.sequence = 0
+
+    @property
+    def active(self):
+        return self.k1 is not None
+
+
+class IPMISimulator:
+    """A BMC which supports RMCP+ sessions with cipher suite 3.
+
+    It listens on a UDP port of the loopback interface and supports the Get
+    Chassis Status, Chassis Control and Close Session commands.
+    """
+
+    def __init__(self, username, password, power_state='off'):
+        """Create a new IPMISimulator.
+
+        Args:
+            username (str): the only IPMI username accepted
+            password (str): the IPMI password of that user
+            power_state (str): the initial chassis power state, 'on' or 'off'
+        """
+        self.username = username.encode()
+        # The user's key Kuid is the password padded with zeros to 20 bytes
+        # (section 13.31). With no BMC key Kg, Kuid is also used as Kg.
+        password_bytes = password.encode()[:20]
+        self.user_key = password_bytes + bytes(20 - len(password_bytes))
+        self.power_state = power_state
+        self.guid = os.urandom(16)
+        # Set to True to ignore all packets, like a BMC which cannot be reached.
+        self.unresponsive = False
+        self.sessions_opened = 0
+        self.commands = []
+        self._sessions = {}
+        self._next_sid = 0x0A000001
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(('127.0.0.1', 0))
+        self.port = self._sock.getsockname()[1]
+        self._sock.settimeout(0.1)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    @property
+    def active_sessions(self):
+        """int: the number of sessions which have been set up and not closed"""
+        with self._lock:
+            return sum(1 for session in self._sessions.values() if session.active)
+
+    def expire_sessions(self):
+        """Forget all sessions, as a BMC does when sessions time out."""
+        with self._lock:
+            self._sessions.clear()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._sock.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _serve(self):
+        while not self._stop_event.is_set():
+            try:
+                packet, address = self._sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            if self.unresponsive:
+                continue
+            with self._lock:
+                try:
+                    response = self._handle_packet(packet)
+                except (InvalidPacket, IndexError, KeyError):
+                    response = None
+            if response is not None:
+                self._sock.sendto(response, address)
+
+    def _handle_packet(self, packet):
+        if len(packet) > 5 and packet[5] & AUTHENTICATED_FLAG:
+            return self._handle_session_packet(packet)
+        payload_type, session_id, sequence, payload = parse_packet(packet)
+        if session_id or sequence:
+            raise InvalidPacket('session setup message with a session ID or sequence number')
+        handlers = {
+            OPEN_SESSION_REQUEST: self._open_session,
+            RAKP_MESSAGE_1: self._rakp1,
+            RAKP_MESSAGE_3: self._rakp3,
+        }
+        if payload_type not in handlers:
+            raise InvalidPacket(f'unexpected payload type {payload_type}')
+        return handlers[payload_type](payload)
+
+    def _open_session(self, payload):
+        # Open Session Request (section 13.17): message tag, requested maximum
+        # privilege level, 2 reserved bytes, remote console session ID, and an
+        # 8-byte authentication, integrity and confidentiality payload, each
+        # made of a payload type, 2 reserved bytes, a length of 8, the
+        # algorithm and 3 reserved bytes.
+        tag = payload[0]
+        console_sid = u32(payload, 4)
+        records = [payload[8 + 8 * i:16 + 8 * i] for i in range(3)]
+        offered = tuple(record[4] & 0x3F for record in records)
+        if any(record[0] != i or record[3] != 8 for i, record in enumerate(records)) \
+                or offered != CIPHER_SUITE_3:
+            # Open Session Response (section 13.18) with only the tag, status
+            # and remote console session ID when the session is refused
+            return build_packet(OPEN_SESSION_RESPONSE, 0, 0,
+                                bytes([tag, STATUS_NO_CIPHER_SUITE_MATCH, 0, 0]) + le32(console_sid))
+
+        session = _SimulatedSession(console_sid, self._next_sid)
+        self._next_sid += 1
+        self._sessions[session.bmc_sid] = session
+        # Open Session Response (section 13.18): tag, status, maximum
+        # privilege level, reserved, remote console session ID, managed
+        # system session ID, and the algorithms chosen in the same format.
+        response = (bytes([tag, 0, 0x04, 0]) + le32(console_sid) + le32(session.bmc_sid) +
+                    b''.join(bytes([i, 0, 0, 8, algorithm, 0, 0, 0])
+                             for i, algorithm in enumerate(CIPHER_SUITE_3)))
+        return build_packet(OPEN_SESSION_RESPONSE, 0, 0, response)
+
+    def _rakp1(self, payload):
+        # RAKP Message 1 (section 13.20): tag, 3 reserved bytes, managed
+        # system session ID, remote console random number Rm, requested
+        # maximum privilege level (role), 2 reserved bytes, user name length
+        # and user name.
+        tag = payload[0]
+        session = self._sessions.get(u32(payload, 4))
+        if session is None:
+            return build_packet(RAKP_MESSAGE_2, 0, 0, bytes([tag, STATUS_INVALID_SESSION_ID, 0, 0]) + le32(0))
+        session.console_rand = payload[8:24]
+        session.role = payload[24]
+        session.username = payload[28:28 + payload[27]]
+        if session.username != self.username:
+            return build_packet(RAKP_MESSAGE_2, 0, 0,
+                                bytes([tag, STATUS_UNAUTHORIZED_NAME, 0, 0]) + le32(session.console_sid))
+
+        # RAKP Message 2 (section 13.21): tag, status, 2 reserved bytes,
+        # remote console session ID, managed system random number Rc, managed
+        # system GUID, and the key exchange authentication code, which is
+        # HMAC(Kuid, SIDm, SIDc, Rm, Rc, GUIDc, ROLEm, ULENGTHm, UNAMEm)
+        # (section 13.31).
+        auth_code = sha1_hmac(self.user_key, le32(session.console_sid), le32(session.bmc_sid),
+                              session.console_rand, session.bmc_rand, self.guid,
+                              bytes([session.role, len(session.username)]), session.username)
+        response = (bytes([tag, 0, 0, 0]) + le32(session.console_sid) + session.bmc_rand +
+                    self.guid + auth_code)
+        return build_packet(RAKP_MESSAGE_2, 0, 0, response)
+
+    def _rakp3(self, payload):
+        # RAKP Message 3 (section 13.22): tag, status, 2 reserved bytes,
+        # managed system session ID and the key exchange authentication code,
+        # which is HMAC(Kuid, Rc, SIDm, ROLEm, ULENGTHm, UNAMEm) (section 13.31).
+        tag = payload[0]
+        session = self._sessions.get(u32(payload, 4))
+        if session is None or session.console_rand is None:
+            return build_packet(RAKP_MESSAGE_4, 0, 0, bytes([tag, STATUS_INVALID_SESSION_ID, 0, 0]) + le32(0))
+        expected = sha1_hmac(self.user_key, session.bmc_rand, le32(session.console_sid),
+                             bytes([session.role, len(session.username)]), session.username)
+        if not hmac.compare_digest(payload[8:28], expected):
+            return build_packet(RAKP_MESSAGE_4, 0, 0,
+                                bytes([tag, STATUS_INVALID_INTEGRITY_CHECK, 0, 0]) + le32(session.console_sid))
+
+        # The session integrity key is SIK = HMAC(Kg, Rm, Rc, ROLEm,
+        # ULENGTHm, UNAMEm) (section 13.31), and the integrity and
+        # confidentiality keys are K1 = HMAC(SIK, 20 bytes of 0x01) and the
+        # first 16 bytes of K2 = HMAC(SIK, 20 bytes of 0x02) (section 13.32).
+        sik = sha1_hmac(self.user_key, session.console_rand, session.bmc_rand,
+                        bytes([session.role, len(session.username)]), session.username)
+        session.k1 = sha1_hmac(sik, b'\x01' * 20)
+        session.k2 = sha1_hmac(sik, b'\x02' * 20)[:16]
+        self.sessions_opened += 1
+
+        # RAKP Message 4 (section 13.23): tag, status, 2 reserved bytes,
+        # remote console session ID, and the integrity check value, which is
+        # the first 12 bytes of HMAC(SIK, Rm, SIDc, GUIDc) (section 13.31).
+        check = sha1_hmac(sik, session.console_rand, le32(session.bmc_sid), self.guid)[:12]
+        return build_packet(RAKP_MESSAGE_4, 0, 0, bytes([tag, 0, 0, 0]) + le32(session.console_sid) + check)
+
+    def _handle_session_packet(self, packet):
+        session = self._sessions.get(u32(packet, 6))
+        if session is None or not session.active:
+            return None
+        payload_type, _, _, message = parse_packet(packet, session.k1, session.k2)
+        if payload_type != IPMI_MESSAGE:
+            return None
+
+        # IPMI request message (section 13.8): rsAddr, netFn/rsLUN, checksum,
+        # rqAddr, rqSeq/rqLUN, command, data and checksum
+        if len(message) < 7 or ipmi_checksum(message[:2]) != message[2] \
+                or ipmi_checksum(message[3:-1]) != message[-1]:
+            raise InvalidPacket('bad IPMI message checksum')
+        netfn, rq_addr, rq_seq, cmd, data = message[1] >> 2, message[3], message[4] >> 2, message[5], message[6:-1]
+        self.commands.append(cmd)
+        completion_code, response_data = self._handle_command(netfn, cmd, data)
+
+        # IPMI response message: rqAddr, netFn/rqLUN, checksum, rsAddr,
+        # rqSeq/rsLUN, command, completion code, data and checksum. The
+        # response network function is the request network function plus one.
+        header = bytes([rq_addr, (netfn + 1) << 2])
+        body = bytes([message[0], rq_seq << 2, cmd, completion_code]) + response_data
+        response = header + bytes([ipmi_checksum(header)]) + body + bytes([ipmi_checksum(body)])
+        session.sequence += 1
+        return build_packet(IPMI_MESSAGE, session.console_sid, session.sequence, response,
+                            session.k1, session.k2)
+
+    def _handle_command(self, netfn, cmd, data):
+        if (netfn, cmd) == (NETFN_CHASSIS_REQUEST, GET_CHASSIS_STATUS):
+            # Bit 0 of the current power state byte is set if power is on
+            return 0, bytes([int(self.power_state == 'on'), 0, 0])
+        if (netfn, cmd) == (NETFN_CHASSIS_REQUEST, CHASSIS_CONTROL):
+            # Chassis control 0 is power down and 1 is power up
+            if data not in (b'\x00', b'\x01'):
+                return COMPLETION_INVALID_DATA, b''
+            self.power_state = 'on' if data == b'\x01' else 'off'
+            return 0, b''
+        if (netfn, cmd) == (NETFN_APP_REQUEST, CLOSE_SESSION):
+            self._sessions.pop(u32(data, 0), None)
+            return 0, b''
+        return COMPLETION_INVALID_COMMAND, b''
@@ -0,0 +1,165 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+A local SSH server for testing code which runs commands over SSH.
+"""
+import socket
+import threading
+
+import paramiko
+
+# Generating a host key is slow, so one key is shared by all servers.
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def get_host_key():
+    """Get the RSA host key used by all LocalSSHServer instances."""
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """Accepts any password and runs exec requests with the server's handler."""
+
+    def __init__(self, server):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.server.run_command,
+                         args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+class LocalSSHServer:
+    """An SSH server listening on the loopback interface.
+
+    Commands are not executed. Instead, each command is passed to a handler
+    function which returns a tuple of (exit_status, stdout, stderr). Clients
+    may log in with any username and password.
+    """
+
+    def __init__(self, handler):
+        """Create a new LocalSSHServer.
+
+        Args:
+            handler (Callable): a function which takes the command string and
+                returns a tuple of (exit_status, stdout, stderr), where stdout
+                and stderr are str.
+        """
+        self.handler = handler
+        self.connection_count = 0
+        self.commands = []
+        self._transports = []
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self.port = self._sock.getsockname()[1]
+        self._accept_thread = None
+
+    @property
+    def connect_kwargs(self):
+        """dict: keyword arguments for paramiko.SSHClient.connect to log in to this server"""
+        return {
+            'port': self.port,
+            'username': 'root',
+            'password': 'password',
+            'look_for_keys': False,
+            'allow_agent': False,
+        }
+
+    def start(self):
+        """Start accepting connections."""
+        self._sock.listen(16)
+        self._accept_thread = threading.Thread(target=self._accept_connections, daemon=True)
+        self._accept_thread.start()
+
+    def _accept_connections(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                # The listening socket was closed.
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(get_host_key())
+            with self._lock:
+                self.connection_count += 1
+                self._transports.append(transport)
+            transport.start_server(server=_ServerInterface(self))
+
+    def run_command(self, channel, command):
+        """Run a command using the handler and send its output over the channel."""
+        with self._lock:
+            self.commands.append(command)
+        exit_status, stdout, stderr = self.handler(command)
+        if stdout:
+            channel.sendall(stdout.encode())
+        if stderr:
+            channel.sendall_stderr(stderr.encode())
+        channel.send_exit_status(exit_status)
+        # The channel is left for the client to close. If it were closed here,
+        # it could be closed before the reply to the exec request is sent.
+        channel.shutdown_write()
+
+    def drop_connections(self):
+        """Close all connections from clients, leaving the server running."""
+        with self._lock:
+            transports = list(self._transports)
+            self._transports.clear()
+        for transport in transports:
+            transport.close()
+
+    def stop(self):
+        """Stop accepting connections and close all existing connections."""
+        try:
+            # Shutting down the socket wakes up the thread blocked in accept()
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._accept_thread.join()
+        self.drop_connections()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,240 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for the sat.cli.bootsys.boa module.
+"""
+from datetime import datetime, timedelta
+import logging
+import unittest
+from unittest.mock import Mock, patch
+
+from kubernetes.client import (
+    V1Job,
+    V1JobCondition,
+    V1JobList,
+    V1JobStatus,
+    V1ListMeta,
+    V1ObjectMeta,
+    V1Pod,
+    V1PodList,
+)
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import ProtocolError
+
+from sat.cli.bootsys.boa import (
+    BOA_FATAL_ERROR_MSG,
+    BOAJobError,
+    BOAJobMonitor,
+    JOB_COMPLETE,
+    JOB_DELETED,
+    JOB_FAILED,
+    get_job_state,
+)
+
+
+def make_job(name, condition_type=None, condition_status='True', resource_version='1'):
+    """Make a V1Job with at most one condition."""
+    conditions = None
+    if condition_type:
+        conditions = [V1JobCondition(type=condition_type, status=condition_status)]
+    return V1Job(metadata=V1ObjectMeta(name=name, resource_version=resource_version),
+                 status=V1JobStatus(conditions=conditions))
+
+
+class TestGetJobState(unittest.TestCase):
+    """Tests for the get_job_state function."""
+
+    def test_running_job(self):
+        """Test that a job without conditions has not finished."""
+        self.assertIsNone(get_job_state(make_job('boa-1')))
+
+    def test_complete_job(self):
+        """Test that a job with a true Complete condition is complete."""
+        self.assertEqual(JOB_COMPLETE, get_job_state(make_job('boa-1', JOB_COMPLETE)))
+
+    def test_failed_job(self):
+        """Test that a job with a true Failed condition failed."""
+        self.assertEqual(JOB_FAILED, get_job_state(make_job('boa-1', JOB_FAILED)))
+
+    def test_false_condition(self):
+        """Test that a condition with status False is ignored."""
+        self.assertIsNone(get_job_state(make_job('boa-1', JOB_COMPLETE, 'False')))
+
+
+class TestBOAJobMonitor(unittest.TestCase):
+    """Tests for the BOAJobMonitor class."""
+
+    def setUp(self):
+        self.batch_api = Mock()
+        self.core_api = Mock()
+        self.batch_api.list_namespaced_job.return_value = V1JobList(
+            items=[make_job('boa-done', JOB_COMPLETE), make_job('boa-running')],
+            metadata=V1ListMeta(resource_version='10')
+        )
+        self.monitor = BOAJobMonitor(self.batch_api, self.core_api)
+
+        self.watch_events = []
+        self.mock_watch_cls = patch('sat.cli.bootsys.boa.Watch').start()
+        self.mock_watch = self.mock_watch_cls.return_value
+        self.mock_watch.stream.side_effect = self.fake_stream
+
+    def tearDown(self):
+        patch.stopall()
+
+    def fake_stream(self, *args, **kwargs):
+        """Yield each list of events in self.watch_events, stopping afterwards."""
+        events = self.watch_events.pop(0)
+        if isinstance(events, Exception):
+            raise events
+        yield from events
+        if not self.watch_events:
+            self.monitor.stop()
+
+    def test_register_finished_job(self):
+        """Test registering a job which already finished before the watch."""
+        self.watch_events = [[]]
+        self.monitor.run()
+        self.assertTrue(self.monitor.register('boa-done').is_set())
+        self.assertFalse(self.monitor.register('boa-running').is_set())
+        self.mock_watch.stream.assert_called_once_with(
+            self.batch_api.list_namespaced_job, 'services',
+            resource_version='10', timeout_seconds=60
+        )
+
+    def test_job_finishes_during_watch(self):
+        """Test that the event of a registered job is set when it finishes."""
+        event = self.monitor.register('boa-running')
+        self.watch_events = [[
+            {'type': 'MODIFIED', 'object': make_job('boa-other', JOB_FAILED, resource_version='11')},
+            {'type': 'MODIFIED', 'object': make_job('boa-running', JOB_COMPLETE, resource_version='12')},
+        ]]
+        self.monitor.run()
+        self.assertTrue(event.is_set())
+        self.assertEqual(JOB_COMPLETE, self.monitor.get_job_state('boa-running'))
+        self.assertEqual(JOB_FAILED, self.monitor.get_job_state('boa-other'))
+
+    def test_job_deleted(self):
+        """Test that a job deleted before it finished is recorded as deleted."""
+        event = self.monitor.register('boa-running')
+        self.watch_events = [[{'type': 'DELETED', 'object': make_job('boa-running')}]]
+        self.monitor.run()
+        self.assertTrue(event.is_set())
+        self.assertEqual(JOB_DELETED, self.monitor.get_job_state('boa-running'))
+
+    def test_watch_restarted_from_last_resource_version(self):
+        """Test that the watch continues from the last resource version it saw."""
+        self.watch_events = [
+            [{'type': 'MODIFIED', 'object': make_job('boa-running', resource_version='15')}],
+            [],
+        ]
+        self.monitor.run()
+        self.assertEqual('15', self.mock_watch.stream.call_args.kwargs['resource_version'])
+        self.batch_api.list_namespaced_job.assert_called_once_with('services')
+
+    def test_watch_expired(self):
+        """Test that jobs are listed again when the watch expires."""
+        self.watch_events = [ApiException(status=410), []]
+        self.monitor.run()
+        self.assertEqual(2, self.batch_api.list_namespaced_job.call_count)
+
+    def test_job_deleted_while_watch_expired(self):
+        """Test that a job missing when jobs are listed again is recorded as deleted."""
+        event = self.monitor.register('boa-running')
+        other_event = self.monitor.register('boa-other')
+        self.batch_api.list_namespaced_job.side_effect = [
+            V1JobList(items=[make_job('boa-running')], metadata=V1ListMeta(resource_version='10')),
+            V1JobList(items=[], metadata=V1ListMeta(resource_version='20')),
+        ]
+        self.watch_events = [ApiException(status=410), []]
+        self.monitor.run()
+        self.assertTrue(event.is_set())
+        self.assertEqual(JOB_DELETED, self.monitor.get_job_state('boa-running'))
+        self.assertTrue(other_event.is_set())
+
+    def test_registered_job_missing_from_first_list(self):
+        """Test that a job missing from the first list of jobs is not recorded as deleted."""
+        event = self.monitor.register('boa-new')
+        self.watch_events = [[]]
+        self.monitor.run()
+        self.assertFalse(event.is_set())
+        self.assertIsNone(self.monitor.get_job_state('boa-new'))
+
+    def test_watch_failure(self):
+        """Test that the watch is retried after a failure."""
+        self.watch_events = [ProtocolError('connection broken'), []]
+        with patch('sat.cli.bootsys.boa.WATCH_RETRY_DELAY', 0):
+            with self.assertLogs(level=logging.WARNING) as logs:
+                self.monitor.run()
+        self.assertIn('Failed to watch BOA jobs', logs.output[0])
+        self.assertEqual(2, self.mock_watch.stream.call_count)
+
+
+class TestBOAJobSucceeded(unittest.TestCase):
+    """Tests for BOAJobMonitor.job_succeeded."""
+
+    def setUp(self):
+        self.core_api = Mock()
+        self.job_name = 'boa-1234'
+        now = datetime.now()
+        self.core_api.list_namespaced_pod.return_value = V1PodList(items=[
+            V1Pod(metadata=V1ObjectMeta(name=f'{self.job_name}-{n}',
+                                        creation_timestamp=now + timedelta(minutes=n)))
+            for n in (1, 3, 2)
+        ])
+        self.core_api.read_namespaced_pod_log.return_value = 'Starting a BOA job.\nFinishing a BOA job.\n'
+        self.monitor = BOAJobMonitor(Mock(), self.core_api)
+
+    def test_job_succeeded(self):
+        """Test a job whose log does not contain the fatal error message."""
+        self.assertTrue(self.monitor.job_succeeded(self.job_name))
+        self.core_api.list_namespaced_pod.assert_called_once_with(
+            'services', label_selector=f'job-name={self.job_name}'
+        )
+        self.core_api.read_namespaced_pod_log.assert_called_once_with(
+            f'{self.job_name}-3', 'services', container='boa', tail_lines=500
+        )
+
+    def test_job_not_successful(self):
+        """Test a job whose log contains the fatal error message."""
+        self.core_api.read_namespaced_pod_log.return_value = f'Starting a BOA job.\n{BOA_FATAL_ERROR_MSG}\n'
+        with self.assertLogs(level=logging.ERROR) as logs:
+            self.assertFalse(self.monitor.job_succeeded(self.job_name))
+        self.assertIn(BOA_FATAL_ERROR_MSG, logs.output[0])
+        self.assertIn(f'kubectl -n services logs -c boa {self.job_name}-3', logs.output[1])
+
+    def test_no_pods(self):
+        """Test a job which has no pods."""
+        self.core_api.list_namespaced_pod.return_value = V1PodList(items=[])
+        with self.assertRaisesRegex(BOAJobError, f'no pods with job-name={self.job_name}'):
+            self.monitor.job_succeeded(self.job_name)
+
+    def test_log_failure(self):
+        """Test a failure to read the log of the job's pod."""
+        self.core_api.read_namespaced_pod_log.side_effect = ApiException(reason='Not Found')
+        with self.assertRaisesRegex(BOAJobError, f'failed to get logs of pod {self.job_name}-3'):
+            self.monitor.job_succeeded(self.job_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
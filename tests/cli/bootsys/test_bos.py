@@ -31,9 +31,12 @@ import math
 import shlex
 import subprocess
 from textwrap import indent
+from threading import Event
 import unittest
 from unittest.mock import MagicMock, Mock, call, patch
 
+from sat.apiclient import APIError
+from sat.cli.bootsys.boa import BOAJobError, JOB_COMPLETE, JOB_FAILED
 from sat.cli.bootsys.bos import (
     BOSFailure,
     BOSLimitString,
@@ -41,7 +44,8 @@ from sat.cli.bootsys.bos import (
     BOSV2SessionWaiter,
     boa_job_successful,
     do_bos_shutdowns,
-    get_session_templates
+    get_session_templates,
+    get_templates_needing_operation,
 )
 from tests.common import ExtendedTestCase
 
@@ -406,6 +410,117 @@ class TestBOSSessionThread(unittest.TestCase):
         self.assertEqual(self.mock_create_response['links'][0]['jobId'],
                          bos_thread.boa_job_id)
 
+    def get_watching_thread(self, job_state=JOB_COMPLETE):
+        """Get a BOSSessionThread with a mock BOAJobMonitor for a finished job."""
+        mock_monitor = Mock()
+        mock_monitor.register.return_value = Event()
+        mock_monitor.register.return_value.set()
+        mock_monitor.get_job_state.return_value = job_state
+        bos_thread = BOSSessionThread('cle-1.3.0', 'boot', boa_job_monitor=mock_monitor)
+        bos_thread.create_session()
+        return bos_thread, mock_monitor
+
+    def test_monitor_status_watch_success(self):
+        """Test monitor_status_watch when the BOA job completed successfully."""
+        bos_thread, mock_monitor = self.get_watching_thread()
+        mock_monitor.job_succeeded.return_value = True
+        bos_thread.monitor_status_watch()
+        mock_monitor.register.assert_called_once_with(bos_thread.boa_job_id)
+        mock_monitor.job_succeeded.assert_called_once_with(bos_thread.boa_job_id)
+        self.assertTrue(bos_thread.complete)
+        self.assertFalse(bos_thread.failed)
+
+    def test_monitor_status_watch_fatal_error(self):
+        """Test monitor_status_watch when the BOA job logged a fatal error."""
+        bos_thread, mock_monitor = self.get_watching_thread()
+        mock_monitor.job_succeeded.return_value = False
+        bos_thread.monitor_status_watch()
+        self.assertTrue(bos_thread.failed)
+
+    def test_monitor_status_watch_job_failed(self):
+        """Test monitor_status_watch when the BOA job failed."""
+        bos_thread, mock_monitor = self.get_watching_thread(JOB_FAILED)
+        bos_thread.monitor_status_watch()
+        mock_monitor.job_succeeded.assert_not_called()
+        self.assertTrue(bos_thread.failed)
+        self.assertIn(f'ended with state {JOB_FAILED}', bos_thread.fail_msg)
+
+    def test_monitor_status_watch_log_errors(self):
+        """Test monitor_status_watch when the BOA job log cannot be read."""
+        bos_thread, mock_monitor = self.get_watching_thread()
+        bos_thread.check_interval = 0
+        mock_monitor.job_succeeded.side_effect = BOAJobError('no pods')
+        with self.assertLogs(level=logging.WARNING):
+            bos_thread.monitor_status_watch()
+        self.assertEqual(bos_thread.max_consec_fails + 1, mock_monitor.job_succeeded.call_count)
+        self.assertTrue(bos_thread.failed)
+
+    def test_run_with_monitor(self):
+        """Test that run uses the BOAJobMonitor and sets the finished event."""
+        finished_event = Event()
+        mock_monitor = Mock()
+        bos_thread = BOSSessionThread('cle-1.3.0', 'boot', boa_job_monitor=mock_monitor,
+                                      finished_event=finished_event)
+        with patch('sat.cli.bootsys.bos.get_config_value', return_value='v1'), \
+                patch.object(bos_thread, 'monitor_status_watch') as mock_monitor_status_watch, \
+                patch.object(bos_thread, 'monitor_status_kubectl') as mock_monitor_status_kubectl:
+            bos_thread.run()
+        mock_monitor_status_watch.assert_called_once_with()
+        mock_monitor_status_kubectl.assert_not_called()
+        self.assertTrue(finished_event.is_set())
+
+
+class TestGetTemplatesNeedingOperation(unittest.TestCase):
+    """Tests for checking which session templates need an operation performed."""
+
+    def setUp(self):
+        self.templates = [
+            {'name': 'cos', 'boot_sets': {'computes': {'node_roles_groups': ['Compute']}}},
+            {'name': 'uan', 'boot_sets': {'uans': {'node_list': ['x3000c0s1b0n0']}}},
+        ]
+        self.components = [
+            {'ID': 'x1000c0s0b0n0', 'State': 'Off', 'Role': 'Compute'},
+            {'ID': 'x3000c0s1b0n0', 'State': 'Ready', 'Role': 'Application'},
+        ]
+        self.mock_bos_client = MagicMock()
+        self.mock_bos_client.get_session_templates.return_value = self.templates
+        patch('sat.cli.bootsys.bos.BOSClientCommon.get_bos_client',
+              return_value=self.mock_bos_client).start()
+        self.mock_hsm_client = patch('sat.cli.bootsys.bos.HSMClient').start().return_value
+        self.mock_hsm_client.get.return_value.json.return_value = {'Components': self.components}
+        patch('sat.cli.bootsys.bos.SATSession').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_templates_needing_boot(self):
+        """Test finding templates which have nodes that are not booted"""
+        self.assertEqual(['cos'], get_templates_needing_operation(['cos', 'uan'], 'boot'))
+
+    def test_templates_needing_shutdown(self):
+        """Test finding templates which have nodes that are not shut down"""
+        self.assertEqual(['uan'], get_templates_needing_operation(['cos', 'uan'], 'shutdown'))
+
+    def test_single_round_of_api_calls(self):
+        """Test that templates and node states are each retrieved once for all templates"""
+        get_templates_needing_operation(['cos', 'uan'], 'boot')
+        self.mock_bos_client.get_session_template.assert_not_called()
+        self.mock_hsm_client.get.assert_called_once_with('State', 'Components', params={'type': 'Node'})
+
+    def test_template_not_in_listing(self):
+        """Test that a template missing from the listing is retrieved individually"""
+        self.mock_bos_client.get_session_template.return_value = {
+            'name': 'other', 'boot_sets': {'computes': {'node_list': ['x1000c0s0b0n0']}}
+        }
+        self.assertEqual(['other'], get_templates_needing_operation(['other'], 'boot'))
+        self.mock_bos_client.get_session_template.assert_called_once_with('other')
+
+    def test_hsm_failure(self):
+        """Test that templates are considered as needing the operation if HSM fails"""
+        self.mock_hsm_client.get.side_effect = APIError('HSM failed')
+        with self.assertLogs(level=logging.ERROR):
+            self.assertEqual(['cos', 'uan'], get_templates_needing_operation(['cos', 'uan'], 'boot'))
+
 
 class TestGetSessionTemplates(ExtendedTestCase):
     """Test the function which processes BOS template options and finds defaults."""
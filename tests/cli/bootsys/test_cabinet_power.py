@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -26,23 +26,114 @@ Unit tests for the sat.cli.bootsys.cabinet_power module.
 """
 
 from argparse import Namespace
-from unittest.mock import patch
+import unittest
+from unittest.mock import MagicMock, patch
 
-from sat.cli.bootsys.cabinet_power import do_cabinets_power_off
+from sat.apiclient import APIError
+from sat.cli.bootsys.cabinet_power import (
+    do_cabinets_power_off,
+    get_air_cooled_node_xnames,
+    get_cabinets_power_off_plan,
+    get_xnames_for_power_action,
+)
+from sat.cli.bootsys.power_plan import CabinetPowerPlan
 
 from tests.common import ExtendedTestCase
 
 
+class TestGetXnames(unittest.TestCase):
+    """Tests for getting the xnames of the components to power."""
+
+    def setUp(self):
+        self.mock_hsm_client = MagicMock()
+
+    def test_get_xnames_for_power_action(self):
+        """Test that the liquid-cooled components are retrieved with a single query."""
+        self.mock_hsm_client.get_component_xnames.return_value = ['x1000c0', 'x1000c0s0', 'x1000c0r0']
+        self.assertEqual(['x1000c0', 'x1000c0s0', 'x1000c0r0'],
+                         get_xnames_for_power_action(self.mock_hsm_client))
+        self.mock_hsm_client.get_component_xnames.assert_called_once_with({
+            'type': ['RouterModule', 'ComputeModule', 'Chassis'],
+            'class': 'Mountain',
+            'enabled': True
+        })
+
+    def test_get_air_cooled_node_xnames(self):
+        """Test that management nodes are excluded from the air-cooled nodes."""
+        self.mock_hsm_client.get_component_xnames.side_effect = [
+            ['x3000c0s5b0n0', 'x3000c0s1b0n0', 'x3001c0s1b0n0'],
+            ['x3000c0s1b0n0']
+        ]
+        self.assertEqual(['x3000c0s5b0n0', 'x3001c0s1b0n0'],
+                         get_air_cooled_node_xnames(self.mock_hsm_client))
+
+
+class TestGetCabinetsPowerOffPlan(ExtendedTestCase):
+    """Tests for the get_cabinets_power_off_plan function."""
+
+    def setUp(self):
+        self.mock_hsm_client = patch('sat.cli.bootsys.cabinet_power.HSMClient').start().return_value
+        patch('sat.cli.bootsys.cabinet_power.SATSession').start()
+        self.config_values = {
+            'bootsys.cabinet_batch_size': 1,
+            'bootsys.max_concurrent_cabinet_batches': 3
+        }
+        patch('sat.cli.bootsys.cabinet_power.get_config_value',
+              side_effect=self.config_values.get).start()
+        self.mock_hsm_client.get_component_xnames.side_effect = [
+            ['x1000c0', 'x1001c0'],
+            ['x3000c0s1b0n0', 'x3000c0s3b0n0'],
+            ['x3000c0s3b0n0']
+        ]
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_get_plan(self):
+        """Test the plan for powering off liquid-cooled and air-cooled cabinets."""
+        plan = get_cabinets_power_off_plan()
+        self.assertEqual('off', plan.power_state)
+        self.assertEqual(1, plan.batch_size)
+        self.assertEqual(3, plan.max_concurrent_batches)
+        self.assertEqual(
+            [('liquid-cooled', ['x1000c0'], False),
+             ('air-cooled', ['x3000c0s1b0n0'], True),
+             ('liquid-cooled', ['x1001c0'], False)],
+            [(batch.phase, batch.xnames, batch.force) for batch in plan.batches]
+        )
+
+    def test_get_plan_hsm_error(self):
+        """Test that a failure to query HSM exits."""
+        self.mock_hsm_client.get_component_xnames.side_effect = APIError('HSM failed')
+        with self.assertLogs(level='ERROR'):
+            with self.assertRaises(SystemExit):
+                get_cabinets_power_off_plan()
+
+
 class TestCabinetsPowerOff(ExtendedTestCase):
     """Tests for the cabinet power off process."""
     def setUp(self):
-        self.mock_liquid_cooled = patch('sat.cli.bootsys.cabinet_power.do_liquid_cooled_cabinets_power_off').start()
-        self.mock_air_cooled = patch('sat.cli.bootsys.cabinet_power.do_air_cooled_cabinets_power_off').start()
+        self.plan = CabinetPowerPlan('off')
+        self.plan.add_phase('liquid-cooled', ['x1000c0', 'x1000c0s0'])
+        self.plan.add_phase('air-cooled', ['x3000c0s1b0n0'], force=True)
+        self.mock_execute = patch.object(self.plan, 'execute').start()
+        self.mock_execute.return_value = {'liquid-cooled': set(), 'air-cooled': set()}
+        self.mock_get_plan = patch('sat.cli.bootsys.cabinet_power.get_cabinets_power_off_plan',
+                                   return_value=self.plan).start()
+        self.config_values = {
+            'bootsys.capmc_timeout': 600,
+            'bootsys.capmc_expected_duration': 0
+        }
+        patch('sat.cli.bootsys.cabinet_power.get_config_value',
+              side_effect=self.config_values.get).start()
+        self.mock_polling_strategy = patch('sat.cli.bootsys.cabinet_power.get_polling_strategy').start()
         self.mock_cron_job = patch('sat.cli.bootsys.cabinet_power.HMSDiscoveryCronJob').start()
         self.mock_prompt = patch('sat.cli.bootsys.cabinet_power.prompt_continue').start()
+        self.mock_print = patch('builtins.print').start()
 
         self.args = Namespace()
         self.args.disruptive = False
+        self.args.dry_run = False
 
     def tearDown(self):
         patch.stopall()
@@ -55,8 +146,9 @@ class TestCabinetsPowerOff(ExtendedTestCase):
         self.mock_cron_job.assert_called_once_with()
         self.mock_cron_job.return_value.set_suspend_status.assert_called_once_with(True)
 
-        self.mock_liquid_cooled.assert_called_once_with(self.args)
-        self.mock_air_cooled.assert_called_once_with(self.args)
+        self.mock_get_plan.assert_called_once_with()
+        self.mock_execute.assert_called_once_with(600, self.mock_polling_strategy.return_value)
+        self.mock_polling_strategy.assert_called_once_with('capmc')
 
     def test_do_cabinets_power_off_without_prompting(self):
         """Test do_cabinets_power_off() wihtout prompting to continue."""
@@ -67,5 +159,28 @@ class TestCabinetsPowerOff(ExtendedTestCase):
         self.mock_cron_job.assert_called_once_with()
         self.mock_cron_job.return_value.set_suspend_status.assert_called_once_with(True)
 
-        self.mock_liquid_cooled.assert_called_once_with(self.args)
-        self.mock_air_cooled.assert_called_once_with(self.args)
+        self.mock_execute.assert_called_once_with(600, self.mock_polling_strategy.return_value)
+
+    def test_do_cabinets_power_off_timed_out(self):
+        """Test do_cabinets_power_off() when components do not reach powered off state."""
+        self.mock_execute.return_value = {'liquid-cooled': {'x1000c0s0'}, 'air-cooled': set()}
+        with self.assertLogs(level='ERROR') as logs:
+            with self.assertRaises(SystemExit):
+                do_cabinets_power_off(self.args)
+        self.assert_in_element('The following liquid-cooled components failed to reach the '
+                               'powered off state after powering off with CAPMC: x1000c0s0',
+                               logs.output)
+
+    def test_do_cabinets_power_off_dry_run(self):
+        """Test do_cabinets_power_off() with dry_run prints the plan without powering off."""
+        self.args.dry_run = True
+        do_cabinets_power_off(self.args)
+
+        self.mock_prompt.assert_not_called()
+        self.mock_cron_job.assert_not_called()
+        self.mock_execute.assert_not_called()
+        printed = [c[0][0] for c in self.mock_print.call_args_list]
+        self.assertEqual(2, len(printed))
+        self.assertIn('x1000', str(printed[0]))
+        self.assertEqual('2 batches will be powered off, up to 1 at a time, in 2 rounds. '
+                         'Estimated time: 600 seconds (at most 1200 seconds).', printed[1])
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,16 +25,12 @@
 Unit tests for the sat.cli.bootsys.ceph module.
 """
 from functools import partial
-from io import BytesIO
 import json
 import logging
 import unittest
-import socket
 import subprocess
 from subprocess import CalledProcessError
-from unittest.mock import patch, call, MagicMock
-
-from paramiko import SSHException
+from unittest.mock import patch, call
 
 from sat.cli.bootsys.ceph import (
     CephHealthWaiter,
@@ -42,14 +38,20 @@ from sat.cli.bootsys.ceph import (
     check_ceph_health,
     toggle_ceph_freeze_flags
 )
+from sat.cli.bootsys.ssh import CommandResult
 from tests.common import ExtendedTestCase
 
 
-def mock_ceph_exec_command(cmd_str, stdin=b'', stdout=b'', stderr=b''):
-    if cmd_str.startswith('cephadm'):
-        stdout = b'[{"systemd_unit": "foo"}]'
+def mock_run_on_host(host, command, stdout='', stderr=''):
+    """Mock running a command on a host, returning a CommandResult."""
+    if command.startswith('cephadm'):
+        stdout = '[{"systemd_unit": "foo"}]'
+    return CommandResult(host, command, 0, stdout, stderr)
+
 
-    return tuple(BytesIO(content) for content in [stdin, stdout, stderr])
+def mock_run_on_hosts(hosts, command, **kwargs):
+    """Mock running a command on many hosts, returning a dict of CommandResults."""
+    return {host: mock_run_on_host(host, command, **kwargs) for host in hosts}
 
 
 class TestCephWaiter(unittest.TestCase):
@@ -60,9 +62,10 @@ class TestCephWaiter(unittest.TestCase):
         self.storage_hosts = [f'ncn-s00{n}' for n in range(1, 4)]
         self.waiter = CephHealthWaiter(10, self.storage_hosts)
 
-        self.mock_ssh_client = MagicMock()
-        self.mock_ssh_client.exec_command.side_effect = mock_ceph_exec_command
-        patch('sat.cli.bootsys.ceph.get_ssh_client', return_value=self.mock_ssh_client).start()
+        self.mock_run_on_hosts = patch('sat.cli.bootsys.ceph.run_on_hosts',
+                                       side_effect=mock_run_on_hosts).start()
+        self.mock_run_on_host = patch('sat.cli.bootsys.ceph.run_on_host',
+                                      side_effect=mock_run_on_host).start()
 
     def tearDown(self):
         patch.stopall()
@@ -81,43 +84,45 @@ class TestCephWaiter(unittest.TestCase):
     def test_ceph_restart_services(self):
         """Test that Ceph services can be restarted before retrying."""
         self.waiter.on_retry_action()
-        self.mock_ssh_client.connect.assert_has_calls([
-            call(host) for host in self.storage_hosts
+        self.mock_run_on_hosts.assert_called_once_with(self.storage_hosts, 'cephadm ls')
+        self.mock_run_on_host.assert_has_calls([
+            call(host, 'systemctl restart "foo"') for host in self.storage_hosts
         ])
-        self.mock_ssh_client.exec_command.assert_has_calls([
-            call('cephadm ls'),
-            call('systemctl restart "foo"')
-        ])
-        self.mock_ssh_client.close.assert_called()
 
     def test_ceph_restart_services_fails_on_ssh_connect(self):
         """Test that warnings are logged when service restart encounters SSH errors"""
-        for exc in [SSHException, socket.error]:
-            self.mock_ssh_client.connect.side_effect = exc
-            with self.assertLogs(level='WARNING'):
-                self.waiter.on_retry_action()
-            self.mock_ssh_client.exec_command.assert_not_called()
-            self.mock_ssh_client.close.assert_called()
-
-            self.mock_ssh_client.reset_mock()
+        self.mock_run_on_hosts.side_effect = lambda hosts, command: {
+            host: CommandResult(host, command, error=f'Failed to connect to {host}')
+            for host in hosts
+        }
+        with self.assertLogs(level='WARNING') as logs:
+            self.waiter.on_retry_action()
+        self.assertEqual(len(self.storage_hosts), len(logs.records))
+        self.mock_run_on_host.assert_not_called()
 
     def test_ceph_restart_fails_with_cephadm(self):
         """Test that warnings are logged when service restart fails from cephadm call"""
-        self.mock_ssh_client.exec_command.side_effect = partial(mock_ceph_exec_command, stderr=b'something went wrong')
+        self.mock_run_on_hosts.side_effect = partial(mock_run_on_hosts, stderr='something went wrong')
         with self.assertLogs(level='WARNING'):
             self.waiter.on_retry_action()
-        self.mock_ssh_client.close.assert_called()
+        self.mock_run_on_host.assert_not_called()
+
+    def test_ceph_restart_fails_with_malformed_json(self):
+        """Test that warnings are logged when cephadm returns malformed JSON"""
+        self.mock_run_on_hosts.side_effect = lambda hosts, command: {
+            host: CommandResult(host, command, 0, '[{"systemd_unit"') for host in hosts
+        }
+        with self.assertLogs(level='WARNING') as logs:
+            self.waiter.on_retry_action()
+        self.assertIn('malformed JSON', logs.output[0])
+        self.mock_run_on_host.assert_not_called()
 
     def test_ceph_restart_fails_with_systemctl(self):
         """Test that warnings are logged when service restart fails from cephadm call"""
-        call_results = [tuple(BytesIO(stream) for stream in streams) for streams in [
-            [b'', b'[{"systemd_unit": "foo"}]', b''],
-            [b'', b'', b'something went wrong']
-        ]] * 3
-        self.mock_ssh_client.exec_command.side_effect = call_results
-        with self.assertLogs(level='WARNING'):
+        self.mock_run_on_host.side_effect = partial(mock_run_on_host, stderr='something went wrong')
+        with self.assertLogs(level='WARNING') as logs:
             self.waiter.on_retry_action()
-        self.mock_ssh_client.close.assert_called()
+        self.assertEqual(len(self.storage_hosts), len(logs.records))
 
 
 class TestToggleCephFreezeFlags(ExtendedTestCase):
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -43,9 +43,11 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
     def setUp(self):
         """Set up some mocks."""
         self.hostname = 'ncn-m001'
-        self.mock_get_ssh_client = mock.patch('sat.cli.bootsys.etcd.get_ssh_client').start()
-        self.mock_ssh_client = self.mock_get_ssh_client.return_value
-        # Whether the corresponding exec_command should raise SSHException
+        self.mock_get_ssh_session_pool = mock.patch('sat.cli.bootsys.etcd.get_ssh_session_pool').start()
+        self.mock_get_client = self.mock_get_ssh_session_pool.return_value.get_client
+        self.mock_ssh_client = self.mock_get_client.return_value
+        # Whether the corresponding exec_command should raise self.exec_exception
+        self.exec_exception = SSHException
         self.systemctl_raises = False
         self.mkdir_raises = False
         self.etcdctl_raises = False
@@ -57,7 +59,7 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
         self.stderr_str = 'error'
         self.stdout_str = 'output'
 
-        def fake_exec_command(cmd):
+        def fake_exec_command(cmd, timeout=None):
             if "systemctl" in cmd:
                 should_raise = self.systemctl_raises
                 exit_status = self.systemctl_exit_status
@@ -72,13 +74,13 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
                 exit_status = 0
 
             if should_raise:
-                raise SSHException()
+                raise self.exec_exception()
 
             fake_stdout = mock.Mock()
             fake_stdout.channel.recv_exit_status.return_value = exit_status
-            fake_stdout.read.return_value = self.stdout_str
+            fake_stdout.read.return_value = self.stdout_str.encode()
             fake_stderr = mock.Mock()
-            fake_stderr.read.return_value = self.stderr_str
+            fake_stderr.read.return_value = self.stderr_str.encode()
 
             return mock.Mock(), fake_stdout, fake_stderr
 
@@ -88,24 +90,28 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
         mock.patch.stopall()
 
     def assert_ssh_client_connect(self):
-        """Assert the SSHClient was created and connected to the hostname."""
-        self.mock_get_ssh_client.assert_called_once_with()
-        self.mock_ssh_client.connect.assert_called_once_with(self.hostname)
+        """Assert only the shared SSHClient for the hostname was used."""
+        self.mock_get_client.assert_called_with(self.hostname)
+        self.assertTrue(all(c == mock.call(self.hostname) for c in self.mock_get_client.call_args_list))
 
     def assert_exec_commands(self):
         """Assert the appropriate exec_command calls were made on the SSHClient."""
-        expected_calls = [mock.call('systemctl is-active etcd')]
+        expected_calls = [mock.call('systemctl is-active etcd', timeout=None)]
         if not (self.systemctl_raises or self.systemctl_exit_status):
-            expected_calls.append(mock.call('mkdir -p /root/etcd_backup'))
+            expected_calls.append(mock.call('mkdir -p /root/etcd_backup', timeout=None))
             if not (self.mkdir_raises or self.mkdir_exit_status):
                 expected_calls.append(mock.call(
                     'ETCDCTL_API=3 etcdctl --cacert /etc/kubernetes/pki/etcd/ca.crt '
                     '--cert /etc/kubernetes/pki/etcd/peer.crt '
                     '--key /etc/kubernetes/pki/etcd/peer.key '
-                    'snapshot save /root/etcd_backup/backup.db'
+                    'snapshot save /root/etcd_backup/backup.db',
+                    timeout=None
                 ))
 
         self.mock_ssh_client.exec_command.assert_has_calls(expected_calls)
+        # Every command is run in one of the host's channel slots
+        channel_slot = self.mock_get_ssh_session_pool.return_value.channel_slot
+        self.assertEqual([mock.call(self.hostname)] * len(expected_calls), channel_slot.call_args_list)
 
     def test_save_etcd_snapshot_successful(self):
         """Test saving an etcd snapshot on a host in the successful case."""
@@ -116,7 +122,7 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
 
     def test_save_etcd_snapshot_ssh_exception(self):
         """Test saving an etcd snapshot on a host when connect raises SSHException."""
-        self.mock_ssh_client.connect.side_effect = SSHException
+        self.mock_get_client.side_effect = SSHException
 
         with self.assertRaisesRegex(EtcdSnapshotFailure, f'Failed to connect to {self.hostname}'):
             save_etcd_snapshot_on_host(self.hostname)
@@ -126,7 +132,7 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
 
     def test_save_etcd_snapshot_socket_error(self):
         """Test saving an etcd snapshot on a host when connect raises a socket.error."""
-        self.mock_ssh_client.connect.side_effect = socket.error
+        self.mock_get_client.side_effect = socket.error
 
         with self.assertRaisesRegex(EtcdSnapshotFailure, f'Failed to connect to {self.hostname}'):
             save_etcd_snapshot_on_host(self.hostname)
@@ -145,6 +151,18 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
         self.assert_ssh_client_connect()
         self.assert_exec_commands()
 
+    def test_save_etcd_snapshot_systemctl_socket_error(self):
+        """Test saving an etcd snapshot on a host when systemctl command raises socket.error."""
+        self.exec_exception = socket.error
+        self.systemctl_raises = True
+        err_regex = f'Failed to determine if etcd is active on {self.hostname}'
+
+        with self.assertRaisesRegex(EtcdSnapshotFailure, err_regex):
+            save_etcd_snapshot_on_host(self.hostname)
+
+        self.assert_ssh_client_connect()
+        self.assert_exec_commands()
+
     def test_save_etcd_snapshot_etcd_inactive(self):
         """Test saving an etcd snapshot on a host when etcd is not active."""
         self.systemctl_exit_status = 1
@@ -189,6 +207,18 @@ class TestSaveEtcdSnapshotOnHost(unittest.TestCase):
         self.assert_ssh_client_connect()
         self.assert_exec_commands()
 
+    def test_save_etcd_snapshot_etcdctl_socket_error(self):
+        """Test saving an etcd snapshot when etcdctl command raises socket.error."""
+        self.exec_exception = socket.error
+        self.etcdctl_raises = True
+        err_regex = f'Failed to execute ".* etcdctl .* snapshot save .*" on {self.hostname}'
+
+        with self.assertRaisesRegex(EtcdSnapshotFailure, err_regex):
+            save_etcd_snapshot_on_host(self.hostname)
+
+        self.assert_ssh_client_connect()
+        self.assert_exec_commands()
+
     def test_save_etcd_snapshot_etcdctl_non_zero_exit(self):
         """Test saving an etcd snapshot when etcdctl command exits non-zero."""
         self.etcdctl_exit_status = 1
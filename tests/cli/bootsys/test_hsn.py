@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -24,10 +24,11 @@
 """
 Unit tests for the sat.cli.bootsys.hsn module.
 """
+import logging
 import unittest
 from unittest.mock import patch
 
-from sat.cli.bootsys.hsn import HSNBringupWaiter, HSNPort
+from sat.cli.bootsys.hsn import HSNBringupWaiter, HSNPort, PortSetState, get_set_bits
 from sat.cli.bootsys.state_recorder import StateError
 
 
@@ -51,7 +52,7 @@ class TestHSNBringupWaiter(unittest.TestCase):
                 'x3000c0r24j16p1',  # exists, is disabled, was not present before shutdown
             ]
         }
-        self.mock_fabric_client.get_fabric_edge_ports_enabled_status.return_value = {
+        self.port_status = {
             'fabric-ports': {
                 'x3000c0r24j4p0': True,
                 'x3000c0r24j4p1': False,
@@ -66,6 +67,10 @@ class TestHSNBringupWaiter(unittest.TestCase):
             }
         }
 
+        self.mock_fabric_client.get_port_sets_enabled_status.side_effect = (
+            lambda port_sets: {port_set: self.port_status[port_set] for port_set in port_sets}
+        )
+
         mock_hsn_recorder_cls = patch('sat.cli.bootsys.hsn.HSNStateRecorder').start()
         self.mock_hsn_recorder = mock_hsn_recorder_cls.return_value
         self.mock_hsn_recorder.get_stored_state.return_value = {
@@ -97,12 +102,36 @@ class TestHSNBringupWaiter(unittest.TestCase):
         self.assertEqual(self.poll_interval, self.waiter.poll_interval)
         self.assertEqual(self.mock_fabric_client, self.waiter.fabric_client)
         self.assertEqual(self.mock_hsn_recorder, self.waiter.hsn_state_recorder)
-        self.assertEqual({}, self.waiter.current_hsn_state)
+        self.assertIsNone(self.waiter.hsn_state_tracker)
 
     def test_on_check_action(self):
-        """Test that on_check_action calls appropriate fabric client method."""
+        """Test that on_check_action gets the status of both port sets and logs progress."""
+        self.waiter.pre_wait_action()
+        with self.assertLogs(level=logging.INFO) as cm:
+            self.waiter.on_check_action()
+        self.mock_fabric_client.get_port_sets_enabled_status.assert_called_once_with(
+            ['fabric-ports', 'edge-ports']
+        )
+        self.assertIn('3 of 8 HSN links up', cm.output[-1])
+
+    def test_on_check_action_converged_port_set(self):
+        """Test that port sets whose ports are all ready are not queried again."""
+        self.port_status['fabric-ports'].update({'x3000c0r24j4p1': True, 'x3000c0r24j8p0': True})
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
-        self.mock_fabric_client.get_fabric_edge_ports_enabled_status.assert_called_once_with()
+        self.waiter.on_check_action()
+        self.mock_fabric_client.get_port_sets_enabled_status.assert_called_with(['edge-ports'])
+        self.assertTrue(self.waiter.member_has_completed(HSNPort('fabric-ports', 'x3000c0r24j8p0')))
+
+    def test_on_check_action_port_no_longer_ready(self):
+        """Test that a warning is logged when a ready port goes down."""
+        self.waiter.pre_wait_action()
+        self.waiter.on_check_action()
+        self.port_status['edge-ports']['x3000c0r24j14p0'] = False
+        with self.assertLogs(level=logging.WARNING) as cm:
+            self.waiter.on_check_action()
+        self.assertIn('Ports in port set edge-ports no longer ready: x3000c0r24j14p0', cm.output[0])
+        self.assertFalse(self.waiter.member_has_completed(HSNPort('edge-ports', 'x3000c0r24j14p0')))
 
     def test_stored_hsn_state(self):
         """Test that the stored_hsn_state gets its info from the HSNStateRecorder and caches itself."""
@@ -142,37 +171,87 @@ class TestHSNBringupWaiter(unittest.TestCase):
             HSNPort('fabric-ports', 'x3000c0r24j4p0'),
             HSNPort('edge-ports', 'x3000c0r24j14p0')
         ]
-        # Have to call this to get self.waiter.current_hsn_state updated
+        # Have to call these to get the state of the ports updated
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         for port in ports:
             self.assertTrue(self.waiter.member_has_completed(port))
 
     def test_port_disabled_before_and_after(self):
         """Test that a disabled port that was disabled before shutdown is complete."""
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         self.assertTrue(self.waiter.member_has_completed(HSNPort('fabric-ports', 'x3000c0r24j4p1')))
 
     def test_port_enabled_before_disabled_after(self):
         """Test that a disabled port that was enabled before shutdown is not complete."""
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         self.assertFalse(self.waiter.member_has_completed(HSNPort('edge-ports', 'x3000c0r24j14p1')))
 
     def test_port_enabled_before_missing_after(self):
         """Test that a port that was enabled before shutdown, now missing status is not complete."""
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         self.assertFalse(self.waiter.member_has_completed(HSNPort('fabric-ports', 'x3000c0r24j8p0')))
 
     def test_port_missing_before_enabled_after(self):
         """Test that a port that was missing before shutdown, enabled after is complete."""
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         self.assertTrue(self.waiter.member_has_completed(HSNPort('fabric-ports', 'x3000c0r24j8p1')))
 
     def test_port_disabled_before_missing_after(self):
         """Test that a port that was disabled before shutdown, missing after is not complete."""
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         self.assertFalse(self.waiter.member_has_completed(HSNPort('edge-ports', 'x3000c0r24j16p0')))
 
     def test_port_missing_before_disabled_after(self):
         """Test that a port that was missing before shutdown, disabled after is not complete."""
+        self.waiter.pre_wait_action()
         self.waiter.on_check_action()
         self.assertFalse(self.waiter.member_has_completed(HSNPort('edge-ports', 'x3000c0r24j16p1')))
+
+
+class TestPortSetState(unittest.TestCase):
+    """Tests for the PortSetState class."""
+
+    def setUp(self):
+        self.state = PortSetState('edge-ports', ['x3000c0r24j4p1', 'x3000c0r24j4p0', 'x3000c0r24j8p0'],
+                                  {'x3000c0r24j4p1': False})
+
+    def test_get_set_bits(self):
+        """Test getting the indices of set bits."""
+        self.assertEqual([0, 2, 5], list(get_set_bits(0b100101)))
+        self.assertEqual([], list(get_set_bits(0)))
+
+    def test_init(self):
+        """Test that ports are indexed in order and expected state is set."""
+        self.assertEqual(['x3000c0r24j4p0', 'x3000c0r24j4p1', 'x3000c0r24j8p0'], self.state.ports)
+        self.assertEqual(0b101, self.state.expected_enabled)
+        self.assertEqual(0, self.state.ready)
+        self.assertFalse(self.state.converged)
+
+    def test_update(self):
+        """Test that update returns the ports whose readiness changed."""
+        now_ready, no_longer_ready = self.state.update({
+            'x3000c0r24j4p0': True, 'x3000c0r24j4p1': False, 'x9000c0r1j1p0': True
+        })
+        self.assertEqual(['x3000c0r24j4p0', 'x3000c0r24j4p1'], self.state.get_xnames(now_ready))
+        self.assertEqual(0, no_longer_ready)
+        self.assertEqual(1, self.state.num_enabled)
+
+        now_ready, no_longer_ready = self.state.update({
+            'x3000c0r24j4p1': True, 'x3000c0r24j8p0': True
+        })
+        self.assertEqual(['x3000c0r24j8p0'], self.state.get_xnames(now_ready))
+        self.assertEqual(['x3000c0r24j4p0'], self.state.get_xnames(no_longer_ready))
+        self.assertFalse(self.state.port_is_ready('x3000c0r24j4p0'))
+        self.assertTrue(self.state.port_is_ready('x3000c0r24j4p1'))
+        self.assertFalse(self.state.port_is_ready('x9000c0r1j1p0'))
+
+    def test_converged(self):
+        """Test that the port set has converged when every port is ready."""
+        self.state.update({'x3000c0r24j4p0': True, 'x3000c0r24j4p1': False, 'x3000c0r24j8p0': True})
+        self.assertTrue(self.state.converged)
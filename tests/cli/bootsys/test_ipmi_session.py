@@ -0,0 +1,323 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for the sat.cli.bootsys.ipmi_session module.
+
+The client is checked against fixed test vectors and against a simulated BMC
+whose RMCP+ implementation is written separately from the client. To check
+the client against ipmitool and a real BMC, which should be done whenever the
+session setup or packet format is changed, run
+
+    ipmitool -I lanplus -C 3 -vvvv -H BMC -U USER -P PASSWORD chassis power status
+
+and compare the session integrity key and the K1 and K2 keys it prints with
+those computed by get_session_integrity_key() and get_session_keys() from the
+random numbers, session IDs, role and user name it also prints.
+"""
+import os
+import unittest
+from unittest.mock import patch
+
+from sat.cli.bootsys.ipmi_session import (
+    CMD_CLOSE_SESSION,
+    CMD_GET_CHASSIS_STATUS,
+    IPMIError,
+    IPMISession,
+    IPMISessionEngine,
+    IPMISessionSetupError,
+    IPMITimeoutError,
+    NAME_ONLY_LOOKUP,
+    NETFN_CHASSIS,
+    PAYLOAD_IPMI,
+    PRIVILEGE_ADMINISTRATOR,
+    build_ipmi_request,
+    decrypt_payload,
+    encrypt_payload,
+    get_rakp2_auth_code,
+    get_rakp3_auth_code,
+    get_rakp4_integrity_check,
+    get_session_integrity_key,
+    get_session_keys,
+    get_user_key,
+    pack_packet,
+    unpack_packet,
+)
+from tests.cli.bootsys.ipmi_simulator import IPMISimulator
+
+HOST = '127.0.0.1'
+USERNAME = 'root'
+PASSWORD = 'initial0'
+
+
+class TestPackets(unittest.TestCase):
+    """Tests for packing and unpacking RMCP+ packets."""
+
+    def setUp(self):
+        self.integrity_key = os.urandom(20)
+        self.confidentiality_key = os.urandom(16)
+
+    def test_encryption_round_trip(self):
+        """Test that payloads of any length can be encrypted and decrypted."""
+        for length in range(40):
+            payload = os.urandom(length)
+            encrypted = encrypt_payload(self.confidentiality_key, payload)
+            self.assertEqual(0, len(encrypted) % 16)
+            self.assertEqual(payload, decrypt_payload(self.confidentiality_key, encrypted))
+
+    def test_unauthenticated_packet_round_trip(self):
+        """Test packing and unpacking a packet outside a session."""
+        packet = pack_packet(PAYLOAD_IPMI, 0, 0, b'payload')
+        self.assertEqual((PAYLOAD_IPMI, 0, 0, b'payload'), unpack_packet(packet))
+
+    def test_authenticated_packet_round_trip(self):
+        """Test packing and unpacking an authenticated and encrypted packet."""
+        packet = pack_packet(PAYLOAD_IPMI, 5, 7, b'payload', self.integrity_key, self.confidentiality_key)
+        self.assertEqual(0, (len(packet) - 4 - 12) % 4)
+        self.assertEqual((PAYLOAD_IPMI, 5, 7, b'payload'),
+                         unpack_packet(packet, self.integrity_key, self.confidentiality_key))
+
+    def test_tampered_packet(self):
+        """Test that a packet with an invalid authentication code is rejected."""
+        packet = bytearray(pack_packet(PAYLOAD_IPMI, 5, 7, b'payload', self.integrity_key))
+        packet[20] ^= 0xFF
+        with self.assertRaisesRegex(IPMIError, 'invalid authentication code'):
+            unpack_packet(bytes(packet), self.integrity_key)
+
+    def test_unauthenticated_packet_in_session(self):
+        """Test that an unauthenticated packet is rejected in a session."""
+        packet = pack_packet(PAYLOAD_IPMI, 5, 7, b'payload')
+        with self.assertRaisesRegex(IPMIError, 'unauthenticated packet'):
+            unpack_packet(packet, self.integrity_key)
+
+    def test_not_rmcp_plus(self):
+        """Test that a packet which is not an RMCP+ packet is rejected."""
+        with self.assertRaisesRegex(IPMIError, 'not an RMCP\\+ packet'):
+            unpack_packet(b'\x06\x00\xff\x07\x00' + bytes(20))
+
+
+class TestKnownAnswers(unittest.TestCase):
+    """Tests of the RAKP, key and packet functions against fixed test vectors.
+
+    The inputs of each computation are written out in the order given in the
+    IPMI v2.0 specification, sections 13.28 to 13.32, and the expected values
+    are the HMAC-SHA1 of those bytes. The session uses the user "root" with
+    password "initial0", requesting the administrator role by name only.
+    """
+
+    USER_KEY = bytes.fromhex('696e697469616c30' + '00' * 12)
+    CONSOLE_SID = 0x11223344
+    BMC_SID = 0xA0B0C0D0
+    CONSOLE_RAND = bytes(range(0x00, 0x10))
+    BMC_RAND = bytes(range(0x10, 0x20))
+    BMC_GUID = bytes(range(0x20, 0x30))
+    ROLE = 0x14
+    USERNAME = b'root'
+
+    SIK = bytes.fromhex('6bd1fd9b3ce78f532be09f49e536fa5d3bf9dfb3')
+    K1 = bytes.fromhex('fcb11c35be174aa22d8a194f7fce67d451bf9fe8')
+    K2 = bytes.fromhex('b7a5b8bea7e62e2328010792d80cee42')
+
+    def test_user_key(self):
+        """Test that the user key is the password padded with zeros to 20 bytes."""
+        self.assertEqual(self.USER_KEY, get_user_key(PASSWORD))
+        self.assertEqual(self.ROLE, PRIVILEGE_ADMINISTRATOR | NAME_ONLY_LOOKUP)
+
+    def test_rakp2_auth_code(self):
+        """Test the key exchange authentication code of RAKP message 2."""
+        # HMAC(Kuid, SIDm | SIDc | Rm | Rc | GUIDc | ROLEm | ULENGTHm | UNAMEm)
+        self.assertEqual(
+            bytes.fromhex('1c25e1a3d5f9e25a8ade6828fd13d334e1d6ec91'),
+            get_rakp2_auth_code(self.USER_KEY, self.CONSOLE_SID, self.BMC_SID, self.CONSOLE_RAND,
+                                self.BMC_RAND, self.BMC_GUID, self.ROLE, self.USERNAME)
+        )
+
+    def test_rakp3_auth_code(self):
+        """Test the key exchange authentication code of RAKP message 3."""
+        # HMAC(Kuid, Rc | SIDm | ROLEm | ULENGTHm | UNAMEm)
+        self.assertEqual(
+            bytes.fromhex('3dfb95b5cd3e093fd6292a7c442e6213c8e26dba'),
+            get_rakp3_auth_code(self.USER_KEY, self.BMC_RAND, self.CONSOLE_SID, self.ROLE, self.USERNAME)
+        )
+
+    def test_session_keys(self):
+        """Test the session integrity key and the keys derived from it."""
+        # SIK = HMAC(Kg, Rm | Rc | ROLEm | ULENGTHm | UNAMEm), with Kg = Kuid
+        self.assertEqual(self.SIK, get_session_integrity_key(self.USER_KEY, self.CONSOLE_RAND,
+                                                             self.BMC_RAND, self.ROLE, self.USERNAME))
+        # K1 = HMAC(SIK, 0x01 * 20), K2 = first 16 bytes of HMAC(SIK, 0x02 * 20)
+        self.assertEqual((self.K1, self.K2), get_session_keys(self.SIK))
+
+    def test_rakp4_integrity_check(self):
+        """Test the integrity check value of RAKP message 4."""
+        # First 12 bytes of HMAC(SIK, Rm | SIDc | GUIDc)
+        self.assertEqual(bytes.fromhex('d82501eee9eb039df4450d66'),
+                         get_rakp4_integrity_check(self.SIK, self.CONSOLE_RAND, self.BMC_SID, self.BMC_GUID))
+
+    def test_session_packet(self):
+        """Test an authenticated and encrypted Get Chassis Status request."""
+        message = build_ipmi_request(NETFN_CHASSIS, CMD_GET_CHASSIS_STATUS, 1)
+        # rsAddr, netFn/rsLUN, checksum, rqAddr, rqSeq/rqLUN, cmd, checksum
+        self.assertEqual(bytes.fromhex('2000e08104017a'), message)
+
+        iv = bytes(range(0x30, 0x40))
+        expected = bytes.fromhex(
+            '0600ff07'                               # RMCP header
+            '06'                                     # auth type: RMCP+
+            'c0'                                     # payload type: IPMI, encrypted, authenticated
+            'd0c0b0a0'                               # session ID
+            '01000000'                               # session sequence number
+            '2000'                                   # payload length
+            '303132333435363738393a3b3c3d3e3f'       # confidentiality header (IV)
+            '6a59e91f2826dcfcc4fc74b64d04615e'       # encrypted message, pad and pad length
+            'ffff'                                   # integrity pad
+            '02'                                     # pad length
+            '07'                                     # next header
+            '1da07640c627c43d3b91f808'               # AuthCode: HMAC-SHA1-96 with K1
+        )
+        with patch('sat.cli.bootsys.ipmi_session.os.urandom', return_value=iv):
+            packet = pack_packet(PAYLOAD_IPMI, self.BMC_SID, 1, message, self.K1, self.K2)
+        self.assertEqual(expected, packet)
+        self.assertEqual((PAYLOAD_IPMI, self.BMC_SID, 1, message), unpack_packet(expected, self.K1, self.K2))
+
+
+class IPMISimulatorTestCase(unittest.TestCase):
+    """Base class for tests which communicate with an IPMISimulator."""
+
+    def setUp(self):
+        self.simulator = IPMISimulator(USERNAME, PASSWORD)
+        self.simulator.start()
+        patch.object(IPMISession, 'TIMEOUT', 0.1).start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.simulator.stop()
+
+    def get_session(self, username=USERNAME, password=PASSWORD):
+        session = IPMISession(HOST, username, password, port=self.simulator.port)
+        self.addCleanup(session.close)
+        return session
+
+
+class TestIPMISession(IPMISimulatorTestCase):
+    """Tests for the IPMISession class."""
+
+    def test_get_power_state(self):
+        """Test getting the power state of a BMC."""
+        session = self.get_session()
+        self.assertEqual('off', session.get_power_state())
+        self.simulator.power_state = 'on'
+        self.assertEqual('on', session.get_power_state())
+
+    def test_set_power_state(self):
+        """Test powering on and off with a BMC."""
+        session = self.get_session()
+        session.set_power_state('on')
+        self.assertEqual('on', self.simulator.power_state)
+        session.set_power_state('off')
+        self.assertEqual('off', self.simulator.power_state)
+
+    def test_session_reused(self):
+        """Test that one session is used for many commands."""
+        session = self.get_session()
+        for _ in range(5):
+            session.get_power_state()
+        self.assertEqual(1, self.simulator.sessions_opened)
+        self.assertEqual([CMD_GET_CHASSIS_STATUS] * 5, self.simulator.commands)
+
+    def test_wrong_password(self):
+        """Test that a wrong password is reported as a session setup error."""
+        with self.assertRaisesRegex(IPMISessionSetupError, 'check the IPMI username and password'):
+            self.get_session(password='wrong').get_power_state()
+
+    def test_unknown_username(self):
+        """Test that an unknown username is reported as a session setup error."""
+        with self.assertRaisesRegex(IPMISessionSetupError, 'status code 0x0d'):
+            self.get_session(username='nobody').get_power_state()
+
+    def test_unresponsive_bmc(self):
+        """Test that a BMC which does not respond causes a timeout error."""
+        self.simulator.unresponsive = True
+        with self.assertRaises(IPMITimeoutError):
+            self.get_session().get_power_state()
+
+    def test_expired_session(self):
+        """Test that a new session is set up when the BMC forgets the old one."""
+        session = self.get_session()
+        session.get_power_state()
+        self.simulator.expire_sessions()
+        self.assertEqual('off', session.get_power_state())
+        self.assertEqual(2, self.simulator.sessions_opened)
+
+    def test_close(self):
+        """Test that closing the session closes it on the BMC."""
+        session = self.get_session()
+        session.get_power_state()
+        self.assertEqual(1, self.simulator.active_sessions)
+        session.close()
+        self.assertEqual(0, self.simulator.active_sessions)
+        self.assertEqual(CMD_CLOSE_SESSION, self.simulator.commands[-1])
+        self.assertFalse(session.active)
+
+
+class TestIPMISessionEngine(IPMISimulatorTestCase):
+    """Tests for the IPMISessionEngine class."""
+
+    def setUp(self):
+        super().setUp()
+        self.engine = IPMISessionEngine(USERNAME, PASSWORD, port=self.simulator.port)
+        self.hosts = [HOST, 'localhost']
+
+    def tearDown(self):
+        self.engine.close()
+        super().tearDown()
+
+    def test_get_power_states(self):
+        """Test getting the power states of many BMCs."""
+        self.simulator.power_state = 'on'
+        self.assertEqual({host: 'on' for host in self.hosts}, self.engine.get_power_states(self.hosts))
+        self.assertEqual({host: 'on' for host in self.hosts}, self.engine.get_power_states(self.hosts))
+        self.assertEqual(len(self.hosts), self.simulator.sessions_opened)
+
+    def test_set_power_states(self):
+        """Test powering on many BMCs."""
+        self.assertEqual({host: None for host in self.hosts}, self.engine.set_power_states(self.hosts, 'on'))
+        self.assertEqual('on', self.simulator.power_state)
+
+    def test_errors_returned(self):
+        """Test that errors are returned as results instead of raised."""
+        self.simulator.unresponsive = True
+        results = self.engine.get_power_states(self.hosts)
+        for host in self.hosts:
+            self.assertIsInstance(results[host], IPMITimeoutError)
+
+    def test_close(self):
+        """Test that closing the engine closes all sessions."""
+        self.engine.get_power_states(self.hosts)
+        self.assertEqual(len(self.hosts), self.simulator.active_sessions)
+        self.engine.close()
+        self.assertEqual(0, self.simulator.active_sessions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,23 +25,16 @@
 Unit tests for the sat.cli.bootsys.k8s module.
 """
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 from sat.cli.bootsys.k8s import KubernetesPodStatusWaiter
-
-
-def generate_mock_pod(namespace, name, phase):
-    """Generate a simple mock V1Pod object."""
-    pod = MagicMock()
-    pod.metadata.namespace = namespace
-    pod.metadata.name = name
-    pod.status.phase = phase
-    return pod
+from tests.fake_pods import get_fake_pod, get_fake_pod_list_response
 
 
 class TestK8sPodWaiter(unittest.TestCase):
     def setUp(self):
         self.mock_k8s_api = patch('sat.cli.bootsys.k8s.CoreV1Api').start()
+        self.mock_list_pods = self.mock_k8s_api.return_value.list_pod_for_all_namespaces
         self.mock_load_kube_config = patch('sat.cli.bootsys.k8s.load_kube_config').start()
 
         self.mocked_pod_dump = {
@@ -56,7 +49,7 @@ class TestK8sPodWaiter(unittest.TestCase):
         }
 
         mock_recorder = patch('sat.cli.bootsys.k8s.PodStateRecorder').start()
-        mock_recorder.get_state_data.return_value = self.mocked_pod_dump
+        mock_recorder.return_value.get_stored_state.return_value = self.mocked_pod_dump
         self.timeout = 1
 
     def tearDown(self):
@@ -64,27 +57,77 @@ class TestK8sPodWaiter(unittest.TestCase):
 
     def test_k8s_pod_waiter_completed(self):
         """Test if a k8s pod is considered completed if it is in its previous state"""
-        self.mock_k8s_api.return_value.list_pod_for_all_namespaces.return_value.items = [
-            generate_mock_pod('galaxies', 'm83', 'Succeeded')
-        ]
+        self.mock_list_pods.return_value = get_fake_pod_list_response([
+            ('galaxies', 'm83', 'Succeeded')
+        ])
 
         waiter = KubernetesPodStatusWaiter(self.timeout)
+        self.assertEqual([('galaxies', 'm83')], waiter.members)
         self.assertTrue(waiter.member_has_completed(('galaxies', 'm83')))
 
     def test_k8s_pod_waiter_not_completed(self):
         """Test if a pod in different state from last shutdown is considered not completed"""
-        self.mock_k8s_api.return_value.list_pod_for_all_namespaces.return_value.items = [
-            generate_mock_pod('galaxies', 'm83', 'Pending')
-        ]
+        self.mock_list_pods.return_value = get_fake_pod_list_response([
+            ('galaxies', 'm83', 'Pending')
+        ])
 
         waiter = KubernetesPodStatusWaiter(self.timeout)
         self.assertFalse(waiter.member_has_completed(('galaxies', 'm83')))
 
     def test_k8s_pod_waiter_new_pod(self):
         """Test if a new pod is considered completed if it succeeded."""
-        self.mock_k8s_api.return_value.list_pod_for_all_namespaces.return_value.items = [
-            generate_mock_pod('galaxies', 'andromeda', 'Pending')
-        ]
+        self.mock_list_pods.return_value = get_fake_pod_list_response([
+            ('galaxies', 'andromeda', 'Pending')
+        ])
 
         waiter = KubernetesPodStatusWaiter(self.timeout)
         self.assertFalse(waiter.member_has_completed(('galaxies', 'andromeda')))
+
+    def test_k8s_pod_waiter_deleted_pod(self):
+        """Test that a pod which has been deleted is not completed."""
+        self.mock_list_pods.return_value = get_fake_pod_list_response([
+            ('galaxies', 'm83', 'Succeeded')
+        ])
+
+        waiter = KubernetesPodStatusWaiter(self.timeout)
+        waiter.pod_cache.handle_event({'type': 'DELETED',
+                                       'object': get_fake_pod('galaxies', 'm83', 'Succeeded')})
+        self.assertFalse(waiter.member_has_completed(('galaxies', 'm83')))
+
+    def test_members_have_completed_only_changed_pods(self):
+        """Test that only pods which changed since they were last checked are checked again."""
+        self.mock_list_pods.return_value = get_fake_pod_list_response([
+            ('galaxies', 'm83', 'Pending'),
+            ('planets', 'jupiter', 'Pending'),
+        ])
+        waiter = KubernetesPodStatusWaiter(self.timeout)
+        members = set(waiter.members)
+
+        with patch.object(waiter, 'member_has_completed', wraps=waiter.member_has_completed) as mock_check:
+            self.assertEqual((set(), set()), waiter.members_have_completed(members))
+            self.assertEqual(2, mock_check.call_count)
+
+            waiter.pod_cache.handle_event({
+                'type': 'MODIFIED',
+                'object': get_fake_pod('galaxies', 'm83', 'Succeeded', resource_version='2')
+            })
+            self.assertEqual(({('galaxies', 'm83')}, set()), waiter.members_have_completed(members))
+            self.assertEqual(3, mock_check.call_count)
+            mock_check.assert_called_with(('galaxies', 'm83'))
+
+            # Pods which have not changed are not checked again
+            self.assertEqual(({('galaxies', 'm83')}, set()), waiter.members_have_completed(members))
+            self.assertEqual(3, mock_check.call_count)
+
+    def test_pod_cache_watched_while_waiting(self):
+        """Test that the pod cache is started before waiting and stopped after."""
+        self.mock_list_pods.return_value = get_fake_pod_list_response([])
+        waiter = KubernetesPodStatusWaiter(self.timeout)
+
+        with patch.object(waiter.pod_cache, 'start') as mock_start, \
+                patch.object(waiter.pod_cache, 'stop') as mock_stop:
+            waiter.pre_wait_action()
+            mock_start.assert_called_once_with()
+            with patch('builtins.print'):
+                waiter.post_wait_action()
+            mock_stop.assert_called_once_with()
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,11 +25,13 @@
 Tests for the sat.cli.bootsys.mgmt_power module.
 """
 from argparse import Namespace
+import socket
 import unittest
 from unittest.mock import MagicMock, patch
 
 from paramiko.ssh_exception import SSHException, NoValidConnectionsError
 
+from sat.cli.bootsys.ipmi_session import IPMISessionSetupError, IPMITimeoutError
 from sat.cli.bootsys.mgmt_power import (
     do_power_off_ncns,
     SSHAvailableWaiter,
@@ -49,15 +51,35 @@ class TestSSHAvailableWaiter(unittest.TestCase):
     def tearDown(self):
         patch.stopall()
 
-    def test_pre_wait_action_loads_keys(self):
+    def test_check_loads_keys(self):
         """Test the SSH waiter loads system host keys through get_ssh_client."""
-        SSHAvailableWaiter(self.members, self.timeout).pre_wait_action()
+        SSHAvailableWaiter(self.members, self.timeout).member_has_completed(self.members[0])
         self.mock_get_ssh_client.assert_called_once_with()
 
     def test_ssh_available(self):
         """Test the SSH waiter detects available nodes"""
         waiter = SSHAvailableWaiter(self.members, self.timeout)
         self.assertTrue(waiter.member_has_completed(self.members[0]))
+        self.mock_ssh_client.connect.assert_called_once_with(
+            self.members[0], timeout=SSHAvailableWaiter.CONNECT_TIMEOUT
+        )
+        self.mock_ssh_client.close.assert_called_once_with()
+
+    def test_ssh_client_closed_on_failure(self):
+        """Test the SSH waiter closes its client when connecting fails"""
+        waiter = SSHAvailableWaiter(self.members, self.timeout)
+        self.mock_ssh_client.connect.side_effect = socket.timeout
+        self.assertFalse(waiter.member_has_completed(self.members[0]))
+        self.mock_ssh_client.close.assert_called_once_with()
+
+    def test_members_checked_concurrently(self):
+        """Test the SSH waiter checks all members with a worker pool"""
+        waiter = SSHAvailableWaiter(self.members, self.timeout)
+        self.assertGreater(waiter.max_workers, 1)
+        completed, failed = waiter.members_have_completed(set(self.members))
+        self.assertEqual(set(self.members), completed)
+        self.assertEqual(set(), failed)
+        self.assertEqual(len(self.members), self.mock_get_ssh_client.call_count)
 
     def test_ssh_not_available(self):
         """Test the SSH waiter detects node isn't available due to SSHException"""
@@ -147,6 +169,141 @@ class TestIPMIPowerStateWaiter(unittest.TestCase):
                 waiter.member_has_completed(self.members[0])
 
 
+class TestIPMIPowerStateWaiterBatch(unittest.TestCase):
+    """Tests for checking the power state of many hosts at once with IPMI."""
+    def setUp(self):
+        self.members = {'ncn-w002', 'ncn-s003', 'ncn-m001'}
+        self.power_state_by_member = {'ncn-w002': 'on', 'ncn-s003': 'off', 'ncn-m001': 'on'}
+        self.mock_popen = patch('sat.cli.bootsys.mgmt_power.subprocess.Popen',
+                                side_effect=self.fake_popen).start()
+        self.waiter = IPMIPowerStateWaiter(self.members, 'on', 1, 'root', 'pass', failure_threshold=1)
+
+    def tearDown(self):
+        patch.stopall()
+
+    def fake_popen(self, command, **_):
+        """Fake a running ipmitool command for the host in the command."""
+        host = command[command.index('-H') + 1].replace('-mgmt', '')
+        proc = MagicMock()
+        power_state = self.power_state_by_member.get(host)
+        if power_state is None:
+            proc.returncode = 1
+            proc.communicate.return_value = ('', 'Unable to establish IPMI v2 / RMCP+ session')
+        else:
+            proc.returncode = 0
+            proc.communicate.return_value = (f'Chassis Power is {power_state}', '')
+        return proc
+
+    def test_all_commands_started_before_waiting(self):
+        """Test that ipmitool is started for every host before any is waited for"""
+        started = []
+
+        def fake_popen(command, **kwargs):
+            proc = self.fake_popen(command, **kwargs)
+            output = proc.communicate.return_value
+
+            def communicate():
+                self.assertEqual(len(self.members), len(started))
+                return output
+
+            proc.communicate.side_effect = communicate
+            started.append(command)
+            return proc
+
+        self.mock_popen.side_effect = fake_popen
+        self.waiter.members_have_completed(self.members)
+        self.assertEqual(len(self.members), len(started))
+
+    def test_members_in_power_state_completed(self):
+        """Test that the hosts in the desired power state are completed"""
+        self.assertEqual(({'ncn-w002', 'ncn-m001'}, set()),
+                         self.waiter.members_have_completed(self.members))
+
+    def test_failing_members_failed(self):
+        """Test that hosts for which ipmitool fails too many times are failed"""
+        del self.power_state_by_member['ncn-m001']
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(({'ncn-w002'}, {'ncn-m001'}),
+                             self.waiter.members_have_completed(self.members))
+
+    def test_ipmitool_not_found(self):
+        """Test that all hosts are failed if ipmitool cannot be found"""
+        self.mock_popen.side_effect = FileNotFoundError('ipmitool')
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual((set(), self.members), self.waiter.members_have_completed(self.members))
+
+
+class TestIPMIPowerStateWaiterEngine(unittest.TestCase):
+    """Tests for checking power states with an IPMISessionEngine."""
+    def setUp(self):
+        self.members = {'ncn-w002', 'ncn-s003', 'ncn-m001'}
+        self.results_by_bmc = {'ncn-w002-mgmt': 'on', 'ncn-s003-mgmt': 'off', 'ncn-m001-mgmt': 'on'}
+        self.mock_engine = MagicMock()
+        self.mock_engine.get_power_states.side_effect = lambda hosts: {
+            host: self.results_by_bmc[host] for host in hosts
+        }
+        self.mock_engine.set_power_states.side_effect = lambda hosts, _: {
+            host: None for host in hosts
+        }
+        self.mock_subprocess_run = patch('sat.cli.bootsys.mgmt_power.subprocess.run').start()
+        self.mock_popen = patch('sat.cli.bootsys.mgmt_power.subprocess.Popen').start()
+        self.mock_popen.return_value.returncode = 0
+        self.mock_popen.return_value.communicate.return_value = ('Chassis Power is on', '')
+        self.waiter = IPMIPowerStateWaiter(self.members, 'on', 1, 'root', 'pass', failure_threshold=2,
+                                           send_command=True, ipmi_engine=self.mock_engine)
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_members_in_power_state_completed(self):
+        """Test that the hosts in the desired power state are completed"""
+        self.assertEqual(({'ncn-w002', 'ncn-m001'}, set()),
+                         self.waiter.members_have_completed(self.members))
+        self.mock_popen.assert_not_called()
+
+    def test_failing_members_failed(self):
+        """Test that hosts whose BMC fails to respond too many times are failed"""
+        self.results_by_bmc['ncn-m001-mgmt'] = IPMITimeoutError('No response')
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertEqual(({'ncn-w002'}, set()), self.waiter.members_have_completed(self.members))
+        self.assertEqual(1, len(logs.records))
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(({'ncn-w002'}, {'ncn-m001'}),
+                             self.waiter.members_have_completed(self.members))
+
+    def test_setup_failure_uses_ipmitool(self):
+        """Test that ipmitool is used for hosts whose BMC refuses a session"""
+        self.results_by_bmc['ncn-s003-mgmt'] = IPMISessionSetupError('unsupported')
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual((self.members, set()), self.waiter.members_have_completed(self.members))
+        self.mock_popen.assert_called_once()
+        self.assertIn('ncn-s003-mgmt', self.mock_popen.call_args.args[0])
+
+        # The engine is not used for that host again.
+        self.waiter.members_have_completed(self.members)
+        self.assertNotIn('ncn-s003-mgmt', self.mock_engine.get_power_states.call_args.args[0])
+
+    def test_sending_ipmi_commands(self):
+        """Test that power commands are sent with the engine"""
+        self.waiter.pre_wait_action()
+        self.mock_engine.set_power_states.assert_called_once()
+        self.assertEqual({f'{member}-mgmt' for member in self.members},
+                         set(self.mock_engine.set_power_states.call_args.args[0]))
+        self.mock_subprocess_run.assert_not_called()
+
+    def test_sending_ipmi_commands_setup_failure(self):
+        """Test that ipmitool sends power commands to hosts whose BMC refuses a session"""
+        self.mock_engine.set_power_states.side_effect = lambda hosts, _: {
+            host: IPMISessionSetupError('unsupported') if host == 'ncn-s003-mgmt' else None
+            for host in hosts
+        }
+        self.mock_subprocess_run.return_value.returncode = 0
+        with self.assertLogs(level='WARNING'):
+            self.waiter.pre_wait_action()
+        self.mock_subprocess_run.assert_called_once()
+        self.assertIn('ncn-s003-mgmt', self.mock_subprocess_run.call_args.args[0])
+
+
 class TestDoPowerOffNcns(unittest.TestCase):
     """Tests for the do_power_off_ncns() function"""
     def setUp(self):
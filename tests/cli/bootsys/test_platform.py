@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -27,8 +27,9 @@ Unit tests for the sat.cli.bootsys.platform module.
 from argparse import Namespace
 from contextlib import contextmanager
 import logging
-from paramiko import SSHException, WarningPolicy
-import socket
+from paramiko import WarningPolicy
+import os
+from tempfile import TemporaryDirectory
 import threading
 import unittest
 from unittest import mock
@@ -50,10 +51,13 @@ from sat.cli.bootsys.platform import (
     do_stop_containers,
     FatalPlatformError,
     NonFatalPlatformError,
-    PlatformServicesStep,
+    PLATFORM_RESOURCE_LIMITS,
     RemoteServiceWaiter,
     SERVICE_ACTION_TIMEOUT,
+    STEPS_BY_ACTION,
 )
+from sat.cli.bootsys.ssh import CommandResult
+from sat.cli.bootsys.steps import Step, StepEngine
 from sat.cli.bootsys.util import FatalBootsysError
 
 
@@ -63,19 +67,13 @@ class TestContainerStopThread(unittest.TestCase):
     def setUp(self):
         """Set up some mocks and a ContainerStopThread"""
         self.host = 'ncn-w001'
-        self.get_ssh_client = mock.patch('sat.cli.bootsys.platform.get_ssh_client').start()
-        self.ssh_client = self.get_ssh_client.return_value
+        self.run_on_host = mock.patch('sat.cli.bootsys.platform.run_on_host').start()
 
         self.cst = ContainerStopThread(self.host)
 
     def tearDown(self):
         mock.patch.stopall()
 
-    def assert_ssh_connected(self):
-        """Assert the SSHClient is created and connected."""
-        self.get_ssh_client.assert_called_once_with()
-        self.ssh_client.connect.assert_called_once_with(self.host)
-
     @contextmanager
     def assert_exits_with_err(self, err_msg, log_level=logging.ERROR):
         """Context manager to assert code raises SystemExit(1), logs an error, and sets success to False
@@ -137,77 +135,42 @@ class TestContainerStopThread(unittest.TestCase):
         with self.assert_exits_successfully(info_msg):
             self.cst._success_exit(info_msg)
 
-    def test_ssh_client_success(self):
-        """Test the ssh_client property of ContainerStopThread."""
-        ssh_client = self.cst.ssh_client
-        self.assertEqual(self.ssh_client, ssh_client)
-        self.assert_ssh_connected()
-        # Check that the property is cached by accessing it again and verifying
-        # that the SSHClient and its methods are not called again.
-        _ = self.cst.ssh_client
-        # The below assertion uses assert_called_once_with, which will fail if
-        # methods are called multiple times.
-        self.assert_ssh_connected()
-
-    def test_ssh_client_ssh_exception(self):
-        """Test the ssh_client property when SSHException is raised by connect."""
-        self.ssh_client.connect.side_effect = SSHException('ssh failed')
-
-        with self.assert_exits_with_err(f'Failed to connect to host {self.host}: ssh failed'):
-            _ = self.cst.ssh_client
-
-        self.assert_ssh_connected()
-
-    def test_ssh_client_socket_error(self):
-        """Test the ssh_client property when socket.error is raised by connect."""
-        self.ssh_client.connect.side_effect = socket.error
-        with self.assert_exits_with_err(f'Failed to connect to host {self.host}: '):
-            _ = self.cst.ssh_client
-
-        self.assert_ssh_connected()
-
-    def set_up_mock_exec_command(self, exit_status, stdout_bytes, stderr_bytes):
-        """Set up mock return value for exec_command method of SSHClient.
+    def set_up_mock_run_on_host(self, exit_status, stdout, stderr):
+        """Set up mock return value for run_on_host.
 
         Args:
-            exit_status (int): the exit status for recv_exit_status
-            stdout_bytes (bytes): the byte string of stdout
-            stderr_bytes (bytes): the byte string of stderr
+            exit_status (int): the exit status of the command
+            stdout (str): the stdout of the command
+            stderr (str): the stderr of the command
         """
-        mock_channel = mock.Mock()
-        mock_channel.recv_exit_status.return_value = exit_status
-        mock_stdout = mock.Mock()
-        mock_stdout.channel = mock_channel
-        mock_stdout.read.return_value = stdout_bytes
-        mock_stderr = mock.Mock()
-        mock_stderr.read.return_value = stderr_bytes
-        self.ssh_client.exec_command.return_value = mock.Mock(), mock_stdout, mock_stderr
+        self.run_on_host.side_effect = lambda host, cmd: CommandResult(host, cmd, exit_status, stdout, stderr)
 
     def test_run_remote_command_success(self):
         """Test _run_remote_command method in the successful case."""
-        self.set_up_mock_exec_command(0, b'containerid1\ncontainerid2\n', b'')
+        self.set_up_mock_run_on_host(0, 'containerid1\ncontainerid2\n', '')
         command = 'crictl ps -q'
 
         exit_status, stdout, stderr = self.cst._run_remote_command(command)
 
-        self.ssh_client.exec_command.assert_called_once_with(command)
+        self.run_on_host.assert_called_once_with(self.host, command)
         self.assertEqual(0, exit_status)
         self.assertEqual('containerid1\ncontainerid2\n', stdout)
         self.assertEqual('', stderr)
 
-    def test_run_remote_command_ssh_exception(self):
-        """Test _run_remote_command method when exec_command raises SSHException"""
-        self.ssh_client.exec_command.side_effect = SSHException('ssh failure')
+    def test_run_remote_command_ssh_failure(self):
+        """Test _run_remote_command method when the command could not be run on the host"""
         command = 'crictl ps -q'
+        err_msg = f'Failed to execute "{command}" on {self.host}: ssh failure'
+        self.run_on_host.return_value = CommandResult(self.host, command, error=err_msg)
 
-        with self.assert_exits_with_err(f'Failed to execute {command} on {self.host}: ssh failure'):
+        with self.assert_exits_with_err(err_msg):
             self.cst._run_remote_command(command)
 
-        self.ssh_client.exec_command.assert_called_once_with(command)
+        self.run_on_host.assert_called_once_with(self.host, command)
 
     def test_run_remote_command_non_zero_exit(self):
         """Test _run_remote_command method when command exits non-zero"""
-        self.set_up_mock_exec_command(1, b'', b'containerd down')
+        self.set_up_mock_run_on_host(1, '', 'containerd down')
         command = 'crictl ps -q'
         err_msg = (f'Command "{command}" on {self.host} exited with exit status 1. '
                    f'stdout: , stderr: containerd down')
@@ -215,16 +178,16 @@ class TestContainerStopThread(unittest.TestCase):
         with self.assert_exits_with_err(err_msg):
             self.cst._run_remote_command(command)
 
-        self.ssh_client.exec_command.assert_called_once_with(command)
+        self.run_on_host.assert_called_once_with(self.host, command)
 
     def test_run_remote_command_non_zero_exit_ignored(self):
         """Test _run_remote_command method when command exits non-zero"""
-        self.set_up_mock_exec_command(1, b'okay', b'just a warning')
+        self.set_up_mock_run_on_host(1, 'okay', 'just a warning')
         command = 'failing_command'
 
         exit_status, stdout, stderr = self.cst._run_remote_command(command, err_on_non_zero=False)
 
-        self.ssh_client.exec_command.assert_called_once_with(command)
+        self.run_on_host.assert_called_once_with(self.host, command)
         self.assertEqual(1, exit_status)
         self.assertEqual('okay', stdout)
         self.assertEqual('just a warning', stderr)
@@ -392,39 +355,40 @@ class TestRemoteServiceWaiter(unittest.TestCase):
         self.host = 'ncn-w001'
         self.service_name = 'exampled'
         self.timeout = 60
-        self.service_status = b'active\n'
-        self.enabled_status = b'enabled\n'
+        self.service_status = 'active\n'
+        self.enabled_status = 'enabled\n'
         # set self.systemctl_works to False to mimic cases when running the command does not
         # change the service's status
         self.systemctl_works = True
-        self.get_ssh_client = mock.patch('sat.cli.bootsys.platform.get_ssh_client').start()
-        self.ssh_client = self.get_ssh_client.return_value
-        self.ssh_client.exec_command.side_effect = self._fake_ssh_command
-        self.ssh_return_values = mock.Mock(), mock.Mock(), mock.Mock()
-        self.ssh_return_values[1].channel.recv_exit_status.return_value = 0
+        self.exit_status = 0
+        self.run_on_host = mock.patch('sat.cli.bootsys.platform.run_on_host',
+                                      side_effect=self._fake_run_on_host).start()
 
         self.waiter = RemoteServiceWaiter(self.host, self.service_name, 'inactive', self.timeout)
 
-    def _fake_ssh_command(self, cmd):
-        """Fake the behavior of SSHClient.exec_command."""
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def _fake_run_on_host(self, host, cmd):
+        """Fake the behavior of run_on_host."""
+        stdout = ''
         if cmd.startswith('systemctl is-active'):
-            self.ssh_return_values[1].read.return_value = self.service_status
+            stdout = self.service_status
         elif cmd.startswith('systemctl is-enabled'):
-            self.ssh_return_values[1].read.return_value = self.enabled_status
+            stdout = self.enabled_status
         if self.systemctl_works:
             if cmd.startswith('systemctl stop'):
-                self.service_status = b'inactive\n'
+                self.service_status = 'inactive\n'
             elif cmd.startswith('systemctl start'):
-                self.service_status = b'active\n'
+                self.service_status = 'active\n'
             elif cmd.startswith('systemctl enable'):
-                self.enabled_status = b'enabled\n'
+                self.enabled_status = 'enabled\n'
 
-        return self.ssh_return_values
+        return CommandResult(host, cmd, self.exit_status, stdout, '')
 
-    def assert_ssh_connected(self):
-        """Assert the SSH client connected to the host."""
-        self.get_ssh_client.assert_called_once_with()
-        self.ssh_client.connect.assert_called_once_with(self.host)
+    def assert_commands_run(self, commands):
+        """Assert the given commands were run on the host, in order."""
+        self.run_on_host.assert_has_calls([mock.call(self.host, command) for command in commands])
 
     def test_init(self):
         """Test creating a RemoteServiceWaiter."""
@@ -466,84 +430,77 @@ class TestRemoteServiceWaiter(unittest.TestCase):
     def test_wait_for_stop(self):
         """When the service stops, the waiter should complete."""
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl stop {self.service_name}'),
-                                                       mock.call(f'systemctl is-active {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl stop {self.service_name}',
+                                  f'systemctl is-active {self.service_name}'])
 
     def test_wait_for_start(self):
         """When the service starts, the waiter should complete."""
         self.waiter.target_state = 'active'
-        self.service_status = b'inactive\n'
+        self.service_status = 'inactive\n'
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl start {self.service_name}'),
-                                                       mock.call(f'systemctl is-active {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl start {self.service_name}',
+                                  f'systemctl is-active {self.service_name}'])
 
     def test_wait_for_enable_only(self):
         """When target_enabled='enabled', an active but disabled service should be enabled."""
         self.waiter.target_enabled = 'enabled'
         self.waiter.target_state = 'active'
-        self.enabled_status = b'disabled\n'
+        self.enabled_status = 'disabled\n'
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl is-enabled {self.service_name}'),
-                                                       mock.call(f'systemctl enable {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl is-enabled {self.service_name}',
+                                  f'systemctl enable {self.service_name}'])
 
     def test_wait_for_start_with_enable(self):
         """When target_enabled='enabled', a disabled service should be enabled."""
         self.waiter.target_enabled = 'enabled'
         self.waiter.target_state = 'active'
-        self.service_status = b'inactive\n'
-        self.enabled_status = b'disabled\n'
+        self.service_status = 'inactive\n'
+        self.enabled_status = 'disabled\n'
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl start {self.service_name}'),
-                                                       mock.call(f'systemctl is-enabled {self.service_name}'),
-                                                       mock.call(f'systemctl enable {self.service_name}'),
-                                                       mock.call(f'systemctl is-active {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl start {self.service_name}',
+                                  f'systemctl is-enabled {self.service_name}',
+                                  f'systemctl enable {self.service_name}',
+                                  f'systemctl is-active {self.service_name}'])
 
     def test_wait_for_start_with_enable_already_enabled(self):
         """When target_enabled='enabled', an already-enabled service should be left alone."""
         self.waiter.target_enabled = 'enabled'
         self.waiter.target_state = 'active'
-        self.service_status = b'inactive\n'
+        self.service_status = 'inactive\n'
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl start {self.service_name}'),
-                                                       mock.call(f'systemctl is-enabled {self.service_name}'),
-                                                       mock.call(f'systemctl is-active {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl start {self.service_name}',
+                                  f'systemctl is-enabled {self.service_name}',
+                                  f'systemctl is-active {self.service_name}'])
 
     def test_wait_for_stop_with_disable(self):
         """When target_enabled='disabled', an enabled service should be disabled."""
         self.waiter.target_enabled = 'disable'
         self.waiter.target_state = 'inactive'
-        self.service_status = b'active\n'
-        self.enabled_status = b'enabled\n'
+        self.service_status = 'active\n'
+        self.enabled_status = 'enabled\n'
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl stop {self.service_name}'),
-                                                       mock.call(f'systemctl is-enabled {self.service_name}'),
-                                                       mock.call(f'systemctl disable {self.service_name}'),
-                                                       mock.call(f'systemctl is-active {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl stop {self.service_name}',
+                                  f'systemctl is-enabled {self.service_name}',
+                                  f'systemctl disable {self.service_name}',
+                                  f'systemctl is-active {self.service_name}'])
 
     def test_wait_for_stop_with_disable_already_disabled(self):
         """When target_enabled='enabled', an already-enabled service should be left alone."""
         self.waiter.target_enabled = 'disabled'
         self.waiter.target_state = 'inactive'
-        self.service_status = b'active\n'
-        self.enabled_status = b'disabled\n'
+        self.service_status = 'active\n'
+        self.enabled_status = 'disabled\n'
         self.assertTrue(self.waiter.wait_for_completion())
-        self.assert_ssh_connected()
-        self.ssh_client.exec_command.assert_has_calls([mock.call(f'systemctl is-active {self.service_name}'),
-                                                       mock.call(f'systemctl stop {self.service_name}'),
-                                                       mock.call(f'systemctl is-enabled {self.service_name}'),
-                                                       mock.call(f'systemctl is-active {self.service_name}')])
+        self.assert_commands_run([f'systemctl is-active {self.service_name}',
+                                  f'systemctl stop {self.service_name}',
+                                  f'systemctl is-enabled {self.service_name}',
+                                  f'systemctl is-active {self.service_name}'])
 
     def test_timeout(self):
         """When the service never stops, the waiter should time out."""
@@ -558,7 +515,7 @@ class TestRemoteServiceWaiter(unittest.TestCase):
 
     def test_nonzero_return(self):
         """When stopping a service returns a nonzero exit code, an error should be logged."""
-        self.ssh_return_values[1].channel.recv_exit_status.return_value = 1
+        self.exit_status = 1
         self.systemctl_works = False
         # fake time so that there is no time spent between iterations, but calls to time.monotonic()
         # make it appear as though time has passed.
@@ -568,15 +525,26 @@ class TestRemoteServiceWaiter(unittest.TestCase):
             with self.assertLogs(level=logging.ERROR):
                 self.assertFalse(self.waiter.wait_for_completion())
 
+    def test_ssh_failure(self):
+        """When a command cannot be run on the host, the waiter should fail."""
+        self.run_on_host.side_effect = lambda host, cmd: CommandResult(
+            host, cmd, error=f'Failed to execute "{cmd}" on {host}: ssh failure'
+        )
+        err_msg = f'Failed to execute "systemctl is-active {self.service_name}" on {self.host}: ssh failure'
+        with self.assertLogs(level=logging.ERROR) as logs_cm:
+            self.assertFalse(self.waiter.wait_for_completion())
+
+        self.assertIn(err_msg, logs_cm.output[0])
+
     def test_service_already_stopped(self):
         """When the service is already stopped, just check that it's stopped and return."""
-        self.service_status = b'inactive\n'
+        self.service_status = 'inactive\n'
         self.waiter.wait_for_completion()
-        self.ssh_client.exec_command.assert_called_once_with(f'systemctl is-active {self.service_name}')
+        self.run_on_host.assert_called_once_with(self.host, f'systemctl is-active {self.service_name}')
 
     def test_unknown_state_stop(self):
         """When stopping a service in 'unknown' state, the waiter should time out."""
-        self.service_status = b'unknown\n'
+        self.service_status = 'unknown\n'
         self.systemctl_works = False
         # fake time so that there is no time spent between iterations, but calls to time.monotonic()
         # make it appear as though time has passed.
@@ -588,7 +556,7 @@ class TestRemoteServiceWaiter(unittest.TestCase):
 
     def test_unknown_state_start(self):
         """When starting a service in 'unknown' state, the waiter should time out."""
-        self.service_status = b'unknown\n'
+        self.service_status = 'unknown\n'
         self.systemctl_works = False
         self.waiter = RemoteServiceWaiter(self.host, self.service_name, 'active', self.timeout)
         # fake time so that there is no time spent between iterations, but calls to time.monotonic()
@@ -606,23 +574,33 @@ class TestDoPlatformAction(unittest.TestCase):
     def setUp(self):
         """Set up mocks."""
         self.known_action = 'start'
-        self.mock_args = mock.Mock()
+        self.mock_args = mock.Mock(resume=False)
         self.mock_first_step = mock.Mock()
         self.mock_second_step = mock.Mock()
         self.mock_steps = {
             self.known_action: [
-                PlatformServicesStep('first step', self.mock_first_step),
-                PlatformServicesStep('second step', self.mock_second_step)
+                Step('first step', self.mock_first_step),
+                Step('second step', self.mock_second_step)
             ]
             # Not necessary to test another valid action. Code path is the same.
         }
         mock.patch('sat.cli.bootsys.platform.STEPS_BY_ACTION', self.mock_steps).start()
 
+        self.ncn_groups = {'managers': ['ncn-m001'], 'kubernetes': ['ncn-m001', 'ncn-w001']}
         self.mock_get_and_verify_ncn_groups = mock.patch(
-            'sat.cli.bootsys.platform.get_and_verify_ncn_groups').start()
+            'sat.cli.bootsys.platform.get_and_verify_ncn_groups',
+            return_value=self.ncn_groups
+        ).start()
+
+        self.resource_dir = TemporaryDirectory()
+        mock.patch('sat.cli.bootsys.platform.get_resource_section_path',
+                   return_value=self.resource_dir.name).start()
+        self.checkpoint_path = os.path.join(self.resource_dir.name,
+                                            f'platform-{self.known_action}-checkpoint.json')
 
     def tearDown(self):
         mock.patch.stopall()
+        self.resource_dir.cleanup()
 
     def test_invalid_action(self):
         """Test giving an invalid action."""
@@ -705,6 +683,72 @@ class TestDoPlatformAction(unittest.TestCase):
         self.assertEqual(cm.records[3].message, 'Executing step: second step')
         self.assertEqual(cm.records[3].levelno, logging.INFO)
 
+    @mock.patch('sat.cli.bootsys.platform.pester_choices', return_value='no')
+    def test_do_platform_action_resume(self, _):
+        """Test that steps completed before a failure are skipped with --resume."""
+        self.mock_second_step.side_effect = NonFatalPlatformError('fail')
+        with self.assertLogs(level=logging.INFO):
+            with self.assertRaises(SystemExit):
+                do_platform_action(self.mock_args, self.known_action)
+        self.assertTrue(os.path.exists(self.checkpoint_path))
+
+        self.mock_second_step.side_effect = None
+        self.mock_args.resume = True
+        with self.assertLogs(level=logging.INFO) as cm:
+            do_platform_action(self.mock_args, self.known_action)
+
+        self.mock_first_step.assert_called_once_with(self.ncn_groups)
+        self.assertEqual(2, self.mock_second_step.call_count)
+        self.assertEqual('Skipping step completed in a previous run: first step',
+                         cm.records[0].message)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_do_platform_action_no_resume(self):
+        """Test that a checkpoint is ignored without --resume."""
+        with open(self.checkpoint_path, 'w') as f:
+            f.write('{"key": null, "completed": ["first step"]}')
+        with self.assertLogs(level=logging.INFO):
+            do_platform_action(self.mock_args, self.known_action)
+        self.mock_first_step.assert_called_once_with(self.ncn_groups)
+
+
+class TestPlatformSteps(unittest.TestCase):
+    """Tests for the definitions of the platform services steps."""
+
+    def test_steps_valid(self):
+        """Test that the steps of each action have valid dependencies."""
+        for action, steps in STEPS_BY_ACTION.items():
+            with self.subTest(action=action):
+                StepEngine(steps)
+
+    def test_kubelet_started_last(self):
+        """Test that kubelet is started after all other platform services."""
+        engine = StepEngine(STEPS_BY_ACTION['start'])
+        self.assertEqual({'containerd-start', 'etcd-start', 'ceph-unfreeze'},
+                         engine.dependencies['kubelet-start'])
+
+    def test_kubernetes_stopped_after_etcd(self):
+        """Test that kubelet is stopped only after the etcd snapshot is taken and etcd stopped."""
+        engine = StepEngine(STEPS_BY_ACTION['stop'])
+        self.assertEqual({'etcd-stop'}, engine.dependencies['kubelet-stop'])
+        self.assertEqual({'etcd-snapshot'}, engine.dependencies['etcd-stop'])
+
+    def test_steps_on_same_ncns_share_resources(self):
+        """Test that steps operating on the same NCNs cannot run at the same time."""
+        for action, steps in STEPS_BY_ACTION.items():
+            for step in steps:
+                with self.subTest(action=action, step=step.name):
+                    self.assertTrue(step.resources)
+                    self.assertTrue(set(step.resources) <= set(PLATFORM_RESOURCE_LIMITS))
+        steps_by_name = {step.name: step for step in STEPS_BY_ACTION['start']}
+        self.assertTrue(set(steps_by_name['etcd-start'].resources) &
+                        set(steps_by_name['containerd-start'].resources))
+
+    def test_ceph_frozen_last(self):
+        """Test that Ceph is frozen after Kubernetes services are stopped."""
+        engine = StepEngine(STEPS_BY_ACTION['stop'])
+        self.assertEqual({'etcd-stop', 'containerd-stop'}, engine.dependencies['ceph-freeze'])
+
 
 class TestDoPlatformStartStop(unittest.TestCase):
     """Tests for the do_platform_start and do_platform_stop functions."""
@@ -858,6 +902,13 @@ class TestDoServiceActionOnHosts(unittest.TestCase):
         self.mock_waiters = [mock.Mock(completed=True) for _ in self.hosts]
         self.mock_waiter = mock.patch('sat.cli.bootsys.platform.RemoteServiceWaiter',
                                       side_effect=self.mock_waiters).start()
+        self.mock_wait_for_all = mock.patch(
+            'sat.cli.bootsys.platform.wait_for_all',
+            side_effect=lambda waiters: all(waiter.completed for waiter in waiters)
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
 
     def test_all_successful(self):
         """Test doing a service action when it is successful on all hosts."""
@@ -868,9 +919,7 @@ class TestDoServiceActionOnHosts(unittest.TestCase):
                       timeout=SERVICE_ACTION_TIMEOUT, target_enabled=self.target_enabled)
             for host in self.hosts
         ])
-        for waiter in self.mock_waiters:
-            waiter.wait_for_completion_async.assert_called_once_with()
-            waiter.wait_for_completion_await.assert_called_once_with()
+        self.mock_wait_for_all.assert_called_once_with(self.mock_waiters)
 
     def test_one_failure(self):
         """Test doing a service action when it fails on a single host."""
@@ -886,9 +935,7 @@ class TestDoServiceActionOnHosts(unittest.TestCase):
                       timeout=SERVICE_ACTION_TIMEOUT, target_enabled=self.target_enabled)
             for host in self.hosts
         ])
-        for waiter in self.mock_waiters:
-            waiter.wait_for_completion_async.assert_called_once_with()
-            waiter.wait_for_completion_await.assert_called_once_with()
+        self.mock_wait_for_all.assert_called_once_with(self.mock_waiters)
 
 
 class TestDoEtcdSnapshotStartStop(unittest.TestCase):
@@ -907,14 +954,22 @@ class TestDoEtcdSnapshotStartStop(unittest.TestCase):
     def tearDown(self):
         mock.patch.stopall()
 
+    def set_snapshot_errors(self, errors_by_host):
+        """Make saving a snapshot raise the given error for each host, if any."""
+        def save_snapshot(host):
+            if errors_by_host[host] is not None:
+                raise errors_by_host[host]
+        self.mock_save_snapshot.side_effect = save_snapshot
+
     def test_do_etcd_snapshot_success(self):
         """Test do_etcd_snapshot in with no errors."""
         do_etcd_snapshot(self.ncn_groups)
-        self.mock_save_snapshot.assert_has_calls([mock.call(manager) for manager in self.managers])
+        self.mock_save_snapshot.assert_has_calls([mock.call(manager) for manager in self.managers],
+                                                 any_order=True)
 
     def test_do_etcd_snapshot_all_etcd_inactive(self):
         """Test do_etcd_snapshot when etcd is inactive on all managers."""
-        self.mock_save_snapshot.side_effect = [EtcdInactiveFailure('etcd inactive')] * len(self.managers)
+        self.mock_save_snapshot.side_effect = EtcdInactiveFailure('etcd inactive')
         err_regex = f'Failed to create etcd snapshot on hosts: {", ".join(self.managers)}'
 
         with self.assertRaisesRegex(NonFatalPlatformError, err_regex):
@@ -929,11 +984,11 @@ class TestDoEtcdSnapshotStartStop(unittest.TestCase):
 
     def test_do_etcd_snapshot_one_etcd_inactive(self):
         """Test do_etcd_snapshot when etcd is inactive on one manager."""
-        self.mock_save_snapshot.side_effect = [
-            None,                                  # ncn-m001
-            EtcdInactiveFailure('etcd inactive'),  # ncn-m002
-            None,                                  # ncn-m003
-        ]
+        self.set_snapshot_errors({
+            'ncn-m001': None,
+            'ncn-m002': EtcdInactiveFailure('etcd inactive'),
+            'ncn-m003': None,
+        })
         err_regex = 'Failed to create etcd snapshot on hosts: ncn-m002'
 
         with self.assertRaisesRegex(NonFatalPlatformError, err_regex):
@@ -946,11 +1001,11 @@ class TestDoEtcdSnapshotStartStop(unittest.TestCase):
 
     def test_do_etcd_snapshot_one_failure(self):
         """Test do_etcd_snapshot when etcd ommand failed on one manager."""
-        self.mock_save_snapshot.side_effect = [
-            None,                                  # ncn-m001
-            EtcdSnapshotFailure('etcd failure'),   # ncn-m002
-            None,                                  # ncn-m003
-        ]
+        self.set_snapshot_errors({
+            'ncn-m001': None,
+            'ncn-m002': EtcdSnapshotFailure('etcd failure'),
+            'ncn-m003': None,
+        })
         err_regex = 'Failed to create etcd snapshot on hosts: ncn-m002'
 
         with self.assertRaisesRegex(FatalPlatformError, err_regex):
@@ -963,11 +1018,11 @@ class TestDoEtcdSnapshotStartStop(unittest.TestCase):
 
     def test_do_etcd_snapshot_one_inactive_one_failure(self):
         """Test do_etcd_snapshot when etcd inactive on on manager, failed command on another."""
-        self.mock_save_snapshot.side_effect = [
-            None,                                  # ncn-m001
-            EtcdInactiveFailure('etcd inactive'),  # ncn-m002
-            EtcdSnapshotFailure('etcd failure'),   # ncn-m003
-        ]
+        self.set_snapshot_errors({
+            'ncn-m001': None,
+            'ncn-m002': EtcdInactiveFailure('etcd inactive'),
+            'ncn-m003': EtcdSnapshotFailure('etcd failure'),
+        })
         err_regex = 'Failed to create etcd snapshot on hosts: ncn-m002, ncn-m003'
 
         with self.assertRaisesRegex(FatalPlatformError, err_regex):
@@ -98,6 +98,40 @@ class TestCAPMCPowerWaiter(ExtendedTestCase):
             self.assertFalse(self.waiter.member_has_completed(member))
         self.assert_in_element(f'Failed to query power state: {api_err_msg}', cm.output)
 
+    def test_members_have_completed(self):
+        """Test checking all members with a single CAPMC query."""
+        self.mock_capmc_client.get_xnames_power_state.return_value = {
+            'off': ['x5000c0s0b0n0'],
+            'on': ['x5000c0s1b0n0']
+        }
+        self.assertEqual(({'x5000c0s0b0n0'}, set()), self.waiter.members_have_completed(self.members))
+        self.mock_capmc_client.get_xnames_power_state.assert_called_once_with(sorted(self.members))
+        self.mock_capmc_client.get_xname_power_state.assert_not_called()
+
+    def test_members_have_completed_api_error(self):
+        """Test that no member is complete and none are queried separately when the query fails."""
+        self.mock_capmc_client.get_xnames_power_state.side_effect = APIError('CAPMC failure')
+        with self.assertLogs(level=logging.DEBUG) as cm:
+            self.assertEqual((set(), set()), self.waiter.members_have_completed(self.members))
+        self.assert_in_element('CAPMC failure', cm.output)
+        self.mock_capmc_client.get_xnames_power_state.assert_called_once_with(sorted(self.members))
+        self.mock_capmc_client.get_xname_power_state.assert_not_called()
+
+    def test_members_have_completed_undefined(self):
+        """Test that members whose power state is undefined are not complete."""
+        self.mock_capmc_client.get_xnames_power_state.return_value = {
+            'off': ['x5000c0s0b0n0'],
+            'undefined': ['x5000c0s1b0n0']
+        }
+        self.assertEqual(({'x5000c0s0b0n0'}, set()), self.waiter.members_have_completed(self.members))
+        self.mock_capmc_client.get_xname_power_state.assert_not_called()
+
+    def test_members_have_completed_single_api_error(self):
+        """Test checking a single member which cannot be queried."""
+        self.mock_capmc_client.get_xnames_power_state.side_effect = APIError('CAPMC failure')
+        self.assertEqual((set(), set()), self.waiter.members_have_completed({'x5000c0s0b0n0'}))
+        self.mock_capmc_client.get_xname_power_state.assert_not_called()
+
 
 class TestDoNodesPowerOff(ExtendedTestCase):
     """Test the do_nodes_power_off function."""
@@ -0,0 +1,206 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for the sat.cli.bootsys.power_plan module.
+"""
+import unittest
+from unittest.mock import MagicMock, call, patch
+
+from sat.apiclient import APIError
+from sat.cli.bootsys.power_plan import CabinetPowerPlan, PowerBatch, get_xnames_by_cabinet
+
+
+class TestGetXnamesByCabinet(unittest.TestCase):
+    """Tests for the get_xnames_by_cabinet function."""
+
+    def test_group_by_cabinet(self):
+        """Test that xnames are grouped and sorted by cabinet."""
+        xnames = ['x1001c0', 'x1000c1', 'x1000c0s2', 'x1000c0', 'x1000c0s10']
+        self.assertEqual(
+            {
+                'x1000': ['x1000c0', 'x1000c0s2', 'x1000c0s10', 'x1000c1'],
+                'x1001': ['x1001c0']
+            },
+            get_xnames_by_cabinet(xnames)
+        )
+        self.assertEqual(['x1000', 'x1001'], list(get_xnames_by_cabinet(xnames)))
+
+    def test_group_no_xnames(self):
+        """Test grouping an empty list of xnames."""
+        self.assertEqual({}, get_xnames_by_cabinet([]))
+
+
+class TestPowerBatch(unittest.TestCase):
+    """Tests for the PowerBatch class."""
+
+    def setUp(self):
+        self.batch = PowerBatch('liquid-cooled', 2, {
+            'x1000': ['x1000c0', 'x1000c0s0', 'x1000c1'],
+            'x1001': ['x1001c0r1']
+        })
+
+    def test_properties(self):
+        """Test the cabinets, xnames, chassis and name of a batch."""
+        self.assertEqual(['x1000', 'x1001'], self.batch.cabinets)
+        self.assertEqual(['x1000c0', 'x1000c0s0', 'x1000c1', 'x1001c0r1'], self.batch.xnames)
+        self.assertEqual(['x1000c0', 'x1000c1', 'x1001c0'], self.batch.chassis)
+        self.assertEqual('liquid-cooled batch 2', self.batch.name)
+        self.assertFalse(self.batch.force)
+
+
+class TestCabinetPowerPlan(unittest.TestCase):
+    """Tests for building a CabinetPowerPlan."""
+
+    def setUp(self):
+        self.liquid_xnames = [f'x100{i}c0' for i in range(5)]
+        self.air_xnames = ['x3000c0s1b0n0', 'x3001c0s1b0n0']
+
+    def test_single_batch_per_phase(self):
+        """Test that a batch size of 0 puts all cabinets of a phase in one batch."""
+        plan = CabinetPowerPlan('off')
+        batches = plan.add_phase('liquid-cooled', self.liquid_xnames)
+        self.assertEqual(1, len(batches))
+        self.assertEqual([f'x100{i}' for i in range(5)], batches[0].cabinets)
+
+    def test_batches_of_cabinets(self):
+        """Test dividing the cabinets of a phase into batches."""
+        plan = CabinetPowerPlan('off', batch_size=2)
+        batches = plan.add_phase('liquid-cooled', self.liquid_xnames)
+        self.assertEqual([['x1000', 'x1001'], ['x1002', 'x1003'], ['x1004']],
+                         [batch.cabinets for batch in batches])
+        self.assertEqual([1, 2, 3], [batch.index for batch in batches])
+
+    def test_empty_phase(self):
+        """Test that a phase with no components has no batches."""
+        plan = CabinetPowerPlan('off', batch_size=2)
+        self.assertEqual([], plan.add_phase('air-cooled', []))
+        self.assertEqual([], plan.batches)
+        self.assertEqual(0, plan.num_rounds)
+
+    def test_batches_interleaved(self):
+        """Test that the batches of the phases are started alternately."""
+        plan = CabinetPowerPlan('off', batch_size=2, max_concurrent_batches=2)
+        plan.add_phase('liquid-cooled', self.liquid_xnames)
+        plan.add_phase('air-cooled', self.air_xnames, force=True)
+        self.assertEqual(
+            [('liquid-cooled', 1), ('air-cooled', 1), ('liquid-cooled', 2), ('liquid-cooled', 3)],
+            [(batch.phase, batch.index) for batch in plan.batches]
+        )
+        self.assertTrue(all(batch.force for batch in plan.batches_by_phase['air-cooled']))
+        self.assertEqual(2, plan.num_rounds)
+        self.assertEqual(200, plan.estimate_duration(100))
+
+    def test_max_concurrent_batches_at_least_one(self):
+        """Test that at least one batch is powered at a time."""
+        plan = CabinetPowerPlan('off', max_concurrent_batches=0)
+        self.assertEqual(1, plan.max_concurrent_batches)
+
+    def test_get_report_rows(self):
+        """Test the rows describing the batches of a plan."""
+        plan = CabinetPowerPlan('off', batch_size=3)
+        plan.add_phase('liquid-cooled', self.liquid_xnames + ['x1000c0s0', 'x1000c1'])
+        self.assertEqual(
+            [
+                ['liquid-cooled', 1, 3, 4, 5, 'x1000, x1001, x1002'],
+                ['liquid-cooled', 2, 2, 2, 2, 'x1003, x1004']
+            ],
+            plan.get_report_rows()
+        )
+
+
+class TestCabinetPowerPlanExecute(unittest.TestCase):
+    """Tests for executing a CabinetPowerPlan."""
+
+    def setUp(self):
+        self.mock_capmc_client = patch('sat.cli.bootsys.power_plan.CAPMCClient').start().return_value
+        patch('sat.cli.bootsys.power_plan.SATSession').start()
+        self.mock_waiter_cls = patch('sat.cli.bootsys.power_plan.CAPMCPowerWaiter').start()
+        self.timed_out_xnames = set()
+        self.waiters = []
+        self.mock_waiter_cls.side_effect = self.create_waiter
+
+        self.plan = CabinetPowerPlan('off', batch_size=1, max_concurrent_batches=2)
+        self.plan.add_phase('liquid-cooled', ['x1000c0', 'x1001c0'])
+        self.plan.add_phase('air-cooled', ['x3000c0s1b0n0'], force=True)
+
+    def tearDown(self):
+        patch.stopall()
+
+    def create_waiter(self, xnames, power_state, timeout):
+        """Create a mock CAPMCPowerWaiter which times out on some of its xnames."""
+        waiter = MagicMock()
+        waiter.wait_for_completion.return_value = {
+            xname for xname in xnames if xname in self.timed_out_xnames
+        }
+        self.waiters.append(waiter)
+        return waiter
+
+    def test_execute_success(self):
+        """Test executing a plan where all components reach the power state."""
+        polling_strategy = MagicMock()
+        result = self.plan.execute(600, polling_strategy)
+
+        self.assertEqual({'liquid-cooled': set(), 'air-cooled': set()}, result)
+        self.mock_capmc_client.set_xnames_power_state.assert_has_calls([
+            call(['x1000c0'], 'off', force=False),
+            call(['x3000c0s1b0n0'], 'off', force=True),
+            call(['x1001c0'], 'off', force=False)
+        ], any_order=True)
+        self.assertEqual(3, self.mock_capmc_client.set_xnames_power_state.call_count)
+        self.mock_waiter_cls.assert_has_calls([
+            call(['x1000c0'], 'off', 600),
+            call(['x3000c0s1b0n0'], 'off', 600),
+            call(['x1001c0'], 'off', 600)
+        ], any_order=True)
+        for waiter in self.waiters:
+            self.assertEqual(polling_strategy, waiter.polling_strategy)
+
+    def test_execute_timed_out(self):
+        """Test that timed out components are returned by phase."""
+        self.timed_out_xnames = {'x1001c0', 'x3000c0s1b0n0'}
+        with self.assertLogs(level='WARNING'):
+            result = self.plan.execute(600)
+        self.assertEqual({'liquid-cooled': {'x1001c0'}, 'air-cooled': {'x3000c0s1b0n0'}}, result)
+
+    def test_execute_capmc_error(self):
+        """Test that a failed power request is logged and the batch is still waited for."""
+        self.mock_capmc_client.set_xnames_power_state.side_effect = APIError('CAPMC failed')
+        with self.assertLogs(level='WARNING') as logs:
+            result = self.plan.execute(600)
+        self.assertEqual({'liquid-cooled': set(), 'air-cooled': set()}, result)
+        for waiter in self.waiters:
+            waiter.wait_for_completion.assert_called_once_with()
+        self.assertEqual(3, len(self.waiters))
+        self.assertTrue(any('CAPMC failed' in message for message in logs.output))
+
+    def test_execute_empty_plan(self):
+        """Test executing a plan with no batches."""
+        plan = CabinetPowerPlan('off')
+        plan.add_phase('liquid-cooled', [])
+        self.assertEqual({'liquid-cooled': set()}, plan.execute(600))
+        self.mock_capmc_client.set_xnames_power_state.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
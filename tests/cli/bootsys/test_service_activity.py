@@ -28,17 +28,17 @@ from collections import OrderedDict
 from kubernetes.config.config_exception import ConfigException
 from kubernetes.client.rest import ApiException
 import logging
-import socket
+import threading
 import unittest
 from unittest.mock import call, MagicMock, Mock, patch
 
-from paramiko.ssh_exception import BadHostKeyException, AuthenticationException, SSHException
-
 from tests.common import ExtendedTestCase
 from sat.apiclient import APIError
+from sat.cli.bootsys.ssh import CommandResult
 from sat.cli.bootsys.service_activity import (
     ServiceActivityChecker,
     ServiceCheckError,
+    SessionCache,
     SDUActivityChecker,
     BOSV1ActivityChecker,
     BOSV2ActivityChecker,
@@ -100,20 +100,74 @@ class TestServiceActivityChecker(unittest.TestCase):
                          str(err))
 
 
-class TestSDUActivityChecker(ExtendedTestCase):
-    """Test the SDUActivityChecker class."""
+class TestSessionCache(unittest.TestCase):
+    """Test the SessionCache class."""
+
     def setUp(self):
-        self.mock_channel = MagicMock()
-        self.mock_channel.recv_exit_status.side_effect = [1, 1, 1]
+        self.mock_sat_session = patch('sat.cli.bootsys.service_activity.SATSession').start()
+        self.mock_monotonic = patch('sat.cli.bootsys.service_activity.time.monotonic',
+                                    return_value=100.0).start()
+        self.cache = SessionCache(max_age=30)
+        self.query = Mock(side_effect=lambda: ['session'])
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_session_shared(self):
+        """Test that a single SATSession is created and shared."""
+        self.assertEqual(self.cache.session, self.cache.session)
+        self.mock_sat_session.assert_called_once_with()
+
+    def test_get_cached(self):
+        """Test that a query is made only once within the maximum age."""
+        self.assertEqual(['session'], self.cache.get(('SVC', 'sessions'), self.query))
+        self.mock_monotonic.return_value = 129.0
+        self.assertEqual(['session'], self.cache.get(('SVC', 'sessions'), self.query))
+        self.query.assert_called_once_with()
+
+    def test_get_expired(self):
+        """Test that a query is made again once its result is too old."""
+        self.cache.get(('SVC', 'sessions'), self.query)
+        self.mock_monotonic.return_value = 131.0
+        self.cache.get(('SVC', 'sessions'), self.query)
+        self.assertEqual(2, self.query.call_count)
+
+    def test_get_different_keys(self):
+        """Test that queries with different keys are cached separately."""
+        self.cache.get(('SVC', 'sessions'), self.query)
+        self.cache.get(('SVC', 'sessions', '1'), self.query)
+        self.assertEqual(2, self.query.call_count)
+
+    def test_get_error_not_cached(self):
+        """Test that a query which raises an exception is made again."""
+        self.query.side_effect = [APIError('failed'), ['session']]
+        with self.assertRaises(APIError):
+            self.cache.get(('SVC', 'sessions'), self.query)
+        self.assertEqual(['session'], self.cache.get(('SVC', 'sessions'), self.query))
+
+    def test_clear(self):
+        """Test that clear removes cached results."""
+        self.cache.get(('SVC', 'sessions'), self.query)
+        self.cache.clear()
+        self.cache.get(('SVC', 'sessions'), self.query)
+        self.assertEqual(2, self.query.call_count)
 
-        self.mock_transport = MagicMock()
-        self.mock_transport.open_session.return_value = self.mock_channel
 
-        self.mock_ssh_client_instance = MagicMock()
-        self.mock_ssh_client_instance.get_transport.return_value = self.mock_transport
+class TestSDUActivityChecker(ExtendedTestCase):
+    """Test the SDUActivityChecker class."""
+    def setUp(self):
+        self.exit_statuses = {'ncn-m001': 1, 'ncn-m002': 1, 'ncn-m003': 1}
+        self.errors = {}
+
+        def mock_run_on_hosts(hosts, command, **kwargs):
+            return {
+                host: CommandResult(host, command, error=self.errors[host]) if host in self.errors
+                else CommandResult(host, command, self.exit_statuses[host], '', 'stderr output')
+                for host in hosts
+            }
 
-        self.mock_ssh_client = patch('sat.cli.bootsys.service_activity.get_ssh_client').start()
-        self.mock_ssh_client.return_value = self.mock_ssh_client_instance
+        self.mock_run_on_hosts = patch('sat.cli.bootsys.service_activity.run_on_hosts',
+                                       side_effect=mock_run_on_hosts).start()
 
         self.mock_get_mgmt_ncn_groups = patch('sat.cli.bootsys.service_activity.get_mgmt_ncn_groups').start()
         self.mock_get_mgmt_ncn_groups.return_value = ({'managers': ['ncn-m001', 'ncn-m002', 'ncn-m003']}, {})
@@ -121,66 +175,46 @@ class TestSDUActivityChecker(ExtendedTestCase):
     def tearDown(self):
         patch.stopall()
 
-    def assert_ssh_client_set_up(self):
-        self.mock_ssh_client_instance.connect.assert_called()
-        self.mock_ssh_client_instance.close.assert_called()
+    def assert_run_on_all_managers(self):
+        self.mock_run_on_hosts.assert_called_once_with(
+            ['ncn-m001', 'ncn-m002', 'ncn-m003'], 'sdu bash pgrep sdu',
+            timeout=SDUActivityChecker.COMMAND_TIMEOUT_SECS
+        )
 
     def test_getting_sdu_sessions_none_running(self):
         """Test no active SDU sessions returned when no dumps are occurring."""
         s = SDUActivityChecker()
 
         self.assertEqual(s.get_active_sessions(), [])
-        self.assert_ssh_client_set_up()
+        self.assert_run_on_all_managers()
 
     def test_getting_sdu_sessions_one_running(self):
         """Test active SDU sessions are returned when remote dumps are occurring."""
         s = SDUActivityChecker()
-        self.mock_channel.recv_exit_status.side_effect = [1, 0, 1]
+        self.exit_statuses['ncn-m002'] = 0
 
         self.assertEqual(s.get_active_sessions(), [OrderedDict([('ncn', 'ncn-m002')])])
-        self.assert_ssh_client_set_up()
+        self.assert_run_on_all_managers()
 
     def test_exception_thrown_on_ssh_error(self):
         """Test an exception is thrown when SSH error occurs when checking SDU sessions."""
-        mock_bad_host_key_exception = BadHostKeyException('ncn-m002', MagicMock(), MagicMock())
-        for err_type in [mock_bad_host_key_exception, AuthenticationException,
-                         SSHException, socket.error]:
-            s = SDUActivityChecker()
-            self.mock_ssh_client_instance.connect.side_effect = err_type
-            with self.assertRaises(ServiceCheckError):
-                self.assertEqual(s.get_active_sessions(), [])
-        self.assert_ssh_client_set_up()
-
-    def test_exception_thrown_on_open_session_error(self):
-        """Test an exception is thrown when there is a problem opening the SSH channel."""
-        self.mock_transport.open_session.side_effect = SSHException
-        with self.assertRaises(ServiceCheckError):
-            SDUActivityChecker().get_active_sessions()
-        self.assert_ssh_client_set_up()
-
-    def test_exception_thrown_on_exec_command_error(self):
-        """Test an exception is thrown when there is a problem executing remote commands."""
-        self.mock_channel.exec_command.side_effect = SSHException
-        with self.assertRaises(ServiceCheckError):
+        self.errors['ncn-m002'] = 'Failed to execute "sdu bash pgrep sdu" on ncn-m002: Authentication failed.'
+        with self.assertRaisesRegex(ServiceCheckError, 'Unable to connect to management NCN "ncn-m002"'):
             SDUActivityChecker().get_active_sessions()
-        self.assert_ssh_client_set_up()
+        self.assert_run_on_all_managers()
 
     def test_exception_thrown_on_remote_pgrep_error(self):
         """Test that exceptions are thrown when error return codes are given from remote pgrep."""
-        self.mock_channel.recv_exit_status.side_effect = None
-
         for returncode in [2, 3, 5]:
-            self.mock_channel.recv_exit_status.return_value = returncode
+            self.exit_statuses['ncn-m003'] = returncode
             s = SDUActivityChecker()
-            with self.assertRaises(ServiceCheckError):
+            with self.assertRaisesRegex(ServiceCheckError, 'ncn-m003'):
                 s.get_active_sessions()
 
     def test_exception_not_thrown_when_sdu_not_installed_or_configured(self):
         """Test that exceptions are not thrown when SDU cannot be accessed."""
-        self.mock_channel.recv_exit_status.side_effect = None
-
         for returncode in [125, 127]:
-            self.mock_channel.recv_exit_status.return_value = returncode
+            self.exit_statuses['ncn-m001'] = returncode
             s = SDUActivityChecker()
             try:
                 s.get_active_sessions()
@@ -364,8 +398,9 @@ class TestBOSV1ActivityChecker(ExtendedTestCase):
 
     def test_get_active_sessions_bos_session_get_err(self):
         """Test get_active_sessions with BOS failing to GET a session id"""
-        # Add an id that does not appear in self.bos_session_details
+        # Add an active id that does not appear in self.bos_session_details
         self.bos_session_ids.append('4')
+        self.pods.append(MockPod('boa-4', 'Running'))
 
         with self.assertLogs(level=logging.WARNING) as cm:
             self.bos_checker.get_active_sessions()
@@ -531,6 +566,15 @@ class TestCFSActivityChecker(unittest.TestCase):
         self.assertEqual('cfs sessions describe', self.cfs_checker.cray_cli_args)
         self.assertEqual('name', self.cfs_checker.id_field_name)
 
+    def test_get_active_sessions_shared_cache(self):
+        """Test that checkers sharing a SessionCache list CFS sessions once."""
+        session_cache = SessionCache()
+        with patch.object(self.mock_cfs_client.return_value, 'get',
+                          wraps=self.mock_cfs_client.return_value.get) as mock_get:
+            CFSActivityChecker(session_cache).get_active_sessions()
+            CFSActivityChecker(session_cache).get_active_sessions()
+        mock_get.assert_called_once_with('sessions')
+
     def test_get_active_sessions_two_active(self):
         """Test get_active_sessions with two active sessions."""
         self.cfs_sessions[0]['status']['session']['status'] = 'running'
@@ -1028,6 +1072,71 @@ class TestReportActiveSessions(ExtendedTestCase):
 
         self.mock_report_cls.assert_not_called()
 
+    def test_report_active_sessions_concurrent(self):
+        """Test _report_active_sessions checks all services at the same time."""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def wait_for_all_checkers():
+            barrier.wait()
+            return []
+
+        checkers = [
+            self.get_mock_service_checker(service_name=name)
+            for name in ['CFS', 'FOO', 'BAR']
+        ]
+        for checker in checkers:
+            checker.get_active_sessions.side_effect = wait_for_all_checkers
+
+        active, failed = _report_active_sessions(checkers)
+
+        self.assertEqual([], active)
+        self.assertEqual([], failed)
+
+    def test_report_active_sessions_timeout(self):
+        """Test _report_active_sessions treats a checker which times out as failed."""
+        finish_event = threading.Event()
+        checker_threads = []
+
+        def wait_until_finished():
+            checker_threads.append(threading.current_thread())
+            finish_event.wait(5)
+            return []
+
+        checkers = [
+            self.get_mock_service_checker(num_sessions=1, service_name='CFS', more_details=''),
+            self.get_mock_service_checker(service_name='SLOW'),
+        ]
+        checkers[1].get_active_sessions.side_effect = wait_until_finished
+        checkers[1].get_err.side_effect = lambda msg: ServiceCheckError(f'Unable to get SLOW sessions: {msg}')
+
+        try:
+            with self.assertLogs(level=logging.ERROR) as cm:
+                active, failed = _report_active_sessions(checkers, timeout=0.1)
+        finally:
+            finish_event.set()
+
+        self.assertEqual(['CFS'], active)
+        self.assertEqual(['SLOW'], failed)
+        self.assert_in_element('Unable to get SLOW sessions: Timed out after 0.1 seconds', cm.output)
+        # A checker which times out must not prevent SAT from exiting
+        self.assertTrue(checker_threads[0].daemon)
+
+    def test_report_active_sessions_timings(self):
+        """Test _report_active_sessions records and logs the time taken by each checker."""
+        checkers = [
+            self.get_mock_service_checker(num_sessions=0, service_name='CFS'),
+            self.get_mock_service_checker(svc_check_err=ServiceCheckError('failed'),
+                                          service_name='BOS'),
+        ]
+        timings = {}
+
+        with self.assertLogs(level=logging.INFO) as cm:
+            _report_active_sessions(checkers, timings=timings)
+
+        self.assertEqual(['CFS', 'BOS'], list(timings))
+        self.assert_in_element('Checked for active sessions in ', cm.output)
+        self.assert_in_element('(CFS: ', cm.output)
+
 
 class TestDoServiceActivityCheck(ExtendedTestCase):
     """Test the do_service_activity_check function."""
@@ -1048,6 +1157,7 @@ class TestDoServiceActivityCheck(ExtendedTestCase):
 
         self.mock_get_config_value = patch('sat.cli.bootsys.service_activity.get_config_value',
                                            return_value='v1').start()
+        self.mock_session_cache = patch('sat.cli.bootsys.service_activity.get_session_cache').start()
 
         self.mock_args = Mock()
 
@@ -1069,6 +1179,14 @@ class TestDoServiceActivityCheck(ExtendedTestCase):
             'the sessions to complete or cancel them before proceeding.'
         )
 
+    def test_do_service_activity_check_shared_cache(self):
+        """Test do_service_activity_check shares one SessionCache between checkers."""
+        self.mock_report_active_sessions.return_value = [], []
+        do_service_activity_check(self.mock_args)
+        # BOSV2ActivityChecker is not used with BOS v1
+        for checker_cls in self.checkers[:1] + self.checkers[2:]:
+            checker_cls.assert_called_once_with(self.mock_session_cache.return_value)
+
     def test_do_service_activity_check_inactive(self):
         """Test do_service_activity_check with no active services."""
         self.mock_report_active_sessions.return_value = [], []
@@ -0,0 +1,219 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for the sat.cli.bootsys.ssh module.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from sat.cli.bootsys.ssh import (
+    CommandResult,
+    SSHSessionPool,
+    get_ssh_session_pool,
+    run_on_host,
+    run_on_hosts,
+)
+from tests.cli.bootsys.ssh_server import LocalSSHServer
+
+HOST = '127.0.0.1'
+
+
+def echo_handler(command):
+    """Handle a command by echoing it back, failing if it starts with 'false'."""
+    if command.startswith('false'):
+        return 1, '', f'{command} failed\n'
+    return 0, f'{command}\n', ''
+
+
+class LocalSSHServerTestCase(unittest.TestCase):
+    """Base class for tests which run commands on a LocalSSHServer."""
+
+    handler = staticmethod(echo_handler)
+
+    def setUp(self):
+        self.server = LocalSSHServer(self.handler)
+        self.server.start()
+        self.pool = SSHSessionPool(connect_kwargs=self.server.connect_kwargs)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+
+class TestRunOnHost(LocalSSHServerTestCase):
+    """Tests for the run_on_host function."""
+
+    def test_run_on_host_success(self):
+        """Test running a command which succeeds."""
+        result = run_on_host(HOST, 'hostname', pool=self.pool)
+        self.assertTrue(result.succeeded)
+        self.assertEqual(0, result.exit_status)
+        self.assertEqual('hostname\n', result.stdout)
+        self.assertEqual('', result.stderr)
+        self.assertIsNone(result.error)
+
+    def test_run_on_host_non_zero_exit(self):
+        """Test running a command which exits with a non-zero exit status."""
+        result = run_on_host(HOST, 'false', pool=self.pool)
+        self.assertFalse(result.succeeded)
+        self.assertEqual(1, result.exit_status)
+        self.assertEqual('false failed\n', result.stderr)
+        self.assertIsNone(result.error)
+
+    def test_run_on_host_connection_failure(self):
+        """Test running a command on a host which cannot be connected to."""
+        with socket.socket() as sock:
+            sock.bind((HOST, 0))
+            port = sock.getsockname()[1]
+        pool = SSHSessionPool(connect_kwargs=dict(self.server.connect_kwargs, port=port))
+
+        result = run_on_host(HOST, 'hostname', pool=pool)
+
+        self.assertFalse(result.succeeded)
+        self.assertIsNone(result.exit_status)
+        self.assertIn(f'Failed to execute "hostname" on {HOST}', result.error)
+
+    def test_run_on_host_default_pool(self):
+        """Test that the shared pool is used when no pool is given."""
+        with patch('sat.cli.bootsys.ssh.get_ssh_session_pool', return_value=self.pool):
+            result = run_on_host(HOST, 'hostname')
+        self.assertTrue(result.succeeded)
+        self.assertEqual(['hostname'], self.server.commands)
+
+
+class TestRunOnHosts(LocalSSHServerTestCase):
+    """Tests for the run_on_hosts function."""
+
+    def test_run_on_hosts(self):
+        """Test running a command on multiple hosts."""
+        hosts = [HOST, 'localhost']
+        results = run_on_hosts(hosts, 'uptime', pool=self.pool)
+
+        self.assertEqual(hosts, list(results))
+        for host, result in results.items():
+            self.assertIsInstance(result, CommandResult)
+            self.assertEqual(host, result.host)
+            self.assertEqual('uptime\n', result.stdout)
+            self.assertTrue(result.succeeded)
+        self.assertEqual(2, self.server.connection_count)
+
+    def test_run_on_no_hosts(self):
+        """Test running a command on an empty list of hosts."""
+        self.assertEqual({}, run_on_hosts([], 'uptime', pool=self.pool))
+
+
+class TestSSHSessionPool(LocalSSHServerTestCase):
+    """Tests for the SSHSessionPool class."""
+
+    def test_connection_reused(self):
+        """Test that commands on the same host share one connection."""
+        client = self.pool.get_client(HOST)
+        for _ in range(5):
+            self.assertTrue(run_on_host(HOST, 'hostname', pool=self.pool).succeeded)
+        self.assertIs(client, self.pool.get_client(HOST))
+        self.assertEqual(1, self.server.connection_count)
+
+    def test_concurrent_channels(self):
+        """Test that multiple commands run at once over a single connection."""
+        barrier = threading.Barrier(3, timeout=10)
+
+        def handler(command):
+            barrier.wait()
+            return 0, command, ''
+
+        self.server.handler = handler
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(lambda n: run_on_host(HOST, f'cmd{n}', pool=self.pool), range(3)))
+
+        self.assertEqual([f'cmd{n}' for n in range(3)], [result.stdout for result in results])
+        self.assertEqual(1, self.server.connection_count)
+
+    def test_max_channels_per_host(self):
+        """Test that the number of concurrent commands on a host is limited."""
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def handler(command):
+            with lock:
+                running.append(command)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(command)
+            return 0, '', ''
+
+        self.server.handler = handler
+        self.pool.max_channels_per_host = 2
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(lambda n: run_on_host(HOST, f'cmd{n}', pool=self.pool), range(6)))
+
+        self.assertEqual(6, len(max_running))
+        self.assertLessEqual(max(max_running), 2)
+
+    def test_reconnect_after_connection_dropped(self):
+        """Test that a new connection is made when the old one was closed."""
+        client = self.pool.get_client(HOST)
+        self.server.drop_connections()
+        transport = client.get_transport()
+        for _ in range(100):
+            if not transport.is_active():
+                break
+            time.sleep(0.05)
+
+        self.assertTrue(run_on_host(HOST, 'hostname', pool=self.pool).succeeded)
+        self.assertIsNot(client, self.pool.get_client(HOST))
+        self.assertEqual(2, self.server.connection_count)
+
+    def test_close(self):
+        """Test that closing the pool closes its connections."""
+        with self.pool as pool:
+            client = pool.get_client(HOST)
+        self.assertIsNone(client.get_transport())
+
+
+class TestGetSSHSessionPool(unittest.TestCase):
+    """Tests for the get_ssh_session_pool function."""
+
+    def setUp(self):
+        patch('sat.cli.bootsys.ssh._session_pool', None).start()
+        self.mock_atexit_register = patch('sat.cli.bootsys.ssh.atexit.register').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_shared_pool(self):
+        """Test that the same pool is returned by every call."""
+        pool = get_ssh_session_pool()
+        self.assertIsInstance(pool, SSHSessionPool)
+        self.assertIs(pool, get_ssh_session_pool())
+        self.mock_atexit_register.assert_called_once_with(pool.close)
+
+
+if __name__ == '__main__':
+    unittest.main()
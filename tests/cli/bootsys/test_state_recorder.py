@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -22,34 +22,166 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 #
 """
-Unit tests for the service_activity module.
+Unit tests for the state_recorder module.
 """
+from argparse import Namespace
 from boto3.exceptions import Boto3Error
+from botocore.exceptions import ClientError
 from kubernetes.config import ConfigException
 import datetime
-import os
+import gzip
+import io
+import json
+import logging
 import unittest
 from unittest.mock import call, patch, Mock
 
-from sat.cli.bootsys.defaults import DEFAULT_LOCAL_STATE_DIR
+import yaml
+
 from sat.cli.bootsys.state_recorder import (
+    apply_merge_patch,
+    do_state_diff,
+    get_merge_patch,
+    get_state_diff_rows,
+    get_state_differences,
     HSNStateRecorder,
     PodStateError, PodStateRecorder,
     StateError, StateRecorder,
 )
+from tests.fake_pods import get_fake_pod_list_response
 
 
-class SimpleRecorder(StateRecorder):
+class FakeS3Object:
+    """An object in a FakeS3Bucket."""
 
-    CONST_DATA = {
-        'foo': 'bar'
-    }
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+
+    @property
+    def last_modified(self):
+        return self.bucket.last_modified[self.key]
+
+    def get(self):
+        if self.key in self.bucket.failing_keys:
+            raise Boto3Error('Failed to get object')
+        if self.key not in self.bucket.contents:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.bucket.contents[self.key])}
+
+    def put(self, Body):
+        if self.key in self.bucket.failing_keys:
+            raise Boto3Error('Failed to put object')
+        self.bucket.contents[self.key] = Body
+        self.bucket.last_modified[self.key] = datetime.datetime(2020, 9, 7) + datetime.timedelta(
+            seconds=len(self.bucket.last_modified)
+        )
+
+    def delete(self):
+        self.bucket.contents.pop(self.key, None)
+        self.bucket.last_modified.pop(self.key, None)
+
+
+class FakeS3Bucket:
+    """An in-memory S3 bucket."""
+
+    def __init__(self):
+        self.contents = {}
+        self.last_modified = {}
+        self.failing_keys = set()
+        self.objects = Mock()
+        self.objects.filter.side_effect = self.filter_objects
+
+    def filter_objects(self, Prefix):
+        return [FakeS3Object(self, key) for key in self.contents if key.startswith(Prefix)]
+
+
+class FakeS3:
+    """An in-memory S3 resource with a single bucket."""
+
+    def __init__(self):
+        self.bucket = FakeS3Bucket()
+
+    def Bucket(self, bucket_name):
+        return self.bucket
+
+    def Object(self, bucket_name, key):
+        return FakeS3Object(self.bucket, key)
+
+
+class SimpleRecorder(StateRecorder):
 
     def __init__(self, *args, **kwargs):
         super().__init__('simple state', *args, **kwargs)
+        self.state_data = {'foo': 'bar'}
 
     def get_state_data(self):
-        return self.CONST_DATA
+        return self.state_data
+
+
+def get_large_state(num_groups=5, num_members=50):
+    """Get a state which is large enough to benefit from delta snapshots."""
+    return {
+        f'group{i}': {f'member-{i}-{j}': 'Running' for j in range(num_members)}
+        for i in range(num_groups)
+    }
+
+
+class TestMergePatch(unittest.TestCase):
+    """Tests for get_merge_patch and apply_merge_patch."""
+
+    def assert_round_trip(self, old, new):
+        """Assert that patching old with the patch from old to new gives new."""
+        patch = get_merge_patch(old, new)
+        self.assertEqual(new, apply_merge_patch(old, patch))
+        return patch
+
+    def test_unchanged(self):
+        """Test the patch between equal values is empty."""
+        self.assertEqual({}, self.assert_round_trip({'a': {'b': 1}}, {'a': {'b': 1}}))
+
+    def test_changed_nested_value(self):
+        """Test the patch of a changed nested value contains only that value."""
+        patch = self.assert_round_trip({'a': {'b': 1, 'c': 2}, 'd': 3},
+                                       {'a': {'b': 1, 'c': 4}, 'd': 3})
+        self.assertEqual({'a': {'c': 4}}, patch)
+
+    def test_added_and_removed_keys(self):
+        """Test the patch adds new keys and removes missing keys with None."""
+        patch = self.assert_round_trip({'a': 1, 'b': 2}, {'b': 2, 'c': False})
+        self.assertEqual({'a': None, 'c': False}, patch)
+
+    def test_non_dict_values(self):
+        """Test a non-dict value replaces the whole target."""
+        self.assertEqual([1, 2], self.assert_round_trip({'a': 1}, [1, 2]))
+        self.assertEqual({'a': 1}, self.assert_round_trip('old', {'a': 1}))
+
+    def test_apply_does_not_modify_target(self):
+        """Test apply_merge_patch does not modify the target."""
+        target = {'a': {'b': 1}}
+        apply_merge_patch(target, {'a': {'b': None}})
+        self.assertEqual({'a': {'b': 1}}, target)
+
+    def test_get_state_differences(self):
+        """Test get_state_differences finds changed, added and removed values."""
+        old = {'ns1': {'pod1': 'Running', 'pod2': 'Running'}, 'ns2': {'pod3': 'Running'}}
+        new = {'ns1': {'pod1': 'Failed', 'pod4': 'Running'}, 'ns2': {'pod3': 'Running'}}
+        self.assertEqual(
+            [(('ns1', 'pod1'), 'Running', 'Failed'),
+             (('ns1', 'pod2'), 'Running', None),
+             (('ns1', 'pod4'), None, 'Running')],
+            get_state_differences(old, new)
+        )
+
+    def test_get_state_diff_rows(self):
+        """Test get_state_diff_rows formats differences as rows."""
+        old = {'x1000c0r1j1p0': {'x1000c0r1j1p0': True}}
+        new = {'x1000c0r1j1p0': {'x1000c0r1j1p0': False}, 'top': 1}
+        self.assertEqual(
+            [['', 'top', 'MISSING', 1],
+             ['x1000c0r1j1p0', 'x1000c0r1j1p0', True, False]],
+            get_state_diff_rows(old, new)
+        )
 
 
 class TestStateRecorder(unittest.TestCase):
@@ -58,342 +190,274 @@ class TestStateRecorder(unittest.TestCase):
 
     def setUp(self):
         """Create an object and set up mocks."""
-        self.dir_path = 'states'
+        self.dir_path = 'states/'
         self.file_prefix = 'simple'
         self.num_to_keep = 5
         self.file_suffix = '.json'
-        self.mock_s3 = Mock()
+        self.s3 = FakeS3()
+        self.bucket = self.s3.bucket
         self.bucket_name = 'sat'
+        self.manifest_key = 'states/simple.manifest.json'
 
         self.simple_recorder = SimpleRecorder(
-            self.dir_path, self.file_prefix, self.num_to_keep, self.mock_s3, self.bucket_name
+            self.dir_path, self.file_prefix, self.num_to_keep, self.s3, self.bucket_name
         )
 
-        self.mock_s3_bucket = self.mock_s3.Bucket.return_value
-        self.bucket_files = [
-            Mock(key='states/simple.2020-09-07T18:05:14.json',
-                 last_modified=datetime.datetime(2020, 9, 7, 18, 5, 14, 266170))
-        ]
-        self.mock_s3_bucket.objects.filter.return_value = self.bucket_files
-
-        self.mock_open = patch('builtins.open').start()
-        self.mock_date_str = '2020-09-07T18:05:14'
-        self.expected_new_file_name = os.path.join(
-            self.dir_path, f'{self.file_prefix}.{self.mock_date_str}{self.file_suffix}'
-        )
-        self.expected_local_new_file_name = os.path.join(
-            DEFAULT_LOCAL_STATE_DIR, self.expected_new_file_name
-        )
+        self.timestamps = (f'2020-09-07T18:{minute:02}:14' for minute in range(60))
         self.mock_datetime = patch('sat.cli.bootsys.state_recorder.datetime').start()
-        self.mock_utcnow = Mock()
-        self.mock_datetime.utcnow = self.mock_utcnow
-        self.mock_utcnow.return_value.strftime.return_value = self.mock_date_str
-
-        self.local_dir_path = os.path.join(DEFAULT_LOCAL_STATE_DIR, self.dir_path)
-        self.mock_remove = patch('os.remove').start()
-        self.mock_makedirs = patch('os.makedirs').start()
-        self.mock_json_dump = patch('json.dump').start()
-        self.mock_json_load = patch('json.load').start()
+        self.mock_datetime.utcnow.return_value.strftime.side_effect = lambda fmt: next(self.timestamps)
 
     def tearDown(self):
         """Stop all mock patches."""
         patch.stopall()
 
-    def set_up_mock_create_new_file(self):
-        """Mock some of the StateRecorder methods to help test higher-level methods."""
-        self.mock_create_new_file = patch('sat.cli.bootsys.state_recorder.StateRecorder._create_new_file').start()
-        self.mock_create_new_file.return_value = self.expected_new_file_name
+    def get_manifest(self):
+        """Get the manifest stored in the fake bucket."""
+        return json.loads(self.bucket.contents[self.manifest_key])
+
+    def get_snapshot(self, key):
+        """Get the decompressed contents of a snapshot in the fake bucket."""
+        return json.loads(gzip.decompress(self.bucket.contents[key]))
+
+    def dump_states(self, states):
+        """Dump each of the given states in turn and return the new keys."""
+        keys = []
+        for state in states:
+            self.simple_recorder.state_data = state
+            self.simple_recorder.dump_state()
+            keys.append(self.get_manifest()['snapshots'][-1]['key'])
+        return keys
+
+    def add_legacy_file(self, key, data):
+        """Add an uncompressed state file stored before the manifest existed."""
+        FakeS3Object(self.bucket, key).put(json.dumps(data).encode())
 
-    def assert_instance_variables(self):
-        """Check that self.simple_recorder has the expected instance variables"""
+    def test_init(self):
+        """Test instantiation of a simple subclass of StateRecorder."""
         self.assertEqual(self.dir_path, self.simple_recorder.dir_path)
         self.assertEqual(self.file_prefix, self.simple_recorder.file_prefix)
         self.assertEqual(self.num_to_keep, self.simple_recorder.num_to_keep)
         self.assertEqual(self.file_suffix, self.simple_recorder.file_suffix)
-        self.assertEqual(self.mock_s3, self.simple_recorder.s3)
+        self.assertEqual(self.s3, self.simple_recorder.s3)
         self.assertEqual(self.bucket_name, self.simple_recorder.bucket_name)
+        self.assertTrue(self.simple_recorder.use_deltas)
+        self.assertEqual(self.manifest_key, self.simple_recorder.manifest_key)
 
-    def test_init(self):
-        """Test instantiation of a simple subclass of StateRecorder."""
-        self.assert_instance_variables()
-
-    def test_init_non_default_values(self):
-        """Test instantiation of a simple subclass of StateRecorder with non-default num_to_keep and suffix"""
-        self.num_to_keep = 10
-        self.file_suffix = '.yaml'
-        self.simple_recorder = SimpleRecorder(
-            self.dir_path, self.file_prefix, self.num_to_keep, self.mock_s3, self.bucket_name, self.file_suffix
+    def test_dump_state_first_snapshot(self):
+        """Test dump_state stores a compressed full snapshot and a manifest."""
+        self.simple_recorder.dump_state()
+        expected_key = 'states/simple.2020-09-07T18:00:14.json.gz'
+        self.assertEqual(
+            {'version': 1, 'base': None, 'state': {'foo': 'bar'}},
+            self.get_snapshot(expected_key)
         )
-        self.assert_instance_variables()
-
-    def test_remove_old_files_none(self):
-        """Test _remove_old_files with no files removes no files."""
-        self.mock_s3_bucket.objects.filter.return_value = []
-        self.simple_recorder._remove_old_files()
-        self.mock_s3.Bucket.assert_called_with(self.bucket_name)
-        self.mock_s3.Bucket.return_value.objects.filter.assert_called_with(Prefix=self.dir_path)
-        self.mock_s3.Object.return_value.delete.assert_not_called()
-
-    def test_remove_old_files_below_limit(self):
-        """Test _remove_old_files with the number of files below the limit removes no files."""
-        self.simple_recorder._remove_old_files()
-        self.mock_s3.Bucket.assert_called_with(self.bucket_name)
-        self.mock_s3.Bucket.return_value.objects.filter.assert_called_with(Prefix=self.dir_path)
-        self.mock_s3.Object.return_value.delete.assert_not_called()
-
-    def test_remove_old_files_at_limit(self):
-        """Test _remove_old_files with the number of files at the limit removes no files."""
-        bucket_files = [
-            Mock(key=f'states/simple.2020-09-07T18:0{i}:14.json',
-                 last_modified=datetime.datetime(2020, 9, 7, 18, i, 14, 266170))
-            for i in range(self.num_to_keep)
-        ]
-        self.mock_s3_bucket.objects.filter.return_value = bucket_files
-        self.simple_recorder._remove_old_files()
-        self.mock_s3.Bucket.assert_called_with(self.bucket_name)
-        self.mock_s3.Bucket.return_value.objects.filter.assert_called_with(Prefix=self.dir_path)
-        self.mock_s3.Object.return_value.delete.assert_not_called()
-
-    def test_remove_old_files_over_limit(self):
-        """Test _remove_old_files with the number of files over the limit."""
-        bucket_files = [
-            Mock(key=f'states/simple.2020-09-07T18:0{i}:14.json',
-                 last_modified=datetime.datetime(2020, 9, 7, 18, i, 14, 266170))
-            for i in range(self.num_to_keep + 1)
-        ]
-        self.mock_s3.Bucket.return_value.objects.filter.return_value = bucket_files
-        self.simple_recorder._remove_old_files()
-        self.mock_s3.Bucket.assert_called_with(self.bucket_name)
-        self.mock_s3.Bucket.return_value.objects.filter.assert_called_with(Prefix=self.dir_path)
-        self.mock_s3.Object.return_value.delete.called_once_with(bucket_files[0])
-
-    def test_remove_old_files_s3_list_error(self):
-        """Test _remove_old_files when S3 can't list files raises a StateError."""
-        self.mock_s3.Bucket.return_value.objects.filter.side_effect = Boto3Error
-        with self.assertRaisesRegex(StateError, 'Unable to list files in S3 Bucket'):
-            self.simple_recorder._remove_old_files()
-        self.mock_s3.Bucket.assert_called_with(self.bucket_name)
-        self.mock_s3.Bucket.return_value.objects.filter.assert_called_with(Prefix=self.dir_path)
-        self.mock_s3.Object.return_value.delete.assert_not_called()
-
-    def test_remove_old_files_irrelevant_file(self):
-        """Test _remove_old_files under the limit but with an extra file that should be ignored"""
-        bucket_files = [
-            Mock(key=f'states/simple.2020-09-07T18:0{i}:14.json',
-                 last_modified=datetime.datetime(2020, 9, 7, 18, i, 14, 266170))
-            for i in range(self.num_to_keep)] + [
-            Mock(key='some-other-file',
-                 last_modified=datetime.datetime(2018, 9, 7, 19, 0, 14, 266170))
-            ]
-        self.mock_s3_bucket.objects.filter.return_value = bucket_files
-        self.simple_recorder._remove_old_files()
-        self.mock_s3.Bucket.assert_called_with(self.bucket_name)
-        self.mock_s3.Bucket.return_value.objects.filter.assert_called_with(Prefix=self.dir_path)
-        self.mock_s3.Object.return_value.delete.assert_not_called()
-
-    def test_create_new_file_success(self):
-        """Test _create_new_file in the successful case."""
-        self.simple_recorder._create_new_file()
-        self.mock_open.assert_called_once_with(self.expected_local_new_file_name, 'w')
-        self.mock_open.return_value.__enter__.return_value.write.assert_called_once_with('')
-
-    def test_create_new_file_open_failure(self):
-        """Test _create_new_file when open fails."""
-        self.mock_open.side_effect = OSError
-        with self.assertRaises(StateError):
-            self.simple_recorder._create_new_file()
-        self.mock_open.assert_called_once_with(self.expected_local_new_file_name, 'w')
-        self.mock_open.return_value.__enter__.assert_not_called()
-
-    def test_create_new_file_write_failure(self):
-        """Test _create_new_file when write fails."""
-        self.mock_open.return_value.__enter__.return_value.write.side_effect = OSError
-        with self.assertRaises(StateError):
-            self.simple_recorder._create_new_file()
-        self.mock_open.assert_called_once_with(
-            self.expected_local_new_file_name, 'w'
+        self.assertEqual(
+            {'version': 1, 'snapshots': [
+                {'key': expected_key, 'timestamp': '2020-09-07T18:00:14', 'base': None}
+            ]},
+            self.get_manifest()
         )
-        self.mock_open.return_value.__enter__.return_value.write.assert_called_once_with('')
 
-    def test_dump_state(self):
-        """Test dump_state method in the successful case."""
-        self.set_up_mock_create_new_file()
-        self.simple_recorder.dump_state()
-        self.mock_makedirs.assert_called_once_with(self.local_dir_path, exist_ok=True)
-        self.mock_create_new_file.assert_called_once_with()
-        self.mock_open.assert_called_once_with(self.expected_local_new_file_name, 'w')
-        self.mock_s3.Object.assert_called_once_with(self.bucket_name, self.expected_new_file_name)
-        self.mock_s3.Object.return_value.upload_file.assert_called_once_with(self.expected_local_new_file_name)
-        self.mock_remove.assert_called_once_with(self.expected_local_new_file_name)
-        self.mock_json_dump.assert_called_once_with(SimpleRecorder.CONST_DATA,
-                                                    self.mock_open.return_value.__enter__.return_value)
-
-    def test_dump_state_makedirs_file_exists(self):
-        """Test dump_state method when the dir or a leading part of the path is a file."""
-        self.set_up_mock_create_new_file()
-        for err in [FileExistsError, NotADirectoryError]:
-            self.mock_makedirs.side_effect = err
-            with self.assertRaisesRegex(StateError, 'is not a directory'):
-                self.simple_recorder.dump_state()
-
-        self.mock_makedirs.assert_called_with(self.local_dir_path, exist_ok=True)
-        self.mock_create_new_file.assert_not_called()
-        self.mock_open.assert_not_called()
-        self.mock_json_dump.assert_not_called()
-        self.mock_s3.Object.assert_not_called()
-
-    def test_dump_state_makedirs_failure(self):
-        """Test dump_state method when it fails to create the dir."""
-        self.set_up_mock_create_new_file()
-        self.mock_makedirs.side_effect = OSError
-        with self.assertRaisesRegex(StateError, f'Failed to ensure state directory {self.local_dir_path} exists'):
-            self.simple_recorder.dump_state()
-        self.mock_makedirs.assert_called_once_with(self.local_dir_path, exist_ok=True)
-        self.mock_create_new_file.assert_not_called()
-        self.mock_open.assert_not_called()
-        self.mock_json_dump.assert_not_called()
-        self.mock_s3.Object.assert_not_called()
-
-    def test_dump_state_file_open_failure(self):
-        """Test dump_state when it fails to open the file to write to."""
-        self.set_up_mock_create_new_file()
-        self.mock_open.side_effect = OSError
-
-        with self.assertRaisesRegex(StateError, 'Failed to write state to file'):
-            self.simple_recorder.dump_state()
+    def test_dump_state_delta(self):
+        """Test dump_state stores a small change as a delta to the last full snapshot."""
+        old_state = get_large_state()
+        new_state = get_large_state()
+        new_state['group1']['member-1-1'] = 'Failed'
+        full_key, delta_key = self.dump_states([old_state, new_state])
 
-        self.mock_makedirs.assert_called_once_with(self.local_dir_path, exist_ok=True)
-        self.mock_create_new_file.assert_called_once_with()
-        self.mock_json_dump.assert_not_called()
-        self.mock_s3.Object.assert_not_called()
-        self.mock_open.assert_called_once_with(self.expected_local_new_file_name, 'w')
-        self.mock_json_dump.assert_not_called()
+        self.assertEqual(
+            {'version': 1, 'base': full_key, 'patch': {'group1': {'member-1-1': 'Failed'}}},
+            self.get_snapshot(delta_key)
+        )
+        self.assertEqual(new_state, self.simple_recorder.get_stored_state())
+        self.assertEqual(old_state, self.simple_recorder.load_snapshot(full_key))
+
+    def test_dump_state_deltas_relative_to_full_snapshot(self):
+        """Test successive deltas are relative to the last full snapshot."""
+        states = [get_large_state() for _ in range(3)]
+        states[1]['group0']['member-0-0'] = 'Failed'
+        states[2]['group0']['member-0-1'] = 'Failed'
+        full_key, _, second_delta_key = self.dump_states(states)
+
+        self.assertEqual(full_key, self.get_snapshot(second_delta_key)['base'])
+        self.assertEqual(states[2], self.simple_recorder.get_stored_state())
+
+    def test_dump_state_large_change_full_snapshot(self):
+        """Test dump_state stores a full snapshot when a delta would not be small enough."""
+        _, new_key = self.dump_states([{'foo': 'bar'}, {'baz': 'bat'}])
+        self.assertIsNone(self.get_snapshot(new_key)['base'])
+
+    def test_dump_state_deltas_disabled(self):
+        """Test dump_state always stores full snapshots when deltas are disabled."""
+        self.simple_recorder.use_deltas = False
+        keys = self.dump_states([get_large_state(), get_large_state()])
+        for key in keys:
+            self.assertIsNone(self.get_snapshot(key)['base'])
+
+    def test_dump_state_removes_old_snapshots(self):
+        """Test dump_state keeps only the newest snapshots."""
+        self.simple_recorder.use_deltas = False
+        keys = self.dump_states([{'count': i} for i in range(self.num_to_keep + 2)])
+        self.assertEqual(keys[2:], self.simple_recorder._get_s3_state_files())
+        self.assertEqual(set(keys[2:]) | {self.manifest_key}, set(self.bucket.contents))
+
+    def test_dump_state_keeps_base_of_delta(self):
+        """Test removing old snapshots keeps the full snapshots needed by deltas."""
+        states = [get_large_state() for _ in range(self.num_to_keep + 1)]
+        for i, state in enumerate(states[1:]):
+            state['group0'][f'member-0-{i}'] = 'Failed'
+        keys = self.dump_states(states)
+
+        self.assertEqual(keys, self.simple_recorder._get_s3_state_files())
+        self.assertIn(keys[0], self.bucket.contents)
+        self.assertEqual(states[-1], self.simple_recorder.get_stored_state())
 
     def test_dump_state_s3_dump_error(self):
         """Test dump_state when uploading to S3 fails raises a StateError"""
-        self.set_up_mock_create_new_file()
-        self.mock_s3.Object.return_value.upload_file.side_effect = Boto3Error
+        self.bucket.failing_keys.add('states/simple.2020-09-07T18:00:14.json.gz')
         with self.assertRaisesRegex(StateError, 'Failed to dump state to S3'):
             self.simple_recorder.dump_state()
-        self.mock_makedirs.assert_called_once_with(self.local_dir_path, exist_ok=True)
-        self.mock_create_new_file.assert_called_once_with()
-        self.mock_open.assert_called_once_with(self.expected_local_new_file_name, 'w')
-        self.mock_s3.Object.assert_called_once_with(self.bucket_name, self.expected_new_file_name)
-        self.mock_json_dump.assert_called_once_with(SimpleRecorder.CONST_DATA,
-                                                    self.mock_open.return_value.__enter__.return_value)
-        self.mock_remove.assert_called_once_with(self.expected_local_new_file_name)
-
-    def test_get_stored_state(self):
-        """Test get_stored_state method in the successful case."""
-        bucket_files = [
-            Mock(key=f'states/simple.2020-09-07T18:0{i}:14.json',
-                 last_modified=datetime.datetime(2020, 9, 7, 18, i, 14, 266170))
-            for i in range(5)
-        ]
-        self.mock_s3_bucket.objects.filter.return_value = bucket_files
-        expected_latest_file = bucket_files[-1].key
-        expected_local_path = os.path.join(DEFAULT_LOCAL_STATE_DIR, expected_latest_file)
-
-        stored_state = self.simple_recorder.get_stored_state()
-
-        # Assert file was downloaded from S3
-        self.mock_s3_bucket.objects.filter.assert_called_once_with(Prefix=self.dir_path)
-        self.mock_s3.Object.assert_called_once_with(self.bucket_name, expected_latest_file)
-        self.mock_s3.Object.return_value.download_file.assert_called_once_with(expected_local_path)
-
-        # Assert file was saved locally and opened
-        self.mock_makedirs.assert_called_once_with(self.local_dir_path, exist_ok=True)
-        self.assertEqual(self.mock_json_load.return_value, stored_state)
-        self.mock_open.assert_called_once_with(expected_local_path)
-        self.mock_json_load.assert_called_once_with(self.mock_open.return_value.__enter__.return_value)
-        self.mock_remove.assert_called_once_with(expected_local_path)
+        self.assertEqual({}, self.bucket.contents)
 
-    def test_get_stored_state_no_state(self):
-        """Test get_stored_state when no files are returned from S3."""
-        self.mock_s3_bucket.objects.filter.return_value = []
-        with self.assertRaisesRegex(StateError, 'No stored state found'):
-            self.simple_recorder.get_stored_state()
-        self.mock_s3_bucket.objects.filter.assert_called_once_with(Prefix=self.dir_path)
-        self.mock_open.assert_not_called()
-        self.mock_json_load.assert_not_called()
-        self.mock_remove.assert_not_called()
-
-    def test_get_stored_state_irrelevant_file(self):
-        """Test get_stored state when a file exists but should be ignored."""
-        bucket_files = [
-            Mock(key=f'states/some-random-file.json',
-                 last_modified=datetime.datetime(2020, 9, 7, 18, 0, 14, 266170))
-        ]
-        self.mock_s3_bucket.objects.filter.return_value = bucket_files
-        with self.assertRaisesRegex(StateError, 'No stored state found'):
-            self.simple_recorder.get_stored_state()
-        self.mock_s3_bucket.objects.filter.assert_called_once_with(Prefix=self.dir_path)
-        self.mock_open.assert_not_called()
-        self.mock_json_load.assert_not_called()
-        self.mock_remove.assert_not_called()
-
-    def test_get_stored_state_os_error(self):
-        """Test get_stored_state method when fails to open file."""
-        self.mock_open.side_effect = OSError
-        expected_local_file = os.path.join(
-            DEFAULT_LOCAL_STATE_DIR, self.bucket_files[0].key
-        )
-
-        with self.assertRaisesRegex(StateError, 'Failed to open downloaded file'):
-            self.simple_recorder.get_stored_state()
-
-        self.mock_open.assert_called_once_with(expected_local_file)
-        self.mock_json_load.assert_not_called()
-        self.mock_remove.assert_called_once_with(expected_local_file)
+    def test_dump_state_manifest_error(self):
+        """Test dump_state when the manifest cannot be read raises a StateError"""
+        self.bucket.failing_keys.add(self.manifest_key)
+        with self.assertRaisesRegex(StateError, 'Unable to read manifest'):
+            self.simple_recorder.dump_state()
 
-    def test_get_stored_state_json_error(self):
-        """Test get_stored_state method when fails to parse JSON from file data."""
-        self.mock_json_load.side_effect = ValueError
-        expected_local_file = os.path.join(
-            DEFAULT_LOCAL_STATE_DIR, self.bucket_files[0].key
+    def test_get_snapshots_legacy_files(self):
+        """Test get_snapshots lists the bucket when there is no manifest."""
+        self.add_legacy_file('states/simple.2020-09-07T18:00:14.json', {'foo': 'old'})
+        self.add_legacy_file('states/simple.2020-09-07T18:01:14.json', {'foo': 'new'})
+        self.add_legacy_file('states/some-other-file.json', {})
+        self.assertEqual(
+            ['states/simple.2020-09-07T18:00:14.json', 'states/simple.2020-09-07T18:01:14.json'],
+            self.simple_recorder._get_s3_state_files()
         )
+        self.assertEqual({'foo': 'new'}, self.simple_recorder.get_stored_state())
 
-        with self.assertRaisesRegex(StateError, 'Failed to parse JSON from downloaded file'):
-            self.simple_recorder.get_stored_state()
+    def test_dump_state_after_legacy_files(self):
+        """Test dump_state adds legacy files to the new manifest and prunes them."""
+        self.simple_recorder.num_to_keep = 2
+        self.add_legacy_file('states/simple.2020-09-06T18:00:14.json', {'foo': 'older'})
+        self.add_legacy_file('states/simple.2020-09-06T18:01:14.json', {'foo': 'old'})
+        self.simple_recorder.dump_state()
+        self.assertEqual(
+            ['states/simple.2020-09-06T18:01:14.json', 'states/simple.2020-09-07T18:00:14.json.gz'],
+            self.simple_recorder._get_s3_state_files()
+        )
+        self.assertNotIn('states/simple.2020-09-06T18:00:14.json', self.bucket.contents)
+        self.assertEqual({'foo': 'bar'}, self.simple_recorder.get_stored_state())
 
-        self.mock_open.assert_called_once_with(expected_local_file)
-        self.mock_json_load.assert_called_once_with(self.mock_open.return_value.__enter__.return_value)
-        self.mock_remove.assert_called_once_with(expected_local_file)
+    def test_get_snapshots_s3_list_error(self):
+        """Test get_snapshots when S3 can't list files raises a StateError."""
+        self.bucket.objects.filter.side_effect = Boto3Error
+        with self.assertRaisesRegex(StateError, 'Unable to list files in S3 Bucket'):
+            self.simple_recorder.get_snapshots()
 
-    def test_get_stored_state_s3_list_error(self):
-        """Test get_stored_state when S3 can't list files raises a StateError."""
-        self.mock_s3_bucket.objects.filter.side_effect = Boto3Error
+    def test_get_snapshots_invalid_manifest(self):
+        """Test get_snapshots with a manifest which is not valid JSON."""
+        self.bucket.contents[self.manifest_key] = b'not json'
+        with self.assertRaisesRegex(StateError, 'Failed to parse JSON from manifest'):
+            self.simple_recorder.get_snapshots()
 
-        with self.assertRaisesRegex(StateError, 'Unable to list files in S3 Bucket'):
+    def test_get_stored_state_no_state(self):
+        """Test get_stored_state when there are no snapshots."""
+        with self.assertRaisesRegex(StateError, 'No stored state found'):
             self.simple_recorder.get_stored_state()
-        self.mock_remove.assert_not_called()
 
     def test_get_stored_state_s3_download_error(self):
         """Test get_stored_state when S3 can't download a file raises a StateError."""
-        self.mock_s3.Object.return_value.download_file.side_effect = Boto3Error
-
+        self.simple_recorder.dump_state()
+        self.bucket.failing_keys.add('states/simple.2020-09-07T18:00:14.json.gz')
         with self.assertRaisesRegex(StateError, 'Unable to download'):
             self.simple_recorder.get_stored_state()
-        self.mock_remove.assert_not_called()
 
+    def test_get_stored_state_corrupt_snapshot(self):
+        """Test get_stored_state when a snapshot cannot be decompressed."""
+        self.simple_recorder.dump_state()
+        self.bucket.contents['states/simple.2020-09-07T18:00:14.json.gz'] = b'not gzip'
+        with self.assertRaisesRegex(StateError, 'Failed to decompress'):
+            self.simple_recorder.get_stored_state()
 
-def get_fake_pod_list(pods):
-    """Get a mock object that looks like a V1PodList.
+    def test_find_snapshot(self):
+        """Test find_snapshot finds a snapshot by key, file name or timestamp."""
+        keys = self.dump_states([{'a': 1}, {'a': 2}])
+        snapshots = self.simple_recorder.get_snapshots()
+        for name in (keys[0], 'simple.2020-09-07T18:00:14.json.gz', '2020-09-07T18:00:14'):
+            self.assertEqual(keys[0], self.simple_recorder.find_snapshot(name, snapshots)['key'])
+        with self.assertRaisesRegex(StateError, 'No simple state snapshot named'):
+            self.simple_recorder.find_snapshot('2021-01-01T00:00:00', snapshots)
 
-    Args:
-        pods (list): A list of tuples where each tuple has the following three
-            components:
-                (namespace, name, phase)
-    """
-    v1_pod_list = Mock()
-    v1_pod_list.items = []
-    for pod in pods:
-        mock_pod = Mock()
-        mock_pod.metadata.namespace = pod[0]
-        mock_pod.metadata.name = pod[1]
-        mock_pod.status.phase = pod[2]
-        v1_pod_list.items.append(mock_pod)
-    return v1_pod_list
+
+class TestDoStateDiff(unittest.TestCase):
+    """Tests for the do_state_diff function."""
+
+    def setUp(self):
+        """Set up a recorder backed by a fake S3 bucket."""
+        self.recorder = SimpleRecorder('states/', 'simple', 5, FakeS3(), 'sat')
+        patch.dict('sat.cli.bootsys.state_recorder.STATE_RECORDER_CLASSES',
+                   {'pod': lambda: self.recorder}).start()
+        patch('sat.cli.bootsys.state_recorder.get_config_value', return_value=False).start()
+        self.timestamps = (f'2020-09-07T18:{minute:02}:14' for minute in range(60))
+        mock_datetime = patch('sat.cli.bootsys.state_recorder.datetime').start()
+        mock_datetime.utcnow.return_value.strftime.side_effect = lambda fmt: next(self.timestamps)
+        self.mock_print = patch('builtins.print').start()
+        self.args = Namespace(state_type='pod', from_snapshot=None, to_snapshot=None,
+                              sort_by=0, reverse=False, fields=None, format='yaml')
+
+    def tearDown(self):
+        """Stop all mock patches."""
+        patch.stopall()
+
+    def dump_states(self, states):
+        """Dump each of the given states in turn."""
+        for state in states:
+            self.recorder.state_data = state
+            self.recorder.dump_state()
+
+    def get_printed_rows(self):
+        """Get the rows of the printed YAML report."""
+        self.mock_print.assert_called_once()
+        return yaml.safe_load(str(self.mock_print.mock_calls[0].args[0]))
+
+    def test_diff_latest(self):
+        """Test comparing the two most recent snapshots."""
+        self.dump_states([{'ns': {'a': 'Running'}}, {'ns': {'a': 'Failed'}}, {'ns': {'a': 'Pending'}}])
+        do_state_diff(self.args)
+        self.assertEqual([{'Group': 'ns', 'Name': 'a', 'Before': 'Failed', 'After': 'Pending'}],
+                         self.get_printed_rows())
+
+    def test_diff_from_and_to(self):
+        """Test comparing snapshots given by timestamp."""
+        self.dump_states([{'ns': {'a': 'Running'}}, {'ns': {'a': 'Failed'}}, {'ns': {'a': 'Pending'}}])
+        self.args.from_snapshot = '2020-09-07T18:02:14'
+        self.args.to_snapshot = '2020-09-07T18:00:14'
+        do_state_diff(self.args)
+        self.assertEqual([{'Group': 'ns', 'Name': 'a', 'Before': 'Pending', 'After': 'Running'}],
+                         self.get_printed_rows())
+
+    def test_diff_no_differences(self):
+        """Test comparing equal snapshots prints nothing."""
+        self.dump_states([{'ns': {'a': 'Running'}}, {'ns': {'a': 'Running'}}])
+        with self.assertLogs(level=logging.INFO) as logs:
+            do_state_diff(self.args)
+        self.mock_print.assert_not_called()
+        self.assertIn('No differences in simple state.', logs.output[-1])
+
+    def test_diff_too_few_snapshots(self):
+        """Test comparing with only one snapshot exits with an error."""
+        self.dump_states([{'ns': {'a': 'Running'}}])
+        with self.assertRaises(SystemExit), self.assertLogs(level=logging.ERROR):
+            do_state_diff(self.args)
+
+    def test_diff_unknown_snapshot(self):
+        """Test comparing with a snapshot which does not exist exits with an error."""
+        self.dump_states([{'ns': {'a': 'Running'}}, {'ns': {'a': 'Failed'}}])
+        self.args.from_snapshot = 'nonexistent'
+        with self.assertRaises(SystemExit), self.assertLogs(level=logging.ERROR) as logs:
+            do_state_diff(self.args)
+        self.assertIn('No simple state snapshot named nonexistent found', logs.output[-1])
 
 
 class TestPodStateRecorder(unittest.TestCase):
@@ -414,7 +478,7 @@ class TestPodStateRecorder(unittest.TestCase):
         self.mock_s3 = patch('sat.cli.bootsys.state_recorder.get_s3_resource').start().return_value
 
         self.mock_load_kube_config = patch('sat.cli.bootsys.state_recorder.load_kube_config').start()
-        self.mock_pods = get_fake_pod_list([
+        self.mock_pods = get_fake_pod_list_response([
             ('services', 'boa', 'complete'),
             ('services', 'cfs', 'complete'),
             ('sma', 'sma-cstream', 'initializing'),
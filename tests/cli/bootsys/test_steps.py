@@ -0,0 +1,241 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for the sat.cli.bootsys.steps module.
+"""
+import json
+import logging
+import os
+from tempfile import TemporaryDirectory
+from threading import Barrier, Lock
+import time
+import unittest
+from unittest import mock
+
+from sat.cli.bootsys.steps import (
+    Step,
+    StepCheckpoint,
+    StepDefinitionError,
+    StepEngine,
+    StepsAborted,
+)
+
+
+class StepTestCase(unittest.TestCase):
+    """Scaffolding for tests which run steps."""
+
+    def setUp(self):
+        self.calls = []
+        self.lock = Lock()
+        self.running = set()
+        self.max_running = 0
+
+    def get_action(self, name, duration=0.0, error=None):
+        """Get an action which records when it runs."""
+        def action(*args):
+            with self.lock:
+                self.running.add(name)
+                self.max_running = max(self.max_running, len(self.running))
+            try:
+                time.sleep(duration)
+                if error is not None:
+                    raise error
+            finally:
+                with self.lock:
+                    self.running.discard(name)
+                    self.calls.append((name, args))
+        return action
+
+    def get_step(self, name, depends_on=(), resources=(), **kwargs):
+        return Step(f'Step {name}', self.get_action(name, **kwargs), name=name,
+                    depends_on=depends_on, resources=resources)
+
+    @property
+    def call_order(self):
+        return [name for name, _ in self.calls]
+
+
+class TestStepEngineDefinition(StepTestCase):
+    """Tests for validating the steps given to a StepEngine."""
+
+    def test_default_dependencies_sequential(self):
+        """Test that steps without declared dependencies depend on the previous step"""
+        engine = StepEngine([Step('a', None), Step('b', None), Step('c', None)])
+        self.assertEqual({'a': set(), 'b': {'a'}, 'c': {'b'}}, engine.dependencies)
+
+    def test_duplicate_names(self):
+        """Test that step names must be unique"""
+        with self.assertRaisesRegex(StepDefinitionError, 'Duplicate step name: a'):
+            StepEngine([self.get_step('a'), self.get_step('a')])
+
+    def test_unknown_dependency(self):
+        """Test that steps cannot depend on unknown steps"""
+        with self.assertRaisesRegex(StepDefinitionError, 'unknown step'):
+            StepEngine([self.get_step('a', depends_on=['b'])])
+
+    def test_cycle(self):
+        """Test that circular dependencies are rejected"""
+        steps = [self.get_step('a', depends_on=['c']), self.get_step('b', depends_on=['a']),
+                 self.get_step('c', depends_on=['b']), self.get_step('d')]
+        with self.assertRaisesRegex(StepDefinitionError, 'Circular dependencies exist between steps: a, b, c'):
+            StepEngine(steps)
+
+
+class TestStepEngineRun(StepTestCase):
+    """Tests for running steps with a StepEngine."""
+
+    def test_args_passed(self):
+        """Test that the arguments are passed to each action"""
+        with self.assertLogs(level=logging.INFO) as cm:
+            StepEngine([self.get_step('a'), self.get_step('b')]).run('groups')
+        self.assertEqual([('a', ('groups',)), ('b', ('groups',))], self.calls)
+        self.assertEqual(['Executing step: Step a', 'Executing step: Step b'],
+                         [record.message for record in cm.records])
+
+    def test_independent_steps_concurrent(self):
+        """Test that independent steps run at the same time"""
+        barrier = Barrier(3, timeout=5)
+        steps = [Step(name, lambda: barrier.wait(), name=name, depends_on=[]) for name in 'abc']
+        with self.assertLogs(level=logging.INFO):
+            StepEngine(steps).run()
+
+    def test_dependencies_respected(self):
+        """Test that steps begin only after their dependencies finish"""
+        steps = [
+            self.get_step('slow', duration=0.1),
+            self.get_step('fast'),
+            self.get_step('last', depends_on=['slow', 'fast']),
+        ]
+        with self.assertLogs(level=logging.INFO):
+            StepEngine(steps).run()
+        self.assertEqual(['fast', 'slow', 'last'], self.call_order)
+
+    def test_resource_limits(self):
+        """Test that the number of steps using a resource at once is limited"""
+        steps = [self.get_step(name, resources=['ncns'], duration=0.02) for name in 'abcd']
+        with self.assertLogs(level=logging.INFO):
+            StepEngine(steps, resource_limits={'ncns': 2}).run()
+        self.assertEqual(2, self.max_running)
+        self.assertEqual(4, len(self.calls))
+
+    def test_failure_without_handler(self):
+        """Test that a step's exception is raised without an error handler"""
+        steps = [self.get_step('a', error=ValueError('bad')), self.get_step('b', depends_on=['a'])]
+        with self.assertLogs(level=logging.INFO):
+            with self.assertRaisesRegex(ValueError, 'bad'):
+                StepEngine(steps).run()
+        self.assertEqual(['a'], self.call_order)
+
+    def test_failure_continue(self):
+        """Test that dependents run if the error handler allows it"""
+        handler = mock.Mock(return_value=True)
+        err = ValueError('bad')
+        steps = [self.get_step('a', error=err), self.get_step('b', depends_on=['a'])]
+        with self.assertLogs(level=logging.INFO):
+            StepEngine(steps).run(error_handler=handler)
+        handler.assert_called_once_with(steps[0], err)
+        self.assertEqual(['a', 'b'], self.call_order)
+
+    def test_failure_abort_waits_for_running(self):
+        """Test that running steps finish, but no more begin, after an abort"""
+        steps = [
+            self.get_step('fails', error=ValueError('bad')),
+            self.get_step('slow', duration=0.1),
+            self.get_step('after', depends_on=['slow']),
+        ]
+        with self.assertLogs(level=logging.INFO):
+            with self.assertRaises(StepsAborted):
+                StepEngine(steps).run(error_handler=lambda step, err: False)
+        self.assertEqual(['fails', 'slow'], self.call_order)
+
+
+class TestStepCheckpoint(StepTestCase):
+    """Tests for saving and resuming from checkpoints."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'checkpoint.json')
+        self.key = {'action': 'stop', 'hosts': ['ncn-m001']}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def get_steps(self, fail_c=False):
+        return [self.get_step('a'), self.get_step('b', depends_on=[]),
+                self.get_step('c', depends_on=['a', 'b'], error=ValueError('c') if fail_c else None),
+                self.get_step('d', depends_on=['c'])]
+
+    def test_completed_steps_saved(self):
+        """Test that the steps which completed before a failure are saved"""
+        with self.assertLogs(level=logging.INFO):
+            with self.assertRaises(ValueError):
+                StepEngine(self.get_steps(fail_c=True), checkpoint=StepCheckpoint(self.path, self.key)).run()
+        with open(self.path) as f:
+            data = json.load(f)
+        self.assertEqual(self.key, data['key'])
+        self.assertCountEqual(['a', 'b'], data['completed'])
+
+    def test_resume(self):
+        """Test that completed steps are skipped when resuming"""
+        with self.assertLogs(level=logging.INFO):
+            with self.assertRaises(ValueError):
+                StepEngine(self.get_steps(fail_c=True), checkpoint=StepCheckpoint(self.path, self.key)).run()
+        self.calls.clear()
+
+        with self.assertLogs(level=logging.INFO):
+            StepEngine(self.get_steps(), checkpoint=StepCheckpoint(self.path, self.key),
+                       resume=True).run()
+        self.assertEqual(['c', 'd'], self.call_order)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_no_resume_clears(self):
+        """Test that the checkpoint is discarded when not resuming"""
+        StepCheckpoint(self.path, self.key).mark_completed('a')
+        with self.assertLogs(level=logging.INFO):
+            StepEngine(self.get_steps(), checkpoint=StepCheckpoint(self.path, self.key)).run()
+        self.assertEqual(['a', 'b', 'c', 'd'], sorted(self.call_order))
+
+    def test_key_mismatch(self):
+        """Test that a checkpoint saved for a different key is ignored"""
+        StepCheckpoint(self.path, {'action': 'start'}).mark_completed('a')
+        checkpoint = StepCheckpoint(self.path, self.key)
+        with self.assertLogs(level=logging.WARNING) as cm:
+            self.assertEqual(set(), checkpoint.load())
+        self.assertIn('Ignoring checkpoint file', cm.records[0].message)
+
+    def test_load_missing(self):
+        """Test loading a checkpoint which does not exist"""
+        self.assertEqual(set(), StepCheckpoint(self.path, self.key).load())
+
+    def test_load_invalid(self):
+        """Test loading a checkpoint which is not valid JSON"""
+        with open(self.path, 'w') as f:
+            f.write('not json')
+        with self.assertLogs(level=logging.WARNING):
+            self.assertEqual(set(), StepCheckpoint(self.path, self.key).load())
+
+
+if __name__ == '__main__':
+    unittest.main()
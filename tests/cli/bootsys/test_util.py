@@ -33,10 +33,12 @@ from sat.cli.bootsys.util import (
     get_mgmt_ncn_hostnames,
     get_and_verify_ncn_groups,
     get_mgmt_ncn_groups,
+    get_polling_strategy,
     get_ssh_client,
     prompt_for_ncn_verification,
     FatalBootsysError
 )
+from sat.waiting import BackoffPolling, ExpectedDurationPolling, FixedPolling
 
 
 class TestGetNcns(unittest.TestCase):
@@ -373,3 +375,48 @@ class TestGetSSHClient(unittest.TestCase):
         self.mock_ssh_client.set_missing_host_key_policy.assert_called_once_with(
             self.mock_warning_policy
         )
+
+
+class TestGetPollingStrategy(unittest.TestCase):
+    """Tests for get_polling_strategy function."""
+
+    def setUp(self):
+        self.config = {
+            'bootsys.bos_boot_polling': 'fixed',
+            'bootsys.bos_boot_timeout': 900,
+            'bootsys.bos_boot_expected_duration': 0,
+            'bootsys.max_poll_interval': 30,
+            'bootsys.poll_jitter': 0.25,
+        }
+        patch('sat.cli.bootsys.util.get_config_value', side_effect=self.config.get).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_fixed_polling(self):
+        """Test getting the fixed polling strategy."""
+        strategy = get_polling_strategy('bos-boot')
+        self.assertIsInstance(strategy, FixedPolling)
+        self.assertEqual(0.25, strategy.jitter)
+
+    def test_backoff_polling(self):
+        """Test getting the backoff polling strategy."""
+        self.config['bootsys.bos_boot_polling'] = 'backoff'
+        strategy = get_polling_strategy('bos-boot')
+        self.assertIsInstance(strategy, BackoffPolling)
+        self.assertEqual(30, strategy.max_interval)
+        self.assertEqual(0.25, strategy.jitter)
+
+    def test_expected_duration_polling(self):
+        """Test getting the expected duration polling strategy."""
+        self.config['bootsys.bos_boot_polling'] = 'expected'
+        self.config['bootsys.bos_boot_expected_duration'] = 600
+        strategy = get_polling_strategy('bos-boot')
+        self.assertIsInstance(strategy, ExpectedDurationPolling)
+        self.assertEqual(600, strategy.expected_duration)
+        self.assertEqual(30, strategy.max_interval)
+
+    def test_expected_duration_polling_default_duration(self):
+        """Test that completion is expected halfway to the timeout by default."""
+        self.config['bootsys.bos_boot_polling'] = 'expected'
+        self.assertEqual(450, get_polling_strategy('bos-boot').expected_duration)
@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -34,6 +34,7 @@ from kubernetes.config.config_exception import ConfigException
 from kubernetes.client.rest import ApiException
 
 from sat.cli.k8s.replicaset import ReplicaSet
+from tests.fake_pods import get_fake_pod_list_response
 
 
 class FakeReplicaSet(kubernetes.client.models.v1_replica_set.V1ReplicaSet):
@@ -53,30 +54,14 @@ class FakeReplicaSets:
         ]
 
 
-class FakePod:
-    def __init__(self, name, node_name, status):
-        self.metadata = Namespace()
-        self.metadata.name = name
-
-        self.spec = Namespace()
-        self.spec.node_name = node_name
-
-        self.status = Namespace()
-        self.status.phase = status
-
-    def __str__(self):
-        print(self.metadata.name, self.spec.node_name)
-
-
-class FakePods:
-    def __init__(self):
-        self.items = [
-            FakePod('replica1-dupes-hash-1', 'w001', 'Running'),
-            FakePod('replica1-dupes-hash-2', 'w001', 'Running'),
-            FakePod('replica1-dupes-hash-3', 'w002', 'Running'),
-            FakePod('replica1-dupes-hash-4', 'w001', 'Terminated'),
-            FakePod('replica1-other-hash-1', 'w001', 'Terminated'),
-        ]
+FAKE_PODS = [
+    ('namespace', 'replica1-dupes-hash-1', 'Running', 'w001', 'dupes-hash'),
+    ('namespace', 'replica1-dupes-hash-2', 'Running', 'w001', 'dupes-hash'),
+    ('namespace', 'replica1-dupes-hash-3', 'Running', 'w002', 'dupes-hash'),
+    ('namespace', 'replica1-dupes-hash-4', 'Terminated', 'w001', 'dupes-hash'),
+    ('namespace', 'replica1-other-hash-1', 'Terminated', 'w001', 'other-hash'),
+    ('other-namespace', 'replica1-dupes-hash-5', 'Running', 'w001', 'dupes-hash'),
+]
 
 
 class TestReplicaset(unittest.TestCase):
@@ -130,15 +115,15 @@ class TestReplicaset(unittest.TestCase):
             'sat.cli.k8s.replicaset.kubernetes.client.AppsV1Api.list_replica_set_for_all_namespaces',
             return_value=FakeReplicaSets()).start()
 
-        mock.patch(
-            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_namespaced_pod',
-            return_value=FakePods()).start()
+        self.mock_list_pods = mock.patch(
+            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_pod_for_all_namespaces',
+            return_value=get_fake_pod_list_response(FAKE_PODS)).start()
 
-        expected = FakePods().items
-        actual = ReplicaSet.get_all_replica_sets()[0].pods[0:4]
+        expected = [pod[1] for pod in FAKE_PODS[0:4]]
+        actual = ReplicaSet.get_all_replica_sets()[0].pods
 
-        for e, a in zip(expected, actual):
-            self.assertEqual(e.metadata.name, a.metadata.name)
+        self.assertEqual(expected, [pod.name for pod in actual])
+        self.mock_list_pods.assert_called_once()
 
     def test_running_pods(self):
         """It should return all pods with status of "Running".
@@ -151,15 +136,14 @@ class TestReplicaset(unittest.TestCase):
             'sat.cli.k8s.replicaset.kubernetes.client.AppsV1Api.list_replica_set_for_all_namespaces',
             return_value=FakeReplicaSets()).start()
 
-        mock.patch(
-            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_namespaced_pod',
-            return_value=FakePods()).start()
+        self.mock_list_pods = mock.patch(
+            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_pod_for_all_namespaces',
+            return_value=get_fake_pod_list_response(FAKE_PODS)).start()
 
-        expected = FakePods().items[0:3]
+        expected = [pod[1] for pod in FAKE_PODS[0:3]]
         actual = ReplicaSet.get_all_replica_sets()[0].running_pods
 
-        for e, a in zip(expected, actual):
-            self.assertEqual(e.metadata.name, a.metadata.name)
+        self.assertEqual(expected, [pod.name for pod in actual])
 
     def test_co_located_replicas(self):
         """Positive test-case for co_located_replicas.
@@ -174,18 +158,14 @@ class TestReplicaset(unittest.TestCase):
             'sat.cli.k8s.replicaset.kubernetes.client.AppsV1Api.list_replica_set_for_all_namespaces',
             return_value=FakeReplicaSets()).start()
 
-        mock.patch(
-            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_namespaced_pod',
-            return_value=FakePods()).start()
+        self.mock_list_pods = mock.patch(
+            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_pod_for_all_namespaces',
+            return_value=get_fake_pod_list_response(FAKE_PODS)).start()
 
-        expected = FakePods().items[0:2]
+        expected = [pod[1] for pod in FAKE_PODS[0:2]]
         actual = ReplicaSet.get_all_replica_sets()[0].co_located_replicas
 
-        self.assertIn('w001', actual)
-
-        self.assertEqual(2, len(actual['w001']))
-        for e, a in zip(expected, actual['w001']):
-            self.assertEqual(e.metadata.name, a)
+        self.assertEqual({'w001': expected}, actual)
 
     def test_get_all_replica_sets_api_exception(self):
         """It should re-raise an ApiException.
@@ -204,6 +184,23 @@ class TestReplicaset(unittest.TestCase):
         with self.assertRaises(ApiException):
             rs = ReplicaSet().get_all_replica_sets()
 
+    def test_get_all_replica_sets_pods_api_exception(self):
+        """It should raise an ApiException if listing pods fails."""
+        mock.patch(
+            'sat.cli.k8s.replicaset.kubernetes.config.load_kube_config',
+            return_value=None).start()
+
+        mock.patch(
+            'sat.cli.k8s.replicaset.kubernetes.client.AppsV1Api.list_replica_set_for_all_namespaces',
+            return_value=FakeReplicaSets()).start()
+
+        mock.patch(
+            'sat.cli.k8s.replicaset.kubernetes.client.CoreV1Api.list_pod_for_all_namespaces',
+            side_effect=ApiException).start()
+
+        with self.assertRaisesRegex(ApiException, 'Could not retrieve list of pods'):
+            ReplicaSet.get_all_replica_sets()
+
 
 if __name__ == '__main__':
     unittest.main()
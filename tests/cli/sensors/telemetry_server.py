@@ -0,0 +1,150 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+A local server for testing code which consumes Telemetry API streams.
+"""
+from collections import defaultdict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+STREAM_PATH_PREFIX = '/apis/sma-telemetry-api/v1/stream/'
+
+StreamResponse = namedtuple('StreamResponse', ['status', 'events', 'keep_open'])
+StreamRequest = namedtuple('StreamRequest', ['topic', 'params', 'headers'])
+
+
+class _StreamRequestHandler(BaseHTTPRequestHandler):
+    """Serves the next scripted response for the requested topic."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_GET(self):
+        server = self.server.telemetry_server
+        parsed = urlsplit(self.path)
+        topic = parsed.path[len(STREAM_PATH_PREFIX):]
+        response = server.record_request(topic, parse_qs(parsed.query), dict(self.headers))
+
+        if response is None or response.status >= 400:
+            status = 404 if response is None else response.status
+            body = b'{"title": "Error"}'
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/problem+json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(response.status)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for data in response.events:
+                frame = f'event: message\ndata: {data}\n\n'.encode()
+                # Split each frame so that clients must handle partial events
+                middle = len(frame) // 2
+                self.write_chunk(frame[:middle])
+                self.write_chunk(frame[middle:])
+            if response.keep_open:
+                server.stopped.wait()
+            else:
+                self.write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class LocalTelemetryServer:
+    """An HTTP server serving scripted Telemetry API streams on the loopback interface.
+
+    Each request for the stream of a topic is served the next response added
+    with `add_response` for the topic, or a 404 response if there is none.
+    """
+
+    def __init__(self):
+        """Create a new LocalTelemetryServer."""
+        self.responses = defaultdict(list)
+        self.requests = []
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _StreamRequestHandler)
+        self._server.daemon_threads = True
+        self._server.telemetry_server = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def add_response(self, topic, events=(), status=200, keep_open=False):
+        """Add a response to a request for the stream of a topic.
+
+        Args:
+            topic (str): the topic
+            events ([str]): the data of each event sent in the stream
+            status (int): the status code of the response
+            keep_open (bool): if True, keep the stream open after sending
+                the events until the server is stopped
+        """
+        with self._lock:
+            self.responses[topic].append(StreamResponse(status, list(events), keep_open))
+
+    def record_request(self, topic, params, headers):
+        """Record a request and get the response for it."""
+        with self._lock:
+            self.requests.append(StreamRequest(topic, params, headers))
+            if self.responses[topic]:
+                return self.responses[topic].pop(0)
+        return None
+
+    def get_stream_url(self, topic, params=None):
+        """Get the URL of the stream of a topic, like TelemetryAPIClient.get_stream_url."""
+        return f'http://127.0.0.1:{self.port}{STREAM_PATH_PREFIX}{topic}?{urlencode(params or {})}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
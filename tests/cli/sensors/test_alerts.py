@@ -0,0 +1,179 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for sat.cli.sensors.alerts
+"""
+
+import json
+import unittest
+from unittest import mock
+
+from parsec import ParseError
+
+from sat.cli.sensors.alerts import (
+    ALERT,
+    AlertEngine,
+    AlertRule,
+    CLEAR,
+    format_ndjson_events,
+    format_pretty_events,
+    SensorWindow,
+)
+
+
+def make_sensor(seconds, value, physical_context='CPU', index=0):
+    """Make a reading of a sensor taken a number of seconds after 21:20:00."""
+    minutes, seconds = divmod(seconds, 60)
+    return {
+        'Timestamp': f'2021-04-16T21:{20 + minutes:02}:{seconds:02}Z',
+        'Location': 'x3000c0s17b3',
+        'PhysicalContext': physical_context,
+        'Index': index,
+        'Value': value
+    }
+
+
+class TestSensorWindow(unittest.TestCase):
+    """Tests for the SensorWindow class."""
+
+    def test_rate_over_window(self):
+        """Test that the rate is computed per minute between the ends of the window."""
+        window = SensorWindow(60)
+        self.assertIsNone(window.add(0, 50))
+        self.assertEqual(60, window.add(10, 60))
+        self.assertEqual(30, window.add(60, 80))
+        # The reading at 0 is now outside the window
+        self.assertEqual(24, window.add(70, 84))
+        self.assertEqual([(10, 60), (60, 80), (70, 84)], list(window.readings))
+
+    def test_out_of_order_reading_ignored(self):
+        """Test that a reading older than the latest reading is not added."""
+        window = SensorWindow(60)
+        window.add(10, 50)
+        window.add(20, 60)
+        self.assertEqual(60, window.add(15, 100))
+        self.assertEqual([(10, 50), (20, 60)], list(window.readings))
+
+
+class TestAlertRule(unittest.TestCase):
+    """Tests for the AlertRule class."""
+
+    def test_threshold_matches(self):
+        """Test evaluating a threshold rule against a batch of rows."""
+        rule = AlertRule('physical=CPU and value>80')
+        rows = [
+            {'Physical Context': 'CPU', 'Value': 85.0},
+            {'Physical Context': 'CPU', 'Value': 75.0},
+            {'Physical Context': 'Baseboard', 'Value': 90.0},
+            {'Physical Context': 'CPU', 'Value': 'MISSING'},
+        ]
+        self.assertEqual([True, False, False, False], rule.get_matches(rows))
+
+    def test_invalid_query(self):
+        """Test that an invalid query raises a ParseError."""
+        with self.assertRaises(ParseError):
+            AlertRule('value >')
+
+    def test_unknown_field(self):
+        """Test that a rule with an unknown field is disabled."""
+        rule = AlertRule('nonexistent>1')
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual([False], rule.get_matches([{'Value': 1.0}]))
+        self.assertFalse(rule.enabled)
+
+
+class TestAlertEngine(unittest.TestCase):
+    """Tests for the AlertEngine class."""
+
+    def setUp(self):
+        self.topic = 'cray-telemetry-temperature'
+        self.metric = {'Context': 'x3000c0s17b3', 'Type': 'NodeBMC'}
+        self.emit = mock.Mock()
+
+    def test_threshold_alert_and_clear(self):
+        """Test that an alert is emitted when a rule starts matching, and cleared when it stops."""
+        engine = AlertEngine([AlertRule('physical=CPU and value>80')], emit=self.emit)
+
+        events = engine.evaluate(self.topic, self.metric, [make_sensor(0, '70'), make_sensor(0, '90', 'Baseboard')])
+        self.assertEqual([], events)
+
+        events = engine.evaluate(self.topic, self.metric, [make_sensor(10, '85'),
+                                                           make_sensor(10, '90', 'CPU', index=1)])
+        self.assertEqual([ALERT, ALERT], [event['event'] for event in events])
+        self.assertEqual([85.0, 90.0], [event['row']['Value'] for event in events])
+        self.emit.assert_called_once_with(events)
+
+        # Still matching, so no new alert
+        self.assertEqual([], engine.evaluate(self.topic, self.metric, [make_sensor(20, '86')]))
+
+        events = engine.evaluate(self.topic, self.metric, [make_sensor(30, '79')])
+        self.assertEqual([CLEAR], [event['event'] for event in events])
+        self.assertEqual('physical=CPU and value>80', events[0]['rule'])
+        self.assertEqual(2, engine.alert_count)
+        self.assertEqual(1, len(engine.active))
+
+    def test_rate_alert(self):
+        """Test a rule on the rate of change of a sensor."""
+        engine = AlertEngine([AlertRule('rate>=10')], window_secs=60)
+        self.assertEqual([], engine.evaluate(self.topic, self.metric, [make_sensor(0, '50')]))
+        self.assertEqual([], engine.evaluate(self.topic, self.metric, [make_sensor(30, '54')]))
+        events = engine.evaluate(self.topic, self.metric, [make_sensor(60, '60')])
+        self.assertEqual([ALERT], [event['event'] for event in events])
+        self.assertEqual(10, events[0]['row']['Rate'])
+
+    def test_multiple_rules(self):
+        """Test that each rule raises its own alerts for the same sensor."""
+        engine = AlertEngine([AlertRule('value>80'), AlertRule('value>90')])
+        events = engine.evaluate(self.topic, self.metric, [make_sensor(0, '95')])
+        self.assertEqual(['value>80', 'value>90'], [event['rule'] for event in events])
+        events = engine.evaluate(self.topic, self.metric, [make_sensor(10, '85')])
+        self.assertEqual([(CLEAR, 'value>90')], [(event['event'], event['rule']) for event in events])
+
+
+class TestFormatEvents(unittest.TestCase):
+    """Tests for formatting alert events."""
+
+    def setUp(self):
+        engine = AlertEngine([AlertRule('value>80')])
+        self.events = engine.evaluate('cray-telemetry-temperature',
+                                      {'Context': 'x3000c0s17b3', 'Type': 'NodeBMC'},
+                                      [make_sensor(0, '95')])
+
+    def test_format_ndjson_events(self):
+        """Test formatting events as newline-delimited JSON."""
+        event = json.loads(format_ndjson_events(self.events))
+        self.assertEqual(ALERT, event['event'])
+        self.assertEqual('x3000c0s17b3', event['row']['xname'])
+        self.assertEqual(95.0, event['row']['Value'])
+
+    def test_format_pretty_events(self):
+        """Test formatting events as a table."""
+        output = format_pretty_events(self.events)
+        self.assertIn('Sensor alerts at', output)
+        self.assertIn('value>80', output)
+        self.assertIn('x3000c0s17b3', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
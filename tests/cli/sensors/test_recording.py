@@ -0,0 +1,272 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for sat.cli.sensors.recording
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sat.cli.sensors.recording import (
+    format_timestamp,
+    iter_recording,
+    parse_timestamp,
+    RecordingError,
+    RingBuffer,
+    SensorRecorder,
+    SensorSeries,
+)
+from sat.constants import MISSING_VALUE
+
+# 2021-04-16T21:20:00Z
+START = 1618608000.0
+
+
+def make_sensor(seconds, value, specific_context='Inlet'):
+    """Make a sensor reading taken a number of seconds after START."""
+    return {
+        'Timestamp': format_timestamp(START + seconds),
+        'Location': 'x3000c0s17b3',
+        'PhysicalContext': 'Baseboard',
+        'Index': 0,
+        'DeviceSpecificContext': specific_context,
+        'Value': value
+    }
+
+
+class TestTimestamps(unittest.TestCase):
+    """Tests for parsing and formatting timestamps."""
+
+    def test_parse_timestamp(self):
+        """Test parsing timestamps with and without fractional seconds and time zones."""
+        self.assertEqual(START, parse_timestamp('2021-04-16T21:20:00Z'))
+        self.assertEqual(START + 0.5, parse_timestamp('2021-04-16T21:20:00.5Z'))
+        self.assertEqual(START, parse_timestamp('2021-04-16T23:20:00+02:00'))
+
+    def test_parse_invalid_timestamp(self):
+        """Test that invalid timestamps are parsed as None."""
+        self.assertIsNone(parse_timestamp('yesterday'))
+        self.assertIsNone(parse_timestamp(MISSING_VALUE))
+        self.assertIsNone(parse_timestamp(None))
+
+    def test_format_timestamp(self):
+        """Test formatting a timestamp."""
+        self.assertEqual('2021-04-16T21:20:00Z', format_timestamp(START))
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Tests for the RingBuffer class."""
+
+    def test_append_until_full(self):
+        """Test that the oldest record is returned once the buffer is full."""
+        ring = RingBuffer(2, 3)
+        self.assertEqual([None, None, None], [ring.append((i, i * 10)) for i in range(3)])
+        self.assertEqual((0, 0), ring.append((3, 30)))
+        self.assertEqual((1, 10), ring.append((4, 40)))
+        self.assertEqual([(2, 20), (3, 30), (4, 40)], list(ring))
+        self.assertEqual(3, len(ring))
+        self.assertEqual((4, 40), ring[-1])
+
+    def test_replace_last(self):
+        """Test replacing the most recent record after wrapping around."""
+        ring = RingBuffer(1, 2)
+        for i in range(5):
+            ring.append((i,))
+        ring.replace_last((10,))
+        self.assertEqual([(3,), (10,)], list(ring))
+
+    def test_index_out_of_range(self):
+        """Test that indexing past the records raises IndexError."""
+        ring = RingBuffer(1, 2)
+        ring.append((1,))
+        with self.assertRaises(IndexError):
+            ring[1]
+
+
+class TestSensorSeries(unittest.TestCase):
+    """Tests for the SensorSeries class."""
+
+    def test_older_samples_bucketed(self):
+        """Test that samples evicted from the raw buffer are combined into buckets."""
+        series = SensorSeries(('topic',), raw_capacity=2, bucket_capacity=10, bucket_secs=60)
+        for seconds, value in [(0, 10), (30, 20), (70, 5), (80, 6), (90, 7)]:
+            series.add(START + seconds, value)
+
+        self.assertEqual([(START + 80, 6), (START + 90, 7)], list(series.samples))
+        self.assertEqual([(START, 2, 10, 20, 30), (START + 60, 1, 5, 5, 5)], list(series.buckets))
+
+    def test_duplicate_timestamp_ignored(self):
+        """Test that a sample with the same timestamp as the latest sample is ignored."""
+        series = SensorSeries(('topic',))
+        self.assertTrue(series.add(START, 1))
+        self.assertFalse(series.add(START, 1))
+        self.assertEqual(1, len(series.samples))
+
+    def test_oldest_buckets_discarded(self):
+        """Test that memory is bounded by discarding the oldest buckets."""
+        series = SensorSeries(('topic',), raw_capacity=1, bucket_capacity=3, bucket_secs=1)
+        for seconds in range(100):
+            series.add(START + seconds, seconds)
+        self.assertEqual(3, len(series.buckets))
+        self.assertEqual(START + 96, series.buckets[0][0])
+        self.assertEqual(1, len(series.samples))
+
+
+class TestSensorRecorder(unittest.TestCase):
+    """Tests for recording to and reading from a recording file."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = os.path.join(self.temp_dir, 'sensors.rec')
+        self.metric = {'Context': 'x3000c0s17b3', 'Type': 'NodeBMC'}
+        self.topic = 'cray-telemetry-temperature'
+
+    def test_round_trip(self):
+        """Test that recorded series are read back with their keys, buckets and samples."""
+        recorder = SensorRecorder(self.path, raw_capacity=2, bucket_secs=60)
+        recorder.record(self.topic, self.metric, [make_sensor(0, '10'), make_sensor(0, '40', 'CPU')])
+        recorder.record(self.topic, self.metric, [make_sensor(30, '20'), make_sensor(30, '41', 'CPU')])
+        recorder.record(self.topic, self.metric, [make_sensor(70, '30')])
+        recorder.write_snapshot()
+
+        recording = list(iter_recording(self.path))
+        self.assertEqual(2, len(recording))
+        inlet, cpu = recording
+        self.assertEqual([self.topic, 'x3000c0s17b3', 'NodeBMC', 'x3000c0s17b3', MISSING_VALUE,
+                          MISSING_VALUE, 'Baseboard', 0, MISSING_VALUE, 'Inlet', MISSING_VALUE],
+                         inlet.key)
+        self.assertEqual([(START, 1, 10, 10, 10)], inlet.buckets)
+        self.assertEqual([(START + 30, 20), (START + 70, 30)], inlet.samples)
+        self.assertEqual([], cpu.buckets)
+        self.assertEqual([(START, 40), (START + 30, 41)], cpu.samples)
+
+        self.assertEqual(
+            {
+                'Samples': 3,
+                'Min': 10,
+                'Max': 30,
+                'Mean': 20,
+                'First Timestamp': '2021-04-16T21:20:00Z',
+                'Last Timestamp': '2021-04-16T21:21:10Z',
+            },
+            inlet.summarize()
+        )
+        self.assertEqual(
+            [
+                {'Start': '2021-04-16T21:20:00Z', 'End': '2021-04-16T21:21:00Z',
+                 'Samples': 1, 'Min': 10, 'Max': 10, 'Mean': 10},
+                {'Start': '2021-04-16T21:20:30Z', 'End': '2021-04-16T21:20:30Z',
+                 'Samples': 1, 'Min': 20, 'Max': 20, 'Mean': 20},
+                {'Start': '2021-04-16T21:21:10Z', 'End': '2021-04-16T21:21:10Z',
+                 'Samples': 1, 'Min': 30, 'Max': 30, 'Mean': 30},
+            ],
+            inlet.get_intervals()
+        )
+
+    def test_invalid_readings_skipped(self):
+        """Test that readings without a numeric value or valid timestamp are skipped."""
+        recorder = SensorRecorder(self.path)
+        bad_timestamp = make_sensor(0, '10')
+        bad_timestamp['Timestamp'] = MISSING_VALUE
+        recorder.record(self.topic, self.metric, [make_sensor(0, 'N/A'), bad_timestamp,
+                                                  make_sensor(0, '1.5')])
+        self.assertEqual(2, recorder.skipped_readings)
+        self.assertEqual(1, len(recorder.series))
+
+    def test_periodic_snapshot(self):
+        """Test that the recording file is written once the snapshot interval has elapsed."""
+        with mock.patch('sat.cli.sensors.recording.time.monotonic', return_value=100):
+            recorder = SensorRecorder(self.path, snapshot_interval=60)
+        with mock.patch('sat.cli.sensors.recording.time.monotonic', return_value=159):
+            recorder.record(self.topic, self.metric, [make_sensor(0, '10')])
+        self.assertFalse(os.path.exists(self.path))
+        with mock.patch('sat.cli.sensors.recording.time.monotonic', return_value=160):
+            recorder.record(self.topic, self.metric, [make_sensor(1, '11')])
+        recorder.wait_for_snapshot()
+        self.assertEqual([[(START, 10), (START + 1, 11)]],
+                         [series.samples for series in iter_recording(self.path)])
+
+    def test_periodic_snapshot_in_worker_thread(self):
+        """Test that periodic snapshots are written outside the calling thread."""
+        writer_threads = []
+        release = threading.Event()
+
+        def fake_write(contents):
+            writer_threads.append(threading.current_thread())
+            release.wait(5)
+
+        recorder = SensorRecorder(self.path, snapshot_interval=0)
+        with mock.patch.object(recorder, '_write_contents', side_effect=fake_write):
+            recorder.record(self.topic, self.metric, [make_sensor(0, '10')])
+            # A second snapshot is not started while the first is being written
+            recorder.record(self.topic, self.metric, [make_sensor(1, '11')])
+            release.set()
+            recorder.wait_for_snapshot()
+
+        self.assertEqual(1, len(writer_threads))
+        self.assertIsNot(threading.current_thread(), writer_threads[0])
+
+    def test_periodic_snapshot_error(self):
+        """Test that a failure to write a periodic snapshot is logged."""
+        recorder = SensorRecorder(os.path.join(self.temp_dir, 'missing', 'sensors.rec'),
+                                  snapshot_interval=0)
+        with self.assertLogs(level='ERROR') as logs:
+            recorder.record(self.topic, self.metric, [make_sensor(0, '10')])
+            recorder.wait_for_snapshot()
+        self.assertIn('Unable to write sensor recording', logs.output[0])
+
+    def test_write_error(self):
+        """Test that a failure to write the recording raises RecordingError."""
+        recorder = SensorRecorder(os.path.join(self.temp_dir, 'missing', 'sensors.rec'))
+        with self.assertRaisesRegex(RecordingError, 'Unable to write sensor recording'):
+            recorder.write_snapshot()
+
+    def test_not_a_recording(self):
+        """Test that reading a file which is not a recording raises RecordingError."""
+        with gzip.open(self.path, 'wb') as f:
+            f.write(b'not a recording')
+        with self.assertRaisesRegex(RecordingError, 'is not a sensor recording'):
+            list(iter_recording(self.path))
+
+    def test_truncated_recording(self):
+        """Test that reading a truncated recording raises RecordingError."""
+        recorder = SensorRecorder(self.path)
+        recorder.record(self.topic, self.metric, [make_sensor(0, '10')])
+        recorder.write_snapshot()
+        with gzip.open(self.path, 'rb') as f:
+            data = f.read()
+        with gzip.open(self.path, 'wb') as f:
+            f.write(data[:-4])
+        with self.assertRaisesRegex(RecordingError, 'truncated'):
+            list(iter_recording(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
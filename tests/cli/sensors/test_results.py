@@ -0,0 +1,157 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for sat.cli.sensors.results
+"""
+
+import unittest
+import unittest.mock
+
+from sat.cli.sensors.main import make_raw_table
+from sat.cli.sensors.results import TopicResults
+
+
+def make_sensor(context, specific_context, value, timestamp='2021-04-16T21:20:53Z'):
+    """Make a sensor reading as returned by the Telemetry API."""
+    return {
+        'Timestamp': timestamp,
+        'Location': context,
+        'ParentalContext': 'Chassis',
+        'PhysicalContext': 'Baseboard',
+        'Index': 0,
+        'DeviceSpecificContext': specific_context,
+        'Value': value
+    }
+
+
+class TestTopicResults(unittest.TestCase):
+    """Tests for the TopicResults class."""
+
+    def setUp(self):
+        self.topic = 'cray-telemetry-temperature'
+        self.xnames_info = [{'xname': 'x3000c0r22b0', 'Type': 'RouterBMC'},
+                            {'xname': 'x3000c0s17b3', 'Type': 'NodeBMC'}]
+        self.topic_results = TopicResults(self.topic, self.xnames_info)
+
+    def test_init(self):
+        """Test the initial results of a TopicResults."""
+        self.assertEqual(
+            {
+                'Topic': self.topic,
+                'Done': False,
+                'APIError': False,
+                'Metrics': [
+                    {'Context': 'x3000c0r22b0', 'Type': 'RouterBMC', 'Count': 0, 'Sensors': []},
+                    {'Context': 'x3000c0s17b3', 'Type': 'NodeBMC', 'Count': 0, 'Sensors': []}
+                ]
+            },
+            self.topic_results.results
+        )
+        self.assertFalse(self.topic_results.all_contexts_received())
+
+    def test_set_sensors_unknown_context(self):
+        """Test set_sensors_for_context with a context that was not requested."""
+        self.assertFalse(self.topic_results.set_sensors_for_context(
+            'x9000c0s0b0', [make_sensor('x9000c0s0b0', 'CPU', '40')]
+        ))
+        for metric in self.topic_results.results['Metrics']:
+            self.assertEqual(0, metric['Count'])
+            self.assertEqual([], metric['Sensors'])
+
+    def test_all_contexts_received(self):
+        """Test all_contexts_received only counts each context once."""
+        sensors = [make_sensor('x3000c0s17b3', 'CPU', '40')]
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', sensors)
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', sensors)
+        self.assertFalse(self.topic_results.all_contexts_received())
+        self.topic_results.set_sensors_for_context('x3000c0r22b0', [])
+        self.assertTrue(self.topic_results.all_contexts_received())
+
+    def test_update_existing_sensor(self):
+        """Test that a sensor with a known identity is updated in place."""
+        original = make_sensor('x3000c0s17b3', 'CPU', '40')
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', [original])
+        self.topic_results.set_sensors_for_context(
+            'x3000c0s17b3', [make_sensor('x3000c0s17b3', 'CPU', '41', timestamp='2021-04-16T21:21:53Z')]
+        )
+        sensors = self.topic_results.results['Metrics'][1]['Sensors']
+        self.assertEqual(1, len(sensors))
+        self.assertIs(original, sensors[0])
+        self.assertEqual('41', original['Value'])
+        self.assertEqual('2021-04-16T21:21:53Z', original['Timestamp'])
+
+    def test_same_identity_different_contexts(self):
+        """Test that sensors with the same fields in different contexts are kept apart."""
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', [make_sensor('x3000', 'CPU', '40')])
+        self.topic_results.set_sensors_for_context('x3000c0r22b0', [make_sensor('x3000', 'CPU', '50')])
+        self.topic_results.set_sensors_for_context('x3000c0r22b0', [make_sensor('x3000', 'CPU', '51')])
+        metrics = self.topic_results.results['Metrics']
+        self.assertEqual(['51'], [sensor['Value'] for sensor in metrics[0]['Sensors']])
+        self.assertEqual(['40'], [sensor['Value'] for sensor in metrics[1]['Sensors']])
+
+    def test_duplicate_sensors_update_first(self):
+        """Test that only the first of duplicate sensors in the initial data is updated."""
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', [
+            make_sensor('x3000c0s17b3', 'CPU', '40'),
+            make_sensor('x3000c0s17b3', 'CPU', '45'),
+        ])
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', [make_sensor('x3000c0s17b3', 'CPU', '42')])
+        sensors = self.topic_results.results['Metrics'][1]['Sensors']
+        self.assertEqual(['42', '45'], [sensor['Value'] for sensor in sensors])
+
+    def test_listeners(self):
+        """Test that listeners are called with readings for requested contexts only."""
+        listener = unittest.mock.Mock()
+        topic_results = TopicResults(self.topic, self.xnames_info, listeners=[listener])
+        sensors = [make_sensor('x3000c0s17b3', 'CPU', '40')]
+        topic_results.set_sensors_for_context('x3000c0s17b3', sensors)
+        topic_results.set_sensors_for_context('x3000c0r22b0', None)
+        topic_results.set_sensors_for_context('x9000c0s0b0', sensors)
+        listener.assert_called_once_with(self.topic, topic_results.results['Metrics'][1], sensors)
+
+    def test_raw_table(self):
+        """Test that the raw table is built from the stored results in arrival order."""
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', [
+            make_sensor('x3000c0s17b3', 'Inlet', '22'),
+            make_sensor('x3000c0s17b3', 'BMC', '26'),
+        ])
+        self.topic_results.set_sensors_for_context('x3000c0r22b0', [make_sensor('x3000c0r22b0', 'ASIC', '50')])
+        self.topic_results.set_sensors_for_context('x3000c0s17b3', [
+            make_sensor('x3000c0s17b3', 'CPU', '40'),
+            make_sensor('x3000c0s17b3', 'Inlet', '23'),
+        ])
+        raw_table = make_raw_table([self.topic_results.results])
+        self.assertEqual(
+            [
+                ['x3000c0r22b0', 'ASIC', '50'],
+                ['x3000c0s17b3', 'Inlet', '23'],
+                ['x3000c0s17b3', 'BMC', '26'],
+                ['x3000c0s17b3', 'CPU', '40'],
+            ],
+            [[str(row[0]), row[10], row[12]] for row in raw_table]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
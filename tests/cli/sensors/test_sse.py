@@ -0,0 +1,167 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for sat.cli.sensors.sse
+"""
+
+import asyncio
+import unittest
+
+from sat.cli.sensors.sse import HTTPStatusError, HTTPStream, HTTPStreamError, SSEEvent, SSEParser
+
+
+class TestSSEParser(unittest.TestCase):
+    """Tests for the SSEParser class."""
+
+    def setUp(self):
+        self.parser = SSEParser()
+
+    def test_single_event(self):
+        """Test parsing a complete event."""
+        self.assertEqual([SSEEvent('message', 'hello', None)],
+                         self.parser.feed(b'data: hello\n\n'))
+
+    def test_partial_event(self):
+        """Test that an event is only returned once it is complete."""
+        self.assertEqual([], self.parser.feed(b'event: upd'))
+        self.assertEqual([], self.parser.feed(b'ate\ndata: {"a"'))
+        self.assertEqual([], self.parser.feed(b': 1}\n'))
+        self.assertEqual([SSEEvent('update', '{"a": 1}', None)], self.parser.feed(b'\n'))
+
+    def test_multiple_data_lines(self):
+        """Test that multiple data lines are joined with newlines."""
+        self.assertEqual([SSEEvent('message', 'a\nb', None)],
+                         self.parser.feed(b'data: a\ndata: b\n\n'))
+
+    def test_line_terminators(self):
+        """Test that CRLF and CR line terminators are handled, even when split."""
+        self.assertEqual([], self.parser.feed(b'data: a\r'))
+        self.assertEqual([], self.parser.feed(b'\ndata: b\r'))
+        self.assertEqual([], self.parser.feed(b'\r'))
+        self.assertEqual([SSEEvent('message', 'a\nb', None), SSEEvent('message', 'c', None)],
+                         self.parser.feed(b'data: c\r\n\r\n'))
+
+    def test_comments_and_id(self):
+        """Test that comments are ignored and the last event id is kept."""
+        events = self.parser.feed(b': keepalive\n\nid: 7\ndata: a\n\ndata: b\n\n')
+        self.assertEqual([SSEEvent('message', 'a', '7'), SSEEvent('message', 'b', '7')], events)
+
+    def test_event_without_data(self):
+        """Test that an event without data is not dispatched."""
+        self.assertEqual([], self.parser.feed(b'event: ping\n\n'))
+        self.assertEqual([SSEEvent('message', 'x', None)], self.parser.feed(b'data:x\n\n'))
+
+
+class TestHTTPStream(unittest.TestCase):
+    """Tests for the HTTPStream class against a local asyncio server."""
+
+    def serve(self, response):
+        """Serve a fixed response to one request and return what a handler function returns.
+
+        Args:
+            response (bytes): the raw HTTP response
+
+        Returns:
+            A function which runs a coroutine function taking the URL of the server.
+        """
+        async def handle(reader, writer):
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            writer.write(response)
+            await writer.drain()
+            writer.close()
+
+        async def run(client_fn):
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await client_fn(f'http://127.0.0.1:{port}/stream')
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        return lambda client_fn: asyncio.run(run(client_fn))
+
+    @staticmethod
+    async def read_events(url):
+        stream = await HTTPStream.open(url)
+        try:
+            return [event async for event in stream.events(read_timeout=5)]
+        finally:
+            stream.close()
+
+    def test_content_length_body(self):
+        """Test reading events from a response with a Content-Length."""
+        body = b'data: a\n\ndata: b\n\n'
+        response = b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body
+        events = self.serve(response)(self.read_events)
+        self.assertEqual(['a', 'b'], [event.data for event in events])
+
+    def test_chunked_body(self):
+        """Test reading events from a chunked response."""
+        response = (b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                    b'5\r\ndata:\r\n6\r\n a\n\nda\r\n6;ext=1\r\nta: b\n\r\n1\r\n\n\r\n0\r\n\r\n')
+        events = self.serve(response)(self.read_events)
+        self.assertEqual(['a', 'b'], [event.data for event in events])
+
+    def test_error_status(self):
+        """Test that an error status raises HTTPStatusError."""
+        response = b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 4\r\n\r\nbusy'
+        with self.assertRaises(HTTPStatusError) as err_cm:
+            self.serve(response)(self.read_events)
+        self.assertEqual(503, err_cm.exception.status)
+        self.assertEqual('Service Unavailable', err_cm.exception.reason)
+        self.assertEqual(b'busy', err_cm.exception.body)
+
+    def test_truncated_chunked_body(self):
+        """Test that a chunked response closed before its last chunk raises an error."""
+        response = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n9\r\ndata: a\n\n\r\n'
+        with self.assertRaises(HTTPStreamError):
+            self.serve(response)(self.read_events)
+
+    def test_read_timeout(self):
+        """Test that a stream with no data raises a timeout."""
+        async def handle(reader, writer):
+            await reader.readline()
+            writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n')
+            await writer.drain()
+            await asyncio.sleep(5)
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            stream = await HTTPStream.open(f'http://127.0.0.1:{port}/stream')
+            try:
+                async for _ in stream.events(read_timeout=0.1):
+                    pass
+            finally:
+                stream.close()
+                server.close()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
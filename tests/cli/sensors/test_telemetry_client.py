@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -25,14 +25,48 @@
 Unit tests for sat.cli.sensors.telemetry_client
 """
 
+import asyncio
 import json
+import time
 import unittest
-from threading import Event
 from unittest import mock
 
 from sat.cli.sensors.telemetry_client import (
-    TelemetryClient
+    TelemetryClient,
+    TelemetryMultiplexer
 )
+from tests.cli.sensors.telemetry_server import LocalTelemetryServer
+
+
+def make_event_data(xname, value):
+    """Make the data of a telemetry stream event with one sensor reading."""
+    return json.dumps({
+        'metrics': {
+            'messages': [
+                {
+                    'Context': xname,
+                    'Events': [
+                        {
+                            'EventTimestamp': '2021-04-16T21:20:53Z',
+                            'MessageId': 'CrayTelemetry.Temperature',
+                            'Oem': {
+                                'Sensors': [
+                                    {
+                                        'Timestamp': '2021-04-16T21:20:53Z',
+                                        'Location': xname,
+                                        'PhysicalContext': 'Baseboard',
+                                        'Index': 0,
+                                        'Value': value
+                                    }
+                                ],
+                                'TelemetrySource': 'cC'
+                            }
+                        }
+                    ]
+                }
+            ]
+        }
+    })
 
 
 class TestTelemetryClient(unittest.TestCase):
@@ -42,13 +76,8 @@ class TestTelemetryClient(unittest.TestCase):
         """Mock functions called."""
 
         self.mock_api_client = mock.Mock()
-        mock.patch('sat.cli.sensors.telemetry_client.TelemetryAPIClient',
-                   return_value=self.mock_api_client).start()
-        mock.patch('sat.cli.sensors.telemetry_client.SATSession').start()
-
         self.mock_api_client.ping.return_value = True
 
-        self.stop_event = Event()
         self.xnames_info = [{'xname': 'x3000c0r22b0', 'Type': 'RouterBMC'},
                             {'xname': 'x3000c0s17b3', 'Type': 'NodeBMC'}]
         self.batchsize = 8
@@ -116,45 +145,27 @@ class TestTelemetryClient(unittest.TestCase):
                 } for xname_info in self.xnames_info
             ]
         }
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
-        self.assertEqual(self.stop_event, telemetry_client.stop_event)
+        self.assertEqual(self.mock_api_client, telemetry_client.api_client)
         self.assertEqual(self.batchsize, telemetry_client.batchsize)
         self.assertEqual(self.update_until_timeout, telemetry_client.update_until_timeout)
         self.assertEqual(all_topics_results[0], temperature_init_results)
         self.assertEqual(all_topics_results[1], None)
 
-    def test_stop(self):
-        """Test stop of a TelemetryClient."""
-        all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
-                                           self.update_until_timeout, self.topic,
-                                           all_topics_results, 0)
-        self.assertFalse(telemetry_client.stopped())
-        telemetry_client.stop()
-        self.assertTrue(telemetry_client.stopped())
-
     def test_get_topic(self):
         """Test get_topic of a TelemetryClient."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         self.assertEqual(self.topic, telemetry_client.get_topic())
 
-    def test_endpoint_alive(self):
-        """Test endpoint_alive of a TelemetryClient."""
-        all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
-                                           self.update_until_timeout, self.topic,
-                                           all_topics_results, 0)
-        self.assertTrue(telemetry_client.endpoint_alive())
-
     def test_set_sensors_for_context(self):
         """Test set_sensors_for_context of a TelemetryClient."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         self.assertTrue(telemetry_client.set_sensors_for_context(
@@ -168,7 +179,7 @@ class TestTelemetryClient(unittest.TestCase):
     def test_set_sensors_for_context_update_existing(self):
         """Test set_sensors_for_context where existing sensors are updated."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         self.assertTrue(telemetry_client.set_sensors_for_context(
@@ -224,7 +235,7 @@ class TestTelemetryClient(unittest.TestCase):
         }
 
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         telemetry_client.unpack_data(json.dumps(bad_event_data))
@@ -233,7 +244,7 @@ class TestTelemetryClient(unittest.TestCase):
     def test_set_sensors_for_context_add_to_existing(self):
         """Test set_sensors_for_context where new sensors are added to existing sensors."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         self.assertTrue(telemetry_client.set_sensors_for_context(
@@ -261,7 +272,7 @@ class TestTelemetryClient(unittest.TestCase):
     def test_am_i_done(self):
         """Test am_i_done of a TelemetryClient."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         self.assertFalse(telemetry_client.am_i_done())
@@ -269,7 +280,7 @@ class TestTelemetryClient(unittest.TestCase):
     def test_unpack_data_with_missing_sensor_readings_for_requested_xnames(self):
         """Test unpack_data for 2 requested xnames where sensor data is received for 1 xname only."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         num_metrics = telemetry_client.unpack_data(json.dumps(self.event_data))
@@ -285,7 +296,7 @@ class TestTelemetryClient(unittest.TestCase):
         """Test unpack_data where sensor data is received for all xnames requested."""
         all_topics_results = [None]
         xnames_info = [{'xname': 'x3000c0s17b3', 'Type': 'NodeBMC'}]
-        telemetry_client = TelemetryClient(self.stop_event, xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
         num_metrics = telemetry_client.unpack_data(json.dumps(self.event_data))
@@ -302,7 +313,7 @@ class TestTelemetryClient(unittest.TestCase):
         all_topics_results = [None]
         xnames_info = [{'xname': 'x3000c0s17b3', 'Type': 'NodeBMC'}]
         update_until_timeout = True
-        telemetry_client = TelemetryClient(self.stop_event, xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, xnames_info, self.batchsize,
                                            update_until_timeout, self.topic,
                                            all_topics_results, 0)
         num_metrics = telemetry_client.unpack_data(json.dumps(self.event_data))
@@ -314,23 +325,201 @@ class TestTelemetryClient(unittest.TestCase):
         self.assertEqual(xname_results['Count'], 1)
         self.assertEqual(xname_results['Sensors'], self.temperature_sensors_results)
 
-    def test_check_if_run_done_when_stopped(self):
-        """Test check_if_run_done of a TelemetryClient that is stopped."""
+    def test_check_if_run_done_when_api_error(self):
+        """Test check_if_run_done of a TelemetryClient whose topic had an API error."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
-        self.assertFalse(telemetry_client.check_if_run_done(self.topic))
-        telemetry_client.stop()
-        self.assertTrue(telemetry_client.check_if_run_done(self.topic))
+        self.assertFalse(telemetry_client.check_if_run_done())
+        all_topics_results[0]['APIError'] = True
+        self.assertTrue(telemetry_client.check_if_run_done())
 
-    def test_ping_and_sleep(self):
-        """Test ping_and_sleep of a TelemetryClient."""
+    def test_check_if_run_done_when_all_received(self):
+        """Test check_if_run_done of a TelemetryClient which has received data for all xnames."""
         all_topics_results = [None]
-        telemetry_client = TelemetryClient(self.stop_event, self.xnames_info, self.batchsize,
+        xnames_info = [{'xname': 'x3000c0s17b3', 'Type': 'NodeBMC'}]
+        telemetry_client = TelemetryClient(self.mock_api_client, xnames_info, self.batchsize,
                                            self.update_until_timeout, self.topic,
                                            all_topics_results, 0)
-        self.assertTrue(telemetry_client.ping_and_sleep(self.topic))
+        telemetry_client.unpack_data(json.dumps(self.event_data))
+        self.assertTrue(telemetry_client.check_if_run_done())
+        self.assertTrue(all_topics_results[0]['Done'])
+
+    def test_get_reconnect_delay(self):
+        """Test that the reconnect delay backs off until the retries are exhausted."""
+        telemetry_client = TelemetryClient(self.mock_api_client, self.xnames_info, self.batchsize,
+                                           self.update_until_timeout, self.topic, [None], 0)
+        delays = [telemetry_client.get_reconnect_delay()
+                  for _ in range(TelemetryClient.RECONNECT_RETRIES + 1)]
+        self.assertEqual([1, 2, 4, None], delays)
+
+
+class TestTelemetryMultiplexer(unittest.TestCase):
+    """Tests for TelemetryMultiplexer consuming streams from a local server."""
+
+    def setUp(self):
+        self.server = LocalTelemetryServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.api_client = mock.Mock()
+        self.api_client.get_stream_url.side_effect = self.server.get_stream_url
+        self.api_client.get_stream_headers.return_value = {'Authorization': 'Bearer token'}
+        self.api_client.cert_verify = False
+
+        self.topics = ['cray-telemetry-temperature', 'cray-telemetry-power']
+        self.xnames_info = [{'xname': 'x3000c0s1b0', 'Type': 'NodeBMC'},
+                            {'xname': 'x3000c0s3b0', 'Type': 'NodeBMC'}]
+
+        mock.patch.object(TelemetryClient, 'RECONNECT_DELAY_SECS', 0.01).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def run_multiplexer(self, total_timeout=10, update_until_timeout=False):
+        """Run a multiplexer for self.topics and return its results."""
+        multiplexer = TelemetryMultiplexer(self.topics, self.xnames_info, 8,
+                                           update_until_timeout, api_client=self.api_client)
+        return multiplexer.run(total_timeout)
+
+    def get_values(self, topic_result):
+        """Get the sensor values of each xname in a topic result."""
+        return {metric['Context']: [sensor['Value'] for sensor in metric['Sensors']]
+                for metric in topic_result['Metrics']}
+
+    def test_all_topics_complete(self):
+        """Test that all topics are consumed concurrently until data is received for all xnames."""
+        for topic in self.topics:
+            self.server.add_response(topic, [make_event_data('x3000c0s1b0', '20'),
+                                             make_event_data('x3000c0s3b0', '30')],
+                                     keep_open=True)
+
+        start = time.monotonic()
+        results = self.run_multiplexer()
+        self.assertLess(time.monotonic() - start, 5)
+
+        for topic, topic_result in zip(self.topics, results):
+            self.assertEqual(topic, topic_result['Topic'])
+            self.assertTrue(topic_result['Done'])
+            self.assertFalse(topic_result['APIError'])
+            self.assertEqual({'x3000c0s1b0': ['20'], 'x3000c0s3b0': ['30']},
+                             self.get_values(topic_result))
+
+        self.assertEqual(sorted(self.topics), sorted(request.topic for request in self.server.requests))
+        for request in self.server.requests:
+            self.assertEqual({'count': ['0'], 'batchsize': ['8']}, request.params)
+            self.assertEqual('Bearer token', request.headers['Authorization'])
+
+    def test_timeout_stops_all_streams(self):
+        """Test that streams which are still waiting for data are stopped at the timeout."""
+        self.server.add_response(self.topics[0], [make_event_data('x3000c0s1b0', '20')],
+                                 keep_open=True)
+        self.server.add_response(self.topics[1], keep_open=True)
+
+        start = time.monotonic()
+        results = self.run_multiplexer(total_timeout=0.5)
+        self.assertLess(time.monotonic() - start, 2)
+
+        for topic_result in results:
+            self.assertFalse(topic_result['Done'])
+            self.assertFalse(topic_result['APIError'])
+        self.assertEqual({'x3000c0s1b0': ['20'], 'x3000c0s3b0': []}, self.get_values(results[0]))
+
+    def test_timeout_stops_busy_stream_ignoring_cancellation(self):
+        """Test that a busy stream stops at the timeout even if its cancellation is lost.
+
+        Before Python 3.12, asyncio.wait_for can swallow a cancellation when
+        the read it is waiting for completes at the same time, which happens
+        constantly on a stream which always has data buffered.
+        """
+        async def busy_stream(client):
+            deadline = time.monotonic() + 5
+            while not client.stopped and time.monotonic() < deadline:
+                try:
+                    await asyncio.sleep(0.001)
+                except asyncio.CancelledError:
+                    # Emulate the cancellation being swallowed
+                    continue
+
+        self.topics = self.topics[:1]
+        multiplexer = TelemetryMultiplexer(self.topics, self.xnames_info, 8, True,
+                                           api_client=self.api_client)
+        client = multiplexer.telemetry_clients[0]
+
+        with mock.patch.object(TelemetryClient, 'consume_stream', busy_stream):
+            start = time.monotonic()
+            multiplexer.run(0.2)
+
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(client.stopped)
+
+    def test_update_until_timeout(self):
+        """Test that sensor data continues to be updated until the timeout."""
+        self.topics = self.topics[:1]
+        self.server.add_response(self.topics[0], [make_event_data('x3000c0s1b0', '20'),
+                                                  make_event_data('x3000c0s3b0', '30'),
+                                                  make_event_data('x3000c0s1b0', '21')],
+                                 keep_open=True)
+
+        results = self.run_multiplexer(total_timeout=0.5, update_until_timeout=True)
+
+        self.assertFalse(results[0]['Done'])
+        self.assertEqual({'x3000c0s1b0': ['21'], 'x3000c0s3b0': ['30']}, self.get_values(results[0]))
+
+    def test_message_counts(self):
+        """Test that the numbers of messages and metrics received are counted."""
+        self.topics = self.topics[:1]
+        self.server.add_response(self.topics[0], [make_event_data('x3000c0s1b0', '20'),
+                                                  make_event_data('x3000c0s3b0', '30')],
+                                 keep_open=True)
+        multiplexer = TelemetryMultiplexer(self.topics, self.xnames_info, 8, False,
+                                           api_client=self.api_client)
+
+        multiplexer.run(10)
+
+        self.assertEqual(2, multiplexer.telemetry_clients[0].total_messages)
+        self.assertEqual(2, multiplexer.telemetry_clients[0].total_metrics)
+
+    def test_reconnect_after_stream_ends(self):
+        """Test that a stream which ends before all data is received is reopened."""
+        self.topics = self.topics[:1]
+        self.server.add_response(self.topics[0], [make_event_data('x3000c0s1b0', '20')])
+        self.server.add_response(self.topics[0], [make_event_data('x3000c0s3b0', '30')],
+                                 keep_open=True)
+
+        results = self.run_multiplexer()
+
+        self.assertTrue(results[0]['Done'])
+        self.assertEqual({'x3000c0s1b0': ['20'], 'x3000c0s3b0': ['30']}, self.get_values(results[0]))
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_retries_exhausted(self):
+        """Test that an API error is recorded when a stream keeps ending without data."""
+        self.topics = self.topics[:1]
+        for _ in range(TelemetryClient.RECONNECT_RETRIES + 1):
+            self.server.add_response(self.topics[0])
+
+        with self.assertLogs(level='ERROR') as logs:
+            results = self.run_multiplexer()
+
+        self.assertTrue(results[0]['APIError'])
+        self.assertEqual(TelemetryClient.RECONNECT_RETRIES + 1, len(self.server.requests))
+        self.assertIn('Exceeded number of retries', logs.output[-1])
+
+    def test_error_status_not_retried(self):
+        """Test that an error response from the API stops only the stream of that topic."""
+        self.server.add_response(self.topics[0], status=503)
+        self.server.add_response(self.topics[1], [make_event_data('x3000c0s1b0', '20'),
+                                                  make_event_data('x3000c0s3b0', '30')],
+                                 keep_open=True)
+
+        with self.assertLogs(level='ERROR'):
+            results = self.run_multiplexer()
+
+        self.assertTrue(results[0]['APIError'])
+        self.assertFalse(results[0]['Done'])
+        self.assertTrue(results[1]['Done'])
+        self.assertEqual(1, len([request for request in self.server.requests
+                                 if request.topic == self.topics[0]]))
 
 
 if __name__ == '__main__':
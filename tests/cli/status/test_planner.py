@@ -0,0 +1,164 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests for the sat.cli.status.planner module.
+"""
+from abc import ABC
+import unittest
+
+from sat.cli.status.planner import StatusQueryPlan
+from sat.cli.status.status_module import StatusModule
+
+NODE_HEADINGS = ['xname', 'Aliases', 'Type', 'NID', 'State', 'Flag', 'Enabled', 'Arch',
+                 'Class', 'Role', 'SubRole', 'Net Type', 'Desired Config']
+BMC_HEADINGS = ['xname', 'Type', 'State', 'Flag', 'Enabled', 'Arch', 'Class', 'Net Type']
+
+
+class TestHSMParams(unittest.TestCase):
+    """Tests for pushing filters down to HSM query parameters"""
+
+    def get_params(self, *filter_strs, headings_by_type=None):
+        if headings_by_type is None:
+            headings_by_type = {'Node': NODE_HEADINGS}
+        return StatusQueryPlan(headings_by_type, filter_strs=list(filter_strs)).get_hsm_params()
+
+    def test_no_filters(self):
+        """Test that no parameters are pushed down without filters"""
+        self.assertEqual({}, self.get_params())
+
+    def test_single_equality(self):
+        """Test pushing down a single equality comparison"""
+        self.assertEqual({'state': 'Off'}, self.get_params('state=Off'))
+
+    def test_conjunction(self):
+        """Test pushing down comparisons joined with 'and'"""
+        self.assertEqual({'state': 'Off', 'role': 'Compute'},
+                         self.get_params('state=Off and role=Compute'))
+
+    def test_multiple_filter_strings(self):
+        """Test that separate filter strings are combined like a conjunction"""
+        self.assertEqual({'state': 'Off', 'role': 'Compute'},
+                         self.get_params('state=Off', 'role=Compute'))
+
+    def test_disjunction_not_pushed_down(self):
+        """Test that comparisons joined with 'or' are not pushed down"""
+        self.assertEqual({}, self.get_params('state=Off or role=Compute'))
+
+    def test_wildcards_not_pushed_down(self):
+        """Test that wildcard patterns are not pushed down"""
+        self.assertEqual({'role': 'Compute'}, self.get_params('state=Of* and role=Compute'))
+
+    def test_inequality_not_pushed_down(self):
+        """Test that comparisons other than equality are not pushed down"""
+        self.assertEqual({'role': 'Compute'}, self.get_params('state!=Ready and role=Compute'))
+
+    def test_conflicting_values_not_pushed_down(self):
+        """Test that a parameter compared to different values is not pushed down"""
+        self.assertEqual({}, self.get_params('state=Off and state=Ready'))
+
+    def test_non_hsm_fields_not_pushed_down(self):
+        """Test that fields which do not come from HSM are not pushed down"""
+        self.assertEqual({}, self.get_params('desired=config'))
+
+    def test_nid_pushed_down(self):
+        """Test that integer NIDs are pushed down"""
+        self.assertEqual({'nid': '42'}, self.get_params('nid=42'))
+
+    def test_enabled_pushed_down(self):
+        """Test that boolean values are pushed down for the Enabled field"""
+        self.assertEqual({'enabled': 'false'}, self.get_params('enabled=False'))
+
+    def test_compute_subrole_none_not_pushed_down(self):
+        """Test that the 'None' SubRole filled in for compute nodes is not pushed down"""
+        self.assertEqual({}, self.get_params('subrole=None'))
+
+    def test_invalid_filter(self):
+        """Test that nothing is pushed down for an invalid filter"""
+        self.assertEqual({}, self.get_params('state=='))
+
+    def test_params_common_to_all_types(self):
+        """Test that only parameters implied for every component type are pushed down"""
+        params = self.get_params('state=Off and role=Compute',
+                                 headings_by_type={'Node': NODE_HEADINGS, 'NodeBMC': BMC_HEADINGS})
+        self.assertEqual({'state': 'Off'}, params)
+
+
+class TestRequiredModules(unittest.TestCase):
+    """Tests for determining which status modules need to be queried"""
+
+    def setUp(self):
+        class PrimaryModule(StatusModule, ABC):
+            primary = True
+            headings = ['xname', 'Type', 'State', 'Role']
+            source_name = 'primary'
+
+        class AliasModule(StatusModule, ABC):
+            headings = ['xname', 'Aliases']
+            source_name = 'alias'
+
+        class ConfigModule(StatusModule, ABC):
+            headings = ['xname', 'Desired Config']
+            source_name = 'config'
+
+        StatusModule._modules.remove(PrimaryModule)
+        StatusModule._modules.remove(AliasModule)
+        StatusModule._modules.remove(ConfigModule)
+        self.modules = [PrimaryModule, AliasModule, ConfigModule]
+        self.headings_by_type = {'Node': ['xname', 'Aliases', 'Type', 'State', 'Role', 'Desired Config']}
+
+    def get_module_names(self, **kwargs):
+        plan = StatusQueryPlan(self.headings_by_type, **kwargs)
+        return [module.source_name for module in plan.get_required_modules(self.modules, 'xname')]
+
+    def test_all_fields_displayed(self):
+        """Test that all modules are required when all fields are displayed"""
+        self.assertEqual(['primary', 'alias', 'config'], self.get_module_names())
+
+    def test_only_primary_fields_displayed(self):
+        """Test that only the primary module is required when only its fields are displayed"""
+        self.assertEqual(['primary'], self.get_module_names(display_headings=['xname', 'state']))
+
+    def test_displayed_field_requires_module(self):
+        """Test that a module supplying a displayed field is required"""
+        self.assertEqual(['primary', 'alias'], self.get_module_names(display_headings=['aliases']))
+
+    def test_filtered_field_requires_module(self):
+        """Test that a module supplying a field used in a filter is required"""
+        self.assertEqual(['primary', 'config'],
+                         self.get_module_names(display_headings=['state'],
+                                               filter_strs=['desired=config']))
+
+    def test_sort_field_requires_module(self):
+        """Test that a module supplying the field to sort by is required"""
+        self.assertEqual(['primary', 'alias'],
+                         self.get_module_names(display_headings=['state'], sort_by='aliases'))
+
+    def test_invalid_filter_requires_all_modules(self):
+        """Test that all modules are required if the filter cannot be parsed"""
+        self.assertEqual(['primary', 'alias', 'config'],
+                         self.get_module_names(display_headings=['state'], filter_strs=['state==']))
+
+
+if __name__ == '__main__':
+    unittest.main()
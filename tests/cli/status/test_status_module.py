@@ -25,7 +25,9 @@
 Tests for the sat.cli.status.status_module module.
 """
 from abc import ABC
+from copy import deepcopy
 import inspect
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -33,6 +35,7 @@ from sat.apiclient.gateway import APIError
 import sat.cli.status.status_module as status_module_module
 from sat.cli.status.status_module import (
     BOSStatusModule,
+    HSMStatusModule,
     StatusModule,
     StatusModuleException,
 )
@@ -268,6 +271,109 @@ class TestGettingRows(BaseStatusModuleTestCase):
         if not row_had_missing_config:
             self.fail('Rows with missing "state" field were omitted')
 
+    def test_secondary_modules_run_concurrently(self):
+        """Test that the non-primary modules are queried concurrently"""
+        barrier = threading.Barrier(2, timeout=5)
+        outer_self = self
+
+        class TestStatusModuleThree(StatusModule):
+            headings = ['xname', 'other']
+            source_name = 'three'
+
+            @property
+            def rows(self):
+                barrier.wait()
+                return [{'xname': row['xname'], 'other': 'value'} for row in outer_self.all_rows]
+
+        original_rows = self.TestStatusModuleTwo.rows
+
+        def rows_after_barrier(module_self):
+            barrier.wait()
+            return original_rows.fget(module_self)
+
+        with patch.object(self.TestStatusModuleTwo, 'rows', property(rows_after_barrier)):
+            rows = StatusModule.get_populated_rows(primary_key='xname', session=MagicMock())
+
+        for row in rows:
+            self.assertEqual(row['other'], 'value')
+            self.assertNotEqual(row['config'], MISSING_VALUE)
+
+    def test_slow_module_times_out(self):
+        """Test that a module which does not finish in time has MISSING values"""
+        release = threading.Event()
+        module_threads = []
+
+        class TestStatusModuleSlow(StatusModule):
+            headings = ['xname', 'slow']
+            source_name = 'slow'
+
+            @property
+            def rows(self):
+                module_threads.append(threading.current_thread())
+                release.wait(5)
+                return []
+
+        try:
+            with self.assertLogs(level='WARNING') as logs:
+                rows = StatusModule.get_populated_rows(primary_key='xname', session=MagicMock(),
+                                                       module_timeout=0.1)
+        finally:
+            release.set()
+
+        self.assertIn('Timed out', logs.output[0])
+        # The abandoned module must not prevent the interpreter from exiting
+        self.assertTrue(module_threads[0].daemon)
+        for row in rows:
+            self.assertEqual(row['slow'], MISSING_VALUE)
+            self.assertNotEqual(row['config'], MISSING_VALUE)
+
+    def test_module_timings(self):
+        """Test that the time taken by each module is recorded"""
+        timings = {}
+        StatusModule.get_populated_rows(primary_key='xname', session=MagicMock(),
+                                        module_timings=timings)
+        self.assertEqual({'one', 'two'}, set(timings))
+        for elapsed in timings.values():
+            self.assertGreaterEqual(elapsed, 0)
+
+
+class TestHSMStatusModule(BaseStatusModuleTestCase):
+    """Tests for the HSMStatusModule class"""
+
+    def setUp(self):
+        super().setUp()
+        self.components = [
+            {'ID': 'x1000c0s0b0n0', 'Type': 'Node', 'State': 'Off', 'Role': 'Compute', 'SubRole': 'None'},
+        ]
+        self.mock_hsm_client = patch('sat.cli.status.status_module.HSMClient').start().return_value
+        self.mock_hsm_client.get.return_value.json.return_value = {'Components': self.components}
+        self.session = MagicMock()
+
+    def test_query_with_hsm_params(self):
+        """Test that additional HSM parameters are passed in the query"""
+        rows = HSMStatusModule(session=self.session, component_types=['Node'],
+                               hsm_params={'state': 'Off'}).rows
+        self.mock_hsm_client.get.assert_called_once_with(
+            'State', 'Components', params={'type': ['Node'], 'state': 'Off'}
+        )
+        self.assertEqual(self.components, rows)
+
+    def test_query_with_rejected_hsm_params(self):
+        """Test that the query is retried without HSM parameters if HSM rejects them"""
+        self.mock_hsm_client.get.side_effect = [APIError('bad state'),
+                                                self.mock_hsm_client.get.return_value]
+        rows = HSMStatusModule(session=self.session, component_types=['Node'],
+                               hsm_params={'state': 'Sleepy'}).rows
+        self.assertEqual(2, self.mock_hsm_client.get.call_count)
+        self.mock_hsm_client.get.assert_called_with('State', 'Components', params={'type': ['Node']})
+        self.assertEqual(self.components, rows)
+
+    def test_query_fails(self):
+        """Test that a failing query raises StatusModuleException"""
+        self.mock_hsm_client.get.side_effect = APIError('HSM is down')
+        with self.assertRaises(StatusModuleException):
+            _ = HSMStatusModule(session=self.session, component_types=['Node']).rows
+
 
 class TestBOSStatusModule(BaseStatusModuleTestCase):
     """Tests for the BOSStatusModule class"""
@@ -452,3 +558,53 @@ class TestBOSStatusModule(BaseStatusModuleTestCase):
             'Most Recent BOS Session': self.bos_session,
             'Most Recent Image': self.img_name,
         })
+
+    def test_resources_resolved_from_listings(self):
+        """Test that images, sessions and templates are resolved from bulk listings"""
+        self.mock_ims_client.get_matching_resources.return_value = [self.mock_ims_client.get_image.return_value]
+        self.mock_bos_client.get_sessions.return_value = [self.mock_bos_client.get_session.return_value]
+        self.mock_bos_client.get_session_templates.return_value = [
+            self.mock_bos_client.get_session_template.return_value
+        ]
+        rows = BOSStatusModule(session=self.session).rows
+
+        self.assertEqual(rows[0]['Most Recent Image'], self.img_name)
+        self.assertEqual(rows[0]['Most Recent Session Template'], self.bos_sessiontemplate)
+        self.mock_ims_client.get_image.assert_not_called()
+        self.mock_bos_client.get_session.assert_not_called()
+        self.mock_bos_client.get_session_template.assert_not_called()
+
+    def test_resources_resolved_once_for_many_components(self):
+        """Test that each distinct resource is only retrieved once for many components"""
+        components = []
+        for node in range(100):
+            component = deepcopy(self.bos_component)
+            component['id'] = f'x1000c0s{node}b0n0'
+            components.append(component)
+        self.mock_bos_client.get_components.return_value = components
+
+        rows = BOSStatusModule(session=self.session).rows
+
+        self.assertEqual(100, len(rows))
+        for row in rows:
+            self.assertEqual(row['Most Recent Image'], self.img_name)
+            self.assertEqual(row['Most Recent Session Template'], self.bos_sessiontemplate)
+        self.mock_ims_client.get_image.assert_called_once_with(self.img_id)
+        self.mock_bos_client.get_session.assert_called_once_with(self.bos_session)
+        self.mock_bos_client.get_session_template.assert_called_once_with(self.bos_sessiontemplate)
+
+    def test_resources_missing_from_listing_retrieved_individually(self):
+        """Test that resources missing from a listing are retrieved individually"""
+        self.mock_bos_client.get_sessions.return_value = [{'name': 'some-other-session'}]
+        rows = BOSStatusModule(session=self.session).rows
+
+        self.assertEqual(rows[0]['Most Recent Session Template'], self.bos_sessiontemplate)
+        self.mock_bos_client.get_session.assert_called_once_with(self.bos_session)
+
+    def test_image_listing_fails(self):
+        """Test that images are retrieved individually if they cannot be listed"""
+        self.mock_ims_client.get_matching_resources.side_effect = APIError('IMS failed')
+        rows = BOSStatusModule(session=self.session).rows
+
+        self.assertEqual(rows[0]['Most Recent Image'], self.img_name)
+        self.mock_ims_client.get_image.assert_called_once_with(self.img_id)
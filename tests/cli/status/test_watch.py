@@ -0,0 +1,142 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests for the sat.cli.status.watch module.
+"""
+import json
+import unittest
+from unittest.mock import patch
+
+from sat.cli.status.watch import (
+    diff_rows,
+    get_rows_by_key,
+    watch_status,
+)
+from sat.report import Report
+from sat.xname import XName
+
+
+def make_report(states, title=None, display_headings=None):
+    """Make a report of node states, keyed by xname."""
+    report = Report(['xname', 'State', 'Flag'], title, no_headings=False, no_borders=False,
+                    show_empty=False, show_missing=False, filter_strs=['state!=Ready'],
+                    display_headings=display_headings)
+    report.add_rows([{'xname': XName(xname), 'State': state, 'Flag': 'OK'}
+                     for xname, state in states.items()])
+    return report
+
+
+class TestDiffRows(unittest.TestCase):
+    """Tests for computing changes between rows"""
+
+    def get_events(self, previous_states, current_states):
+        previous = get_rows_by_key([make_report(previous_states)], 'xname')
+        current = get_rows_by_key([make_report(current_states)], 'xname')
+        return diff_rows(previous, current)
+
+    def test_no_changes(self):
+        """Test that there are no events if nothing changed"""
+        self.assertEqual([], self.get_events({'x1000c0s0b0n0': 'Off'}, {'x1000c0s0b0n0': 'Off'}))
+
+    def test_row_changed(self):
+        """Test that a changed row produces a 'changed' event"""
+        events = self.get_events({'x1000c0s0b0n0': 'Off'}, {'x1000c0s0b0n0': 'On'})
+        self.assertEqual(1, len(events))
+        self.assertEqual('changed', events[0]['event'])
+        self.assertEqual({'State': {'old': 'Off', 'new': 'On'}}, events[0]['changes'])
+
+    def test_row_added(self):
+        """Test that a new row produces an 'added' event"""
+        events = self.get_events({}, {'x1000c0s0b0n0': 'Off'})
+        self.assertEqual(['added'], [event['event'] for event in events])
+
+    def test_row_no_longer_matches_filter(self):
+        """Test that a row which stops matching the filter produces a 'removed' event"""
+        events = self.get_events({'x1000c0s0b0n0': 'On'}, {'x1000c0s0b0n0': 'Ready'})
+        self.assertEqual(['removed'], [event['event'] for event in events])
+        self.assertEqual('On', events[0]['row']['State'])
+
+    def test_primary_key_not_displayed(self):
+        """Test that rows are identified by the primary key when it is not a displayed field"""
+        previous = get_rows_by_key([make_report({'x1000c0s0b0n0': 'Off', 'x1000c0s0b0n1': 'Off'},
+                                                display_headings=['state', 'flag'])], 'xname')
+        current = get_rows_by_key([make_report({'x1000c0s0b0n0': 'On', 'x1000c0s0b0n1': 'Off'},
+                                               display_headings=['state', 'flag'])], 'xname')
+
+        self.assertEqual({'x1000c0s0b0n0', 'x1000c0s0b0n1'}, set(previous))
+        events = diff_rows(previous, current)
+        self.assertEqual(1, len(events))
+        self.assertEqual('changed', events[0]['event'])
+        self.assertEqual('x1000c0s0b0n0', events[0]['key'])
+        self.assertEqual({'State': {'old': 'Off', 'new': 'On'}}, events[0]['changes'])
+
+
+class TestWatchStatus(unittest.TestCase):
+    """Tests for watching status"""
+
+    def setUp(self):
+        self.mock_sleep = patch('sat.cli.status.watch.time.sleep').start()
+        self.mock_print = patch('builtins.print').start()
+        self.states = [
+            {'x1000c0s0b0n0': 'Off', 'x1000c0s0b0n1': 'Off'},
+            {'x1000c0s0b0n0': 'On', 'x1000c0s0b0n1': 'Off'},
+            {'x1000c0s0b0n0': 'On', 'x1000c0s0b0n1': 'Off'},
+        ]
+        self.get_reports = lambda: [make_report(self.states.pop(0))]
+
+    def tearDown(self):
+        patch.stopall()
+
+    def get_printed(self):
+        return [call_args.args[0] for call_args in self.mock_print.call_args_list]
+
+    def test_watch_pretty(self):
+        """Test that the full report and then only changed rows are printed"""
+        watch_status(self.get_reports, interval=5, primary_key='xname', max_iterations=3)
+
+        printed = self.get_printed()
+        self.assertEqual(2, len(printed))
+        self.assertIn('x1000c0s0b0n1', printed[0])
+        self.assertIn('x1000c0s0b0n0', printed[1])
+        self.assertNotIn('x1000c0s0b0n1', printed[1])
+        self.assertIn('changed', printed[1])
+        self.assertEqual(2, self.mock_sleep.call_count)
+
+    def test_watch_ndjson(self):
+        """Test that change events are printed as newline-delimited JSON"""
+        watch_status(self.get_reports, interval=5, primary_key='xname',
+                     print_format='ndjson', max_iterations=3)
+
+        printed = self.get_printed()
+        self.assertEqual(2, len(printed))
+        initial_events = [json.loads(line) for line in printed[0].splitlines()]
+        self.assertEqual(['added', 'added'], [event['event'] for event in initial_events])
+        changed_event = json.loads(printed[1])
+        self.assertEqual('changed', changed_event['event'])
+        self.assertEqual({'xname': 'x1000c0s0b0n0', 'State': 'On', 'Flag': 'OK'}, changed_event['row'])
+        self.assertEqual({'State': {'old': 'Off', 'new': 'On'}}, changed_event['changes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
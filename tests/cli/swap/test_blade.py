@@ -514,6 +514,36 @@ class TestWaitingForChassisBMCEndpoints(BaseBladeSwapProcedureTest):
             self.swap_in.wait_for_chassisbmc_endpoints()
 
 
+class TestRedfishEndpointDiscoveryWaiter(unittest.TestCase):
+    """Tests for the RedfishEndpointDiscoveryWaiter class"""
+    def setUp(self):
+        self.bmcs = ['x1000c0s0b0', 'x1000c0s0b1', 'x1000c0s1b0']
+        self.hsm_client = MagicMock(autospec=HSMClient)
+        self.hsm_client.query_components.return_value = [{'ID': bmc} for bmc in self.bmcs]
+        self.hsm_client.get_redfish_endpoints.return_value = [
+            {'ID': 'x1000c0s0b0', 'DiscoveryInfo': {'LastDiscoveryStatus': 'DiscoverOK'}},
+            {'ID': 'x1000c0s0b1', 'DiscoveryInfo': {'LastDiscoveryStatus': 'DiscoveryStarted'}},
+        ]
+        self.waiter = RedfishEndpointDiscoveryWaiter(['x1000c0s0'], self.hsm_client, 10)
+
+    def test_members_have_completed(self):
+        """Test checking the discovery status of all endpoints with one request"""
+        self.assertEqual(({'x1000c0s0b0'}, set()),
+                         self.waiter.members_have_completed(set(self.bmcs)))
+        self.hsm_client.get_redfish_endpoints.assert_called_once_with(set(self.bmcs))
+        self.hsm_client.get_redfish_endpoint_inventory.assert_not_called()
+
+    def test_members_have_completed_api_error(self):
+        """Test checking each endpoint separately when they cannot be queried at once"""
+        self.hsm_client.get_redfish_endpoints.side_effect = APIError('HSM failure')
+        self.hsm_client.get_redfish_endpoint_inventory.return_value = {
+            'DiscoveryInfo': {'LastDiscoveryStatus': 'DiscoverOK'}
+        }
+        self.assertEqual((set(self.bmcs), set()),
+                         self.waiter.members_have_completed(set(self.bmcs)))
+        self.assertEqual(len(self.bmcs), self.hsm_client.get_redfish_endpoint_inventory.call_count)
+
+
 class TestWaitingForNodeBMCEndpoints(BaseBladeSwapProcedureTest):
     def setUp(self):
         super().setUp()
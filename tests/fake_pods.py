@@ -0,0 +1,91 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Fake Kubernetes API responses for unit tests which use sat.pod_cache.
+"""
+import json
+from unittest.mock import Mock
+
+
+def get_fake_pod(namespace, name, phase, node=None, template_hash=None, resource_version='1'):
+    """Get a pod as returned as JSON by the Kubernetes API.
+
+    Returns:
+        dict: the pod
+    """
+    pod = {
+        'metadata': {
+            'namespace': namespace,
+            'name': name,
+            'resourceVersion': resource_version,
+        },
+        'spec': {},
+        'status': {'phase': phase},
+    }
+    if node is not None:
+        pod['spec']['nodeName'] = node
+    if template_hash is not None:
+        pod['metadata']['labels'] = {'pod-template-hash': template_hash}
+    return pod
+
+
+def get_fake_pod_list_response(pods, resource_version='1', continue_token=None):
+    """Get a mock of the response to a request to list pods without preloading content.
+
+    Args:
+        pods (list): a list of dicts from get_fake_pod, or tuples of the
+            arguments to get_fake_pod
+        resource_version (str): the resource version of the list
+        continue_token (str): the token used to get the next page of pods
+
+    Returns:
+        Mock: the mock response, whose data is the JSON pod list
+    """
+    metadata = {'resourceVersion': resource_version}
+    if continue_token:
+        metadata['continue'] = continue_token
+    response = Mock()
+    response.data = json.dumps({
+        'kind': 'PodList',
+        'metadata': metadata,
+        'items': [pod if isinstance(pod, dict) else get_fake_pod(*pod) for pod in pods],
+    }).encode()
+    return response
+
+
+def get_fake_watch_response(events):
+    """Get a mock of the streamed response to a request to watch pods.
+
+    Args:
+        events (list): a list of (event type, object) tuples
+
+    Returns:
+        Mock: the mock response
+    """
+    response = Mock()
+    response.stream.return_value = [
+        (json.dumps({'type': event_type, 'object': obj}) + '\n').encode()
+        for event_type, obj in events
+    ]
+    return response
@@ -45,7 +45,11 @@ from sat.config import (
     load_config,
     read_config_value_file,
     validate_bos_api_version,
-    validate_log_level
+    validate_cabinet_batch_size,
+    validate_log_level,
+    validate_max_concurrent_cabinet_batches,
+    validate_poll_jitter,
+    validate_polling_strategy,
 )
 from tests.common import ExtendedTestCase
 
@@ -86,6 +90,53 @@ class TestValidateBosApiVersion(unittest.TestCase):
                     validate_bos_api_version(version)
 
 
+class TestValidatePollingOptions(unittest.TestCase):
+    """Tests for the validate_polling_strategy and validate_poll_jitter functions"""
+
+    def test_validate_valid_polling_strategies(self):
+        """Test that the known polling strategies are valid"""
+        for strategy in ['fixed', 'backoff', 'expected']:
+            with self.subTest(strategy=strategy):
+                validate_polling_strategy(strategy)
+
+    def test_validate_invalid_polling_strategy(self):
+        """Test that unknown polling strategies are not allowed"""
+        with self.assertRaisesRegex(ConfigValidationError, 'not one of the valid polling strategies'):
+            validate_polling_strategy('adaptive')
+
+    def test_validate_poll_jitter(self):
+        """Test that jitter must be at least 0 and less than 1"""
+        for jitter in [0.0, 0.5, 0.99]:
+            with self.subTest(jitter=jitter):
+                validate_poll_jitter(jitter)
+        for jitter in [-0.1, 1.0, 2.0]:
+            with self.subTest(jitter=jitter):
+                with self.assertRaises(ConfigValidationError):
+                    validate_poll_jitter(jitter)
+
+
+class TestValidateCabinetBatchOptions(unittest.TestCase):
+    """Tests for the validate_cabinet_batch_size and validate_max_concurrent_cabinet_batches functions"""
+
+    def test_validate_cabinet_batch_size(self):
+        """Test that the cabinet batch size must be at least 0"""
+        for batch_size in [0, 1, 16]:
+            with self.subTest(batch_size=batch_size):
+                validate_cabinet_batch_size(batch_size)
+        with self.assertRaisesRegex(ConfigValidationError, 'must be at least 0'):
+            validate_cabinet_batch_size(-1)
+
+    def test_validate_max_concurrent_cabinet_batches(self):
+        """Test that the maximum number of concurrent cabinet batches must be at least 1"""
+        for max_batches in [1, 2, 8]:
+            with self.subTest(max_batches=max_batches):
+                validate_max_concurrent_cabinet_batches(max_batches)
+        for max_batches in [0, -1]:
+            with self.subTest(max_batches=max_batches):
+                with self.assertRaisesRegex(ConfigValidationError, 'must be at least 1'):
+                    validate_max_concurrent_cabinet_batches(max_batches)
+
+
 class TestOptionValue(unittest.TestCase):
     """Test we get the right values from _option_value."""
     def setUp(self):
@@ -0,0 +1,260 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Unit tests for the sat.pod_cache module.
+"""
+import threading
+import unittest
+from unittest import mock
+
+from kubernetes.client.rest import ApiException
+
+from sat.pod_cache import CachedPod, PodCache, get_cached_pod
+from tests.fake_pods import get_fake_pod, get_fake_pod_list_response, get_fake_watch_response
+
+
+class TestGetCachedPod(unittest.TestCase):
+    """Tests for the get_cached_pod function."""
+
+    def test_get_cached_pod(self):
+        """Test getting the cached fields of a pod."""
+        pod = get_fake_pod('services', 'cfs-abc', 'Running', node='ncn-w001', template_hash='abc')
+        self.assertEqual(CachedPod('services', 'cfs-abc', 'Running', 'ncn-w001', 'abc'),
+                         get_cached_pod(pod))
+
+    def test_get_cached_pod_missing_fields(self):
+        """Test getting the cached fields of a pod without a status, node or labels."""
+        pod = {'metadata': {'namespace': 'services', 'name': 'cfs-abc'}}
+        self.assertEqual(CachedPod('services', 'cfs-abc', None, None, None), get_cached_pod(pod))
+
+
+class TestPodCache(unittest.TestCase):
+    """Tests for the PodCache class."""
+
+    def setUp(self):
+        self.k8s_api = mock.Mock()
+        self.list_responses = [get_fake_pod_list_response([
+            ('services', 'cfs-abc', 'Running', 'ncn-w001', 'abc'),
+            ('services', 'cfs-def', 'Pending', 'ncn-w002', 'abc'),
+            ('user', 'uai', 'Running', 'ncn-w001'),
+        ], resource_version='100')]
+        self.watch_responses = []
+
+        def list_pod_for_all_namespaces(watch=False, **kwargs):
+            if watch:
+                return self.watch_responses.pop(0)
+            return self.list_responses.pop(0)
+
+        self.k8s_api.list_pod_for_all_namespaces.side_effect = list_pod_for_all_namespaces
+        self.pod_cache = PodCache(self.k8s_api)
+        self.changes = []
+        self.pod_cache.add_listener(lambda key, pod: self.changes.append((key, pod)))
+
+    def test_list(self):
+        """Test listing all pods."""
+        self.pod_cache.list()
+        self.assertEqual('100', self.pod_cache.resource_version)
+        self.assertEqual({('services', 'cfs-abc'), ('services', 'cfs-def'), ('user', 'uai')},
+                         set(self.pod_cache.pods))
+        self.assertEqual('Pending', self.pod_cache.get_phase('services', 'cfs-def'))
+        self.assertIsNone(self.pod_cache.get_phase('services', 'missing'))
+        self.assertEqual(3, len(self.changes))
+        self.k8s_api.list_pod_for_all_namespaces.assert_called_once_with(
+            limit=PodCache.LIST_PAGE_SIZE, _preload_content=False
+        )
+
+    def test_list_pages(self):
+        """Test listing all pods in multiple pages."""
+        self.list_responses = [
+            get_fake_pod_list_response([('services', 'cfs-abc', 'Running')], '99', 'token'),
+            get_fake_pod_list_response([('user', 'uai', 'Running')], '100'),
+        ]
+        self.pod_cache.list()
+        self.assertEqual({('services', 'cfs-abc'), ('user', 'uai')}, set(self.pod_cache.pods))
+        self.assertEqual('100', self.pod_cache.resource_version)
+        self.k8s_api.list_pod_for_all_namespaces.assert_called_with(
+            limit=PodCache.LIST_PAGE_SIZE, _continue='token', _preload_content=False
+        )
+
+    def test_list_again(self):
+        """Test that listing again notifies listeners of only changed and deleted pods."""
+        self.pod_cache.list()
+        self.changes.clear()
+        self.list_responses.append(get_fake_pod_list_response([
+            ('services', 'cfs-abc', 'Running', 'ncn-w001', 'abc'),
+            ('services', 'cfs-def', 'Running', 'ncn-w002', 'abc'),
+        ], resource_version='200'))
+
+        self.pod_cache.list()
+
+        self.assertEqual([
+            (('user', 'uai'), None),
+            (('services', 'cfs-def'), CachedPod('services', 'cfs-def', 'Running', 'ncn-w002', 'abc')),
+        ], self.changes)
+
+    def test_handle_event(self):
+        """Test updating the cache from watch events."""
+        self.pod_cache.list()
+        self.changes.clear()
+
+        self.pod_cache.handle_event({'type': 'ADDED',
+                                     'object': get_fake_pod('user', 'uai2', 'Pending', resource_version='101')})
+        self.pod_cache.handle_event({'type': 'MODIFIED',
+                                     'object': get_fake_pod('user', 'uai2', 'Running', resource_version='102')})
+        self.pod_cache.handle_event({'type': 'DELETED',
+                                     'object': get_fake_pod('user', 'uai', 'Running', resource_version='103')})
+        self.pod_cache.handle_event({'type': 'BOOKMARK',
+                                     'object': {'metadata': {'resourceVersion': '104'}}})
+
+        self.assertEqual('104', self.pod_cache.resource_version)
+        self.assertEqual('Running', self.pod_cache.get_phase('user', 'uai2'))
+        self.assertNotIn(('user', 'uai'), self.pod_cache.pods)
+        self.assertEqual([('user', 'uai2'), ('user', 'uai2'), ('user', 'uai')],
+                         [key for key, _ in self.changes])
+
+    def test_handle_event_unchanged(self):
+        """Test that listeners are not notified when the cached fields of a pod do not change."""
+        self.pod_cache.list()
+        self.changes.clear()
+        self.pod_cache.handle_event({
+            'type': 'MODIFIED',
+            'object': get_fake_pod('user', 'uai', 'Running', 'ncn-w001', resource_version='101')
+        })
+        self.assertEqual([], self.changes)
+        self.assertEqual('101', self.pod_cache.resource_version)
+
+    def test_handle_event_expired(self):
+        """Test that an expired resource version requires the pods to be listed again."""
+        self.pod_cache.list()
+        self.pod_cache.handle_event({'type': 'ERROR', 'object': {'code': 410}})
+        self.assertIsNone(self.pod_cache.resource_version)
+
+    def test_handle_event_error(self):
+        """Test that other errors are logged and require the pods to be listed again."""
+        self.pod_cache.list()
+        with self.assertLogs(level='WARNING') as cm:
+            self.pod_cache.handle_event({'type': 'ERROR', 'object': {'code': 500, 'message': 'oops'}})
+        self.assertIn('Error received while watching pods: oops', cm.output[0])
+        self.assertIsNone(self.pod_cache.resource_version)
+
+    def test_watch(self):
+        """Test watching pods from the resource version of the list."""
+        self.pod_cache.list()
+        self.watch_responses.append(get_fake_watch_response([
+            ('MODIFIED', get_fake_pod('services', 'cfs-def', 'Running', 'ncn-w002', 'abc', '101')),
+            ('ERROR', {'code': 410}),
+            ('ADDED', get_fake_pod('user', 'uai2', 'Running', resource_version='102')),
+        ]))
+
+        self.pod_cache.watch()
+
+        self.k8s_api.list_pod_for_all_namespaces.assert_called_with(
+            watch=True, resource_version='100', allow_watch_bookmarks=True,
+            timeout_seconds=PodCache.WATCH_TIMEOUT_SECS, _preload_content=False,
+            _request_timeout=PodCache.WATCH_REQUEST_TIMEOUT_SECS
+        )
+        self.assertEqual('Running', self.pod_cache.get_phase('services', 'cfs-def'))
+        # The watch stops at the error, so later events are not processed
+        self.assertNotIn(('user', 'uai2'), self.pod_cache.pods)
+        self.assertIsNone(self.pod_cache.resource_version)
+
+    def test_start_lists_and_watches(self):
+        """Test that the background thread lists pods again after the resource version expires."""
+        self.list_responses.append(get_fake_pod_list_response(
+            [('user', 'uai', 'Succeeded', 'ncn-w001')], resource_version='200'
+        ))
+        watched = threading.Event()
+
+        def watch_side_effect(watch=False, **kwargs):
+            if not watch:
+                return self.list_responses.pop(0)
+            if kwargs['resource_version'] == '100':
+                raise ApiException(status=410)
+            watched.set()
+            self.pod_cache.stop()
+            return get_fake_watch_response([])
+
+        self.k8s_api.list_pod_for_all_namespaces.side_effect = watch_side_effect
+        self.pod_cache.start()
+        self.assertTrue(watched.wait(5))
+
+        self.assertEqual({('user', 'uai')}, set(self.pod_cache.pods))
+        self.assertEqual('Succeeded', self.pod_cache.get_phase('user', 'uai'))
+
+    def test_restart_while_watching(self):
+        """Test that restarting the cache while a watch is blocked does not revive the old thread."""
+        first_watch = threading.Event()
+        release_first_watch = threading.Event()
+        second_watch = threading.Event()
+        release_second_watch = threading.Event()
+        watch_threads = []
+
+        def watch_side_effect(watch=False, **kwargs):
+            if not watch:
+                return self.list_responses.pop(0)
+            watch_threads.append(threading.current_thread())
+            if len(watch_threads) == 1:
+                first_watch.set()
+                release_first_watch.wait(5)
+                return get_fake_watch_response([
+                    ('DELETED', get_fake_pod('user', 'uai', 'Running', resource_version='101')),
+                ])
+            second_watch.set()
+            release_second_watch.wait(5)
+            return get_fake_watch_response([])
+
+        self.k8s_api.list_pod_for_all_namespaces.side_effect = watch_side_effect
+        self.pod_cache.start()
+        self.assertTrue(first_watch.wait(5))
+        self.pod_cache.stop()
+        self.pod_cache.start()
+        self.assertTrue(second_watch.wait(5))
+
+        release_first_watch.set()
+        watch_threads[0].join(5)
+        self.pod_cache.stop()
+        release_second_watch.set()
+
+        self.assertFalse(watch_threads[0].is_alive())
+        self.assertIsNot(watch_threads[0], watch_threads[1])
+        self.assertIn(('user', 'uai'), self.pod_cache.pods)
+
+    def test_get_phases_by_namespace(self):
+        """Test getting the phases of pods grouped by namespace."""
+        self.pod_cache.list()
+        self.assertEqual({'services': {'cfs-abc': 'Running', 'cfs-def': 'Pending'},
+                          'user': {'uai': 'Running'}},
+                         dict(self.pod_cache.get_phases_by_namespace()))
+
+    def test_get_pods_by_template_hash(self):
+        """Test getting pods grouped by namespace and pod-template-hash."""
+        self.pod_cache.list()
+        self.assertEqual({('services', 'abc'): [
+            CachedPod('services', 'cfs-abc', 'Running', 'ncn-w001', 'abc'),
+            CachedPod('services', 'cfs-def', 'Pending', 'ncn-w002', 'abc'),
+        ]}, dict(self.pod_cache.get_pods_by_template_hash()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests for the sat.template_membership module.
+"""
+import unittest
+from unittest.mock import MagicMock
+
+from sat.apiclient.gateway import APIError
+from sat.template_membership import TemplateMembershipResolver
+
+
+class TestTemplateMembershipResolver(unittest.TestCase):
+    """Tests for the TemplateMembershipResolver class"""
+
+    def setUp(self):
+        self.components = [
+            {'ID': 'x1000c0s0b0n0', 'State': 'Ready', 'Role': 'Compute'},
+            {'ID': 'x1000c0s0b0n1', 'State': 'Off', 'Role': 'Compute'},
+            {'ID': 'x3000c0s1b0n0', 'State': 'Ready', 'Role': 'Application'},
+            {'ID': 'x3000c0s2b0n0', 'State': 'Ready', 'Role': 'Management'},
+        ]
+        self.groups = [
+            {'label': 'uan', 'members': {'ids': ['x3000c0s1b0n0']}},
+            {'label': 'mgmt', 'members': {'ids': ['x3000c0s2b0n0', 'x3000c0s2b0']}},
+        ]
+
+        def mock_get(*args, **kwargs):
+            response = MagicMock()
+            if args == ('groups',):
+                response.json.return_value = self.groups
+            else:
+                response.json.return_value = {'Components': self.components}
+            return response
+
+        self.mock_hsm_client = MagicMock()
+        self.mock_hsm_client.get.side_effect = mock_get
+        self.resolver = TemplateMembershipResolver(self.mock_hsm_client)
+
+    @staticmethod
+    def template(name='template', **boot_sets):
+        return {'name': name, 'boot_sets': boot_sets}
+
+    def test_node_list(self):
+        """Test expanding a boot set with a node list"""
+        membership = self.resolver.get_membership(self.template(
+            computes={'node_list': ['x1000c0s0b0n0', 'x1000c0s0b0n1']}
+        ))
+        self.assertEqual({'x1000c0s0b0n0', 'x1000c0s0b0n1'}, membership.xnames)
+        self.assertIn('x1000c0s0b0n0', membership)
+        self.assertNotIn('x3000c0s1b0n0', membership)
+
+    def test_node_list_nonexistent_node(self):
+        """Test that nodes in a node list which are not in HSM are excluded"""
+        membership = self.resolver.get_membership(self.template(
+            computes={'node_list': ['x1000c0s0b0n0', 'x9000c0s0b0n0']}
+        ))
+        self.assertEqual({'x1000c0s0b0n0'}, membership.xnames)
+
+    def test_node_roles_groups(self):
+        """Test expanding a boot set with roles"""
+        membership = self.resolver.get_membership(self.template(
+            computes={'node_roles_groups': ['compute']}
+        ))
+        self.assertEqual({'x1000c0s0b0n0', 'x1000c0s0b0n1'}, membership.xnames)
+
+    def test_node_groups(self):
+        """Test expanding a boot set with groups, excluding non-node members"""
+        membership = self.resolver.get_membership(self.template(
+            mgmt={'node_groups': ['mgmt']}
+        ))
+        self.assertEqual({'x3000c0s2b0n0'}, membership.xnames)
+
+    def test_nodes_by_state(self):
+        """Test getting a histogram of node states for multiple boot sets"""
+        membership = self.resolver.get_membership(self.template(
+            computes={'node_roles_groups': ['Compute']},
+            uans={'node_groups': ['uan']},
+        ))
+        self.assertEqual({'Ready': ['x1000c0s0b0n0', 'x3000c0s1b0n0'], 'Off': ['x1000c0s0b0n1']},
+                         membership.nodes_by_state)
+
+    def test_empty_field(self):
+        """Test that a boot set field with an empty list matches no nodes"""
+        membership = self.resolver.get_membership(self.template(computes={'node_list': []}))
+        self.assertEqual(set(), membership.xnames)
+
+    def test_no_boot_sets(self):
+        """Test that a session template without boot sets has no nodes"""
+        self.assertEqual(set(), self.resolver.get_membership({'name': 'empty'}).xnames)
+
+    def test_hsm_queried_once(self):
+        """Test that HSM is queried once for many session templates"""
+        for index in range(30):
+            self.resolver.get_membership(self.template(
+                name=f'template{index}',
+                computes={'node_list': [f'x1000c0s0b0n{index}'], 'node_roles_groups': ['Application']},
+                uans={'node_groups': ['uan']},
+            ))
+        self.assertEqual(2, self.mock_hsm_client.get.call_count)
+
+    def test_membership_cached_by_content(self):
+        """Test that session templates with the same boot sets share a result"""
+        first = self.resolver.get_membership(self.template(name='a', computes={'node_roles_groups': ['Compute']}))
+        second = self.resolver.get_membership(self.template(name='b', computes={'node_roles_groups': ['Compute']}))
+        self.assertIs(first, second)
+
+    def test_groups_not_queried_if_unused(self):
+        """Test that groups are not retrieved unless a boot set uses node groups"""
+        self.resolver.get_membership(self.template(computes={'node_roles_groups': ['Compute']}))
+        self.mock_hsm_client.get.assert_called_once_with('State', 'Components', params={'type': 'Node'})
+
+    def test_hsm_failure(self):
+        """Test that an APIError is raised if HSM cannot be queried"""
+        self.mock_hsm_client.get.side_effect = APIError('HSM failed')
+        with self.assertRaises(APIError):
+            self.resolver.get_membership(self.template(computes={'node_roles_groups': ['Compute']}))
+
+
+if __name__ == '__main__':
+    unittest.main()
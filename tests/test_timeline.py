@@ -0,0 +1,206 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests for the sat.timeline module.
+"""
+import json
+import os
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from sat.timeline import (
+    Timeline,
+    WaiterTiming,
+    disable_timeline,
+    enable_timeline,
+    get_timeline,
+    record_waiter_timing,
+)
+
+
+class TimelineTestCase(unittest.TestCase):
+    """Scaffolding for tests which create a Timeline"""
+    def setUp(self):
+        patch('sat.timeline.time.time', return_value=1000.0).start()
+        patch('sat.timeline.time.monotonic', return_value=100.0).start()
+        self.timeline = Timeline()
+
+        self.group_timing = WaiterTiming('GroupWaiter')
+        self.group_timing.begin('nodes powered on', 100.0)
+        self.group_timing.attempt_starts.extend([100.0, 110.0])
+        self.group_timing.num_checks = 7
+        for member in ['x1', 'x2', 'x3']:
+            self.group_timing.add_member(member)
+        self.group_timing.member_finished('x1', 102.0, 'completed')
+        self.group_timing.member_failure_reason('x2', 'no power')
+        self.group_timing.member_finished('x2', 103.0, 'failed')
+        self.group_timing.finish(115.0, 'timed out')
+
+        self.timing = WaiterTiming('Waiter')
+        self.timing.begin('ceph healthy', 101.0)
+        self.timing.attempt_starts.append(101.0)
+        self.timing.num_checks = 2
+        self.timing.finish(101.5, 'completed')
+
+        self.timeline.add(self.group_timing)
+        self.timeline.add(self.timing)
+
+    def tearDown(self):
+        patch.stopall()
+
+
+class TestWaiterTiming(TimelineTestCase):
+    """Tests for the WaiterTiming class"""
+
+    def test_unfinished_members_timed_out(self):
+        """Test that members which did not finish are recorded as timed out"""
+        self.assertEqual('timed out', self.group_timing.members['x3'].outcome)
+        self.assertEqual(115.0, self.group_timing.members['x3'].end)
+
+    def test_first_finish_recorded(self):
+        """Test that only the first time a member finishes is recorded"""
+        self.group_timing.member_finished('x1', 112.0, 'completed')
+        self.assertEqual(102.0, self.group_timing.members['x1'].end)
+
+    def test_begin_resets(self):
+        """Test that beginning again discards the previous timing"""
+        self.group_timing.begin('nodes powered on', 200.0)
+        self.assertEqual({}, self.group_timing.members)
+        self.assertIsNone(self.group_timing.outcome)
+        self.assertEqual(0, self.group_timing.num_checks)
+
+
+class TestTimeline(TimelineTestCase):
+    """Tests for the Timeline class"""
+
+    def test_add_once(self):
+        """Test that the same timing is only added once"""
+        self.timeline.add(self.timing)
+        self.assertEqual(2, len(self.timeline.waiter_timings))
+
+    def test_to_dict(self):
+        """Test converting the timeline to a dict with wall clock times"""
+        waiters = self.timeline.to_dict()['waiters']
+        self.assertEqual(2, len(waiters))
+        group = waiters[0]
+        self.assertEqual('nodes powered on', group['condition'])
+        self.assertEqual('GroupWaiter', group['type'])
+        self.assertEqual(1000.0, group['start'])
+        self.assertEqual(15.0, group['duration'])
+        self.assertEqual(2, group['attempts'])
+        self.assertEqual(1, group['retries'])
+        self.assertEqual(7, group['checks'])
+        self.assertEqual('timed out', group['outcome'])
+        self.assertEqual(
+            [
+                {'member': 'x1', 'begin': 1000.0, 'end': 1002.0, 'duration': 2.0,
+                 'outcome': 'completed', 'reason': None},
+                {'member': 'x2', 'begin': 1000.0, 'end': 1003.0, 'duration': 3.0,
+                 'outcome': 'failed', 'reason': 'no power'},
+                {'member': 'x3', 'begin': 1000.0, 'end': 1015.0, 'duration': 15.0,
+                 'outcome': 'timed out', 'reason': None},
+            ],
+            group['members']
+        )
+        self.assertEqual([], waiters[1]['members'])
+
+    def test_to_chrome_trace(self):
+        """Test converting the timeline to Chrome trace events"""
+        events = self.timeline.to_chrome_trace()['traceEvents']
+        complete_events = {(event['pid'], event['name']): event
+                           for event in events if event['ph'] == 'X'}
+        self.assertEqual(5, len(complete_events))
+
+        group_event = complete_events[(1, 'nodes powered on')]
+        self.assertEqual(0, group_event['ts'])
+        self.assertEqual(15000000, group_event['dur'])
+        self.assertEqual('timed out', group_event['args']['outcome'])
+
+        member_event = complete_events[(1, 'x2')]
+        self.assertEqual(0, member_event['ts'])
+        self.assertEqual(3000000, member_event['dur'])
+        self.assertEqual('no power', member_event['args']['reason'])
+
+        waiter_event = complete_events[(2, 'ceph healthy')]
+        self.assertEqual(1000000, waiter_event['ts'])
+        self.assertEqual(500000, waiter_event['dur'])
+
+        retries = [event for event in events if event['ph'] == 'i']
+        self.assertEqual([10000000], [event['ts'] for event in retries])
+
+        process_names = {event['pid']: event['args']['name'] for event in events
+                         if event['ph'] == 'M' and event['name'] == 'process_name'}
+        self.assertEqual({1: 'nodes powered on', 2: 'ceph healthy'}, process_names)
+
+    def test_to_chrome_trace_unfinished(self):
+        """Test that a Waiter which has not finished is shown up to its last event"""
+        timing = WaiterTiming('GroupWaiter')
+        timing.begin('unfinished', 100.0)
+        timing.member_finished('x1', 104.0, 'completed')
+        timeline = Timeline()
+        timeline.add(timing)
+        events = timeline.to_chrome_trace()['traceEvents']
+        waiter_event = next(event for event in events
+                            if event['ph'] == 'X' and event['name'] == 'unfinished')
+        self.assertEqual(4000000, waiter_event['dur'])
+
+    def test_write(self):
+        """Test writing the timeline in each format"""
+        with TemporaryDirectory() as tmpdir:
+            for timeline_format, key in [('json', 'waiters'), ('chrome', 'traceEvents')]:
+                with self.subTest(timeline_format=timeline_format):
+                    path = os.path.join(tmpdir, f'timeline.{timeline_format}')
+                    self.timeline.write(path, timeline_format)
+                    with open(path) as f:
+                        self.assertIn(key, json.load(f))
+
+    def test_write_invalid_format(self):
+        """Test that writing an invalid format raises ValueError"""
+        with self.assertRaises(ValueError):
+            self.timeline.write('/dev/null', 'xml')
+
+
+class TestGlobalTimeline(unittest.TestCase):
+    """Tests for enabling and disabling the global timeline"""
+
+    def tearDown(self):
+        disable_timeline()
+
+    def test_not_recorded_when_disabled(self):
+        """Test that timings are not collected unless the timeline is enabled"""
+        record_waiter_timing(WaiterTiming('Waiter'))
+        self.assertIsNone(get_timeline())
+
+    def test_recorded_when_enabled(self):
+        """Test that timings are collected once the timeline is enabled"""
+        timeline = enable_timeline()
+        timing = WaiterTiming('Waiter')
+        record_waiter_timing(timing)
+        self.assertIs(timeline, get_timeline())
+        self.assertEqual([timing], timeline.waiter_timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
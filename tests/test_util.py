@@ -29,6 +29,7 @@ from itertools import combinations, repeat
 import logging
 import os
 from textwrap import dedent
+import threading
 from unittest import mock
 import unittest
 from unittest.mock import patch
@@ -502,6 +503,29 @@ class TestBeginEndLogger(ExtendedTestCase):
         self.assertEqual(2, len(cm.output))
 
 
+class TestSubmitDaemon(unittest.TestCase):
+    """Tests for the submit_daemon function."""
+
+    def test_result(self):
+        """Test that the future is given the result of the function."""
+        future = util.submit_daemon(lambda x, y=0: x + y, 1, y=2)
+        self.assertEqual(3, future.result(timeout=5))
+
+    def test_exception(self):
+        """Test that the future is given the exception raised by the function."""
+        def fail():
+            raise ValueError('failed')
+
+        future = util.submit_daemon(fail)
+        with self.assertRaisesRegex(ValueError, 'failed'):
+            future.result(timeout=5)
+
+    def test_daemon_thread(self):
+        """Test that the function is called in a daemon thread."""
+        future = util.submit_daemon(lambda: threading.current_thread().daemon)
+        self.assertTrue(future.result(timeout=5))
+
+
 class TestGetUsernameAndPasswordInteractively(ExtendedTestCase):
     def setUp(self):
         """Set up some mocks."""
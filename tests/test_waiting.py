@@ -1,7 +1,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -26,19 +26,34 @@ Unit tests for the sat.waiting module.
 """
 
 import itertools
+import os
+import subprocess
+import sys
+import textwrap
+from threading import Barrier, Event, Lock
+import time
 from unittest.mock import Mock, patch
 
+from sat.timeline import disable_timeline, enable_timeline
 from sat.waiting import (
     DependencyCycleError,
     DependencyGroupMember,
     DependencyGroupWaiter,
+    get_dependency_cycles,
     GroupWaiter,
+    BackoffPolling,
+    ExpectedDurationPolling,
+    FixedPolling,
     SimultaneousWaiter,
     Waiter,
+    WaiterScheduler,
     WaitingFailure,
+    wait_for_all,
 )
 from tests.common import ExtendedTestCase
 
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 def get_mock_waiter(complete_behavior):
     """Get a Waiter class which mocks out completion checking.
@@ -107,6 +122,20 @@ def get_mock_group_waiter(member_complete_behavior, parent_cls=GroupWaiter):
 SuccessfulWaiter = get_mock_waiter(True)
 
 
+class FakeClock:
+    """A clock which only advances when sleeping."""
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
 class WaiterTestCase(ExtendedTestCase):
     """Common test class for (Group)Waiter classes."""
     def setUp(self):
@@ -114,9 +143,11 @@ class WaiterTestCase(ExtendedTestCase):
                                          side_effect=itertools.count(0, 1)).start()
         self.mock_time_sleep = patch('sat.waiting.time.sleep').start()
 
-        self.mock_thread_patcher = patch('sat.waiting.Thread')
-        self.mock_thread = self.mock_thread_patcher.start()
-        self.mock_thread.return_value.is_alive.side_effect = [True, False]
+    def use_fake_clock(self):
+        """Make time pass only when sleeping, regardless of how often it is read."""
+        self.clock = FakeClock()
+        self.mock_time_monotonic.side_effect = self.clock.monotonic
+        self.mock_time_sleep.side_effect = self.clock.sleep
 
     def tearDown(self):
         patch.stopall()
@@ -202,73 +233,286 @@ class TestWaiter(WaiterTestCase):
         mock_post_wait.assert_called_once()
         mock_on_retry.assert_called_once()
 
-    def test_wait_async_launch_thread(self):
-        """Test that a thread is created when waiting asynchronously"""
+    def test_wait_async_uses_background_scheduler(self):
+        """Test that waiting asynchronously adds the waiter to the background scheduler"""
         instance = SuccessfulWaiter(10)
-        instance.wait_for_completion_async()
+        with patch('sat.waiting._background_scheduler') as mock_scheduler:
+            instance.wait_for_completion_async()
 
-        self.mock_thread.assert_called_once_with(target=instance.wait_for_completion)
-        self.mock_thread.return_value.start.assert_called_once()
+        mock_scheduler.add.assert_called_once_with(instance)
 
-    def test_wait_await_join_thread(self):
-        """Test that the waiting thread is joined when wait_..._await called"""
+    def test_wait_await_waits_for_completion(self):
+        """Test that wait_..._await returns once the waiter has completed"""
         instance = SuccessfulWaiter(10)
 
         instance.wait_for_completion_async()
         instance.wait_for_completion_await()
 
-        self.mock_thread.return_value.join.assert_called()
+        self.assertTrue(instance.completed)
+
+    def test_wait_await_without_async(self):
+        """Test that wait_..._await cannot be called before wait_..._async"""
+        with self.assertRaises(RuntimeError):
+            SuccessfulWaiter(10).wait_for_completion_await()
 
     def test_wait_context_manager_works(self):
-        """Test that the GroupWaiter context manager waits in background"""
+        """Test that the Waiter context manager waits in background"""
 
         with SuccessfulWaiter(10) as instance:
             pass
 
-        self.mock_thread.assert_called_once_with(target=instance.wait_for_completion)
-        self.mock_thread.return_value.start.assert_called_once()
-        self.mock_thread.return_value.join.assert_called()
+        self.assertTrue(instance.completed)
 
     def test_is_waiting_async(self):
         """Test if an async waiter is waiting"""
-        instance = SuccessfulWaiter(10)
+        condition_reached = Event()
+
+        class EventWaiter(Waiter):
+            def has_completed(self):
+                return condition_reached.is_set()
+
+            def condition_name(self):
+                return 'Testing Waiter'
+
+        instance = EventWaiter(10, poll_interval=0.01)
         self.assertFalse(instance.is_waiting_async())
-        instance.wait_for_completion_async()
-        self.assertTrue(instance.is_waiting_async())
+        with patch('sat.waiting.time.monotonic', time.monotonic):
+            instance.wait_for_completion_async()
+            self.assertTrue(instance.is_waiting_async())
+            condition_reached.set()
+            instance.wait_for_completion_await()
         self.assertFalse(instance.is_waiting_async())
+        self.assertTrue(instance.completed)
+
+
+class TestWaiterScheduler(WaiterTestCase):
+    """Tests for the WaiterScheduler class and wait_for_all."""
+    def setUp(self):
+        super().setUp()
+        self.use_fake_clock()
+        self.mock_thread = patch('sat.waiting.Thread').start()
+
+    @staticmethod
+    def get_counting_waiter(timeout, poll_interval, checks_needed=None):
+        """Get a Waiter which completes after a number of checks, if any."""
+        waiter = get_mock_waiter(False)(timeout, poll_interval=poll_interval)
+        waiter.checks = []
+
+        def has_completed():
+            waiter.checks.append(time.monotonic())
+            return checks_needed is not None and len(waiter.checks) >= checks_needed
+
+        waiter.has_completed = has_completed
+        return waiter
+
+    def test_waiters_checked_only_when_due(self):
+        """Test that each waiter is checked at its own poll interval"""
+        fast = self.get_counting_waiter(10, poll_interval=1)
+        slow = self.get_counting_waiter(10, poll_interval=5)
+        self.assertFalse(wait_for_all([fast, slow]))
+
+        self.assertEqual(list(range(10)), fast.checks)
+        self.assertEqual([0, 5], slow.checks)
+
+    def test_wait_for_all_completes(self):
+        """Test that waiters are finished independently of each other"""
+        first = self.get_counting_waiter(10, poll_interval=2, checks_needed=2)
+        second = self.get_counting_waiter(10, poll_interval=1, checks_needed=5)
+        self.assertTrue(wait_for_all([first, second]))
+
+        self.assertEqual([0, 2], first.checks)
+        self.assertEqual([0, 1, 2, 3, 4], second.checks)
+        self.assertEqual(4, self.clock.now)
+        self.assertFalse(first.is_waiting())
+        self.assertFalse(second.is_waiting())
+
+    def test_no_threads_in_foreground(self):
+        """Test that no thread is started to wait in the foreground"""
+        waiters = [self.get_counting_waiter(10, poll_interval=1, checks_needed=3)
+                   for _ in range(100)]
+        self.assertTrue(wait_for_all(waiters))
+        self.mock_thread.assert_not_called()
+        # All waiters are due at the same time, so there is one sleep per tick.
+        self.assertEqual([1, 1], self.clock.sleeps)
+
+    def test_background_thread_started_once(self):
+        """Test that one background thread is started for many waiters"""
+        scheduler = WaiterScheduler(background=True)
+        for _ in range(10):
+            scheduler.add(SuccessfulWaiter(10))
+        self.mock_thread.assert_called_once_with(target=scheduler.run)
+        self.mock_thread.return_value.start.assert_called_once_with()
+
+    def test_unexpected_error_raised_in_foreground(self):
+        """Test that an unexpected error is raised when waiting in the foreground"""
+        BrokenWaiter = get_mock_waiter(ValueError('bad value'))
+        waiter = BrokenWaiter(10)
+        with self.assertRaisesRegex(ValueError, 'bad value'):
+            wait_for_all([waiter, SuccessfulWaiter(10)])
+        self.assertFalse(waiter.is_waiting())
+
+    def test_unexpected_error_logged_in_background(self):
+        """Test that an unexpected error is logged when waiting in the background"""
+        BrokenWaiter = get_mock_waiter(ValueError('bad value'))
+        broken, successful = BrokenWaiter(10), SuccessfulWaiter(10)
+        scheduler = WaiterScheduler(background=True)
+        scheduler.add(broken)
+        scheduler.add(successful)
+        with self.assertLogs(level='ERROR') as cm:
+            scheduler.run()
+
+        self.assert_in_element('bad value', cm.output)
+        self.assertFalse(broken.completed)
+        self.assertTrue(successful.completed)
+
+
+class TestPreWaitActions(WaiterTestCase):
+    """Tests for running the pre-wait actions of Waiters."""
+    def setUp(self):
+        super().setUp()
+        self.use_fake_clock()
+
+    @staticmethod
+    def get_pre_wait_waiter(timeout, pre_wait_action, checks_needed=1):
+        """Get a Waiter which runs the given pre-wait action."""
+        class PreWaitWaiter(get_mock_waiter(False)):
+            def pre_wait_action(self):
+                pre_wait_action()
+
+        waiter = PreWaitWaiter(timeout)
+        waiter.checks = []
+
+        def has_completed():
+            waiter.checks.append(time.monotonic())
+            return len(waiter.checks) >= checks_needed
+
+        waiter.has_completed = has_completed
+        return waiter
+
+    def test_slow_pre_wait_action_not_counted_in_timeout(self):
+        """Test that a pre-wait action slower than the timeout is followed by a check"""
+        def slow_pre_wait_action():
+            self.clock.now += 20
+
+        waiter = self.get_pre_wait_waiter(10, slow_pre_wait_action)
+        self.assertTrue(waiter.wait_for_completion())
+        self.assertEqual([20], waiter.checks)
+
+    def test_checked_at_least_once_per_attempt(self):
+        """Test that a waiter is checked once even if another waiter's check delays it past its timeout"""
+        slow = TestWaiterScheduler.get_counting_waiter(100, poll_interval=1, checks_needed=1)
+        slow.on_check_action = lambda: setattr(self.clock, 'now', self.clock.now + 20)
+        delayed = TestWaiterScheduler.get_counting_waiter(10, poll_interval=1, checks_needed=1)
+        self.assertTrue(wait_for_all([slow, delayed]))
+        self.assertEqual([20], delayed.checks)
+
+    def test_pre_wait_actions_run_concurrently(self):
+        """Test that the pre-wait action of one waiter does not delay another"""
+        barrier = Barrier(2, timeout=5)
+        waiters = [self.get_pre_wait_waiter(10, barrier.wait) for _ in range(2)]
+        self.assertTrue(wait_for_all(waiters))
+        self.assertFalse(barrier.broken)
+
+    def test_pre_wait_action_failure(self):
+        """Test that a WaitingFailure raised by a pre-wait action in its thread fails the waiter"""
+        def failing_pre_wait_action():
+            raise WaitingFailure('cannot start')
+
+        waiter = self.get_pre_wait_waiter(10, failing_pre_wait_action)
+        with self.assertLogs(level='ERROR') as cm:
+            self.assertFalse(waiter.wait_for_completion())
+        self.assertTrue(waiter.failed)
+        self.assertEqual([], waiter.checks)
+        self.assert_in_element('cannot start', cm.output)
+
+
+class TestPollingStrategies(WaiterTestCase):
+    """Tests for the polling strategies of Waiters."""
+    def setUp(self):
+        super().setUp()
+        self.use_fake_clock()
+
+    def get_waiter(self, polling_strategy, timeout=100, poll_interval=1, checks_needed=None):
+        """Get a Waiter which records the times it is checked."""
+        waiter = TestWaiterScheduler.get_counting_waiter(timeout, poll_interval, checks_needed)
+        waiter.polling_strategy = polling_strategy
+        return waiter
+
+    def test_fixed_polling(self):
+        """Test that fixed polling checks at the poll interval and at the deadline"""
+        waiter = self.get_waiter(FixedPolling(), timeout=10, poll_interval=4)
+        self.assertFalse(waiter.wait_for_completion())
+        self.assertEqual([0, 4, 8, 10], waiter.checks)
+
+    def test_backoff_polling(self):
+        """Test that backoff polling increases intervals up to the maximum"""
+        waiter = self.get_waiter(BackoffPolling(max_interval=10), timeout=40)
+        self.assertFalse(waiter.wait_for_completion())
+        self.assertEqual([0, 1, 3, 7, 15, 25, 35, 40], waiter.checks)
+
+    def test_expected_duration_polling(self):
+        """Test that expected duration polling checks more often near the expected duration"""
+        waiter = self.get_waiter(ExpectedDurationPolling(64, max_interval=16), timeout=70)
+        self.assertFalse(waiter.wait_for_completion())
+        self.assertEqual([0, 16, 32, 48, 56, 60, 62, 63, 64, 65, 66, 67, 68, 69, 70], waiter.checks)
+
+    def test_final_check_at_deadline_completes(self):
+        """Test that a condition reached by the final check at the deadline is completed"""
+        waiter = self.get_waiter(BackoffPolling(), timeout=5, checks_needed=4)
+        self.assertTrue(waiter.wait_for_completion())
+        self.assertEqual([0, 1, 3, 5], waiter.checks)
+
+    def test_no_final_check_without_strategy(self):
+        """Test that waiters without a polling strategy do not check at the deadline"""
+        waiter = self.get_waiter(None, timeout=10, poll_interval=4)
+        self.assertFalse(waiter.wait_for_completion())
+        self.assertEqual([0, 4, 8], waiter.checks)
+
+    @patch('sat.waiting.random.uniform', side_effect=[0.5, 1.5])
+    def test_jitter(self, mock_uniform):
+        """Test that jitter lengthens or shortens intervals"""
+        strategy = FixedPolling(jitter=0.5)
+        waiter = SuccessfulWaiter(10, poll_interval=4)
+        self.assertEqual(2, strategy.get_next_interval(waiter, 0, 1))
+        self.assertEqual(6, strategy.get_next_interval(waiter, 0, 2))
+        mock_uniform.assert_called_with(0.5, 1.5)
+
+    def test_invalid_jitter(self):
+        """Test that jitter must be at least 0 and less than 1"""
+        for jitter in [-1, 1, 1.5]:
+            with self.subTest(jitter=jitter):
+                with self.assertRaises(ValueError):
+                    BackoffPolling(jitter=jitter)
 
 
 class TestSimulWaiter(WaiterTestCase):
     """Test the abstract SimultaneousWaiter class."""
     def setUp(self):
         super().setUp()
+        self.use_fake_clock()
 
     def test_init_with_bad_class(self):
         """Test the SimultaneousWaiter only accepts Waiter subclasses"""
         with self.assertRaises(TypeError):
             SimultaneousWaiter(Mock())
 
-    def test_starts_threads(self):
-        """Test the SimultaneousWaiter starts and cleans up threads"""
+    @patch('sat.waiting.Thread')
+    def test_does_not_start_threads(self, mock_thread):
+        """Test the SimultaneousWaiter waits for its conditions without threads"""
         sw = SimultaneousWaiter([SuccessfulWaiter], 10)
-        sw.wait_for_completion()
-        self.mock_thread.assert_called_once()
-        self.mock_thread.return_value.join.assert_called()
+        self.assertTrue(sw.wait_for_completion())
+        mock_thread.assert_not_called()
 
     def test_simul_waiter_completed(self):
         """Test waiting for multiple conditions"""
-        self.mock_thread_patcher.stop()
-
         EventualWaiter = get_mock_waiter([False, True])
         sw = SimultaneousWaiter([EventualWaiter, SuccessfulWaiter], 5)
         self.assertTrue(sw.wait_for_completion())
 
     def test_simul_waiter_failed(self):
         """Test failing to wait for one of multiple simultaneous conditions."""
-        self.mock_thread_patcher.stop()
-
         NotFastEnoughWaiter = get_mock_waiter([False, True])
-        sw = SimultaneousWaiter([NotFastEnoughWaiter, SuccessfulWaiter], 2)
+        sw = SimultaneousWaiter([NotFastEnoughWaiter, SuccessfulWaiter], 1)
         self.assertFalse(sw.wait_for_completion())
 
 
@@ -287,6 +531,24 @@ class TestGroupWaiter(GroupWaiterTestCase):
         SuccessfulWaiter = get_mock_group_waiter(True)
         instance = SuccessfulWaiter(self.members, 10)
 
+        self.assertEqual(len(instance.wait_for_completion()), 0)
+        # There is no need to sleep once every member has completed.
+        self.mock_time_sleep.assert_not_called()
+
+    def test_wait_for_completion_eventually_successful(self):
+        """Test waiting for completion when members complete on a later poll"""
+        self.use_fake_clock()
+        checked = set()
+
+        def completed_on_second_check(member):
+            if member in checked:
+                return True
+            checked.add(member)
+            return False
+
+        EventualWaiter = get_mock_group_waiter(completed_on_second_check)
+        instance = EventualWaiter(self.members, 10)
+
         self.assertEqual(len(instance.wait_for_completion()), 0)
         self.mock_time_sleep.assert_called()
 
@@ -326,6 +588,234 @@ class TestGroupWaiter(GroupWaiterTestCase):
         mock_on_retry.assert_called_once()
 
 
+class TestBatchGroupWaiter(GroupWaiterTestCase):
+    """Tests for GroupWaiters which check all members at once."""
+    def setUp(self):
+        super().setUp()
+        self.use_fake_clock()
+        self.batches = []
+        test_case = self
+
+        class BatchWaiter(get_mock_group_waiter(Mock(side_effect=AssertionError))):
+            def members_have_completed(self, members):
+                test_case.batches.append(set(members))
+                # 'foo' completes on the second poll, and 'baz' fails.
+                completed = {'bar'} | ({'foo'} if len(test_case.batches) > 1 else set())
+                return completed & members, {'baz'} & members
+
+        self.BatchWaiter = BatchWaiter
+
+    def test_one_check_per_poll(self):
+        """Test that the batch check is used instead of checking each member"""
+        instance = self.BatchWaiter(self.members, 10)
+        self.assertEqual(set(), instance.wait_for_completion())
+        self.assertEqual([set(self.members), {'foo'}], self.batches)
+
+    def test_batch_failures_recorded(self):
+        """Test that members failed by the batch check are recorded"""
+        instance = self.BatchWaiter(self.members, 10)
+        instance.wait_for_completion()
+        self.assertEqual({'baz'}, instance.failed)
+
+    def test_default_batch_check(self):
+        """Test that the default batch check checks each member"""
+        def member_has_completed(member):
+            if member == 'baz':
+                raise WaitingFailure('no baz')
+            return member == 'foo'
+
+        instance = get_mock_group_waiter(member_has_completed)(self.members, 10)
+        with self.assertLogs(level='ERROR') as cm:
+            result = instance.members_have_completed(set(self.members))
+        self.assertEqual(({'foo'}, {'baz'}), result)
+        self.assert_in_element('no baz', cm.output)
+
+
+class TestConcurrentGroupWaiter(ExtendedTestCase):
+    """Tests for GroupWaiters which check members with a pool of worker threads."""
+    def setUp(self):
+        self.members = {f'member{i}' for i in range(6)}
+        self.release_slow = Event()
+        self.running = 0
+        self.max_running = 0
+        self.num_checks = {}
+        self.lock = Lock()
+
+    def tearDown(self):
+        self.release_slow.set()
+
+    def member_has_completed(self, member):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.running, self.max_running)
+            self.num_checks[member] = self.num_checks.get(member, 0) + 1
+        try:
+            if member == 'slow':
+                self.release_slow.wait(5)
+            elif member == 'broken':
+                raise WaitingFailure('broken member')
+            elif member == 'buggy':
+                raise KeyError(member)
+            else:
+                time.sleep(0.05)
+            return True
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def get_waiter(self, members, max_workers, member_check_timeout=None):
+        return get_mock_group_waiter(self.member_has_completed)(
+            members, 10, max_workers=max_workers, member_check_timeout=member_check_timeout
+        )
+
+    def test_checks_bounded_by_max_workers(self):
+        """Test that no more than max_workers members are checked at once"""
+        waiter = self.get_waiter(self.members, max_workers=3)
+        self.assertEqual((self.members, set()), waiter.members_have_completed(self.members))
+        self.assertEqual(3, self.max_running)
+
+    def test_checks_run_concurrently(self):
+        """Test that checking many members takes about as long as checking one"""
+        waiter = self.get_waiter(self.members, max_workers=len(self.members))
+        start = time.monotonic()
+        waiter.members_have_completed(self.members)
+        self.assertLess(time.monotonic() - start, 0.05 * len(self.members))
+
+    def test_slow_check_abandoned(self):
+        """Test that a check exceeding member_check_timeout is treated as not completed"""
+        members = self.members | {'slow'}
+        waiter = self.get_waiter(members, max_workers=4, member_check_timeout=0.5)
+        with self.assertLogs(level='WARNING') as cm:
+            completed, failed = waiter.members_have_completed(members)
+        self.assertEqual(self.members, completed)
+        self.assertEqual(set(), failed)
+        self.assert_in_element('Timed out after 0.5 seconds', cm.output)
+
+    def test_abandoned_check_not_repeated(self):
+        """Test that a member is not checked again while its last check is running"""
+        members = self.members | {'slow'}
+        waiter = self.get_waiter(members, max_workers=4, member_check_timeout=0.2)
+        with self.assertLogs(level='WARNING'):
+            waiter.members_have_completed(members)
+        self.assertEqual((set(), set()), waiter.members_have_completed({'slow'}))
+        self.assertEqual(1, self.num_checks['slow'])
+
+    def test_abandoned_check_does_not_block_exit(self):
+        """Test that a hung check abandoned after its timeout does not prevent exiting"""
+        script = textwrap.dedent('''
+            from threading import Event
+            from sat.waiting import GroupWaiter
+
+            class HungWaiter(GroupWaiter):
+                def condition_name(self):
+                    return 'hung'
+
+                def member_has_completed(self, member):
+                    Event().wait()
+
+            waiter = HungWaiter({'hung'}, 10, max_workers=1, member_check_timeout=0.1)
+            print(waiter.members_have_completed({'hung'}))
+        ''')
+        result = subprocess.run([sys.executable, '-c', script], cwd=REPO_ROOT,
+                                capture_output=True, text=True, timeout=30)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual('(set(), set())', result.stdout.strip())
+
+    def test_failures_recorded(self):
+        """Test that members raising WaitingFailure are reported as failed"""
+        members = self.members | {'broken'}
+        waiter = self.get_waiter(members, max_workers=4)
+        with self.assertLogs(level='ERROR') as cm:
+            completed, failed = waiter.members_have_completed(members)
+        self.assertEqual(self.members, completed)
+        self.assertEqual({'broken'}, failed)
+        self.assert_in_element('broken member', cm.output)
+
+    def test_unexpected_errors_raised(self):
+        """Test that unexpected exceptions from checks are not swallowed"""
+        members = self.members | {'buggy'}
+        waiter = self.get_waiter(members, max_workers=4)
+        with self.assertRaises(KeyError):
+            waiter.members_have_completed(members)
+
+    def test_wait_for_completion(self):
+        """Test waiting for completion with concurrent member checks"""
+        members = self.members | {'broken'}
+        waiter = self.get_waiter(members, max_workers=4, member_check_timeout=1)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(set(), waiter.wait_for_completion())
+        self.assertEqual({'broken'}, waiter.failed)
+
+
+class TestWaiterTiming(GroupWaiterTestCase):
+    """Tests for the timing recorded by Waiters."""
+    def setUp(self):
+        super().setUp()
+        self.use_fake_clock()
+
+    def tearDown(self):
+        super().tearDown()
+        disable_timeline()
+
+    def test_waiter_timing(self):
+        """Test that the start, end, and checks of a Waiter are recorded"""
+        waiter = get_mock_waiter([False, False, True])(10)
+        waiter.wait_for_completion()
+        self.assertEqual('Testing Waiter', waiter.timing.name)
+        self.assertEqual('MockWaiter', waiter.timing.waiter_type)
+        self.assertEqual(0, waiter.timing.start)
+        self.assertEqual(2, waiter.timing.end)
+        self.assertEqual(3, waiter.timing.num_checks)
+        self.assertEqual('completed', waiter.timing.outcome)
+
+    def test_retries_recorded(self):
+        """Test that each attempt of a Waiter which times out is recorded"""
+        waiter = get_mock_waiter(False)(2, retries=1)
+        with self.assertLogs(level='ERROR'):
+            waiter.wait_for_completion()
+        self.assertEqual(2, len(waiter.timing.attempt_starts))
+        self.assertEqual('timed out', waiter.timing.outcome)
+
+    def test_failure_reason_recorded(self):
+        """Test that the reason a Waiter failed is recorded"""
+        waiter = get_mock_waiter(WaitingFailure('no way'))(10)
+        with self.assertLogs(level='ERROR'):
+            waiter.wait_for_completion()
+        self.assertEqual('failed', waiter.timing.outcome)
+        self.assertEqual('no way', waiter.timing.reason)
+
+    def test_member_timing(self):
+        """Test that the time each member of a GroupWaiter finished is recorded"""
+        def member_has_completed(member):
+            if member == 'baz':
+                raise WaitingFailure('no baz')
+            return member == 'foo' or time.monotonic() >= 3
+
+        waiter = get_mock_group_waiter(member_has_completed)(self.members, 10)
+        with self.assertLogs(level='ERROR'):
+            waiter.wait_for_completion()
+        members = waiter.timing.members
+        self.assertEqual(['completed', 'completed', 'failed'],
+                         [members[name].outcome for name in ['foo', 'bar', 'baz']])
+        self.assertEqual([0, 3, 0], [members[name].end for name in ['foo', 'bar', 'baz']])
+        self.assertEqual('no baz', members['baz'].reason)
+
+    def test_unfinished_members_timed_out(self):
+        """Test that members of a GroupWaiter which time out are recorded"""
+        waiter = get_mock_group_waiter(lambda member: member == 'foo')(self.members, 5)
+        with self.assertLogs(level='ERROR'):
+            waiter.wait_for_completion()
+        self.assertEqual('timed out', waiter.timing.members['bar'].outcome)
+        self.assertEqual('completed', waiter.timing.members['foo'].outcome)
+
+    def test_timeline_collects_timings(self):
+        """Test that the timings of Waiters are collected when the timeline is enabled"""
+        timeline = enable_timeline()
+        waiters = [get_mock_waiter(True)(10), get_mock_group_waiter(True)(self.members, 10)]
+        wait_for_all(waiters)
+        self.assertEqual([waiter.timing for waiter in waiters], timeline.waiter_timings)
+
+
 class TestFailingGroupWaiter(GroupWaiterTestCase):
     """Tests for GroupWaiter when some members fail"""
     def setUp(self):
@@ -428,6 +918,64 @@ class TestDependencyGroupMember(DependencyGroupTestCase):
                 self.assertIn(member, chain[idx - 1].dependencies)
 
 
+class TestGetDependencyCycles(DependencyGroupTestCase):
+    """Tests for the get_dependency_cycles function"""
+
+    def get_ring(self, n_members, prefix='member'):
+        """Get members which each depend on the next, without checking for cycles."""
+        members = [DependentTestMember(f'{prefix} {n}', test_case=self)
+                   for n in range(n_members)]
+        for idx, member in enumerate(members):
+            member.add_dependency(members[(idx + 1) % n_members], check_cycles=False)
+        return members
+
+    def assert_is_cycle(self, cycle):
+        """Assert that each member of the cycle depends on the next."""
+        for idx, member in enumerate(cycle):
+            self.assertIn(cycle[(idx + 1) % len(cycle)], member.dependencies)
+
+    def test_no_cycles(self):
+        """Test that no cycles are found in an acyclic graph"""
+        self.assertEqual([], get_dependency_cycles(self.members))
+
+    def test_single_cycle(self):
+        """Test finding a cycle including every member"""
+        members = self.get_ring(5)
+        cycles = get_dependency_cycles(members)
+        self.assertEqual(1, len(cycles))
+        self.assertEqual(set(members), set(cycles[0]))
+        self.assert_is_cycle(cycles[0])
+
+    def test_dependents_of_cycle_excluded(self):
+        """Test that members which only depend on a cycle are not part of it"""
+        members = self.get_ring(3)
+        dependent = DependentTestMember('dependent', test_case=self)
+        dependent.add_dependency(members[0], check_cycles=False)
+        cycles = get_dependency_cycles(members + [dependent] + self.members)
+        self.assertEqual([set(members)], [set(cycle) for cycle in cycles])
+
+    def test_multiple_cycles(self):
+        """Test that each separate cycle is found once"""
+        first_ring = self.get_ring(3, 'first')
+        second_ring = self.get_ring(4, 'second')
+        cycles = get_dependency_cycles(first_ring + second_ring)
+        self.assertCountEqual([set(first_ring), set(second_ring)], [set(cycle) for cycle in cycles])
+        for cycle in cycles:
+            self.assert_is_cycle(cycle)
+
+    def test_self_dependency(self):
+        """Test that a member depending on itself is a cycle"""
+        member = DependentTestMember('self', test_case=self)
+        member.add_dependency(member, check_cycles=False)
+        self.assertEqual([[member]], get_dependency_cycles([member]))
+
+    def test_waiter_rejects_cycles(self):
+        """Test that a DependencyGroupWaiter cannot be created with a cycle"""
+        waiter_cls = get_mock_group_waiter(True, parent_cls=DependencyGroupWaiter)
+        with self.assertRaises(DependencyCycleError):
+            waiter_cls(self.get_ring(3), 10)
+
+
 class DependencyGroupWaiterTestCase(DependencyGroupTestCase):
     def setUp(self):
         super().setUp()
@@ -459,6 +1007,66 @@ class TestSuccessfulDependencyGroupWaiter(DependencyGroupWaiterTestCase):
                 for dep in member.dependencies:
                     self.assertGreater(self.begun_members.index(member), self.begun_members.index(dep))
 
+    def test_max_in_flight_limits_members_in_progress(self):
+        """Test that no more than max_in_flight members are in progress at once"""
+        in_progress = []
+
+        class LimitedDepWaiter(self.SuccessfulDepWaiter):
+            def members_have_completed(self, members):
+                in_progress.append(len(members))
+                # Complete one member per poll
+                member = min(members, key=lambda m: m.name)
+                return {member}, set()
+
+        first = DependentTestMember('first', test_case=self)
+        others = [DependentTestMember(f'other {n}', test_case=self) for n in range(5)]
+        for other in others:
+            other.add_dependency(first)
+        LimitedDepWaiter([first] + others, 10, max_in_flight=2).wait_for_completion()
+        self.assertEqual(2, max(in_progress))
+        self.assertEqual(6, len(self.begun_members))
+
+    def test_max_in_flight_must_be_positive(self):
+        """Test that max_in_flight must allow at least one member to be in progress"""
+        with self.assertRaises(ValueError):
+            self.SuccessfulDepWaiter(self.members, 10, max_in_flight=0)
+
+    def test_critical_path_first(self):
+        """Test that members with the longest chain of dependents are begun first"""
+        short = DependentTestMember('short', test_case=self)
+        long_chain = [DependentTestMember(f'long {n}', test_case=self) for n in range(3)]
+        for dependency, dependent in zip(long_chain, long_chain[1:]):
+            dependent.add_dependency(dependency)
+        self.SuccessfulDepWaiter([short] + long_chain, 10, max_in_flight=1).wait_for_completion()
+        # The short member is not begun until the rest of the chain is no
+        # longer than it.
+        self.assertEqual(long_chain[:2], self.begun_members[:2])
+
+    def test_large_graph(self):
+        """Test waiting for a large layered dependency graph"""
+        layers = [[DependentTestMember(f'layer {i} member {j}', test_case=self) for j in range(20)]
+                  for i in range(25)]
+        for layer, next_layer in zip(layers, layers[1:]):
+            for idx, member in enumerate(next_layer):
+                member.add_dependency(layer[idx], check_cycles=False)
+                member.add_dependency(layer[(idx * 7) % len(layer)], check_cycles=False)
+        members = [member for layer in layers for member in layer]
+
+        self.assertEqual(set(), self.SuccessfulDepWaiter(members, 100).wait_for_completion())
+        begun_indices = {member: idx for idx, member in enumerate(self.begun_members)}
+        self.assertEqual(len(members), len(begun_indices))
+        for member in members:
+            for dep in member.dependencies:
+                self.assertGreater(begun_indices[member], begun_indices[dep])
+
+    def test_member_begin_times_recorded(self):
+        """Test that the time each dependent member began is recorded"""
+        self.use_fake_clock()
+        waiter = self.SuccessfulDepWaiter(self.members, 10, poll_interval=2)
+        waiter.wait_for_completion()
+        self.assertEqual([0, 0, 0, 2],
+                         [waiter.timing.members[str(member)].begin for member in self.members])
+
     def test_members_must_be_dep_group_member_subclasses(self):
         """Test that all dependent group members subclass DependencyGroupMember"""
         with self.assertRaises(TypeError):
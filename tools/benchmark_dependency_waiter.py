@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Benchmark DependencyGroupWaiter on a large synthetic dependency graph.
+#
+# This compares building the dependency graph with a cycle check for each
+# dependency against a single cycle check of the whole graph, and compares the
+# ready-set scheduling of DependencyGroupWaiter against the previous approach
+# of computing the full dependencies of each dependent of a completed member.
+#
+# Run from the root of the repository with:
+#
+#     python3 -m tools.benchmark_dependency_waiter
+
+import argparse
+import random
+import time
+
+from sat.waiting import (
+    DependencyGroupMember,
+    DependencyGroupWaiter,
+    get_dependency_cycles,
+)
+
+
+class BenchmarkMember(DependencyGroupMember):
+    """A member which completes as soon as it is checked."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def begin(self):
+        pass
+
+    def __repr__(self):
+        return self.name
+
+
+class BenchmarkWaiter(DependencyGroupWaiter):
+    """A waiter for BenchmarkMembers."""
+    def condition_name(self):
+        return 'benchmark members'
+
+    def member_has_completed(self, member):
+        return True
+
+
+class FullDependenciesWaiter(BenchmarkWaiter):
+    """A waiter which begins dependents by computing their full dependencies.
+
+    This is how DependencyGroupWaiter released dependents before it tracked
+    the number of remaining dependencies of each member.
+    """
+    def pre_wait_action(self):
+        self.pending = {member for member in self.members if not member.has_dependencies()}
+        self._ready = []
+        for member in self.pending:
+            self._begin_member(member)
+
+    def _check(self):
+        if self.pending:
+            completed, failed = self.members_have_completed(set(self.pending))
+            self.failed |= failed
+            self.pending -= (completed | self.failed)
+            for member in completed:
+                for dependent in member.dependents:
+                    if not dependent.full_dependencies().intersection(self.pending | self.failed):
+                        self.pending.add(dependent)
+                        self._begin_member(dependent)
+
+        self.completed = not self.pending
+        return self.completed
+
+
+def create_parser():
+    """Creates the ArgumentParser for this program.
+
+    Returns:
+        The argparse.ArgumentParser object to parse arguments for this script.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark DependencyGroupWaiter on a synthetic dependency graph'
+    )
+    parser.add_argument('--nodes', type=int, default=2000,
+                        help='The number of members in the dependency graph.')
+    parser.add_argument('--max-dependencies', type=int, default=3,
+                        help='The maximum number of dependencies of each member.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='The seed used to generate the dependency graph.')
+    return parser
+
+
+def get_dependency_graph(num_nodes, max_dependencies, seed, check_cycles):
+    """Create members which each depend on a few randomly chosen earlier members.
+
+    Returns:
+        list of BenchmarkMember: the members of the graph
+    """
+    rng = random.Random(seed)
+    members = [BenchmarkMember(f'member{idx}') for idx in range(num_nodes)]
+    for idx, member in enumerate(members[1:], start=1):
+        for dependency in rng.sample(members[:idx], min(idx, rng.randint(0, max_dependencies))):
+            member.add_dependency(dependency, check_cycles=check_cycles)
+    return members
+
+
+def time_call(func, *args, **kwargs):
+    """Call a function and return its result and the elapsed time in seconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parsed = create_parser().parse_args()
+    graph_args = (parsed.nodes, parsed.max_dependencies, parsed.seed)
+
+    _, checked_time = time_call(get_dependency_graph, *graph_args, check_cycles=True)
+    members, unchecked_time = time_call(get_dependency_graph, *graph_args, check_cycles=False)
+    cycles, cycles_time = time_call(get_dependency_cycles, members)
+    assert not cycles
+    num_edges = sum(len(member.dependencies) for member in members)
+    print(f'Graph with {len(members)} members and {num_edges} dependencies')
+    print(f'  build, checking each dependency for cycles: {checked_time:8.3f}s')
+    print(f'  build, then checking the graph once:        {unchecked_time + cycles_time:8.3f}s')
+
+    for name, waiter_cls in [('full dependencies', FullDependenciesWaiter),
+                             ('ready-set scheduling', BenchmarkWaiter)]:
+        waiter = waiter_cls(get_dependency_graph(*graph_args, check_cycles=False),
+                            timeout=3600, poll_interval=0)
+        remaining, wait_time = time_call(waiter.wait_for_completion)
+        assert not remaining and not waiter.failed
+        print(f'  wait, {name + ":":<38} {wait_time:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Benchmark "sat sensors" against a local stand-in for the Telemetry API.
+#
+# This starts tools.telemetry_server in a separate process, so that its CPU
+# time is not counted, and measures the rate at which the telemetry streams
+# are consumed, the CPU time used per message, and the time taken to receive
+# sensor readings from every BMC for increasing numbers of BMCs.
+#
+# Run from the root of the repository with:
+#
+#     python3 -m tools.benchmark_sensors
+
+import argparse
+import logging
+import subprocess
+import sys
+import time
+import warnings
+
+from sat.apiclient.telemetry import TelemetryAPIClient
+from sat.cli.sensors.telemetry_client import TelemetryMultiplexer
+from tools.telemetry_server import get_synthetic_xnames
+
+TOPICS = ['cray-telemetry-temperature', 'cray-telemetry-power']
+
+
+def create_parser():
+    """Creates the ArgumentParser for this program.
+
+    Returns:
+        The argparse.ArgumentParser object to parse arguments for this script.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark sat sensors against a local Telemetry API stand-in'
+    )
+    parser.add_argument('--bmcs', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='The numbers of BMCs to measure the time to complete for.')
+    parser.add_argument('--sensors', type=int, default=20,
+                        help='The number of sensors of each BMC in each topic.')
+    parser.add_argument('--batchsize', type=int, default=16,
+                        help='The number of metrics in each message.')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='The number of seconds to measure throughput for.')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='The number of messages per second sent on each stream. '
+                             'By default, messages are sent as fast as possible.')
+    return parser
+
+
+def start_server(num_bmcs, num_sensors, rate):
+    """Start the telemetry server in a separate process.
+
+    Returns:
+        tuple: the subprocess.Popen of the server and the port it listens on
+    """
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'tools.telemetry_server', '--bmcs', str(num_bmcs),
+         '--sensors', str(num_sensors), '--rate', str(rate), '--topics', *TOPICS],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True
+    )
+    url = server.stdout.readline().strip()
+    if not url:
+        server.wait()
+        sys.exit(f'The telemetry server failed to start: exit code {server.returncode}')
+    return server, int(url.rsplit(':', 1)[1])
+
+
+def stop_server(server):
+    """Stop the telemetry server process."""
+    server.terminate()
+    server.wait()
+
+
+def time_call(func, *args, **kwargs):
+    """Call a function and return its result, and the elapsed and CPU time in seconds."""
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start, time.process_time() - cpu_start
+
+
+def run_sensors(port, num_bmcs, batchsize, update_until_timeout, total_timeout):
+    """Consume the telemetry streams like sat sensors does.
+
+    Returns:
+        tuple: the results of each topic, and the numbers of messages and
+            metrics received
+    """
+    api_client = TelemetryAPIClient(host=f'127.0.0.1:{port}', cert_verify=False, timeout=60)
+    xnames_info = [{'xname': xname, 'Type': 'NodeBMC'} for xname in get_synthetic_xnames(num_bmcs)]
+    multiplexer = TelemetryMultiplexer(TOPICS, xnames_info, batchsize, update_until_timeout,
+                                       api_client=api_client)
+    if not multiplexer.endpoint_alive():
+        sys.exit('The telemetry server is not responding.')
+    results = multiplexer.run(total_timeout)
+    messages = sum(client.total_messages for client in multiplexer.telemetry_clients)
+    metrics = sum(client.total_metrics for client in multiplexer.telemetry_clients)
+    return results, messages, metrics
+
+
+def print_stats(label, elapsed, cpu, messages, metrics):
+    """Print the throughput and CPU use of a run."""
+    print(f'  {label:<24} {elapsed:8.3f}s {messages / elapsed:10.1f} messages/s '
+          f'{metrics / elapsed:10.1f} metrics/s '
+          f'{1000 * cpu / max(messages, 1):8.3f} ms CPU/message')
+
+
+def main():
+    parsed = create_parser().parse_args()
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', message='Unverified HTTPS request')
+
+    print(f'Throughput of {len(TOPICS)} topics over {parsed.duration:g}s with '
+          f'{max(parsed.bmcs)} BMCs, {parsed.sensors} sensors per BMC, '
+          f'batch size {parsed.batchsize}')
+    server, port = start_server(max(parsed.bmcs), parsed.sensors, parsed.rate)
+    try:
+        (_, messages, metrics), elapsed, cpu = time_call(
+            run_sensors, port, max(parsed.bmcs), parsed.batchsize, True, parsed.duration
+        )
+        print_stats('update until timeout:', elapsed, cpu, messages, metrics)
+    finally:
+        stop_server(server)
+
+    print('Time to receive readings from every BMC')
+    for num_bmcs in parsed.bmcs:
+        server, port = start_server(num_bmcs, parsed.sensors, parsed.rate)
+        try:
+            (results, messages, metrics), elapsed, cpu = time_call(
+                run_sensors, port, num_bmcs, parsed.batchsize, False, 3600
+            )
+        finally:
+            stop_server(server)
+        assert all(result['Done'] and not result['APIError'] for result in results)
+        print_stats(f'{num_bmcs} BMCs:', elapsed, cpu, messages, metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# A local stand-in for the SMA Telemetry API.
+#
+# The server streams synthetic sensor readings, or readings replayed from a
+# recording made with "sat sensors --record", as server-sent events. It
+# serves the "ping" and "stream/<topic>" endpoints used by "sat sensors",
+# honoring the "count" and "batchsize" query parameters of a stream. It can
+# be used to exercise and benchmark the sensors subcommand without a live
+# Telemetry API and Kafka.
+#
+# Run from the root of the repository with:
+#
+#     python3 -m tools.telemetry_server --bmcs 1000 --sensors 20
+#
+# The URL of the server is printed on the first line of output.
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import signal
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from sat.cli.sensors.recording import format_timestamp, iter_recording
+
+API_PREFIX = '/apis/sma-telemetry-api/v1/'
+DEFAULT_TOPICS = ['cray-telemetry-temperature', 'cray-telemetry-power']
+
+# The physical contexts and base values of synthetic sensors for each topic
+SYNTHETIC_SENSORS = {
+    'cray-telemetry-temperature': [('CPU', 55.0), ('Baseboard', 30.0), ('Memory', 40.0)],
+    'cray-telemetry-voltage': [('VoltageRegulator', 12.0), ('CPU', 1.8)],
+    'cray-telemetry-power': [('PowerSupply', 450.0), ('CPU', 150.0)],
+    'cray-telemetry-energy': [('Chassis', 1.0e6)],
+    'cray-telemetry-fan': [('Fan', 6000.0)],
+    'cray-telemetry-pressure': [('LiquidInlet', 30.0)],
+}
+
+
+class SyntheticTopic:
+    """Generates readings of sensors which vary slowly around a base value."""
+
+    def __init__(self, topic, xnames, sensors_per_bmc):
+        """Create a new SyntheticTopic.
+
+        Args:
+            topic (str): the name of the telemetry topic
+            xnames ([str]): the BMCs which report readings
+            sensors_per_bmc (int): the number of sensors of each BMC
+        """
+        self.topic = topic
+        self.xnames = xnames
+        contexts = SYNTHETIC_SENSORS.get(topic, [('Chassis', 1.0)])
+        self.sensors = [(contexts[index % len(contexts)][0], index, contexts[index % len(contexts)][1])
+                        for index in range(sensors_per_bmc)]
+
+    def get_sensors(self, xname_index, iteration):
+        """Get the readings of the sensors of a BMC.
+
+        Args:
+            xname_index (int): the index of the BMC in self.xnames
+            iteration (int): the number of times readings have been sent for
+                all BMCs
+
+        Returns:
+            list of dict: the sensor readings
+        """
+        xname = self.xnames[xname_index]
+        timestamp = format_timestamp(time.time())
+        return [
+            {
+                'Timestamp': timestamp,
+                'Location': xname,
+                'PhysicalContext': context,
+                'Index': index,
+                'DeviceSpecificContext': f'{context} {index}',
+                'Value': f'{base * (1 + 0.05 * math.sin(iteration / 10 + index + xname_index)):.2f}',
+            }
+            for context, index, base in self.sensors
+        ]
+
+
+class RecordedTopic:
+    """Replays the readings of a topic from a sensor recording.
+
+    The buckets and samples of each sensor are replayed in order, one reading
+    per sensor each time readings are sent for a BMC, and the replay starts
+    again from the beginning once a sensor's readings are exhausted.
+    """
+
+    def __init__(self, topic, recording):
+        """Create a new RecordedTopic.
+
+        Args:
+            topic (str): the name of the telemetry topic
+            recording ([RecordedSeries]): the recorded series of all topics
+        """
+        self.topic = topic
+        readings_by_xname = {}
+        for series in recording:
+            series_topic, xname, _, location, parental_context, parental_index, physical_context, \
+                index, physical_subcontext, device_specific_context, subindex = series.key
+            if series_topic != topic:
+                continue
+            sensor = {
+                'Location': location,
+                'ParentalContext': parental_context,
+                'ParentalIndex': parental_index,
+                'PhysicalContext': physical_context,
+                'Index': index,
+                'PhysicalSubContext': physical_subcontext,
+                'DeviceSpecificContext': device_specific_context,
+                'SubIndex': subindex,
+            }
+            # Fields which were missing from the recorded readings are omitted
+            sensor = {key: value for key, value in sensor.items() if value != 'MISSING'}
+            values = [(start, total / count) for start, count, _, _, total in series.buckets]
+            values.extend(series.samples)
+            readings_by_xname.setdefault(xname, []).append((sensor, values))
+        self.xnames = sorted(readings_by_xname)
+        self.readings = [readings_by_xname[xname] for xname in self.xnames]
+
+    def get_sensors(self, xname_index, iteration):
+        """Get the next recorded readings of the sensors of a BMC.
+
+        Args:
+            xname_index (int): the index of the BMC in self.xnames
+            iteration (int): the number of times readings have been sent for
+                all BMCs
+
+        Returns:
+            list of dict: the sensor readings
+        """
+        sensors = []
+        for sensor, values in self.readings[xname_index]:
+            timestamp, value = values[iteration % len(values)]
+            sensors.append({**sensor, 'Timestamp': format_timestamp(timestamp), 'Value': f'{value:g}'})
+        return sensors
+
+
+class TelemetryStandIn:
+    """The topics served by the stand-in and the rate at which messages are sent."""
+
+    def __init__(self, topics, rate=0.0):
+        """Create a new TelemetryStandIn.
+
+        Args:
+            topics (dict): a mapping from topic name to SyntheticTopic or RecordedTopic
+            rate (float): the number of messages per second sent on each
+                stream, or 0 to send messages as fast as possible
+        """
+        self.topics = topics
+        self.rate = rate
+        self.stopped = threading.Event()
+        self.messages_sent = 0
+        self._lock = threading.Lock()
+
+    def iter_messages(self, topic, count, batchsize):
+        """Generate the data of the messages of a stream.
+
+        Args:
+            topic (str): the name of the topic
+            count (int): the number of messages to send, or 0 for no limit
+            batchsize (int): the number of metrics in each message
+
+        Yields:
+            str: the JSON data of each message
+        """
+        source = self.topics[topic]
+        position = 0
+        sent = 0
+        while not self.stopped.is_set() and (count == 0 or sent < count):
+            metrics = []
+            for _ in range(batchsize):
+                iteration, xname_index = divmod(position, len(source.xnames))
+                metrics.append({
+                    'Context': source.xnames[xname_index],
+                    'Events': [{
+                        'EventTimestamp': format_timestamp(time.time()),
+                        'MessageId': 'CrayTelemetry.Sensors',
+                        'Oem': {
+                            'Sensors': source.get_sensors(xname_index, iteration),
+                            'TelemetrySource': 'River'
+                        }
+                    }]
+                })
+                position += 1
+            yield json.dumps({'metrics': {'messages': metrics}})
+            sent += 1
+            with self._lock:
+                self.messages_sent += 1
+            if self.rate:
+                self.stopped.wait(1 / self.rate)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Serves the ping and stream endpoints of the Telemetry API."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        parsed = urlsplit(self.path)
+        if not parsed.path.startswith(API_PREFIX):
+            self.send_json(404, {'title': 'Not Found'})
+            return
+
+        resource = parsed.path[len(API_PREFIX):]
+        if resource == 'ping':
+            self.send_json(200, {})
+            return
+
+        topic = resource[len('stream/'):] if resource.startswith('stream/') else None
+        if topic not in stand_in.topics:
+            self.send_json(404, {'title': 'Not Found', 'detail': f'Unknown topic {topic}'})
+            return
+
+        params = parse_qs(parsed.query)
+        try:
+            count = int(params.get('count', ['0'])[0])
+            batchsize = int(params.get('batchsize', ['1'])[0])
+        except ValueError:
+            self.send_json(400, {'title': 'Bad Request', 'detail': 'Invalid count or batchsize'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for data in stand_in.iter_messages(topic, count, max(batchsize, 1)):
+                frame = f'event: message\ndata: {data}\n\n'.encode()
+                self.wfile.write(f'{len(frame):x}\r\n'.encode() + frame + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+            pass
+        self.close_connection = True
+
+
+def create_tls_context(hostname):
+    """Create a server TLS context with a new self-signed certificate.
+
+    Args:
+        hostname (str): the host name in the certificate
+
+    Returns:
+        ssl.SSLContext: the server context
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cert_path = os.path.join(temp_dir, 'cert.pem')
+        key_path = os.path.join(temp_dir, 'key.pem')
+        with open(cert_path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, 'wb') as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM,
+                                      serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+        context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def create_server(stand_in, host='127.0.0.1', port=0, use_tls=True):
+    """Create an HTTP server for a TelemetryStandIn.
+
+    Args:
+        stand_in (TelemetryStandIn): the topics to serve
+        host (str): the address to listen on
+        port (int): the port to listen on, or 0 for any free port
+        use_tls (bool): whether to serve HTTPS with a self-signed certificate
+
+    Returns:
+        ThreadingHTTPServer: the server, which is not yet serving
+    """
+    server = ThreadingHTTPServer((host, port), _RequestHandler)
+    server.daemon_threads = True
+    server.stand_in = stand_in
+    if use_tls:
+        server.socket = create_tls_context(host).wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def create_parser():
+    """Creates the ArgumentParser for this program.
+
+    Returns:
+        The argparse.ArgumentParser object to parse arguments for this script.
+    """
+    parser = argparse.ArgumentParser(description='Serve synthetic or recorded telemetry '
+                                                 'like the SMA Telemetry API')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='The address to listen on.')
+    parser.add_argument('--port', type=int, default=0,
+                        help='The port to listen on. By default, any free port is used.')
+    parser.add_argument('--no-tls', action='store_true',
+                        help='Serve HTTP instead of HTTPS with a self-signed certificate.')
+    parser.add_argument('--topics', nargs='+', default=DEFAULT_TOPICS,
+                        help='The topics to serve synthetic readings for.')
+    parser.add_argument('--bmcs', type=int, default=16,
+                        help='The number of BMCs with synthetic readings.')
+    parser.add_argument('--sensors', type=int, default=10,
+                        help='The number of sensors of each BMC in each topic.')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='The number of messages per second sent on each stream. '
+                             'By default, messages are sent as fast as possible.')
+    parser.add_argument('--recording',
+                        help='Replay the readings in a recording made by "sat sensors --record" '
+                             'instead of serving synthetic readings.')
+    return parser
+
+
+def get_synthetic_xnames(num_bmcs):
+    """Get the xnames of synthetic NodeBMCs, with up to 64 BMCs per chassis."""
+    return [f'x3000c{index // 64}s{index % 64}b0' for index in range(num_bmcs)]
+
+
+def main():
+    parsed = create_parser().parse_args()
+
+    if parsed.recording:
+        recording = list(iter_recording(parsed.recording))
+        topic_names = sorted({series.key[0] for series in recording})
+        topics = {topic: RecordedTopic(topic, recording) for topic in topic_names}
+    else:
+        xnames = get_synthetic_xnames(parsed.bmcs)
+        topics = {topic: SyntheticTopic(topic, xnames, parsed.sensors) for topic in parsed.topics}
+
+    stand_in = TelemetryStandIn(topics, parsed.rate)
+    server = create_server(stand_in, parsed.host, parsed.port, not parsed.no_tls)
+
+    def shutdown(signum, frame):
+        stand_in.stopped.set()
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    scheme = 'http' if parsed.no_tls else 'https'
+    print(f'{scheme}://{parsed.host}:{server.server_address[1]}', flush=True)
+    server.serve_forever(poll_interval=0.1)
+    server.server_close()
+    print(f'Sent {stand_in.messages_sent} messages on topics {", ".join(topics)}',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()